@@ -16,12 +16,13 @@
 import os
 import sys
 import json
+import time
 import logging
-import requests
 import asyncio
-import pandas as pd
+import argparse
 import numpy as np
 import re
+import functools
 from collections import deque
 from typing import Dict, Optional, Any, Tuple
 
@@ -37,11 +38,23 @@ try:
         initialize,
         stop,
         set_step,
-        advance
+        advance,
+        get_forecast,
+        get_scenario,
+        get_inputs,
+        ForecastService
     )
     from src.agents.information_synthesizer_agent import make_information_synthesizer_agent
     from src.agents.decision_maker_agent import make_decision_maker_agent
     from src.utils import convert_seconds_to_datetime_string
+    from src.core.tracing import span, configure_tracing
+    from src.core.llm_client import set_llm_episode, export_scheduler_metrics
+    from src.config import parse_cli_overrides, configure_settings
+    from src.schedules import EpisodeSchedule, ScheduleRules
+    from src.action_registry import ActionRegistry
+    from src.policy import EXPERT_ACTION_NAME, LocalController, expert_features
+    from src.core.prompt_engine import PromptEngine
+    from src.core.run_config import RunConfig, load_run_config, split_overrides
 except ImportError as e:
     print("=" * 80)
     print("[IMPORT ERROR] 无法导入 'src' 目录下的模块。")
@@ -58,45 +71,47 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # 阶段一：全局参数与配置
 # ==============================================================================
 
-# --- BOPTEST & 模拟参数 ---
-BOPTEST_URL = 'http://127.0.0.1:80'
-TESTCASE = 'bestest_air'
-TRAINING_START_TIME = 146 * 24 * 3600
-TESTING_START_TIME = 153 * 24 * 3600
-EPISODE_LENGTH = 7 * 24 * 3600
-WARMUP_PERIOD = 7 * 24 * 3600
-
-# --- 周期定义 ---
-CONTROL_PERIOD = 900
-SAMPLING_PERIOD = 60
+# --- BOPTEST、模拟参数、周期定义与奖励权重 ---
+# 均来自 configs/run_config.yaml 的 expert_data 部分 (见 src.core.run_config.ExpertDataConfig)
+# Simulation parameters, periods and reward weights come from the expert_data section of
+# configs/run_config.yaml (see src.core.run_config.ExpertDataConfig)
 
 # --- 路径定义 ---
 OUTPUT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_DIR = os.path.join(OUTPUT_DIR, "datasets")
 STATIC_INFO_PATH = os.path.join(PROJECT_ROOT, "data", "output", "static_building_info.json")
-os.makedirs(DATASET_DIR, exist_ok=True)
 
-# --- 调试与奖励权重 ---
+# --- 调试 ---
 DEBUG_MODE = True
-W_COST, W_TEMP, W_SLEW = 100.0, 1.0, 10.0
 
 
 # ==============================================================================
 # 阶段二：辅助函数
 # ==============================================================================
 
+@functools.lru_cache(maxsize=1)
+def _schedule_rules() -> ScheduleRules:
+    # configs/schedules_config.yaml 只读取一次 (the schedules config is read once)
+    return ScheduleRules.from_config()
+
+
 def get_price_by_time_of_use(time_seconds: float) -> float:
-    ON_PEAK_PRICE, MID_PEAK_PRICE, OFF_PEAK_PRICE = 0.13814, 0.08420, 0.04440
-    seconds_in_day = time_seconds % 86400
-    if 12 * 3600 <= seconds_in_day < 19 * 3600:
-        return ON_PEAK_PRICE
-    elif (6 * 3600 <= seconds_in_day < 12 * 3600) or (19 * 3600 <= seconds_in_day < 22 * 3600):
-        return MID_PEAK_PRICE
-    else:
-        return OFF_PEAK_PRICE
+    # 循环内使用预计算的 EpisodeSchedule；此函数保留给单点查询 (the loop uses a precomputed EpisodeSchedule)
+    return _schedule_rules().price_at(time_seconds)
+
+
+def _fan_action(action_json: Dict, action_registry: Optional[ActionRegistry]) -> float:
+    # 动作注册表负责截断和拒绝无效值；没有注册表时按 [0, 1] 截断
+    # The action registry clamps and rejects invalid values; without one the value is clipped to [0, 1]
+    if action_registry is None:
+        return float(np.clip(float(action_json['fcu_oveFan_u']), 0.0, 1.0))
+    action, notes = action_registry.validate({'fcu_oveFan_u': action_json['fcu_oveFan_u']})
+    if action is None:
+        raise ValueError('; '.join(notes))
+    return float(action['fcu_oveFan_u'])
 
 
-def parse_llm_action(text: str) -> float:
+def parse_llm_action(text: str, action_registry: Optional[ActionRegistry] = None) -> float:
     try:
         action_match = re.search(r'<action>(.*?)</action>', text, re.DOTALL)
         if action_match:
@@ -104,16 +119,16 @@ def parse_llm_action(text: str) -> float:
             if action_str.startswith("```json"): action_str = action_str[7:]
             if action_str.endswith("```"): action_str = action_str[:-3]
             action_json = json.loads(action_str)
-            return np.clip(float(action_json['fcu_oveFan_u']), 0.0, 1.0)
+            return _fan_action(action_json, action_registry)
 
         json_block_match = re.search(r'```json(.*?)```', text, re.DOTALL)
         if json_block_match:
             action_str = json_block_match.group(1).strip()
             action_json = json.loads(action_str)
-            return np.clip(float(action_json['fcu_oveFan_u']), 0.0, 1.0)
+            return _fan_action(action_json, action_registry)
 
         action_json = json.loads(text)
-        return np.clip(float(action_json['fcu_oveFan_u']), 0.0, 1.0)
+        return _fan_action(action_json, action_registry)
     except Exception as e:
         logging.error(f"解析LLM动作失败: {e}. Raw text: '{text}'. 返回安全动作0.0。")
         return 0.0
@@ -135,22 +150,32 @@ def load_json_file(path: str) -> Dict:
 # 阶段三：主数据生成函数
 # ==============================================================================
 
-async def generate_llm_expert_dataset(mode: str = 'train'):
+async def generate_llm_expert_dataset(mode: str = 'train', run_config: Optional[RunConfig] = None):
+    run_config = run_config or load_run_config()
+    params = run_config.expert_data
+    control_period, sampling_period = params.control_period, params.sampling_period
+    dataset_dir = params.output_dir or DATASET_DIR
+    os.makedirs(dataset_dir, exist_ok=True)
     logging.info(f"\n{'=' * 80}\n===== 开始生成LLM专家数据集 ({mode.upper()}) =====\n{'=' * 80}")
 
+    # pandas 只在写出数据集时需要，惰性导入以加快启动
+    # pandas is only needed to write the dataset, so it is imported lazily for faster startup
+    import pandas as pd
+
     testid = None
     dataset = []
-    start_time = TRAINING_START_TIME if mode == 'train' else TESTING_START_TIME
+    start_time = params.training_start_time if mode == 'train' else params.testing_start_time
 
-    csv_output_filename = os.path.join(DATASET_DIR, f'llm_expert_data_{mode}.csv')
-    llm_log_filename = os.path.join(DATASET_DIR, f'llm_interactions_{mode}.jsonl')
+    csv_output_filename = os.path.join(dataset_dir, f'llm_expert_data_{mode}.csv')
+    llm_log_filename = os.path.join(dataset_dir, f'llm_interactions_{mode}.jsonl')
 
     try:
         logging.info("\n--- [步骤 1/5] BOPTEST环境初始化 ---")
-        testid = await asyncio.to_thread(select_testcase, TESTCASE)
+        testid = await asyncio.to_thread(select_testcase, params.test_case_name)
         if not testid: raise RuntimeError("选择测试案例失败。")
-        await asyncio.to_thread(set_step, testid, SAMPLING_PERIOD)
-        initial_state = await asyncio.to_thread(initialize, testid, start_time, WARMUP_PERIOD)
+        set_llm_episode(run_config.run_name or f"expert_{mode}_{testid}")
+        await asyncio.to_thread(set_step, testid, sampling_period)
+        initial_state = await asyncio.to_thread(initialize, testid, start_time, params.warmup_period)
         if not initial_state: raise RuntimeError("BOPTEST环境初始化失败。")
         logging.info(f"BOPTEST环境初始化成功! Test ID: {testid}")
 
@@ -161,115 +186,171 @@ async def generate_llm_expert_dataset(mode: str = 'train'):
         static_info = load_json_file(STATIC_INFO_PATH)
         if not static_info:
             logging.warning("未能加载静态建筑信息，LLM的上下文将受限。")
+        # 整个回合的电价、舒适度设定点和在室时间表，按采样周期预计算，奖励与提示共用
+        # Price, comfort setpoint and occupancy of the whole episode, precomputed at the sampling period
+        # and shared by the reward and the prompt
+        schedule = EpisodeSchedule.for_episode(start_time, params.episode_length, sampling_period,
+                                               testcase=params.test_case_name, static_info=static_info)
+        inputs = await asyncio.to_thread(get_inputs, testid)
+        action_registry = ActionRegistry.for_testcase(static_info, params.test_case_name, inputs)
+        # 决策输入的模板把不变的目标放在前面 (the decision input template puts the constant goal first)
+        prompt_engine = PromptEngine()
+        # 目标中的权重与奖励计算使用的权重一致 (the goal states the same weights the reward uses)
+        user_goal = ("Your goal is to be an expert building controller. Minimize a weighted sum of: "
+                     f"1. Energy Cost (weight={params.w_cost}), 2. Thermal Discomfort (weight={params.w_temp}), "
+                     f"3. Control Action Slew Rate (weight={params.w_slew}). "
+                     "Provide the fan speed 'fcu_oveFan_u' (0.0 to 1.0) in JSON format.")
 
         y_current = initial_state
         last_llm_action, last_reward = 0.0, 0.0
         history_temp = deque([y_current.get('zon_reaTRooAir_y', 297.15)] * 4, maxlen=4)
         history_power = deque([y_current.get('fcu_reaPCoo_y', 0)] * 4, maxlen=4)
 
+        # 整个回合的预测只获取一次并缓存到磁盘，之后每个控制周期在本地切片
+        # The episode's forecast is fetched once and cached on disk; every control period slices it locally
+        forecast_points = ['TDryBul', 'HGloHor', 'PriceElectricPowerDynamic']
+        forecast_horizon = 4 * control_period
+        forecasts = ForecastService(testid, params.test_case_name, forecast_points, control_period,
+                                    block_horizon=int(params.episode_length) + forecast_horizon,
+                                    fetch=get_forecast, scenario=get_scenario, start_time=start_time)
+
+        # 由专家数据集训练的本地策略服务分布内的状态，与 CSV 使用同一状态向量
+        # A policy trained on the expert dataset serves in-distribution states from the same state vector
+        local_controller = None
+        if params.local_policy:
+            local_controller = LocalController.from_file(params.local_policy, params.local_policy_margin)
+            logging.info(f"Local policy '{params.local_policy}' enabled "
+                         f"(gate threshold {local_controller.policy.gate_threshold:.2f}).")
+
         logging.info("代理和状态跟踪器准备就绪。")
 
         logging.info("\n--- [步骤 3/5] 进入主控制循环 ---")
-        total_control_steps = int(EPISODE_LENGTH / CONTROL_PERIOD)
-        steps_per_control = int(CONTROL_PERIOD / SAMPLING_PERIOD)
+        total_control_steps = int(params.episode_length / control_period)
+        steps_per_control = int(control_period / sampling_period)
 
         for i in range(total_control_steps):
             logging.info(f"\n" + "-" * 30 + f" 外层控制周期 {i + 1}/{total_control_steps} " + "-" * 30)
-
-            y_control_period_start = y_current
-
-            # --- a.1. 为数据集和LLM准备统一的26维数值状态 ---
-            state_vector = {}
-            forecast_points = ['TDryBul', 'HGloHor', 'PriceElectricPowerDynamic']
-            forecast_payload = {'point_names': forecast_points, 'horizon': 4 * CONTROL_PERIOD,
-                                'interval': CONTROL_PERIOD}
-            res_forecast = requests.put(f'{BOPTEST_URL}/forecast/{testid}', json=forecast_payload)
-            forecast_data = res_forecast.json().get('payload', {})
-            for point in forecast_points:
-                values = forecast_data.get(point, [0] * 5)
-                state_vector[f'obs_{point}_current'] = values[0]
-                for j in range(4): state_vector[f'obs_{point}_future_{j + 1}'] = values[j + 1]
-
-            current_temp = y_control_period_start.get('zon_reaTRooAir_y', 297.15)
-            current_power = y_control_period_start.get('fcu_reaPCoo_y', 0)
-            temp_vector, power_vector = [current_temp] + list(history_temp), [current_power] + list(history_power)
-            state_vector['obs_temp_current'] = temp_vector[0]
-            for j in range(4): state_vector[f'obs_temp_past_{j + 1}'] = temp_vector[j + 1]
-            state_vector['obs_power_current'] = power_vector[0]
-            for j in range(4): state_vector[f'obs_power_past_{j + 1}'] = power_vector[j + 1]
-            state_vector['obs_time_sec_of_day'] = y_control_period_start.get('time', 0) % 86400
-
-            # --- a.2. 为LLM准备文本状态 (使用完整的26维向量) ---
-            input_for_synthesizer = {
-                "static_info": static_info,
-                "full_state_vector": state_vector,
-                "human_readable_time": convert_seconds_to_datetime_string(y_control_period_start.get('time')),
-                "data_schema_notes": {
-                    "temporal_order_note": "For keys with '_past_N', N=1 is the most recent past step (t-15m), and N=4 is the oldest (t-60m). For keys with '_future_N', N=1 is the next future step (t+15m)."
-                }
-            }
-            synthesized_input = \
-            (await information_synthesizer.run(task=json.dumps(input_for_synthesizer, indent=4))).messages[-1].content
-
-            # --- a.3. 调用LLM进行决策 ---
-            user_goal = ("Your goal is to be an expert building controller. Minimize a weighted sum of: "
-                         "1. Energy Cost (weight=100.0), 2. Thermal Discomfort (weight=1.0), "
-                         "3. Control Action Slew Rate (weight=10.0). "
-                         "Provide the fan speed 'fcu_oveFan_u' (0.0 to 1.0) in JSON format.")
-            llm_input_for_decision = (
-                f"[CURRENT STATE]:\n{synthesized_input}\n\n[USER GOAL]:\n{user_goal}\n\n[LAST REWARD]:\n{last_reward:.4f}")
-            llm_raw_output = (await decision_maker.run(task=llm_input_for_decision)).messages[-1].content
-            action_llm = parse_llm_action(llm_raw_output)
-
-            # --- b. 内部循环：执行并计算过程奖励 ---
-            process_energy_cost, process_temp_violation_squared = 0.0, 0.0
-            y_sample_iterator = y_control_period_start
-            for _ in range(steps_per_control):
-                control_signal = {'fcu_oveFan_u': action_llm, 'fcu_oveFan_activate': 1, 'fcu_oveTSup_activate': 1,
-                                  'fcu_oveTSup_u': 291.15}
-                y_next_sample = await asyncio.to_thread(advance, testid, control_signal)
-                if not y_next_sample: break
-                power = y_sample_iterator.get('fcu_reaPCoo_y', 0)
-                price = get_price_by_time_of_use(y_sample_iterator.get('time', 0))
-                process_energy_cost += price * (power / 1000.0) * (SAMPLING_PERIOD / 3600.0)
-                temp = y_sample_iterator.get('zon_reaTRooAir_y', 0)
-                time_in_day = y_sample_iterator.get('time', 0) % 86400
-                setpoint = (24.0 + 273.15) if 28800 <= time_in_day < 64800 else (30.0 + 273.15)
-                process_temp_violation_squared += max(0, temp - setpoint) ** 2
-                y_sample_iterator = y_next_sample
-
-            y_current = y_sample_iterator
-            if not y_current: break
-
-            # --- c. 周期结束：计算最终奖励并记录数据 ---
-            action_slew_rate = (action_llm - last_llm_action) ** 2
-            final_reward = -(
-                        W_COST * process_energy_cost + W_TEMP * process_temp_violation_squared + W_SLEW * action_slew_rate)
-            last_reward = final_reward
-
-            log_entry = {'step': i, 'reward': final_reward, 'action_llm': action_llm,
-                         'unweighted_energy_cost': process_energy_cost,
-                         'unweighted_temp_violation_sq': process_temp_violation_squared,
-                         'unweighted_action_slew': action_slew_rate}
-            log_entry.update(state_vector)
-            dataset.append(log_entry)
-
-            pd.DataFrame(dataset).to_csv(csv_output_filename, index=False)
-            with open(llm_log_filename, 'a', encoding='utf-8') as f:
-                log_line = json.dumps({'step': i, 'input': llm_input_for_decision, 'output': llm_raw_output})
-                f.write(log_line + '\n')
-
-            if DEBUG_MODE:
-                logging.info(f"[DEBUG] Parsed LLM Action: {action_llm:.4f} | Final Reward: {final_reward:.4f}")
-                logging.info(f" incremental data saved to {csv_output_filename} and {llm_log_filename}")
-
-            # --- d. 更新历史状态 ---
-            last_llm_action = action_llm
-            history_temp.append(current_temp)
-            history_power.append(current_power)
+            with span("control_period", step=i + 1, testid=testid):
+
+                y_control_period_start = y_current
+
+                # --- a.1. 为数据集和LLM准备统一的26维数值状态 ---
+                state_vector = {}
+                forecast_data = await asyncio.to_thread(forecasts.window, y_control_period_start.get('time', 0),
+                                                        forecast_horizon) or {}
+                for point in forecast_points:
+                    values = forecast_data.get(point, [0] * 5)
+                    state_vector[f'obs_{point}_current'] = values[0]
+                    for j in range(4): state_vector[f'obs_{point}_future_{j + 1}'] = values[j + 1]
+
+                current_temp = y_control_period_start.get('zon_reaTRooAir_y', 297.15)
+                current_power = y_control_period_start.get('fcu_reaPCoo_y', 0)
+                temp_vector, power_vector = [current_temp] + list(history_temp), [current_power] + list(history_power)
+                state_vector['obs_temp_current'] = temp_vector[0]
+                for j in range(4): state_vector[f'obs_temp_past_{j + 1}'] = temp_vector[j + 1]
+                state_vector['obs_power_current'] = power_vector[0]
+                for j in range(4): state_vector[f'obs_power_past_{j + 1}'] = power_vector[j + 1]
+                state_vector['obs_time_sec_of_day'] = y_control_period_start.get('time', 0) % 86400
+
+                # --- a.1.5. 本地策略 (置信门控，分布外的状态才询问LLM) ---
+                local_action, llm_raw_output = None, None
+                if local_controller is not None:
+                    local_action, distance = local_controller.decide(expert_features(state_vector))
+                    if local_action is not None:
+                        try:
+                            action_llm = _fan_action({EXPERT_ACTION_NAME: local_action[EXPERT_ACTION_NAME]},
+                                                     action_registry)
+                            logging.info(f"Served by the local policy (distance {distance:.2f}).")
+                        except ValueError as e:
+                            logging.warning(f"Local policy action rejected ({e}); asking the LLM.")
+                            local_action = None
+                llm_start = time.perf_counter()
+
+                if local_action is None:
+                    # --- a.2. 为LLM准备文本状态 (使用完整的26维向量) ---
+                    input_for_synthesizer = {
+                        "static_info": static_info,
+                        "full_state_vector": state_vector,
+                        "human_readable_time": convert_seconds_to_datetime_string(y_control_period_start.get('time')),
+                        "schedule": schedule.window(y_control_period_start.get('time', 0), 5, step=control_period),
+                        "data_schema_notes": {
+                            "temporal_order_note": "For keys with '_past_N', N=1 is the most recent past step (t-15m), and N=4 is the oldest (t-60m). For keys with '_future_N', N=1 is the next future step (t+15m)."
+                        }
+                    }
+                    with span("llm.information_synthesizer"):
+                        synthesized_input = \
+                        (await information_synthesizer.run(task=json.dumps(input_for_synthesizer, indent=4))).messages[-1].content
+
+                    # --- a.3. 调用LLM进行决策 ---
+                    llm_input_for_decision = prompt_engine.render("expert_decision_input_template", user_goal=user_goal,
+                                                                  last_reward=last_reward,
+                                                                  current_state=synthesized_input).text
+                    with span("llm.decision_maker"):
+                        llm_raw_output = (await decision_maker.run(task=llm_input_for_decision)).messages[-1].content
+                    action_llm = parse_llm_action(llm_raw_output, action_registry)
+                    if local_controller is not None:
+                        local_controller.record_llm_step(time.perf_counter() - llm_start)
+
+                # --- b. 内部循环：执行并计算过程奖励 ---
+                process_energy_cost, process_temp_violation_squared = 0.0, 0.0
+                y_sample_iterator = y_control_period_start
+                with span("sample_loop", samples=steps_per_control):
+                    for _ in range(steps_per_control):
+                        control_signal = {'fcu_oveFan_u': action_llm, 'fcu_oveFan_activate': 1, 'fcu_oveTSup_activate': 1,
+                                          'fcu_oveTSup_u': 291.15}
+                        y_next_sample = await asyncio.to_thread(advance, testid, control_signal)
+                        if not y_next_sample: break
+                        sample_time = y_sample_iterator.get('time', 0)
+                        power = y_sample_iterator.get('fcu_reaPCoo_y', 0)
+                        price, setpoint = schedule.reward_terms_at(sample_time)
+                        process_energy_cost += price * (power / 1000.0) * (sampling_period / 3600.0)
+                        temp = y_sample_iterator.get('zon_reaTRooAir_y', 0)
+                        process_temp_violation_squared += max(0, temp - setpoint) ** 2
+                        y_sample_iterator = y_next_sample
+
+                y_current = y_sample_iterator
+                if not y_current: break
+
+                # --- c. 周期结束：计算最终奖励并记录数据 ---
+                action_slew_rate = (action_llm - last_llm_action) ** 2
+                final_reward = -(
+                            params.w_cost * process_energy_cost + params.w_temp * process_temp_violation_squared
+                            + params.w_slew * action_slew_rate)
+                last_reward = final_reward
+
+                log_entry = {'step': i, 'reward': final_reward, 'action_llm': action_llm,
+                             'unweighted_energy_cost': process_energy_cost,
+                             'unweighted_temp_violation_sq': process_temp_violation_squared,
+                             'unweighted_action_slew': action_slew_rate}
+                log_entry.update(state_vector)
+                if local_controller is not None:
+                    # 本地策略服务的行不是专家决策，训练时会被跳过 (rows served locally are skipped in training)
+                    log_entry['policy'] = 'local' if local_action is not None else ''
+                dataset.append(log_entry)
+
+                with span("dataset.save"):
+                    pd.DataFrame(dataset).to_csv(csv_output_filename, index=False)
+                    if local_action is None:
+                        with open(llm_log_filename, 'a', encoding='utf-8') as f:
+                            log_line = json.dumps({'step': i, 'input': llm_input_for_decision, 'output': llm_raw_output})
+                            f.write(log_line + '\n')
+
+                if DEBUG_MODE:
+                    logging.info(f"[DEBUG] Parsed LLM Action: {action_llm:.4f} | Final Reward: {final_reward:.4f}")
+                    logging.info(f" incremental data saved to {csv_output_filename} and {llm_log_filename}")
+
+                # --- d. 更新历史状态 ---
+                last_llm_action = action_llm
+                history_temp.append(current_temp)
+                history_power.append(current_power)
 
         logging.info("\n--- [步骤 4/5] 主控制循环完成 ---")
         logging.info(f"最终数据集已生成，共 {len(dataset)} 条记录。")
+        if action_registry is not None:
+            logging.info(f"Action repair statistics: {action_registry.stats.to_dict()}")
+        logging.info(f"Prompt prefix statistics: {prompt_engine.stats_dict()}")
+        if local_controller is not None:
+            logging.info(f"Local policy statistics: {local_controller.stats.to_dict()}")
 
     except Exception as e:
         logging.error(f"\n在主工作流中发生严重错误: {e}", exc_info=True)
@@ -279,6 +360,7 @@ async def generate_llm_expert_dataset(mode: str = 'train'):
         if testid:
             await asyncio.to_thread(stop, testid)
             logging.info(f"已停止并清理BOPTEST测试实例: {testid}")
+        export_scheduler_metrics()
         logging.info(f"\n{'=' * 80}\n===== LLM专家数据集生成流程结束 =====\n{'=' * 80}")
 
 
@@ -286,6 +368,20 @@ async def generate_llm_expert_dataset(mode: str = 'train'):
 # 阶段四：主程序入口
 # ==============================================================================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate an LLM expert dataset against BOPTEST.")
+    parser.add_argument("--mode", choices=["train", "test"], default="train")
+    parser.add_argument("--config", type=str, default=None,
+                        help="Path of the run config YAML (default: configs/run_config.yaml).")
+    parser.add_argument("--set", dest="overrides", action="append", metavar="KEY=VALUE",
+                        help="Override a setting or run parameter, e.g. expert_data.control_period=1800 (repeatable).")
+    cli_args = parser.parse_args()
+    # 环境设置 (如 trace_file、llm_base_url) 与运行参数分开应用 (settings are applied apart from run parameters)
+    settings_overrides, run_overrides = split_overrides(parse_cli_overrides(cli_args.overrides))
+    settings = configure_settings(**settings_overrides)
+    run_config = load_run_config(cli_args.config, overrides=run_overrides)
+    if settings.trace_file:
+        configure_tracing(settings.trace_file)
+
     os.chdir(PROJECT_ROOT)
     logging.info(f"工作目录已更改为项目根目录: {os.getcwd()}")
 
@@ -296,4 +392,4 @@ if __name__ == "__main__":
     except ImportError:
         pass
 
-    asyncio.run(generate_llm_expert_dataset(mode='train'))
\ No newline at end of file
+    asyncio.run(generate_llm_expert_dataset(mode=cli_args.mode, run_config=run_config))
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+比较已存储的运行 (Compare stored runs)。
+
+示例 (Examples):
+    python analyze_runs.py data/output
+    python analyze_runs.py data/output/memory_store_a.json data/output/memory_store_b.json --daily
+    python analyze_runs.py data/output --columns "kpi:*" --export data/output/runs.parquet
+    python analyze_runs.py data/output --summary-out data/output/run_summary.csv
+"""
+import os
+import csv
+import glob
+import time
+import argparse
+
+from src.run_analytics import (DEFAULT_COMFORT_BAND, ZONE_TEMPERATURE_PATTERNS, comparison_table, daily_energy,
+                               export_runs, format_table, load_runs, summarize_run)
+
+# 对比表的默认列 (default columns of the comparison table)
+DEFAULT_COLUMNS = ["run", "testcase", "objective", "steps", "days", "total_reward", "ener_tot", "energy_per_day",
+                   "tdis_tot", "idis_tot", "cost_tot", "comfort_violation_h", "out_of_band_h"]
+
+
+def expand_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(sorted(glob.glob(os.path.join(path, "memory_store*.json"))))
+        else:
+            sources.append(path)
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize and compare stored LLM-in-the-loop runs.")
+    parser.add_argument("paths", nargs="+", help="Memory files, or directories searched for memory_store*.json.")
+    parser.add_argument("--runs", nargs="*", default=None, help="Only these run keys (or key prefixes).")
+    parser.add_argument("--columns", nargs="*", default=None,
+                        help="Column patterns to load, e.g. 'kpi:*' 'obs:*TRoo*' (default: all).")
+    parser.add_argument("--comfort-band", type=str, default=f"{DEFAULT_COMFORT_BAND[0]},{DEFAULT_COMFORT_BAND[1]}",
+                        help="Zone comfort band in degC for out_of_band_h (default: 21,24).")
+    parser.add_argument("--all-columns", action="store_true", help="Show every summary metric in the table.")
+    parser.add_argument("--daily", action="store_true", help="Also print the energy per simulated day.")
+    parser.add_argument("--export", type=str, default=None, help="Write the step table to .npz, .parquet or .csv.")
+    parser.add_argument("--summary-out", type=str, default=None, help="Write the comparison table to a CSV file.")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse the memory files instead of using the cache.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sources = expand_sources(args.paths)
+    columns = args.columns
+    if columns is not None:
+        # 汇总指标需要的列总会加载 (the columns the summary needs are always loaded)
+        columns = list(columns) + ["kpi:*", "rew:*"] + ["obs:" + p for p in ZONE_TEMPERATURE_PATTERNS]
+    tables = [t for t in load_runs(sources, columns=columns, keys=args.runs, use_cache=not args.no_cache) if len(t)]
+    low, high = (float(v) for v in args.comfort_band.split(","))
+    summaries = [summarize_run(table, comfort_band=(low, high)) for table in tables]
+    header, rows = comparison_table(summaries, None if args.all_columns else DEFAULT_COLUMNS)
+    print(format_table(header, rows))
+
+    if args.daily:
+        for table in tables:
+            days, energy = daily_energy(table)
+            if len(days):
+                print(f"\n{table.label} energy per day (ener_tot increments):")
+                print(format_table(["day", "energy"], [[int(d), float(e)] for d, e in zip(days, energy)]))
+
+    if args.summary_out:
+        with open(args.summary_out, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        print(f"\n📄 Comparison table written to '{args.summary_out}'.")
+    if args.export:
+        export_runs(tables, args.export)
+        print(f"📄 Step table ({sum(len(t) for t in tables)} rows) written to '{args.export}'.")
+    print(f"\n{len(tables)} runs from {len(sources)} files analysed in {time.perf_counter() - start:.2f}s.")
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+控制循环端到端基准测试 (End-to-end benchmarks for the control loop)。
+
+使用脚本化的假模型客户端 (确定性回复 + 可配置延迟) 和本地 BOPTEST 替身，
+运行 `run_agent_workflow` 与 `generate_llm_expert_dataset`，测量：
+    * 每秒步数 (steps/second)
+    * 各阶段开销 (来自追踪 span 的时间分解)
+    * MemoryStore 在 10k 步内的内存增长
+    * 持久化 (memory.save) 的耗时与文件大小
+结果写入机器可读的 JSON 文件；可与基线文件比较以发现管道代码的性能回退。
+无需 API 密钥或模拟器。
+
+Runs both loops against a scripted fake model client and the local BOPTEST stand-in and
+writes steps/second, per-stage overhead, memory growth and persistence cost to a JSON file.
+
+示例 (Examples):
+    python benchmarks/bench_control_loop.py
+    python benchmarks/bench_control_loop.py --steps 100 --latency-ms 50 --output results.json
+    python benchmarks/bench_control_loop.py --baseline benchmarks/results/baseline.json --tolerance 0.2
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import functools
+import contextlib
+import tracemalloc
+import subprocess
+from typing import Dict, Any, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import main
+from LLM_expert_data_collection import generate_llm_expert_data as expert
+from src.agents import decision_maker_agent, information_synthesizer_agent, knowledge_retriever_agent
+from src.core.scripted_llm_client import ScriptedChatCompletionClient, scripted_response
+from src.core.scheduled_client import ScheduledChatCompletionClient
+from src.core.llm_client import configure_scheduler, export_scheduler_metrics
+from src.core.prompt_loader import load_prompt
+from src.core.prompt_engine import PromptEngine
+from src.core.run_config import load_run_config, apply_overrides
+from src.core.tracing import configure_tracing, load_spans, summarize_spans
+from src.boptest_client import ForecastService
+from src.local_boptest import LocalBoptest, bind_local_boptest
+from src.experience import ExperienceHistory
+from src.memory_store import MemoryStore
+from src.point_registry import PointRegistry
+
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "benchmarks", "results", "bench_control_loop.json")
+
+
+def install_fake_llm(latency_s: float) -> List[ScriptedChatCompletionClient]:
+    """
+    让所有代理工厂使用脚本化客户端 (同样经过请求调度器)，返回创建出的客户端列表以便统计调用次数。
+    Makes every agent factory use the scripted client, still routed through the request scheduler;
+    returns the created clients for call counts.
+    """
+    created: List[ScriptedChatCompletionClient] = []
+
+    def factory(priority_class: str = "default"):
+        client = ScriptedChatCompletionClient(latency_s=latency_s)
+        created.append(client)
+        return ScheduledChatCompletionClient(client, priority_class=priority_class)
+
+    for module in (decision_maker_agent, information_synthesizer_agent, knowledge_retriever_agent):
+        module.get_deepseek_client = factory
+    return created
+
+
+def _stage_breakdown(trace_path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(trace_path):
+        return []
+    return summarize_spans(load_spans(trace_path))
+
+
+def bench_agent_loop(steps: int, latency_s: float, workdir: str, best_of_n: int = 1,
+                     candidate_workers: int = 0) -> Dict[str, Any]:
+    """运行 main.run_agent_workflow 并测量吞吐量。(Runs main.run_agent_workflow and measures throughput.)"""
+    trace_path = os.path.join(workdir, "trace_agent_loop.jsonl")
+    memory_file = os.path.join(workdir, "memory_store_bench.json")
+    clients = install_fake_llm(latency_s)
+    scheduler = configure_scheduler()
+    main.export_scheduler_metrics = functools.partial(export_scheduler_metrics, os.path.join(workdir, "sched.json"))
+    simulator = bind_local_boptest(main, LocalBoptest())
+    run_config = load_run_config(overrides={"simulation_steps": steps, "memory_filename": memory_file,
+                                            "best_of_n": best_of_n, "candidate_workers": candidate_workers})
+
+    configure_tracing(trace_path)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        asyncio.run(main.run_agent_workflow(run_config))
+    elapsed = time.perf_counter() - start
+    configure_tracing(None)
+
+    with open(memory_file, "r", encoding="utf-8") as f:
+        runs = list(json.load(f).values())
+    completed = sum(len(run["history"]) - 1 for run in runs)
+    return {
+        "steps_requested": steps,
+        "steps_completed": completed,
+        "llm_latency_s": latency_s,
+        "llm_calls": sum(c.calls for c in clients),
+        "wall_time_s": elapsed,
+        "steps_per_second": completed / elapsed if elapsed > 0 else None,
+        "memory_file_bytes": os.path.getsize(memory_file),
+        "stages": _stage_breakdown(trace_path),
+        "llm_scheduler": scheduler.metrics(),
+        "simulator": type(simulator).__name__,
+        "best_of_n": (runs[0].get("run_meta") or {}).get("best_of_n") if runs else None,
+    }
+
+
+def bench_expert_loop(periods: int, latency_s: float, workdir: str) -> Dict[str, Any]:
+    """运行 generate_llm_expert_dataset 并测量吞吐量。(Runs generate_llm_expert_dataset and measures throughput.)"""
+    trace_path = os.path.join(workdir, "trace_expert_loop.jsonl")
+    clients = install_fake_llm(latency_s)
+    scheduler = configure_scheduler()
+    expert.export_scheduler_metrics = functools.partial(export_scheduler_metrics, os.path.join(workdir, "sched.json"))
+    bind_local_boptest(expert, LocalBoptest())
+    # 预测缓存写在临时目录中，每次都从一次获取开始 (the forecast cache lives in the workdir, so every run starts cold)
+    expert.ForecastService = functools.partial(ForecastService, cache_dir=os.path.join(workdir, "forecast_cache"))
+    run_config = load_run_config()
+    params = run_config.expert_data
+    run_config = apply_overrides(run_config, {"expert_data.episode_length": periods * params.control_period,
+                                              "expert_data.output_dir": workdir})
+    expert.DEBUG_MODE = False
+
+    configure_tracing(trace_path)
+    start = time.perf_counter()
+    asyncio.run(expert.generate_llm_expert_dataset(mode="bench", run_config=run_config))
+    elapsed = time.perf_counter() - start
+    configure_tracing(None)
+
+    samples = periods * int(params.control_period / params.sampling_period)
+    return {
+        "control_periods": periods,
+        "simulator_samples": samples,
+        "llm_latency_s": latency_s,
+        "llm_calls": sum(c.calls for c in clients),
+        "wall_time_s": elapsed,
+        "periods_per_second": periods / elapsed if elapsed > 0 else None,
+        "samples_per_second": samples / elapsed if elapsed > 0 else None,
+        "stages": _stage_breakdown(trace_path),
+        "llm_scheduler": scheduler.metrics(),
+    }
+
+
+def _grow_memory(memory: MemoryStore, simulator: LocalBoptest, testid: str, steps: int, on_step=None):
+    """按主循环的记录方式向 MemoryStore 追加 steps 个步骤。(Appends `steps` steps the way the main loop does.)"""
+    instruction = load_prompt("decision_maker_prompt")
+    synthesizer_system = load_prompt("information_synthesizer_prompt")
+    user_goal = load_run_config().controllable_param_desc
+    prompt_engine = PromptEngine()
+    for step in range(1, steps + 1):
+        feedback = simulator.advance_and_get_feedback(testid, {"con_oveTSetCoo_u": 297.15, "con_oveTSetCoo_activate": 1})
+        # 与 main.py 相同的决策输入结构 (the same decision input layout as main.py)
+        briefing = scripted_response(synthesizer_system, json.dumps(memory.get_prompt_history(3)))
+        llm_input = prompt_engine.render("decision_input_template", user_goal=user_goal, plan_hint="",
+                                         retrieved_knowledge="No external knowledge was consulted.",
+                                         current_state=briefing, last_reward=-0.01).text
+        memory.update_latest_step({
+            "instruction": instruction, "llm_input": llm_input,
+            "llm_thought": "reasoning " * 80, "action": {"con_oveTSetCoo_u": 297.15},
+            "kpis": feedback["kpis"], "reward": -0.01
+        })
+        new_obs = feedback["observation"]
+        memory.add_new_step(new_observation=new_obs, new_time=new_obs.pop("time", 0.0))
+        if on_step is not None:
+            on_step(step)
+
+
+def bench_memory_and_persistence(steps: int, checkpoints: List[int], workdir: str,
+                                 hot_steps: Optional[int] = None) -> Dict[str, Any]:
+    """
+    模拟主循环的记录方式，测量 MemoryStore 的内存增长，并在检查点测量 save() 的耗时。
+    hot_steps 不为 None 时使用分层历史 (更早的步骤溢出到磁盘)。
+    Grows a MemoryStore the way the main loop does, tracking memory and timing save() at checkpoints.
+    With `hot_steps`, the tiered history is used (older steps spill to disk).
+    """
+    simulator = LocalBoptest()
+
+    def new_store(name: str):
+        testid = simulator.select_testcase("bestest_air")
+        simulator.set_step(testid, 3600)
+        initial_state = simulator.initialize(testid, 334 * 24 * 3600, 0)
+        memory = MemoryStore("bench", filename=os.path.join(workdir, name), point_registry=point_registry,
+                             hot_steps=hot_steps)
+        return testid, initial_state, memory
+
+    with open(os.path.join(PROJECT_ROOT, "data", "output", "static_building_info.json"), "r", encoding="utf-8") as f:
+        point_registry = PointRegistry.from_static_info(json.load(f), testcase="bestest_air")
+    testid, initial_state, memory = new_store("memory_store_growth.json")
+    tracemalloc.start()
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+    memory.add_initial_state(initial_state)
+
+    growth, persistence = [], []
+
+    def record_growth(step: int):
+        if step % max(1, steps // 10) == 0 or step == steps:
+            current = tracemalloc.get_traced_memory()[0] - baseline_bytes
+            growth.append({"steps": step, "traced_bytes": current, "bytes_per_step": current / step})
+
+    _grow_memory(memory, simulator, testid, steps, record_growth)
+    tracemalloc.stop()
+
+    targets = sorted(c for c in checkpoints if c <= steps)
+
+    def time_save(step: int, store: MemoryStore):
+        save_start = time.perf_counter()
+        store.save()
+        save_time = time.perf_counter() - save_start
+        persistence.append({"steps": step, "save_time_s": save_time,
+                            "file_bytes": os.path.getsize(store.filepath)})
+
+    if hot_steps is None:
+        # 在 tracemalloc 关闭后计时，避免其开销；用历史前缀模拟各检查点
+        # Timed after tracemalloc is stopped to avoid its overhead; history prefixes stand in for checkpoints
+        full_history = memory.history
+        records = full_history.to_list()
+        for checkpoint in targets:
+            memory.history = ExperienceHistory(records[:checkpoint + 1])
+            time_save(checkpoint, memory)
+        memory.history = full_history
+    else:
+        # 分层历史的前缀无法由热窗口重建，因此不带 tracemalloc 重新生成一遍，在检查点处直接保存
+        # A tiered prefix cannot be rebuilt from the hot window, so the run is regrown untraced and
+        # saved in place at the checkpoints
+        testid, initial_state, timed = new_store("memory_store_persist.json")
+        timed.add_initial_state(initial_state)
+        _grow_memory(timed, simulator, testid, max(targets, default=0),
+                     lambda step: time_save(step, timed) if step in targets else None)
+    return {"memory_growth": growth, "persistence": persistence}
+
+
+def compare_with_baseline(results: Dict[str, Any], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    与基线结果比较吞吐量，返回超过容差的性能回退描述。
+    Compares throughput against a baseline and returns the regressions beyond the tolerance.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for section, metric in (("agent_loop", "steps_per_second"), ("expert_loop", "samples_per_second")):
+        old = (baseline.get(section) or {}).get(metric)
+        new = (results.get(section) or {}).get(metric)
+        if old and new and new < old * (1.0 - tolerance):
+            regressions.append(f"{section}.{metric}: {new:.2f} < baseline {old:.2f} (-{(1 - new / old) * 100:.1f}%)")
+    old_save = (baseline.get("persistence") or [{}])[-1].get("save_time_s")
+    new_save = (results.get("persistence") or [{}])[-1].get("save_time_s")
+    if old_save and new_save and new_save > old_save * (1.0 + tolerance):
+        regressions.append(f"persistence.save_time_s: {new_save:.3f} > baseline {old_save:.3f}")
+    return regressions
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the control loops with a fake LLM and a local simulator.")
+    parser.add_argument("--steps", type=int, default=48, help="Control steps for run_agent_workflow.")
+    parser.add_argument("--expert-periods", type=int, default=16, help="Control periods for the expert-data loop.")
+    parser.add_argument("--best-of-n", type=int, default=1, help="Candidate actions per decision in the agent loop.")
+    parser.add_argument("--candidate-workers", type=int, default=0,
+                        help="Worker processes evaluating candidates (0: in-process).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency per fake LLM call.")
+    parser.add_argument("--memory-steps", type=int, default=10000, help="Steps for the memory-growth benchmark.")
+    parser.add_argument("--persist-checkpoints", type=str, default="100,1000,5000,10000",
+                        help="Comma-separated history sizes at which save() is timed.")
+    parser.add_argument("--memory-hot-steps", type=int, default=None,
+                        help="Steps kept in memory by the tiered history (default: unbounded).")
+    parser.add_argument("--skip", type=str, default="", help="Comma-separated sections to skip: agent,expert,memory.")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Path of the JSON results file.")
+    parser.add_argument("--baseline", type=str, default=None, help="A previous results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    latency_s = args.latency_ms / 1000.0
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        }
+    }
+
+    with tempfile.TemporaryDirectory(prefix="llmcl_bench_") as workdir:
+        if "agent" not in skip:
+            results["agent_loop"] = bench_agent_loop(args.steps, latency_s, workdir, args.best_of_n,
+                                                     args.candidate_workers)
+            print(f"agent loop:  {results['agent_loop']['steps_per_second']:.1f} steps/s")
+            best_of_n = results["agent_loop"]["best_of_n"]
+            if best_of_n and best_of_n["evaluations_per_second"]:
+                print(f"candidates:  {best_of_n['evaluations_per_second']:.1f} evaluations/s "
+                      f"({best_of_n['evaluations']} in {best_of_n['decisions']} decisions)")
+        if "expert" not in skip:
+            results["expert_loop"] = bench_expert_loop(args.expert_periods, latency_s, workdir)
+            print(f"expert loop: {results['expert_loop']['samples_per_second']:.1f} simulator samples/s")
+        if "memory" not in skip:
+            checkpoints = [int(c) for c in args.persist_checkpoints.split(",") if c.strip()]
+            results.update(bench_memory_and_persistence(args.memory_steps, checkpoints, workdir,
+                                                        args.memory_hot_steps))
+            last = results["memory_growth"][-1]
+            print(f"memory:      {last['bytes_per_step'] / 1024:.1f} KiB/step after {last['steps']} steps")
+            for p in results["persistence"]:
+                print(f"save():      {p['save_time_s'] * 1e3:.1f} ms at {p['steps']} steps "
+                      f"({p['file_bytes'] / 1e6:.1f} MB)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, default=str)
+    print(f"📄 Results written to '{args.output}'")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        for r in regressions:
+            print(f"❌ Regression: {r}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline.")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+测量每个入口点的导入耗时 (Measures import time for each entry point)。
+
+每个模块在一个全新的解释器中导入 (不设置任何 API 密钥)，记录墙钟时间的中位数、
+是否导入成功，以及 `python -X importtime` 报告的累计耗时最高的依赖。
+
+Each module is imported in a fresh interpreter without API keys; the median wall time,
+success and the most expensive dependencies reported by `-X importtime` are recorded.
+
+示例 (Example):
+    python benchmarks/bench_import_time.py --repeat 5 --output benchmarks/results/import_time.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Any, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "benchmarks", "results", "import_time.json")
+
+ENTRY_POINTS = [
+    "src.config",
+    "src.boptest_client",
+    "src.memory_store",
+    "src.extractor",
+    "src.agents.decision_maker_agent",
+    "src.agents.knowledge_retriever_agent",
+    "main",
+    "create_finetune_dataset",
+    "trace_report",
+    "LLM_expert_data_collection.generate_llm_expert_data",
+]
+
+
+def _clean_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    for key in ("OPENAI_API_KEY", "DEEPSEEK_API_KEY"):
+        env.pop(key, None)
+    env["PYTHONPATH"] = PROJECT_ROOT
+    return env
+
+
+def _parse_importtime(stderr: str, module: str, top: int) -> List[Dict[str, Any]]:
+    entries = []
+    recording = False
+    # 排除模块自身及其父包，只保留它引入的依赖
+    # Exclude the module itself and its parent packages, keeping only what it pulls in
+    own = {".".join(module.split(".")[:i]) for i in range(1, module.count(".") + 2)}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        if name == "site":
+            # 解释器启动部分到 site 为止 (Interpreter startup ends with site)
+            recording = True
+            continue
+        if recording and name not in own:
+            entries.append({"module": name, "self_us": int(parts[0]), "cumulative_us": int(parts[1])})
+    return sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:top]
+
+
+def measure(module: str, repeat: int, top: int) -> Dict[str, Any]:
+    """测量一个模块的导入耗时。(Measures the import time of one module.)"""
+    env = _clean_env()
+    timings, ok, error = [], True, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=PROJECT_ROOT, env=env,
+                                capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            ok = False
+            error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+            break
+    detail = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_ROOT,
+                            env=env, capture_output=True, text=True)
+    return {
+        "module": module,
+        "ok": ok,
+        "error": error,
+        "median_wall_s": statistics.median(timings),
+        "min_wall_s": min(timings),
+        "top_imports": _parse_importtime(detail.stderr, module, top),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time of each entry point in a fresh interpreter.")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module; the median is reported.")
+    parser.add_argument("--top", type=int, default=5, help="Number of most expensive dependencies to keep.")
+    parser.add_argument("--modules", type=str, default=None, help="Comma-separated modules (default: all).")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Path of the JSON results file.")
+    args = parser.parse_args()
+
+    modules = [m.strip() for m in args.modules.split(",")] if args.modules else ENTRY_POINTS
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=_clean_env())
+    interpreter_s = time.perf_counter() - start
+
+    results = []
+    for module in modules:
+        r = measure(module, args.repeat, args.top)
+        results.append(r)
+        status = "ok" if r["ok"] else f"FAILED: {r['error']}"
+        print(f"{module:<55}{r['median_wall_s'] * 1e3:>9.1f} ms  {status}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"interpreter_startup_s": interpreter_s, "modules": results}, f, indent=4)
+    print(f"📄 Results written to '{args.output}'")
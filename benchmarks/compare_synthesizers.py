@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+信息综合方式对比 (Compare the LLM synthesizer with the template briefing)。
+
+用相同的运行配置分别以 synthesizer=llm 和 synthesizer=template 运行 `run_agent_workflow`
+(可重复多次)，比较决策质量 (累计奖励、最终 KPI、与 LLM 简报下动作的差异) 和简报阶段的耗时。
+默认使用配置中的真实模型和 BOPTEST；--fake-llm 与 --local-simulator 只用于离线检查管道本身，
+此时奖励差异没有意义 (脚本化客户端的动作只取决于输入文本的哈希)。
+
+Runs `run_agent_workflow` with synthesizer=llm and synthesizer=template on the same run config
+(optionally repeated) and compares decision quality (cumulative reward, final KPIs, the action
+difference from the LLM-briefed run) and the cost of the briefing stage. The configured model
+and BOPTEST are used by default; --fake-llm and --local-simulator only check the plumbing
+offline, and the reward difference is then meaningless (the scripted client's actions depend
+only on a hash of the input text).
+
+示例 (Examples):
+    python benchmarks/compare_synthesizers.py --steps 48 --repeats 3
+    python benchmarks/compare_synthesizers.py --fake-llm --local-simulator --steps 24
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+import functools
+import contextlib
+from typing import Dict, Any, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import main
+from src.briefing import SYNTHESIZERS, SYNTHESIZER_LLM
+from src.core.llm_client import configure_scheduler, export_scheduler_metrics
+from src.core.run_config import load_run_config
+from src.core.tracing import configure_tracing, load_spans, summarize_spans
+
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "benchmarks", "results", "compare_synthesizers.json")
+BRIEFING_STAGES = ("llm.information_synthesizer", "briefing.template")
+
+
+def _load_run(memory_file: str) -> Dict[str, Any]:
+    with open(memory_file, "r", encoding="utf-8") as f:
+        runs = list(json.load(f).values())
+    if not runs:
+        raise RuntimeError(f"No run was recorded in '{memory_file}'.")
+    return runs[-1]
+
+
+def run_once(synthesizer: str, overrides: Dict[str, Any], workdir: str, tag: str) -> Dict[str, Any]:
+    """以给定的简报方式运行一次主循环并汇总结果。(Runs the main loop once with a synthesizer and summarizes it.)"""
+    memory_file = os.path.join(workdir, f"memory_{tag}.json")
+    trace_path = os.path.join(workdir, f"trace_{tag}.jsonl")
+    run_config = load_run_config(overrides={**overrides, "synthesizer": synthesizer,
+                                            "memory_filename": memory_file, "run_name": tag})
+    # 调度器绑定在事件循环上，每次运行都重新创建 (the scheduler is bound to an event loop; one per run)
+    configure_scheduler()
+    main.export_scheduler_metrics = functools.partial(export_scheduler_metrics,
+                                                      os.path.join(workdir, f"scheduler_{tag}.json"))
+    configure_tracing(trace_path)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        asyncio.run(main.run_agent_workflow(run_config))
+    elapsed = time.perf_counter() - start
+    configure_tracing(None)
+
+    run = _load_run(memory_file)
+    steps = [s for s in run["history"] if s.get("action") is not None]
+    rewards = [s["reward"] for s in steps if isinstance(s.get("reward"), (int, float))]
+    stages = {row["stage"]: row for row in summarize_spans(load_spans(trace_path))} if os.path.exists(trace_path) else {}
+    briefing = next((stages[name] for name in BRIEFING_STAGES if name in stages), None)
+    return {
+        "synthesizer": synthesizer,
+        "steps_completed": len(steps),
+        "reward_sum": sum(rewards),
+        "reward_mean": sum(rewards) / len(rewards) if rewards else None,
+        "final_kpis": steps[-1].get("kpis") if steps else None,
+        "actions": [s["action"] for s in steps],
+        "wall_time_s": elapsed,
+        "briefing_mean_s": briefing["mean_s"] if briefing else None,
+        "briefing_stats": (run.get("run_meta") or {}).get("synthesizer"),
+    }
+
+
+def action_difference(reference: List[Dict[str, Any]], other: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    逐步比较两次运行的动作: 每个控制点的平均绝对差和完全一致的比例。
+    Compares two runs step by step: the mean absolute difference per control point and the share of
+    identical actions.
+    """
+    pairs = list(zip(reference, other))
+    differences: Dict[str, List[float]] = {}
+    for a, b in pairs:
+        for name, value in a.items():
+            if name.endswith("_activate") or not isinstance(value, (int, float)):
+                continue
+            if isinstance(b.get(name), (int, float)):
+                differences.setdefault(name, []).append(abs(value - b[name]))
+    return {"steps": len(pairs),
+            "identical_share": sum(a == b for a, b in pairs) / len(pairs) if pairs else None,
+            "mean_abs_difference": {name: sum(d) / len(d) for name, d in differences.items()}}
+
+
+def _spread(values: List[float]) -> Dict[str, Optional[float]]:
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"mean": None, "stdev": None}
+    return {"mean": statistics.fmean(values), "stdev": statistics.stdev(values) if len(values) > 1 else 0.0}
+
+
+def compare(runs: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """按简报方式汇总各次重复，并给出相对 LLM 简报的差异。(Aggregates repeats per synthesizer, relative to the LLM.)"""
+    summary: Dict[str, Any] = {}
+    for synthesizer, results in runs.items():
+        kpi_names = sorted({k for r in results for k, v in (r["final_kpis"] or {}).items() if isinstance(v, (int, float))})
+        summary[synthesizer] = {
+            "repeats": len(results),
+            "reward_sum": _spread([r["reward_sum"] for r in results]),
+            "final_kpis": {k: _spread([(r["final_kpis"] or {}).get(k) for r in results]) for k in kpi_names},
+            "briefing_mean_ms": _spread([1e3 * r["briefing_mean_s"] if r["briefing_mean_s"] is not None else None
+                                         for r in results]),
+            "wall_time_s": _spread([r["wall_time_s"] for r in results]),
+        }
+    reference = runs.get(SYNTHESIZER_LLM)
+    for synthesizer, results in runs.items():
+        if synthesizer == SYNTHESIZER_LLM or not reference:
+            continue
+        llm_reward = summary[SYNTHESIZER_LLM]["reward_sum"]["mean"]
+        own_reward = summary[synthesizer]["reward_sum"]["mean"]
+        summary[synthesizer]["versus_llm"] = {
+            "reward_sum_delta": own_reward - llm_reward if None not in (own_reward, llm_reward) else None,
+            "actions": [action_difference(a["actions"], b["actions"]) for a, b in zip(reference, results)],
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare decision quality with the LLM and the template briefing.")
+    parser.add_argument("--steps", type=int, default=48, help="Control steps per run.")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per synthesizer (the LLM is not deterministic).")
+    parser.add_argument("--synthesizers", type=str, default=",".join(SYNTHESIZERS),
+                        help="Comma-separated synthesizers to run.")
+    parser.add_argument("--set", dest="overrides", action="append", default=[],
+                        help="Override a run parameter for every run, e.g. start_time=12614400 (repeatable).")
+    parser.add_argument("--fake-llm", action="store_true", help="Use the scripted client (plumbing check only).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency per fake LLM call.")
+    parser.add_argument("--local-simulator", action="store_true", help="Use the local BOPTEST stand-in.")
+    parser.add_argument("--workdir", type=str, default=None, help="Keep the memory files and traces here.")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Path of the JSON results file.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    overrides: Dict[str, Any] = {"simulation_steps": args.steps}
+    for item in args.overrides:
+        key, _, value = item.partition("=")
+        try:
+            overrides[key.strip()] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key.strip()] = value
+    if args.fake_llm:
+        # 与端到端基准相同的脚本化客户端 (the same scripted client as the end-to-end benchmark)
+        from bench_control_loop import install_fake_llm
+        install_fake_llm(args.latency_ms / 1000.0)
+    if args.local_simulator:
+        from src.local_boptest import LocalBoptest, bind_local_boptest
+
+    synthesizers = [s.strip() for s in args.synthesizers.split(",") if s.strip()]
+    runs: Dict[str, List[Dict[str, Any]]] = {s: [] for s in synthesizers}
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or stack.enter_context(tempfile.TemporaryDirectory(prefix="llmcl_synth_"))
+        os.makedirs(workdir, exist_ok=True)
+        for repeat in range(args.repeats):
+            for synthesizer in synthesizers:
+                if args.local_simulator:
+                    bind_local_boptest(main, LocalBoptest())
+                result = run_once(synthesizer, overrides, workdir, f"{synthesizer}_{repeat}")
+                runs[synthesizer].append(result)
+                briefing_ms = f"{1e3 * result['briefing_mean_s']:.2f} ms" if result["briefing_mean_s"] else "n/a"
+                print(f"{synthesizer:>8} #{repeat}: reward {result['reward_sum']:.4f} over "
+                      f"{result['steps_completed']} steps, briefing {briefing_ms}, {result['wall_time_s']:.1f}s")
+
+    results = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "steps": args.steps,
+                        "repeats": args.repeats, "fake_llm": args.fake_llm,
+                        "local_simulator": args.local_simulator, "overrides": overrides},
+               "summary": compare(runs), "runs": runs}
+    for synthesizer, summary in results["summary"].items():
+        delta = (summary.get("versus_llm") or {}).get("reward_sum_delta")
+        print(f"{synthesizer:>8}: mean reward {summary['reward_sum']['mean']:.4f}"
+              + (f" ({delta:+.4f} vs llm)" if delta is not None else ""))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, default=str)
+    print(f"📄 Results written to '{args.output}'")
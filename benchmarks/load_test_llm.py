@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+代理栈的离线负载测试 (Offline load test of the agent stack)。
+
+启动本地模拟LLM服务 (src/core/mock_llm_server.py)，把 LLM_BASE_URL 指向它，然后：
+    * client: 以给定并发度通过真实的客户端栈 (get_deepseek_client -> 请求调度器 ->
+      OpenAIChatCompletionClient -> HTTP) 发送 N 个请求，测量吞吐量、延迟分位数和失败数；
+    * agent:  在本地 BOPTEST 替身上并发运行多个 run_agent_workflow，测量总的步数吞吐量。
+服务的延迟、错误注入和流式输出都可配置；不需要网络或 API 密钥。
+
+Starts the local mock LLM server, points LLM_BASE_URL at it and then
+    * client: sends N requests at a given concurrency through the real client stack
+      (get_deepseek_client -> request scheduler -> OpenAIChatCompletionClient -> HTTP) and measures
+      throughput, latency percentiles and failures;
+    * agent:  runs several run_agent_workflow loops concurrently on the local BOPTEST stand-in and
+      measures the total step throughput.
+Server latency, error injection and streaming are configurable; no network or API key is needed.
+
+示例 (Examples):
+    python benchmarks/load_test_llm.py --requests 2000 --concurrency 64 --latency-ms 200
+    python benchmarks/load_test_llm.py --skip agent --stream --error-rate 0.05 --error-status 429
+    python benchmarks/load_test_llm.py --skip client --runs 16 --steps 24 --latency-ms 500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import functools
+import contextlib
+import urllib.request
+from typing import Dict, Any, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.config import configure_settings
+from src.core.config_loader import load_config
+from src.core.llm_client import configure_scheduler, export_scheduler_metrics, get_deepseek_client
+from src.core.mock_llm_server import MockLLMServer, MockOptions, ReplayStore
+from src.core.prompt_loader import load_prompt
+
+DEFAULT_OUTPUT = os.path.join(PROJECT_ROOT, "benchmarks", "results", "load_test_llm.json")
+DEFAULT_REPLAY = os.path.join(PROJECT_ROOT, "LLM_expert_data_collection", "datasets", "llm_interactions_train.jsonl")
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _prompts(replay_files: List[str], count: int) -> List[str]:
+    """回放文件中的输入加上合成的输入，共 count 个。(Inputs from the replay files plus synthetic ones, `count` in all.)"""
+    recorded = []
+    for path in replay_files:
+        if path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                recorded += [json.loads(line)["input"] for line in f if line.strip()]
+    return [recorded[i] if i < len(recorded) else
+            f"//-- INPUTS --//\n[USER GOAL]:\nKeep the zone comfortable.\n\n[CURRENT STATE]:\nRequest {i}."
+            for i in range(count)]
+
+
+async def load_clients(requests: int, concurrency: int, stream: bool, replay_files: List[str]) -> Dict[str, Any]:
+    """以固定并发度通过客户端栈发送请求。(Sends requests through the client stack at a fixed concurrency.)"""
+    from autogen_core.models import SystemMessage, UserMessage
+
+    system = SystemMessage(content=load_prompt("decision_maker_prompt"))
+    prompts = _prompts(replay_files, requests)
+    clients = [get_deepseek_client(priority_class="decision_maker") for _ in range(concurrency)]
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+    cursor = iter(range(requests))
+
+    async def worker(client):
+        for index in cursor:
+            messages = [system, UserMessage(content=prompts[index], source="user")]
+            start = time.perf_counter()
+            try:
+                if stream:
+                    async for _ in client.create_stream(messages):
+                        pass
+                else:
+                    await client.create(messages)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    return {
+        "requests": requests, "concurrency": concurrency, "stream": stream,
+        "completed": len(latencies), "failures": failures, "wall_time_s": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed > 0 else None,
+        "latency_s": {"p50": _percentile(latencies, 0.5), "p95": _percentile(latencies, 0.95),
+                      "p99": _percentile(latencies, 0.99), "max": max(latencies, default=None)},
+    }
+
+
+async def load_agents(runs: int, steps: int, workdir: str) -> Dict[str, Any]:
+    """在本地 BOPTEST 替身上并发运行多个主循环。(Runs several main loops concurrently on the local stand-in.)"""
+    import main
+    from src.local_boptest import LocalBoptest, bind_local_boptest
+    from src.core.run_config import load_run_config
+
+    main.export_scheduler_metrics = functools.partial(export_scheduler_metrics, os.path.join(workdir, "sched.json"))
+    bind_local_boptest(main, LocalBoptest())
+    configs = [load_run_config(overrides={"simulation_steps": steps, "run_name": f"load_{i}",
+                                          "memory_filename": os.path.join(workdir, f"memory_load_{i}.json")})
+               for i in range(runs)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        await asyncio.gather(*(main.run_agent_workflow(config) for config in configs))
+    elapsed = time.perf_counter() - start
+
+    completed = 0
+    for config in configs:
+        with open(config.memory_filename, "r", encoding="utf-8") as f:
+            completed += sum(len(run["history"]) - 1 for run in json.load(f).values())
+    return {"runs": runs, "steps_requested": runs * steps, "steps_completed": completed, "wall_time_s": elapsed,
+            "steps_per_second": completed / elapsed if elapsed > 0 else None}
+
+
+def _remote_stats(base_url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/stats", timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+async def run_load_test(args) -> Dict[str, Any]:
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        replay = ReplayStore()
+        for path in args.replay:
+            replay.load(path)
+        server = MockLLMServer(replay, MockOptions(
+            latency_s=args.latency_ms / 1000.0, jitter_s=args.jitter_ms / 1000.0, error_rate=args.error_rate,
+            error_status=args.error_status, retry_after_s=args.retry_after_s,
+            stream_interval_s=args.stream_interval_ms / 1000.0, seed=args.seed), port=0)
+        # 服务运行在自己的线程和事件循环中 (the server runs on its own thread and event loop)
+        base_url = server.start_in_thread()
+    configure_settings(llm_base_url=base_url)
+    os.environ.setdefault(load_config()["model"]["api_key_env_var"], "mock")
+
+    results: Dict[str, Any] = {"base_url": base_url}
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    # 负载测试只受并发上限约束，不受配置中的速率限制约束 (only the concurrency limit applies, not the rate limits)
+    if "client" not in skip:
+        scheduler = configure_scheduler(max_concurrent=args.max_concurrent or args.concurrency,
+                                        max_retries=args.max_retries, backoff_s=args.backoff_s)
+        results["client"] = await load_clients(args.requests, args.concurrency, args.stream, args.replay)
+        results["client"]["llm_scheduler"] = scheduler.metrics()
+    if "agent" not in skip:
+        scheduler = configure_scheduler(max_concurrent=args.max_concurrent or args.concurrency,
+                                        max_retries=args.max_retries, backoff_s=args.backoff_s)
+        with tempfile.TemporaryDirectory(prefix="llmcl_load_") as workdir:
+            results["agent"] = await load_agents(args.runs, args.steps, workdir)
+        results["agent"]["llm_scheduler"] = scheduler.metrics()
+    if server is not None:
+        server.stop_thread()
+        results["server"] = server.stats.to_dict()
+    else:
+        results["server"] = await asyncio.to_thread(_remote_stats, base_url)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the agent stack against the local mock LLM server.")
+    parser.add_argument("--base-url", type=str, default=None,
+                        help="Use an already running mock server (default: start one in-process).")
+    parser.add_argument("--replay", action="append", default=None,
+                        help="Replay file for the in-process server (repeatable; default: the expert interactions).")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests sent by the client section.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients in the client section.")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Scheduler concurrency limit (default: --concurrency).")
+    parser.add_argument("--max-retries", type=int, default=5, help="Scheduler retries on 429 and 5xx.")
+    parser.add_argument("--backoff-s", type=float, default=0.05, help="Scheduler back-off before the first retry.")
+    parser.add_argument("--stream", action="store_true", help="Use streamed completions in the client section.")
+    parser.add_argument("--runs", type=int, default=8, help="Concurrent agent loops in the agent section.")
+    parser.add_argument("--steps", type=int, default=24, help="Control steps per agent loop.")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Server latency per completion.")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Uniform random latency added on top.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error.")
+    parser.add_argument("--error-status", type=int, default=500, choices=(429, 500, 502, 503),
+                        help="Status of injected errors.")
+    parser.add_argument("--retry-after-s", type=float, default=0.05, help="Retry-After sent with injected 429s.")
+    parser.add_argument("--stream-interval-ms", type=float, default=0.0, help="Delay between streamed chunks.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the server's latency and error draws.")
+    parser.add_argument("--skip", type=str, default="", help="Comma-separated sections to skip: client,agent.")
+    parser.add_argument("--output", type=str, default=DEFAULT_OUTPUT, help="Path of the JSON results file.")
+    args = parser.parse_args()
+    if args.replay is None:
+        args.replay = [DEFAULT_REPLAY] if os.path.exists(DEFAULT_REPLAY) else []
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run_load_test(args))
+    results["meta"] = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "latency_ms": args.latency_ms,
+                       "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "error_status": args.error_status}
+
+    if "client" in results:
+        client = results["client"]
+        print(f"client: {client['requests_per_second']:.1f} requests/s at concurrency {client['concurrency']}, "
+              f"p50 {client['latency_s']['p50'] * 1e3:.0f} ms, p95 {client['latency_s']['p95'] * 1e3:.0f} ms, "
+              f"{client['completed']}/{client['requests']} completed, failures {client['failures'] or 0}")
+    if "agent" in results:
+        agent = results["agent"]
+        print(f"agent:  {agent['steps_per_second']:.1f} steps/s over {agent['runs']} concurrent runs "
+              f"({agent['steps_completed']}/{agent['steps_requested']} steps)")
+    if results.get("server"):
+        print(f"server: {results['server']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, default=str)
+    print(f"📄 Results written to '{args.output}'")
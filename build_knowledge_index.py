@@ -0,0 +1,33 @@
+"""
+构建 (或更新) 本地知识检索索引并试查询 (Build or refresh the local knowledge index and try queries)。
+
+示例 (Examples):
+    python build_knowledge_index.py
+    python build_knowledge_index.py --paths "data/input/*.md" "docs/*.md" --query "occupied cooling setpoint"
+主控制循环在 use_graphrag_tool=true 且 knowledge_backend=local 时使用同一个索引。
+The main loop uses the same index when use_graphrag_tool=true and knowledge_backend=local.
+"""
+import time
+import argparse
+
+from src.config import get_settings
+from src.retrieval import INDEX_DIR, KnowledgeIndex, render_results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local BM25 knowledge index and run sample queries.")
+    parser.add_argument("--paths", nargs="*", default=None,
+                        help="Document globs (default: the knowledge_paths setting).")
+    parser.add_argument("--index-dir", type=str, default=INDEX_DIR, help="Directory of the persisted index.")
+    parser.add_argument("--query", action="append", default=[], help="A query to run against the index (repeatable).")
+    parser.add_argument("--top-k", type=int, default=3, help="Chunks returned per query.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = KnowledgeIndex.open(args.paths or get_settings().knowledge_paths.split(","), args.index_dir)
+    print(f"📄 Index ready: {len(index)} chunks, {len(index.vocabulary)} terms "
+          f"({time.perf_counter() - start:.3f}s, {args.index_dir}).")
+    for query in args.query:
+        start = time.perf_counter()
+        results = index.search(query, args.top_k)
+        print(f"\n--- {query!r} ({1e3 * (time.perf_counter() - start):.2f} ms) ---")
+        print(render_results(results))
@@ -5,6 +5,8 @@ import re
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 
+from src.memory_store import expand_memories
+
 
 def extract_section(text: str, title: str) -> Optional[str]:
     """
@@ -106,6 +108,8 @@ def convert_memory_to_finetune_data(input_path: Path, output_path: Path):
         print(f"❌ Error: Expected a non-empty dictionary in '{input_path}'")
         return
 
+    # 记忆文件用字符串表驻留重复的提示，这里透明地还原 (resolve the interned prompts transparently)
+    data = expand_memories(data, str(input_path.resolve().parent))
     run_id = next(iter(data))
     history = data.get(run_id, {}).get("history", [])
 
@@ -122,6 +126,10 @@ def convert_memory_to_finetune_data(input_path: Path, output_path: Path):
             # 确保记录是有效的字典
             if not isinstance(record, dict):
                 continue
+            # 本地策略或计划执行器给出的步骤没有对应的 LLM 提示，不用于微调
+            # (steps served by the local policy or the plan executor have no LLM prompt)
+            if record.get("policy"):
+                continue
 
             finetune_entry = format_llama_factory_entry(record)
 
@@ -0,0 +1,29 @@
+"""
+将记忆文件导出为旧格式 (Export a memory file in the legacy format)。
+
+MemoryStore 用字符串表驻留重复的提示和静态文本块；本脚本把所有引用还原，
+写出每条记录都带完整文本、没有字符串表的旧格式文件。
+MemoryStore interns repeated prompts and static blocks in a string table; this script resolves
+every reference and writes the legacy format with the full text in every record.
+
+示例 (Example):
+    python export_memory.py data/output/memory_store.json data/output/memory_store_expanded.json
+"""
+import os
+import json
+import argparse
+
+from src.memory_store import expand_memories
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a memory file with all interned strings resolved.")
+    parser.add_argument("input_file", help="Path of the memory_store JSON file.")
+    parser.add_argument("output_file", help="Path of the expanded JSON file to write.")
+    args = parser.parse_args()
+
+    with open(args.input_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    with open(args.output_file, "w", encoding="utf-8") as f:
+        json.dump(expand_memories(data, os.path.dirname(os.path.abspath(args.input_file))), f, indent=4, ensure_ascii=False)
+    print(f"✅ Expanded {sum(len(run.get('history', [])) for run in data.values())} records "
+          f"to '{args.output_file}'.")
@@ -1,32 +1,49 @@
 import os
 import sys
 import json
+import time
 import logging
 import asyncio
+import argparse
+from datetime import datetime
 from typing import Dict, Optional
 import re
 from typing import Dict, Optional, Tuple
 # --- 项目模块 ---
 # --- Project Modules ---
-from src.extractor import run_extraction_pipeline
 from src.boptest_client import (
     select_testcase,
     initialize,
+    advance,
     stop,
     set_step,
+    get_kpis,
+    get_inputs,
     advance_and_get_feedback
 )
 from src.memory_store import MemoryStore
-from src.config import (
-    HISTORY_WINDOW_SIZE, CONTROL_STEP, SIMULATION_STEPS,
-    SELECTED_OBJECTIVE, CONTROLLABLE_PARAM_DESC, TEST_CASE_NAME, START_TIME, WARMUP_PERIOD, USE_GRAPHRAG_TOOL
-)
+from src.point_registry import PointRegistry
+from src.action_registry import ActionRegistry
+from src.resume import (REPLAY, REINIT, replay_actions,
+                        STATUS_RUNNING, STATUS_STOPPED, STATUS_FAILED, STATUS_COMPLETED)
+from src.config import get_settings, configure_settings, parse_cli_overrides
+from src.core.run_config import RunConfig, load_run_config, split_overrides
 from src.agents.information_synthesizer_agent import make_information_synthesizer_agent
 from src.agents.decision_maker_agent import make_decision_maker_agent
 from src.agents.knowledge_retriever_agent import make_knowledge_retriever_agent
-from src.reward_calculator import RewardCalculator
+from src.reward_engine import RewardEngine
+from src.retrieval import KnowledgeCache, KnowledgeIndex, render_results, signature_query, state_signature
+from src.schedules import ScheduleRules
+from src.briefing import SYNTHESIZER_TEMPLATE, BriefingCache, TemplateBriefing
+from src.candidates import BestOfNStats, choose_action, make_candidate_evaluator
+from src.policy import LocalController, step_features
+from src.planning import PlanExecutor
 from src.utils import convert_seconds_to_datetime_string
 from src.core.config_loader import load_objectives_config
+from src.core.tracing import span, configure_tracing
+from src.core.llm_client import set_llm_episode, export_scheduler_metrics
+from src.core.prompt_engine import PromptEngine
+from src.core.prompt_loader import load_prompt
 # --- 设置日志记录 ---
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -99,184 +116,454 @@ def parse_llm_output(text: str) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
-async def run_agent_workflow():
+async def run_agent_workflow(run_config: Optional[RunConfig] = None, resume_key: Optional[str] = None,
+                             resume_strategy: str = REPLAY):
     """
     项目的主工作流，现在使用async/await以兼容AutoGen。
     The main project workflow, now using async/await for AutoGen compatibility.
+
+    Args:
+        run_config (Optional[RunConfig]): 运行配置，默认从 configs/run_config.yaml 加载。
+                                          Run configuration, loaded from configs/run_config.yaml by default.
+        resume_key (Optional[str]): 要续跑的运行在记忆文件中的键 (见 resume_run.py)。
+                                    Key of the run to resume in the memory file (see resume_run.py).
+        resume_strategy (str): 'replay' 或 'reinit'，见 src/resume.py。
+                               'replay' or 'reinit', see src/resume.py.
     """
+    run_config = run_config or load_run_config()
+    selected_objective = run_config.selected_objective
+    simulation_steps = run_config.simulation_steps
     testid = None
+    memory = None
+    candidate_evaluator = None
+    best_of_n_stats = BestOfNStats()
+    candidate_count = run_config.best_of_n
+    local_controller = None
+    plan_executor = None
+    action_registry = None
+    run_status = STATUS_FAILED
+    use_graphrag_tool = get_settings().use_graphrag_tool
+    knowledge_index = None
+    knowledge_cache = KnowledgeCache()
+    briefing_cache = None
+    template_briefing = None
+    # 决策输入由预编译模板渲染，不变的内容在前 (decision inputs come from precompiled, static-first templates)
+    prompt_engine = PromptEngine()
 
     try:
         # # === 阶段 0: 静态建筑信息提取 ===(建议分两部分来)
         # logging.info("=" * 50)
         # logging.info("Executing Stage 0: Static Building Information Extraction.")
+        # from src.extractor import run_extraction_pipeline  # 惰性导入 (lazy import, pulls in llama_index)
         # await asyncio.to_thread(run_extraction_pipeline)
         # logging.info("Stage 0 finished.")
         # # === 阶段 0: 静态建筑信息提取 ===
 
         # 【修改】: 加载并选择目标
         objectives_config = load_objectives_config()
-        if SELECTED_OBJECTIVE not in objectives_config:
-            raise ValueError(f"Selected objective '{SELECTED_OBJECTIVE}' not found in objectives_config.yaml")
+        if selected_objective not in objectives_config:
+            raise ValueError(f"Selected objective '{selected_objective}' not found in objectives_config.yaml")
 
-        selected_objective_config = objectives_config[SELECTED_OBJECTIVE]
+        selected_objective_config = objectives_config[selected_objective]
         objective_description = selected_objective_config['description']
-        reward_function_name = selected_objective_config['reward_function']
+        # 所有带奖励声明的目标每一步都会计算，便于对比 (every declared objective is evaluated each step)
+        reward_engine = RewardEngine.from_objectives_config(objectives_config)
+        if selected_objective not in reward_engine:
+            raise ValueError(f"Objective '{selected_objective}' has no `reward` spec in objectives_config.yaml")
 
         # 动态组装完整的用户需求
-        user_demand_for_llm = f"{CONTROLLABLE_PARAM_DESC}\n{objective_description}"
+        user_demand_for_llm = f"{run_config.controllable_param_desc}\n{objective_description}"
 
-        logging.info(f"Running simulation with objective: '{SELECTED_OBJECTIVE}'")
-        logging.info(f"Reward function to be used: '{reward_function_name}'")
+        if run_config.run_name:
+            logging.info(f"Run: '{run_config.run_name}'")
+        logging.info(f"Running simulation with objective: '{selected_objective}'")
+        logging.info(f"Reward objectives evaluated: {reward_engine.names}")
 
         # === 阶段 1: BOPTEST环境初始化 ===
         logging.info("=" * 50)
         logging.info("Executing Stage 1: Select Test Case and Initialize.")
-        testcase_name = TEST_CASE_NAME
+        testcase_name = run_config.test_case_name
         testid = await asyncio.to_thread(select_testcase, testcase_name)
 
         if not testid:
             logging.error("选择测试案例失败，进程中止。 (Failed to select test case, halting.)")
             return
+        # 并发运行在LLM调度器中按 episode 公平排队 (concurrent runs are queued fairly per episode)
+        set_llm_episode(run_config.run_name or resume_key or testid)
         # 【新增】: 设置全局控制步长
-        await asyncio.to_thread(set_step, testid, CONTROL_STEP)
-        start_time = START_TIME
-        warmup_period = WARMUP_PERIOD
-        initial_state = await asyncio.to_thread(initialize, testid, start_time, warmup_period)
-
-        if not initial_state:
-            logging.error("BOPTEST环境初始化失败。 (BOPTEST environment initialization failed.)")
-            return
-
-        logging.info("BOPTEST环境初始化成功! (BOPTEST environment initialized successfully!)")
+        await asyncio.to_thread(set_step, testid, run_config.control_step)
+        start_time = run_config.start_time
+        warmup_period = run_config.warmup_period
 
-        # === 阶段 2: 记录初始状态和静态信息到Memory Store (您的原有代码) ===
-        logging.info("=" * 50)
-        logging.info("Executing Stage 2: Log to Memory Store.")
-        memory = MemoryStore(testid)
-        # 【修复】: 创建 RewardCalculator 的一个实例
-        reward_calculator = RewardCalculator()
         static_info_path = os.path.join(os.path.dirname(__file__), 'data', 'output', 'static_building_info.json')
         static_info = load_json_file(static_info_path)
-
-        if static_info:
-            memory.add_static_info(static_info)
+        # 观测点注册表决定哪些点进入提示、哪些只存储、哪些丢弃
+        # The point registry decides which points are prompted, only stored, or dropped
+        point_registry = PointRegistry.from_static_info(static_info, testcase=run_config.test_case_name)
+        schedule_rules = ScheduleRules.from_config(testcase=testcase_name, static_info=static_info)
+        if run_config.synthesizer == SYNTHESIZER_TEMPLATE:
+            # 确定性模板简报代替信息综合代理 (a deterministic template briefing replaces the synthesizer)
+            template_briefing = TemplateBriefing(static_info, point_registry)
+        elif run_config.briefing_reuse_steps > 0:
+            # 状态没有实质变化时复用上一份简报 (the previous briefing is reused while nothing material changes)
+            briefing_cache = BriefingCache(schedule_rules, point_registry, run_config.briefing_temperature_delta,
+                                           run_config.briefing_power_delta, run_config.briefing_reuse_steps)
+        if use_graphrag_tool:
+            # 知识检索结果按工况签名缓存；本地后端用持久化的 BM25 索引代替 GraphRAG 代理
+            # Retrieval results are cached per regime signature; the local backend replaces the GraphRAG
+            # agent with a persisted BM25 index
+            if get_settings().knowledge_backend == "local":
+                knowledge_index = await asyncio.to_thread(KnowledgeIndex.open,
+                                                          get_settings().knowledge_paths.split(","))
+                logging.info(f"Local knowledge index: {len(knowledge_index)} chunks.")
+        # 动作注册表在 advance 之前校验、截断动作并补上激活标志
+        # The action registry validates and clamps actions and adds the activate flags before advance
+        inputs = await asyncio.to_thread(get_inputs, testid)
+        action_registry = ActionRegistry.for_testcase(static_info, testcase=testcase_name, inputs=inputs)
+
+        if resume_key:
+            # === 断点续跑: 把新的 BOPTEST 实例恢复到最后一个已完成步骤 ===
+            # === Resume: bring the new BOPTEST instance to the last complete step ===
+            memory = MemoryStore(resume_key, filename=run_config.memory_filename, point_registry=point_registry,
+                                 hot_steps=run_config.hot_history_steps or None,
+                                 spill_chunk=run_config.history_spill_chunk)
+            completed = memory.trim_incomplete()
+            if not memory.history:
+                raise ValueError(f"Run '{resume_key}' has no recorded steps to resume from.")
+            logging.info(f"Resuming run '{resume_key}' after {completed} completed steps ({resume_strategy}).")
+            if resume_strategy == REINIT:
+                latest = memory.latest_step()
+                resume_time = latest.time if latest.action is None else latest.time + run_config.control_step
+                measurements = await asyncio.to_thread(initialize, testid, int(resume_time), warmup_period)
+                # 累计 KPI 从零重新开始 (cumulative KPIs restart from zero)
+                memory.set_last_objective_integrand(0.0)
+                memory.set_last_objective_values(dict.fromkeys(reward_engine.names, 0.0))
+            else:
+                measurements = await asyncio.to_thread(initialize, testid, start_time, warmup_period)
+                if measurements and completed:
+                    measurements = await asyncio.to_thread(replay_actions, advance, testid, memory, completed)
+            if not measurements:
+                logging.error("BOPTEST环境恢复失败。 (Failed to restore the BOPTEST environment.)")
+                return
+            memory.sync_latest_observation(measurements)
         else:
-            logging.warning("无法加载静态信息。")
+            initial_state = await asyncio.to_thread(initialize, testid, start_time, warmup_period)
+
+            if not initial_state:
+                logging.error("BOPTEST环境初始化失败。 (BOPTEST environment initialization failed.)")
+                return
 
-        memory.add_initial_state(initial_state)
+            logging.info("BOPTEST环境初始化成功! (BOPTEST environment initialized successfully!)")
+
+            # === 阶段 2: 记录初始状态和静态信息到Memory Store (您的原有代码) ===
+            logging.info("=" * 50)
+            logging.info("Executing Stage 2: Log to Memory Store.")
+            memory = MemoryStore(testid, filename=run_config.memory_filename, point_registry=point_registry,
+                                 hot_steps=run_config.hot_history_steps or None,
+                                 spill_chunk=run_config.history_spill_chunk)
+
+            if static_info:
+                memory.add_static_info(static_info)
+            else:
+                logging.warning("无法加载静态信息。")
+
+            memory.add_initial_state(initial_state)
+            memory.update_run_meta(run_config=run_config.to_dict(), started_at=datetime.now().isoformat(timespec="seconds"))
+
+        memory.update_run_meta(status=STATUS_RUNNING, boptest_testid=testid)
+        if run_config.best_of_n > 1:
+            # 候选动作在分叉的模拟器上评估 (candidate actions are evaluated on forked simulators)
+            client = {"select_testcase": select_testcase, "set_step": set_step, "initialize": initialize,
+                      "advance": advance, "get_kpis": get_kpis, "stop": stop}
+            candidate_evaluator = make_candidate_evaluator(client, testid, testcase_name, run_config.control_step,
+                                                           run_config.candidate_warmup_period,
+                                                           run_config.candidate_workers, run_config.candidate_max_remote)
+            best_of_n_stats.approximation = candidate_evaluator.approximation
+            if candidate_evaluator.max_candidates and candidate_count > candidate_evaluator.max_candidates:
+                logging.warning(f"best_of_n={candidate_count} is capped at candidate_max_remote="
+                                f"{candidate_evaluator.max_candidates}: every BOPTEST evaluation re-initializes a testid.")
+                candidate_count = candidate_evaluator.max_candidates
+            logging.info(f"Best-of-{candidate_count} decisions with {type(candidate_evaluator).__name__} "
+                         f"({candidate_evaluator.approximation}).")
+        if run_config.local_policy:
+            # 蒸馏的本地策略服务分布内的状态 (the distilled local policy serves in-distribution states)
+            local_controller = LocalController.from_file(run_config.local_policy, run_config.local_policy_margin)
+            logging.info(f"Local policy '{run_config.local_policy}' enabled "
+                         f"(gate threshold {local_controller.policy.gate_threshold:.2f}).")
+        if run_config.plan_horizon_steps > 1:
+            # LLM 给出多步计划，本地执行器逐步执行 (the LLM plans several steps; a local executor runs them)
+            plan_executor = PlanExecutor(run_config.plan_horizon_steps, run_config.plan_deviation_threshold,
+                                         point_registry)
+            logging.info(f"Hierarchical control: plans of {run_config.plan_horizon_steps} control steps.")
         # 注意：这里的save()会保存初始状态，后续步骤完成后会再次保存
         memory.save()
 
         # ======================================================================
         # === 主控制循环 ===
         # ======================================================================
-        for i in range(SIMULATION_STEPS):
-            current_step_data = memory.current_run_history[-1]
-            current_step_num = memory.current_run_history[-1]['timestep']
+        for i in range(memory.latest_step().timestep, simulation_steps):
+            current_step = memory.latest_step()
+            current_step_num = current_step.timestep
             logging.info(
-                "\n" + "#" * 70 + f"\n# Starting Control Loop: Step {current_step_num + 1}/{SIMULATION_STEPS}\n" + "#" * 70 + "\n")
-
-            # --- 阶段 3: 信息综合 (含时间转换) ---
-            information_synthesizer = make_information_synthesizer_agent()
-            recent_history = memory.get_recent_history(num_steps=HISTORY_WINDOW_SIZE)
-
-            # 【新增】: 转换时间并加入输入字典
-            current_time_seconds = current_step_data.get('time')
-            human_readable_time = convert_seconds_to_datetime_string(current_time_seconds)
-
-            input_for_synthesizer = {
-                "static_info": memory.testcase_data.get("static_info"),
-                "history": recent_history,
-                "human_readable_time": human_readable_time  # 将可读时间传入
-            }
-            synthesized_input = \
-            (await information_synthesizer.run(task=json.dumps(input_for_synthesizer, indent=4))).messages[-1].content
-
-            # --- 【新增】阶段 3.5: 知识检索 (条件性执行) ---
-            retrieved_knowledge = "No external knowledge was consulted."
-            if USE_GRAPHRAG_TOOL:
-                logging.info(f"--- [Step {i + 1}] Stage 3.5: Knowledge Retrieval ---")
-                try:
-                    knowledge_retriever = make_knowledge_retriever_agent()
-                    # 构造给知识检索代理的输入
-                    retriever_input = (
-                        f"[CURRENT STATE]:\n{synthesized_input}\n\n"
-                        f"[USER GOAL]:\n{user_demand_for_llm}"
-                    )
-                    # 运行知识检索代理
-                    retrieval_result = await knowledge_retriever.run(task=retriever_input)
-                    # 知识就是最后一个消息的内容
-                    retrieved_knowledge = retrieval_result.messages[-1].content
-                    logging.info("--- Knowledge retrieval successful ---")
-                except Exception as e:
-                    logging.error(f"Knowledge retrieval failed: {e}. Proceeding without external knowledge.")
-
-            # --- 阶段 4: 最终决策 ---
-            logging.info(f"--- [Step {i + 1}] Stage 4: Decision Making ---")
-            decision_maker, instruction = make_decision_maker_agent()
-            last_reward = memory.get_last_reward()
-            if last_reward is None: last_reward = 0.0
-
-            # 【修改】: 构造包含所有信息的最终输入
-            llm_input_for_decision = (
-                f"//-- INPUTS --//\n"
-                f"[CURRENT STATE]:\n{synthesized_input}\n\n"
-                f"[RETRIEVED KNOWLEDGE]:\n{retrieved_knowledge}\n\n"
-                f"[USER GOAL]:\n{user_demand_for_llm}\n\n"
-                f"[LAST REWARD]:\n{last_reward:.4f}"
-            )
-
-            llm_raw_output = (await decision_maker.run(task=llm_input_for_decision)).messages[-1].content
-            llm_thought, llm_action_str = parse_llm_output(llm_raw_output)
-
-            # --- 阶段 5: 环境交互与反馈记录 ---
-            logging.info(f"--- [Step {i + 1}] Stage 5: Environment Interaction & Feedback ---")
-            if llm_thought and llm_action_str:
-                try:
-                    action_json = json.loads(llm_action_str)
-                    print(f"\n[Step {current_step_num + 1}] Action Decided: {action_json}")
-
-                    feedback = await asyncio.to_thread(advance_and_get_feedback, testid, action_json)
-
-                    if feedback:
-                        kpis = feedback.get("kpis", {})
-                        last_obj = memory.get_last_objective_integrand()
-                        # 【修改】: 动态调用奖励函数
-                        reward_function = getattr(reward_calculator, reward_function_name)
-                        reward, new_obj = reward_function(kpis, last_obj)
-
-                        memory.set_last_objective_integrand(new_obj)
-
-                        print(f"[Step {current_step_num + 1}] KPIs Received: {kpis}")
-                        print(f"[Step {current_step_num + 1}] Reward Calculated: {reward:.4f}")
-
-                        memory.update_latest_step({
-                            "instruction": instruction, "llm_input": llm_input_for_decision,
-                            "llm_thought": llm_thought, "action": action_json,
-                            "kpis": kpis, "reward": reward
-                        })
-
-                        new_obs = feedback.get("observation", {})
-                        new_time = new_obs.pop('time', 0.0)
-                        memory.add_new_step(new_observation=new_obs, new_time=new_time)
-
-                        memory.save()
+                "\n" + "#" * 70 + f"\n# Starting Control Loop: Step {current_step_num + 1}/{simulation_steps}\n" + "#" * 70 + "\n")
+
+            with span("control_step", step=current_step_num + 1, testid=testid):
+                # --- 阶段 2.5: 本地策略 (置信门控，分布外的状态才询问LLM) ---
+                # --- Stage 2.5: local policy (gated; only out-of-distribution states go to the LLM) ---
+                local_action, served_by, candidate_log, plan, decision_prompt = None, None, None, None, None
+                current_time_seconds = current_step.time
+                if plan_executor is not None:
+                    # --- 分层执行: 计划未到期且没有偏离时直接执行 (execute the plan while it holds) ---
+                    local_action, note = plan_executor.next_action(current_step_num, current_step.observation)
+                    if local_action is not None:
+                        logging.info(f"--- [Step {i + 1}] Executing {note} ---")
+                        served_by = "plan"
+                        instruction, llm_input_for_decision = None, None
+                        llm_thought = f"Executing {note}."
+                        llm_action_str = json.dumps(local_action)
                     else:
-                        break
-                except json.JSONDecodeError: break
-            else:
-                break  # 如果LLM输出无法解析，则终止循环
+                        logging.info(f"--- [Step {i + 1}] Planning ({note}) ---")
+                if local_action is None and local_controller is not None:
+                    local_action, distance = local_controller.decide(
+                        step_features(current_step.observation, current_time_seconds))
+                    if local_action is not None:
+                        served_by = "local"
+                        logging.info(f"--- [Step {i + 1}] Served by the local policy (distance {distance:.2f}) ---")
+                        instruction, llm_input_for_decision = None, None
+                        llm_thought = f"Local policy action (state distance {distance:.2f})."
+                        llm_action_str = json.dumps(local_action)
+                    else:
+                        logging.info(f"--- [Step {i + 1}] State out of distribution (distance {distance:.2f}); "
+                                     f"asking the LLM ---")
+                llm_start = time.perf_counter()
+
+                if local_action is None:
+                    # --- 阶段 3: 信息综合 (含时间转换) ---
+                    recent_history = memory.get_prompt_history(num_steps=run_config.history_window_size)
+
+                    # 【新增】: 转换时间并加入输入字典
+                    human_readable_time = convert_seconds_to_datetime_string(current_time_seconds)
+
+                    input_for_synthesizer = {
+                        "static_info": memory.testcase_data.get("static_info"),
+                        "history": recent_history,
+                        "human_readable_time": human_readable_time  # 将可读时间传入
+                    }
+                    # 长时段上下文: 最近几个模拟日的汇总，大小不随运行时长增长
+                    # Long-horizon context: summaries of the last few simulated days, bounded in size
+                    daily_summary = memory.get_daily_summaries(run_config.daily_summary_days)
+                    if daily_summary:
+                        input_for_synthesizer["daily_summary"] = daily_summary
+                    synthesized_input = None
+                    if template_briefing is not None:
+                        with span("briefing.template"):
+                            synthesized_input = template_briefing.render(
+                                memory, human_readable_time, run_config.history_window_size, daily_summary)
+                    elif briefing_cache is not None:
+                        synthesized_input = briefing_cache.reuse(current_step.observation, current_time_seconds,
+                                                                 human_readable_time)
+                        if synthesized_input is not None:
+                            logging.info(f"--- [Step {i + 1}] State unchanged; reusing the previous briefing ---")
+                    if synthesized_input is None:
+                        information_synthesizer = make_information_synthesizer_agent()
+                        with span("llm.information_synthesizer"):
+                            synthesized_input = \
+                            (await information_synthesizer.run(task=json.dumps(input_for_synthesizer, indent=4))).messages[-1].content
+                        if briefing_cache is not None:
+                            briefing_cache.store(synthesized_input, current_step.observation, current_time_seconds,
+                                                 human_readable_time)
+
+                    # --- 【新增】阶段 3.5: 知识检索 (条件性执行) ---
+                    retrieved_knowledge = "No external knowledge was consulted."
+                    if use_graphrag_tool:
+                        logging.info(f"--- [Step {i + 1}] Stage 3.5: Knowledge Retrieval ---")
+                        signature = state_signature(current_step.observation, current_time_seconds,
+                                                    selected_objective, schedule_rules, point_registry)
+                        cached_knowledge = knowledge_cache.get(signature)
+                        if cached_knowledge is not None:
+                            retrieved_knowledge = cached_knowledge
+                            logging.info(f"--- Knowledge reused for regime {signature} ---")
+                        elif knowledge_index is not None:
+                            search_start = time.perf_counter()
+                            with span("retrieval.local"):
+                                retrieved_knowledge = render_results(knowledge_index.search(
+                                    signature_query(signature, objective_description), run_config.retrieval_top_k))
+                            knowledge_cache.put(signature, retrieved_knowledge, time.perf_counter() - search_start)
+                        else:
+                            try:
+                                search_start = time.perf_counter()
+                                knowledge_retriever = make_knowledge_retriever_agent()
+                                # 构造给知识检索代理的输入
+                                retriever_input = prompt_engine.render(
+                                    "knowledge_retriever_input_template", user_goal=user_demand_for_llm,
+                                    current_state=synthesized_input).text
+                                # 运行知识检索代理
+                                with span("llm.knowledge_retriever"):
+                                    retrieval_result = await knowledge_retriever.run(task=retriever_input)
+                                # 知识就是最后一个消息的内容
+                                retrieved_knowledge = retrieval_result.messages[-1].content
+                                knowledge_cache.put(signature, retrieved_knowledge, time.perf_counter() - search_start)
+                                logging.info("--- Knowledge retrieval successful ---")
+                            except Exception as e:
+                                logging.error(f"Knowledge retrieval failed: {e}. Proceeding without external knowledge.")
+
+                    # --- 阶段 4: 最终决策 ---
+                    logging.info(f"--- [Step {i + 1}] Stage 4: Decision Making ---")
+                    last_reward = memory.get_last_reward()
+                    if last_reward is None: last_reward = 0.0
+
+                    # 【修改】: 构造包含所有信息的最终输入；用户目标和计划说明在前，每步变化的状态在后
+                    # The user goal and plan instructions come first and the per-step state last, so the
+                    # provider can cache the shared prefix
+                    decision_prompt = prompt_engine.render(
+                        "decision_input_template", user_goal=user_demand_for_llm,
+                        plan_hint=plan_executor.hint(run_config.control_step) if plan_executor is not None else "",
+                        retrieved_knowledge=retrieved_knowledge, current_state=synthesized_input,
+                        last_reward=last_reward)
+                    llm_input_for_decision = decision_prompt.text
+                    logging.info(f"Decision input: {decision_prompt.prompt_chars} chars, stable prefix "
+                                 f"{decision_prompt.stable_prefix_chars} ({decision_prompt.stable_share:.0%}).")
+
+                    if candidate_evaluator is not None:
+                        # 多个候选在 candidate_horizon 个控制步上比较，只执行得分最高的一个；每个候选由 choose_action 创建自己的代理
+                        # Candidates are compared over candidate_horizon control steps; only the best is executed.
+                        # choose_action builds an agent per candidate
+                        instruction = load_prompt("decision_maker_prompt")
+                        with span("best_of_n", candidates=candidate_count):
+                            chosen, candidates = await choose_action(
+                                make_decision_maker_agent, llm_input_for_decision, candidate_count,
+                                parse_llm_output, candidate_evaluator, reward_engine, selected_objective,
+                                run_config.candidate_horizon, current_time_seconds, best_of_n_stats,
+                                repair=(lambda action: action_registry.validate(action, track=False)[0])
+                                if action_registry is not None else None)
+                        llm_input_for_decision, llm_raw_output = chosen.prompt, chosen.raw_output
+                        candidate_log = [c.summary() for c in candidates]
+                    else:
+                        decision_maker, instruction = make_decision_maker_agent()
+                        with span("llm.decision_maker"):
+                            llm_raw_output = (await decision_maker.run(task=llm_input_for_decision)).messages[-1].content
+                    llm_thought, llm_action_str = parse_llm_output(llm_raw_output)
+                    if plan_executor is not None:
+                        # 执行计划的第一段 (the first segment of the plan is executed now)
+                        plan = plan_executor.adopt(llm_action_str, current_step_num)
+                        llm_action_str = json.dumps(plan.segments[0].action) if plan is not None else None
+
+                    if local_controller is not None:
+                        local_controller.record_llm_step(time.perf_counter() - llm_start)
+
+                # --- 阶段 5: 环境交互与反馈记录 ---
+                logging.info(f"--- [Step {i + 1}] Stage 5: Environment Interaction & Feedback ---")
+                if llm_thought and llm_action_str:
+                    try:
+                        action_json = json.loads(llm_action_str)
+                        action_repairs = []
+                        if action_registry is not None:
+                            requested_action = action_json
+                            action_json, action_repairs = action_registry.validate(requested_action)
+                            if action_json is None:
+                                logging.error(f"Action {requested_action} rejected: {'; '.join(action_repairs)}")
+                                break
+                        print(f"\n[Step {current_step_num + 1}] Action Decided: {action_json}")
+
+                        feedback = await asyncio.to_thread(advance_and_get_feedback, testid, action_json)
+
+                        if feedback:
+                            kpis = feedback.get("kpis", {})
+                            # 旧记录只保存了所选目标的目标函数值 (legacy records only hold the selected objective's value)
+                            last_values = memory.get_last_objective_values() or \
+                                {selected_objective: memory.get_last_objective_integrand()}
+                            with span("reward"):
+                                rewards, objective_values = reward_engine.step(kpis, last_values)
+                            reward = rewards[selected_objective]
+
+                            memory.set_last_objective_values(objective_values)
+                            memory.set_last_objective_integrand(objective_values[selected_objective])
+
+                            print(f"[Step {current_step_num + 1}] KPIs Received: {kpis}")
+                            print(f"[Step {current_step_num + 1}] Reward Calculated: {reward:.4f}")
+
+                            step_record = {
+                                "instruction": instruction, "llm_input": llm_input_for_decision,
+                                "llm_thought": llm_thought, "action": action_json,
+                                "kpis": kpis, "reward": reward, "rewards": rewards
+                            }
+                            if candidate_log is not None:
+                                step_record["candidates"] = candidate_log
+                            if plan is not None:
+                                step_record["plan"] = plan.to_dict()
+                            if action_repairs:
+                                step_record["action_repairs"] = action_repairs
+                            if served_by is not None:
+                                step_record["policy"] = served_by
+                            if decision_prompt is not None:
+                                step_record["prompt_prefix"] = decision_prompt.to_dict()
+                            memory.update_latest_step(step_record)
+
+                            new_obs = feedback.get("observation", {})
+                            new_time = new_obs.pop('time', 0.0)
+                            memory.add_new_step(new_observation=new_obs, new_time=new_time)
+
+                            memory.save()
+                        else:
+                            break
+                    except json.JSONDecodeError: break
+                else:
+                    break  # 如果LLM输出无法解析，则终止循环
+
+        run_status = STATUS_COMPLETED if memory.completed_steps() >= simulation_steps else STATUS_STOPPED
 
     finally:
+        # 记录运行状态，未完成的运行可以用 resume_run.py 续跑 (unfinished runs can be resumed with resume_run.py)
+        if candidate_evaluator is not None:
+            candidate_evaluator.close()
+            logging.info(f"Best-of-N statistics: {best_of_n_stats.to_dict()}")
+        if memory is not None:
+            memory.update_run_meta(status=run_status)
+            if best_of_n_stats.decisions:
+                memory.update_run_meta(best_of_n=best_of_n_stats.to_dict())
+            if local_controller is not None:
+                logging.info(f"Local policy statistics: {local_controller.stats.to_dict()}")
+                memory.update_run_meta(local_policy=local_controller.stats.to_dict())
+            if briefing_cache is not None:
+                logging.info(f"Briefing statistics: {briefing_cache.stats.to_dict()}")
+                memory.update_run_meta(synthesizer=briefing_cache.stats.to_dict())
+            if template_briefing is not None:
+                logging.info(f"Template briefing statistics: {template_briefing.stats.to_dict()}")
+                memory.update_run_meta(synthesizer=template_briefing.stats.to_dict())
+            if knowledge_cache.stats.requests:
+                logging.info(f"Knowledge retrieval statistics: {knowledge_cache.stats.to_dict()}")
+                memory.update_run_meta(knowledge_retrieval=knowledge_cache.stats.to_dict())
+            if action_registry is not None:
+                logging.info(f"Action repair statistics: {action_registry.stats.to_dict()}")
+                memory.update_run_meta(action_repairs=action_registry.stats.to_dict())
+            if prompt_engine.stats:
+                logging.info(f"Prompt prefix statistics: {prompt_engine.stats_dict()}")
+                memory.update_run_meta(prompt_prefix=prompt_engine.stats_dict())
+            if plan_executor is not None:
+                logging.info(f"Planning statistics: {plan_executor.stats.to_dict()}")
+                memory.update_run_meta(planning=plan_executor.stats.to_dict())
+            memory.save()
         # === 最终步骤: 停止测试案例 ===
         if testid:
             logging.info("=" * 50 + "\nExecuting Final Stage: Stopping test case\n" + "=" * 50)
             await asyncio.to_thread(stop, testid)
             logging.info("Test case stopped.")
+        export_scheduler_metrics()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the LLM-in-the-loop building control workflow.")
+    parser.add_argument("--config", type=str, default=None,
+                        help="Path of the run config YAML (default: configs/run_config.yaml).")
+    parser.add_argument("--set", dest="overrides", action="append", metavar="KEY=VALUE",
+                        help="Override a setting or run parameter, e.g. history_window_size=5 (repeatable).")
+    cli_args = parser.parse_args()
+    settings_overrides, run_overrides = split_overrides(parse_cli_overrides(cli_args.overrides))
+    settings = configure_settings(**settings_overrides)
+    run_config = load_run_config(cli_args.config, overrides=run_overrides)
+    if settings.trace_file:
+        configure_tracing(settings.trace_file)
+
     if not os.path.exists('src/__init__.py'):
         with open('src/__init__.py', 'w') as f: pass
     if not os.path.exists('src/core/__init__.py'):
@@ -296,7 +583,7 @@ if __name__ == "__main__":
         logging.warning("nest_asyncio未找到。将使用`asyncio.run`。")
 
     try:
-        asyncio.run(run_agent_workflow())
+        asyncio.run(run_agent_workflow(run_config))
     except KeyboardInterrupt:
         logging.info("程序被用户中断。")
 
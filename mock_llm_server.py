@@ -0,0 +1,48 @@
+"""
+启动本地 OpenAI 兼容的模拟LLM服务 (Start the local OpenAI-compatible mock LLM server)。
+
+示例 (Examples):
+    python mock_llm_server.py
+    python mock_llm_server.py --replay LLM_expert_data_collection/datasets/llm_interactions_train.jsonl \
+        --replay data/output/memory_store.json --latency-ms 800 --jitter-ms 400 --error-rate 0.05 --error-status 429
+然后让代理栈指向它 (then point the agent stack at it):
+    export LLM_BASE_URL=http://127.0.0.1:8765/v1 DEEPSEEK_API_KEY=mock
+    python main.py
+服务运行时可在 /stats 查看统计。(Statistics are served at /stats while it runs.)
+"""
+import asyncio
+import logging
+import argparse
+
+from src.core.mock_llm_server import MockLLMServer, MockOptions, ReplayStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic completions on an OpenAI-compatible API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Listen address.")
+    parser.add_argument("--port", type=int, default=8765, help="Listen port.")
+    parser.add_argument("--replay", action="append", default=[],
+                        help="An llm_interactions_*.jsonl or MemoryStore .json file to replay (repeatable).")
+    parser.add_argument("--model", type=str, default="mock-llm", help="Model name reported by /v1/models.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency per completion.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform random latency added on top.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error.")
+    parser.add_argument("--error-status", type=int, default=500, choices=(429, 500, 502, 503),
+                        help="Status of injected errors.")
+    parser.add_argument("--retry-after-s", type=float, default=0.5, help="Retry-After sent with injected 429s.")
+    parser.add_argument("--stream-chunk-chars", type=int, default=16, help="Characters per streamed chunk.")
+    parser.add_argument("--stream-interval-ms", type=float, default=0.0, help="Delay between streamed chunks.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the latency and error draws.")
+    args = parser.parse_args()
+
+    replay = ReplayStore()
+    for path in args.replay:
+        logging.info(f"Loaded {replay.load(path)} recorded completions from '{path}'.")
+    options = MockOptions(model=args.model, latency_s=args.latency_ms / 1000.0, jitter_s=args.jitter_ms / 1000.0,
+                          error_rate=args.error_rate, error_status=args.error_status,
+                          retry_after_s=args.retry_after_s, stream_chunk_chars=args.stream_chunk_chars,
+                          stream_interval_s=args.stream_interval_ms / 1000.0, seed=args.seed)
+    server = MockLLMServer(replay, options, args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logging.info(f"Mock LLM server stopped: {server.stats.to_dict()}")
@@ -0,0 +1,40 @@
+"""
+不调用LLM重放一次记录的运行 (Replay a recorded run without calling the LLM)。
+
+示例 (Examples):
+    python replay_run.py <run_key>
+    python replay_run.py <run_key> --batch-identical --objective comfort_focus
+    python replay_run.py <run_key> --local      # 使用本地模拟器 (use the local stand-in simulator)
+"""
+import argparse
+
+import src.replay as replay
+from src.local_boptest import bind_local_boptest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the recorded actions of a run and diff its KPIs and rewards.")
+    parser.add_argument("run_key", help="Key of the recorded run (see resume_run.py --list --all).")
+    parser.add_argument("--memory-file", type=str, default="memory_store.json",
+                        help="Memory file name under data/output (default: memory_store.json).")
+    parser.add_argument("--output-file", type=str, default=None,
+                        help="Memory file for the replay record (default: the source file).")
+    parser.add_argument("--batch-identical", action="store_true",
+                        help="Merge consecutive identical actions into one longer step.")
+    parser.add_argument("--max-batch", type=int, default=None, help="Upper bound on the steps merged per advance.")
+    parser.add_argument("--objective", type=str, default=None,
+                        help="Objective used to recompute rewards (default: the run's own objective).")
+    parser.add_argument("--local", action="store_true", help="Replay on the local stand-in simulator.")
+    args = parser.parse_args()
+
+    if args.local:
+        bind_local_boptest(replay)
+    report = replay.replay_run(args.run_key, filename=args.memory_file, output_filename=args.output_file,
+                               batch_identical=args.batch_identical, max_batch=args.max_batch,
+                               objective=args.objective)
+    print(f"✅ Replayed {report['recorded_steps']} steps in {report['advance_calls']} advance calls "
+          f"as '{report['replay_key']}'.")
+    print(f"   Total reward: original {report['original_total_reward']:.4f}, "
+          f"replayed {report['replayed_total_reward']:.4f} (diff {report['total_reward_diff']:+.4f})")
+    for name, value in sorted(report["max_kpi_diff"].items()):
+        print(f"   max |Δ{name}| = {abs(value):.6g}")
+    print(f"📄 Diff report: {report['report_path']}")
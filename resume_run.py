@@ -0,0 +1,65 @@
+"""
+续跑一个中断的控制运行 (Resume an interrupted control run)。
+
+示例 (Examples):
+    python resume_run.py --list
+    python resume_run.py <run_key>
+    python resume_run.py <run_key> --strategy reinit --set simulation_steps=400
+"""
+import sys
+import asyncio
+import logging
+import argparse
+
+from src.config import configure_settings, parse_cli_overrides
+from src.core.run_config import split_overrides
+from src.core.tracing import configure_tracing
+from src.memory_store import MemoryStore
+from src.resume import RESUME_STRATEGIES, REPLAY, list_runs, resume_run_config
+from src.utils import convert_seconds_to_datetime_string
+
+
+def print_runs(filename: str, show_all: bool):
+    runs = [run for run in list_runs(filename) if show_all or run.resumable]
+    if not runs:
+        print(f"No {'' if show_all else 'resumable '}runs in '{filename}'.")
+        return
+    print(f"{'run key':<40} {'testcase':<16} {'status':<10} {'steps':>11}  {'sim time':<20} updated")
+    for run in runs:
+        steps = f"{run.completed_steps}/{run.simulation_steps if run.simulation_steps is not None else '?'}"
+        sim_time = convert_seconds_to_datetime_string(run.last_time) if run.last_time is not None else "-"
+        print(f"{run.key:<40} {run.test_case_name or '?':<16} {run.status:<10} {steps:>11}  "
+              f"{sim_time:<20} {run.updated_at or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or resume interrupted LLM-in-the-loop control runs.")
+    parser.add_argument("run_key", nargs="?", help="Key of the run to resume (see --list).")
+    parser.add_argument("--list", action="store_true", help="List the resumable runs and exit.")
+    parser.add_argument("--all", action="store_true", help="With --list, also show completed runs.")
+    parser.add_argument("--memory-file", type=str, default="memory_store.json",
+                        help="Memory file name under data/output (default: memory_store.json).")
+    parser.add_argument("--strategy", choices=RESUME_STRATEGIES, default=REPLAY,
+                        help="replay: re-run the recorded actions (exact); reinit: initialize at the stored time.")
+    parser.add_argument("--set", dest="overrides", action="append", metavar="KEY=VALUE",
+                        help="Override a setting or run parameter, e.g. simulation_steps=400 (repeatable).")
+    args = parser.parse_args()
+
+    if args.list or not args.run_key:
+        print_runs(args.memory_file, args.all)
+        sys.exit(0)
+
+    settings_overrides, run_overrides = split_overrides(parse_cli_overrides(args.overrides))
+    settings = configure_settings(**settings_overrides)
+    if settings.trace_file:
+        configure_tracing(settings.trace_file)
+
+    memory = MemoryStore(args.run_key, filename=args.memory_file)
+    if not memory.history:
+        logging.error(f"Run '{args.run_key}' not found in '{args.memory_file}'.")
+        sys.exit(1)
+    run_config = resume_run_config(memory, run_overrides)
+
+    # main 在导入时加载 AutoGen 等重依赖，只在真正续跑时导入 (main pulls in AutoGen; import it only to resume)
+    from main import run_agent_workflow
+    asyncio.run(run_agent_workflow(run_config, resume_key=args.run_key, resume_strategy=args.strategy))
@@ -0,0 +1,129 @@
+"""
+参数扫描批量执行 (Batch execution of a parameter sweep)。
+
+将扫描规格 (见 src.core.run_config.expand_sweep) 展开为多个运行配置，然后逐个（或并发地）
+执行主控制循环或专家数据采集。每个运行使用独立的 memory 文件，结束后写出一份汇总。
+
+Expands a sweep spec into run configs and executes the main control loop (or the expert-data
+loop) for each of them, sequentially or concurrently, then writes a summary.
+
+示例 (Examples):
+    python run_sweep.py configs/sweep_example.yaml --dry-run
+    python run_sweep.py configs/sweep_example.yaml --export data/output/sweeps/window_sweep
+    python run_sweep.py configs/sweep_example.yaml --concurrency 3
+    python run_sweep.py configs/sweep_example.yaml --loop expert --mode test
+"""
+import os
+import sys
+import json
+import time
+import logging
+import asyncio
+import argparse
+from dataclasses import replace
+from typing import Dict, Any, List
+
+import yaml
+
+from src.config import OUTPUT_DATA_DIR, configure_settings, parse_cli_overrides
+from src.core.run_config import RunConfig, load_sweep, apply_overrides, split_overrides
+from src.core.tracing import configure_tracing
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def export_configs(configs: List[RunConfig], directory: str):
+    """将每个展开后的运行配置写为独立的 YAML 文件。(Writes each expanded run config to its own YAML file.)"""
+    os.makedirs(directory, exist_ok=True)
+    for config in configs:
+        path = os.path.join(directory, f"{config.run_name}.yaml")
+        with open(path, "w", encoding="utf-8") as f:
+            yaml.safe_dump(config.to_dict(), f, allow_unicode=True, sort_keys=False)
+    logging.info(f"已导出 {len(configs)} 个运行配置到 '{directory}'。 (Exported {len(configs)} run configs.)")
+
+
+async def _execute_one(config: RunConfig, loop: str, mode: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    async with semaphore:
+        logging.info(f"▶ 开始运行 (Starting run): {config.run_name}")
+        start = time.perf_counter()
+        status, error = "ok", None
+        try:
+            if loop == "agent":
+                from main import run_agent_workflow
+                await run_agent_workflow(config)
+            else:
+                from LLM_expert_data_collection.generate_llm_expert_data import generate_llm_expert_dataset
+                await generate_llm_expert_dataset(mode=mode, run_config=config)
+        except Exception as e:
+            status, error = "error", str(e)
+            logging.error(f"运行 {config.run_name} 失败 (Run failed): {e}", exc_info=True)
+        elapsed = time.perf_counter() - start
+        logging.info(f"■ 运行结束 (Finished run): {config.run_name} [{status}] in {elapsed:.1f}s")
+        return {"run_name": config.run_name, "status": status, "error": error, "wall_time_s": elapsed,
+                "memory_filename": config.memory_filename, "config": config.to_dict()}
+
+
+async def execute_sweep(configs: List[RunConfig], loop: str = "agent", mode: str = "train",
+                        concurrency: int = 1) -> List[Dict[str, Any]]:
+    """
+    执行所有运行；`concurrency` 限制同时进行的运行数 (每个运行使用各自的 BOPTEST 测试实例)。
+    Executes every run; `concurrency` bounds the simultaneous runs (each uses its own BOPTEST test id).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*(_execute_one(c, loop, mode, semaphore) for c in configs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expand a parameter sweep into run configs and execute them.")
+    parser.add_argument("sweep", help="Path of the sweep spec YAML.")
+    parser.add_argument("--loop", choices=["agent", "expert"], default="agent",
+                        help="Which loop to run: main.py's agent workflow or the expert-data collection.")
+    parser.add_argument("--mode", choices=["train", "test"], default="train", help="Expert-data mode.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Maximum number of runs in flight.")
+    parser.add_argument("--set", dest="overrides", action="append", metavar="KEY=VALUE",
+                        help="Override applied to every run after expansion (repeatable).")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the expanded runs.")
+    parser.add_argument("--export", type=str, default=None, help="Write each expanded run config to this directory.")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Path of the JSON summary (default: data/output/sweeps/<name>_summary.json).")
+    args = parser.parse_args()
+
+    settings_overrides, run_overrides = split_overrides(parse_cli_overrides(args.overrides))
+    settings = configure_settings(**settings_overrides)
+    if settings.trace_file:
+        configure_tracing(settings.trace_file)
+
+    run_configs = [apply_overrides(c, run_overrides) for c in load_sweep(args.sweep)]
+    if args.loop == "expert":
+        # 专家数据按运行名分目录输出，避免互相覆盖 (expert datasets go to per-run directories)
+        for i, c in enumerate(run_configs):
+            if not c.expert_data.output_dir:
+                output_dir = os.path.join(OUTPUT_DATA_DIR, "sweeps", c.run_name)
+                run_configs[i] = replace(c, expert_data=replace(c.expert_data, output_dir=output_dir))
+
+    print(f"扫描共展开为 {len(run_configs)} 个运行 (Sweep expanded to {len(run_configs)} runs):")
+    for c in run_configs:
+        print(f"  - {c.run_name}")
+
+    if args.export:
+        export_configs(run_configs, args.export)
+    if args.dry_run:
+        sys.exit(0)
+
+    try:
+        import nest_asyncio
+
+        nest_asyncio.apply()
+    except ImportError:
+        pass
+
+    results = asyncio.run(execute_sweep(run_configs, loop=args.loop, mode=args.mode, concurrency=args.concurrency))
+
+    sweep_name = os.path.splitext(os.path.basename(args.sweep))[0]
+    summary_path = args.summary or os.path.join(OUTPUT_DATA_DIR, "sweeps", f"{sweep_name}_summary.json")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+    failed = [r for r in results if r["status"] != "ok"]
+    print(f"📄 汇总已写入 (Summary written to) '{summary_path}' — {len(results) - len(failed)} ok, {len(failed)} failed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,246 @@
+"""
+动作注册表 (Action registry)。
+
+根据静态建筑信息中的 action_space (以及 BOPTEST /inputs 返回的测试案例输入) 为每个测试案例
+预编译每个控制点的校验器。动作在送入 advance 之前完成校验和修复：未知的键被拒绝 (丢弃)，
+无法转换为数值的值被丢弃，越界值被截断到 min_value/max_value，并自动补上对应的 *_activate 标志 (BOPTEST
+只在标志为 1 时应用覆盖值)。没有任何有效控制点的动作整体被拒绝。修复统计按运行记录在
+ActionRepairStats 中。
+
+Pre-compiles a validator per control point and testcase from the action_space of the static
+building info (and the testcase inputs reported by BOPTEST /inputs). Actions are validated and
+repaired before `advance`: unknown keys are rejected (dropped), values that are not numbers are
+converted or dropped, out-of-range values are clamped to min_value/max_value, and the matching
+*_activate flags are added (BOPTEST only applies an override whose flag is 1). An action without any valid control
+point is rejected as a whole. Repair statistics are kept per run in ActionRepairStats.
+
+只有 BOPTEST /inputs 可用时才校验: 仅凭静态信息 (可能描述的是另一个测试案例) 会拒绝测试案例真实的控制点。
+Validation only runs when BOPTEST /inputs is available: the static info alone (which may describe
+another testcase) would reject the testcase's real control points.
+"""
+import math
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ACTIVATE_SUFFIX = "_activate"
+
+CLAMPED, CONVERTED, INVALID = "clamped", "converted", "invalid"
+
+
+@dataclass(frozen=True)
+class ActionSpec:
+    """一个控制点的取值范围。(The range of one control point.)"""
+    name: str
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    unit: Optional[str] = None
+    description: Optional[str] = None
+
+
+def _actions_of(static_info: Any) -> List[Dict[str, Any]]:
+    if static_info is None:
+        return []
+    if hasattr(static_info, "model_dump"):  # StaticBuildingData
+        static_info = static_info.model_dump()
+    action_space = static_info.get("action_space") or {}
+    return [a for a in action_space.get("actions") or [] if a.get("name")]
+
+
+def _inputs_as_actions(inputs: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """BOPTEST /inputs 的载荷 -> action_space 形式的列表。(BOPTEST /inputs payload -> action_space entries.)"""
+    return [{"name": name, "min_value": info.get("Minimum"), "max_value": info.get("Maximum"),
+             "unit": info.get("Unit"), "description": info.get("Description")}
+            for name, info in (inputs or {}).items() if isinstance(info, dict)]
+
+
+def _merge_actions(static_actions: List[Dict[str, Any]], input_actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    /inputs 的边界和单位覆盖静态信息中同名 (或按后缀匹配) 的点；静态信息只提供缺少的描述和 /inputs 中没有的点。
+    The /inputs bounds and units replace the static-info entry of the same (or suffix-matched) point;
+    static info only supplies missing descriptions and the points /inputs lacks.
+    """
+    merged = {action["name"]: action for action in static_actions}
+    live = set()
+    for action in input_actions:
+        parts = action["name"].split("_")
+        covered = [name for name in ("_".join(parts[i:]) for i in range(len(parts) - 1))
+                   if name in merged and name not in live]
+        description = action.get("description") or next(
+            (merged[name].get("description") for name in covered if merged[name].get("description")), None)
+        for name in covered:
+            del merged[name]
+        merged[action["name"]] = {**action, "description": description}
+        live.add(action["name"])
+    return list(merged.values())
+
+
+def _compile(spec: ActionSpec) -> Callable[[Any], Tuple[Optional[float], Optional[str]]]:
+    """
+    预编译一个控制点的校验器: 值 -> (修复后的值, 修复类型)；值无法使用时为 (None, INVALID)。
+    Pre-compiles a point's validator: value -> (repaired value, repair kind); (None, INVALID) when unusable.
+    """
+    low = -math.inf if spec.min_value is None else float(spec.min_value)
+    high = math.inf if spec.max_value is None else float(spec.max_value)
+
+    def validate(value: Any) -> Tuple[Optional[float], Optional[str]]:
+        kind = None
+        if not isinstance(value, (int, float)):
+            try:
+                value, kind = float(value), CONVERTED
+            except (TypeError, ValueError):
+                return None, INVALID
+        if value != value:  # NaN
+            return None, INVALID
+        if value < low:
+            return low, CLAMPED
+        if value > high:
+            return high, CLAMPED
+        return value, kind
+
+    return validate
+
+
+@dataclass
+class ActionRepairStats:
+    """一次运行中动作校验与修复的累计统计。(Cumulative validation and repair statistics of a run.)"""
+    actions: int = 0
+    repaired: int = 0
+    rejected: int = 0
+    activated: int = 0
+    clamped: Dict[str, int] = field(default_factory=dict)
+    converted: Dict[str, int] = field(default_factory=dict)
+    unknown: Dict[str, int] = field(default_factory=dict)
+    invalid: Dict[str, int] = field(default_factory=dict)
+    validate_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"actions": self.actions, "repaired": self.repaired, "rejected": self.rejected,
+                "activate_flags_added": self.activated, "clamped": dict(self.clamped),
+                "converted": dict(self.converted),
+                "unknown_keys": dict(self.unknown), "invalid_values": dict(self.invalid),
+                "mean_validate_us": round(1e6 * self.validate_s / self.actions, 2) if self.actions else None}
+
+
+class ActionRegistry:
+    """
+    Args:
+        actions (List[Dict]): action_space 中的控制点 (name/min_value/max_value/unit/description)。
+                              Points from the action_space (name/min_value/max_value/unit/description).
+        testcase (Optional[str]): 测试案例名。(The testcase name.)
+    """
+
+    def __init__(self, actions: List[Dict[str, Any]], testcase: Optional[str] = None):
+        self.testcase = testcase
+        self._specs: Dict[str, ActionSpec] = {}
+        for action in actions:
+            # 同名的点先出现者优先；from_static_info 已让 /inputs 覆盖静态信息
+            # The first occurrence of a name wins; from_static_info already lets /inputs override static info
+            self._specs.setdefault(action["name"], ActionSpec(
+                action["name"], action.get("min_value"), action.get("max_value"),
+                action.get("unit"), action.get("description")))
+        self._validators = {name: _compile(spec) for name, spec in self._specs.items()}
+        # 动作中的键 -> 校验器 (未知键为 None)，首次出现时解析 (action key -> validator, None if unknown)
+        self._resolved: Dict[str, Optional[Callable]] = {}
+        self.stats = ActionRepairStats()
+
+    @classmethod
+    def from_static_info(cls, static_info: Any, testcase: Optional[str] = None,
+                         inputs: Optional[Dict[str, Any]] = None) -> "ActionRegistry":
+        """
+        由静态建筑信息 (dict 或 StaticBuildingData) 和 BOPTEST /inputs 的载荷构建注册表；/inputs 的边界和单位优先
+        (静态信息可能描述的是另一个测试案例)，静态信息补充描述和 /inputs 中没有的点。
+        Builds the registry from the static building info (a dict or a StaticBuildingData) and a BOPTEST
+        /inputs payload. The /inputs bounds and units take precedence (the static info may describe another
+        testcase); static info supplies descriptions and the points /inputs lacks.
+        """
+        return cls(_merge_actions(_actions_of(static_info), _inputs_as_actions(inputs)), testcase)
+
+    @classmethod
+    def for_testcase(cls, static_info: Any, testcase: Optional[str] = None,
+                     inputs: Optional[Dict[str, Any]] = None) -> Optional["ActionRegistry"]:
+        """
+        控制循环使用的注册表；/inputs 不可用 (请求失败时为 None) 时返回 None 并警告，动作不经校验直接发送。
+        The registry used by the control loops; without /inputs (None when the request failed) None is
+        returned with a warning and actions are sent unchecked.
+        """
+        if not inputs:
+            logging.warning(f"BOPTEST /inputs is unavailable for '{testcase}', so its control points are unknown; "
+                            f"actions are sent to the simulator unchecked.")
+            return None
+        return cls.from_static_info(static_info, testcase, inputs)
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def _match(self, name: str) -> Optional[str]:
+        # 与观测点注册表相同的后缀匹配: con_oveTSetCoo_u -> oveTSetCoo_u
+        # The same suffix matching as the point registry: con_oveTSetCoo_u -> oveTSetCoo_u
+        parts = name.split("_")
+        for i in range(len(parts) - 1):
+            candidate = "_".join(parts[i:])
+            if candidate in self._specs:
+                return candidate
+        return None
+
+    def _validator(self, name: str) -> Optional[Callable]:
+        if name not in self._resolved:
+            matched = self._match(name)
+            self._resolved[name] = self._validators[matched] if matched else None
+        return self._resolved[name]
+
+    def spec(self, name: str) -> Optional[ActionSpec]:
+        matched = self._match(name)
+        return self._specs[matched] if matched else None
+
+    def validate(self, action: Any, track: bool = True) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        校验并修复一个动作，返回 (修复后的动作, 修复说明)；动作被拒绝时为 (None, 说明)。
+        track=False 时不计入统计 (例如尚未执行的候选动作)。
+        Validates and repairs an action; returns (the repaired action, repair notes), or (None, notes)
+        when the action is rejected. With track=False the statistics are left alone (e.g. for
+        candidate actions that are not executed).
+        """
+        start = time.perf_counter()
+        stats = self.stats if track else ActionRepairStats()
+        stats.actions += 1
+        notes: List[str] = []
+        repaired: Dict[str, Any] = {}
+        if isinstance(action, dict):
+            for name, value in action.items():
+                validator = self._validator(name)
+                if validator is None:
+                    stats.unknown[name] = stats.unknown.get(name, 0) + 1
+                    notes.append(f"unknown key {name}")
+                    continue
+                fixed, kind = validator(value)
+                if kind == INVALID:
+                    stats.invalid[name] = stats.invalid.get(name, 0) + 1
+                    notes.append(f"invalid value {name}={value!r}")
+                    continue
+                if kind == CLAMPED:
+                    stats.clamped[name] = stats.clamped.get(name, 0) + 1
+                    notes.append(f"clamped {name} {value} -> {fixed}")
+                elif kind == CONVERTED:
+                    stats.converted[name] = stats.converted.get(name, 0) + 1
+                    notes.append(f"converted {name}={value!r}")
+                repaired[name] = fixed
+            # 补上缺失的激活标志 (add the missing activate flags)
+            for name in [n for n in repaired if n.endswith("_u")]:
+                flag = name[:-2] + ACTIVATE_SUFFIX
+                if flag not in repaired and self._validator(flag) is not None:
+                    repaired[flag] = 1
+                    stats.activated += 1
+                    notes.append(f"added {flag}")
+        else:
+            notes.append(f"not an object: {type(action).__name__}")
+        if not any(not name.endswith(ACTIVATE_SUFFIX) for name in repaired):
+            stats.rejected += 1
+            stats.validate_s += time.perf_counter() - start
+            return None, notes + ["no valid control point"]
+        # 只补上激活标志不算修复 (only adding activate flags does not count as a repair)
+        if any(not note.startswith("added ") for note in notes):
+            stats.repaired += 1
+        stats.validate_s += time.perf_counter() - start
+        return repaired, notes
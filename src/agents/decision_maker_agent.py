@@ -1,11 +1,13 @@
 import logging
-from autogen_agentchat.agents import AssistantAgent
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
 # --- 项目模块 ---
 from src.core.llm_client import get_deepseek_client
 from src.core.prompt_loader import load_prompt
 
+if TYPE_CHECKING:
+    from autogen_agentchat.agents import AssistantAgent
+
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -14,12 +16,16 @@ def make_decision_maker_agent(
         name: str = "DecisionMakerAgent",
         prompt_file: str = "decision_maker_prompt",
         **kwargs
-) -> Tuple[AssistantAgent, str]:
+) -> Tuple["AssistantAgent", str]:
     """
     配置并返回一个用于决策的AutoGen AssistantAgent。
     这个版本是一个纯粹的思考者，不携带任何工具。
     """
-    agent_model_client = get_deepseek_client()
+    # 惰性导入 autogen，避免在导入本模块时付出开销
+    # Lazy import so that importing this module stays cheap
+    from autogen_agentchat.agents import AssistantAgent
+
+    agent_model_client = get_deepseek_client(priority_class="decision_maker")
     instruction = load_prompt(prompt_file)
 
     # 决策代理现在不再直接与工具交互
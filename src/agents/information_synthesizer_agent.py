@@ -1,15 +1,18 @@
 # src/agents/information_synthesizer_agent.py
 
-from autogen_agentchat.agents import AssistantAgent
+from typing import TYPE_CHECKING
 # Assuming the user's project structure has a 'src' root in PYTHONPATH
 from src.core.llm_client import get_deepseek_client
 from src.core.prompt_loader import load_prompt
 
+if TYPE_CHECKING:
+    from autogen_agentchat.agents import AssistantAgent
+
 def make_information_synthesizer_agent(
     name: str = "Information_Synthesizer",
     prompt_file: str = "information_synthesizer_prompt",
     **kwargs
-) -> AssistantAgent:
+) -> "AssistantAgent":
     """
     创建一个AssistantAgent，它将静态和动态的建筑信息综合成一个简洁的摘要。
     Creates an AssistantAgent that synthesizes static and dynamic building
@@ -23,9 +26,13 @@ def make_information_synthesizer_agent(
     Returns:
         AssistantAgent: An instance of the Information Synthesizer agent.
     """
+    # 惰性导入 autogen，避免在导入本模块时付出开销
+    # Lazy import so that importing this module stays cheap
+    from autogen_agentchat.agents import AssistantAgent
+
     # 获取配置好的Deepseek客户端
     # Get the configured Deepseek client
-    agent_model_client = get_deepseek_client()
+    agent_model_client = get_deepseek_client(priority_class="information_synthesizer")
 
     # 从指定的提示文件加载系统消息
     # Load the system message from the specified prompt file
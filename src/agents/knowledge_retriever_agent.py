@@ -1,17 +1,19 @@
 import logging
-from autogen_agentchat.agents import AssistantAgent
-from typing import Tuple
+import importlib.util
+from typing import TYPE_CHECKING
 
 # --- 项目模块 ---
 from src.core.llm_client import get_deepseek_client
 from src.core.prompt_loader import load_prompt
-from src.config import GRAPHRAG_SETTINGS_PATH
+from src.config import get_settings
 
-# 仅在需要时尝试导入工具，以保持灵活性
-try:
-    from autogen_ext.tools.graphrag import LocalSearchTool
+if TYPE_CHECKING:
+    from autogen_agentchat.agents import AssistantAgent
 
-    AUTOGEN_EXT_INSTALLED = True
+# 仅检查工具是否可用，真正的导入推迟到创建代理时，以保持导入轻量
+# Only check that the tool is available; the import itself is deferred to agent creation
+try:
+    AUTOGEN_EXT_INSTALLED = importlib.util.find_spec("autogen_ext.tools.graphrag") is not None
 except ImportError:
     AUTOGEN_EXT_INSTALLED = False
 
@@ -23,7 +25,7 @@ def make_knowledge_retriever_agent(
         name: str = "KnowledgeRetrieverAgent",
         prompt_file: str = "knowledge_retriever_prompt",
         **kwargs
-) -> AssistantAgent:
+) -> "AssistantAgent":
     """
     创建一个专门负责从GraphRAG知识库中检索信息的代理。
     """
@@ -31,12 +33,16 @@ def make_knowledge_retriever_agent(
         raise ImportError(
             "`autogen_ext` or its dependencies are not installed. KnowledgeRetrieverAgent cannot be created.")
 
-    agent_model_client = get_deepseek_client()
+    from autogen_agentchat.agents import AssistantAgent
+    from autogen_ext.tools.graphrag import LocalSearchTool
+
+    agent_model_client = get_deepseek_client(priority_class="knowledge_retriever")
     instruction = load_prompt(prompt_file)
+    graphrag_settings_path = get_settings().graphrag_settings_path
 
     try:
-        logging.info(f"KnowledgeRetrieverAgent is initializing GraphRAG tool from: {GRAPHRAG_SETTINGS_PATH}")
-        graphrag_tool = LocalSearchTool.from_settings(settings_path=GRAPHRAG_SETTINGS_PATH)
+        logging.info(f"KnowledgeRetrieverAgent is initializing GraphRAG tool from: {graphrag_settings_path}")
+        graphrag_tool = LocalSearchTool.from_settings(settings_path=graphrag_settings_path)
     except Exception as e:
         logging.error(f"Fatal error initializing GraphRAG tool: {e}")
         # 如果工具初始化失败，则无法创建此代理
@@ -1,10 +1,15 @@
+import os
+import json
+import hashlib
+import tempfile
 import requests
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable, Union
 
-# 从当前包的config模块中导入BOPTEST_BASE_URL
-# Import BOPTEST_BASE_URL from the config module in the current package
-from .config import BOPTEST_BASE_URL
+# 从当前包的config模块中惰性获取BOPTEST地址
+# Lazily read the BOPTEST address from the config module in the current package
+from .config import get_settings, OUTPUT_DATA_DIR
+from .core.tracing import traced
 
 # --- 模块级别的日志记录设置 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,6 +40,7 @@ def _handle_request_errors(func):
     return wrapper
 
 
+@traced("boptest.select_testcase")
 @_handle_request_errors
 def select_testcase(testcase_name: str) -> Optional[str]:
     """
@@ -49,7 +55,7 @@ def select_testcase(testcase_name: str) -> Optional[str]:
         Optional[str]: 如果成功，返回一个字符串格式的testid。如果失败，返回None。
                        The testid as a string on success. Returns None on failure.
     """
-    url = f"{BOPTEST_BASE_URL}/testcases/{testcase_name}/select"
+    url = f"{get_settings().boptest_base_url}/testcases/{testcase_name}/select"
     logging.info(f"Selecting testcase '{testcase_name}' with POST request to {url}")
     response = requests.post(url, timeout=120)
     response.raise_for_status()
@@ -61,19 +67,21 @@ def select_testcase(testcase_name: str) -> Optional[str]:
     logging.info(f"Successfully selected testcase. Received testid: {testid}")
     return testid
 
+@traced("boptest.set_step")
 @_handle_request_errors
 def set_step(testid: str, step: int) -> Optional[Dict[str, Any]]:
     """
     【新增】设置BOPTEST模拟的步长。
     Sets the simulation step for BOPTEST.
     """
-    url = f"{BOPTEST_BASE_URL}/step/{testid}"
+    url = f"{get_settings().boptest_base_url}/step/{testid}"
     payload = {'step': step}
     logging.info(f"Setting simulation step to {step}s for testid {testid}.")
     response = requests.put(url, json=payload, timeout=60)
     response.raise_for_status()
     return response.json()
 
+@traced("boptest.initialize")
 @_handle_request_errors
 def initialize(testid: str, start_time: int, warmup_period: int) -> Optional[Dict[str, Any]]:
     """
@@ -94,7 +102,7 @@ def initialize(testid: str, start_time: int, warmup_period: int) -> Optional[Dic
     """
     # [关键修正] URL现在是 /initialize/{testid} 端点，并且使用 PUT 方法
     # [KEY CHANGE] The URL is now the /initialize/{testid} endpoint, and the method is PUT
-    url = f"{BOPTEST_BASE_URL}/initialize/{testid}"
+    url = f"{get_settings().boptest_base_url}/initialize/{testid}"
 
     # [关键修正] testid 不再是payload的一部分
     # [KEY CHANGE] testid is no longer part of the payload
@@ -112,6 +120,7 @@ def initialize(testid: str, start_time: int, warmup_period: int) -> Optional[Dic
     return initial_state
 
 
+@traced("boptest.advance")
 @_handle_request_errors
 def advance(testid: str, control_inputs: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """
@@ -128,13 +137,14 @@ def advance(testid: str, control_inputs: Optional[Dict[str, Any]] = None) -> Opt
         Optional[Dict[str, Any]]: 成功时返回新的测量值字典，失败时返回None。
                                   A dictionary of new measurements on success, None on failure.
     """
-    url = f"{BOPTEST_BASE_URL}/advance/{testid}"
+    url = f"{get_settings().boptest_base_url}/advance/{testid}"
     logging.info(f"Advancing simulation for testid {testid} with inputs: {control_inputs or {} }")
     response = requests.post(url, json=control_inputs or {}, timeout=120)
     response.raise_for_status()
     return response.json().get('payload', {})
 
 
+@traced("boptest.get_kpis")
 @_handle_request_errors
 def get_kpis(testid: str) -> Optional[Dict[str, Any]]:
     """
@@ -149,12 +159,13 @@ def get_kpis(testid: str) -> Optional[Dict[str, Any]]:
         Optional[Dict[str, Any]]: 包含KPI值的字典，或在失败时返回None。
                                   A dictionary of KPI values, or None on failure.
     """
-    url = f"{BOPTEST_BASE_URL}/kpi/{testid}"
+    url = f"{get_settings().boptest_base_url}/kpi/{testid}"
     logging.info(f"Fetching KPIs for testid {testid}")
     response = requests.get(url, timeout=60)
     response.raise_for_status()
     return response.json().get('payload', {})
 
+@traced("boptest.advance_and_get_feedback")
 @_handle_request_errors
 def advance_and_get_feedback(testid: str, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
@@ -175,6 +186,59 @@ def advance_and_get_feedback(testid: str, action: Dict[str, Any]) -> Optional[Di
 
     return {"observation": new_state, "kpis": kpis}
 
+@traced("boptest.get_forecast")
+@_handle_request_errors
+def get_forecast(testid: str, point_names: List[str], horizon: int, interval: int) -> Optional[Dict[str, Any]]:
+    """
+    获取扰动预测（天气、电价等）。
+    Get forecasts of boundary conditions (weather, prices, ...).
+
+    Args:
+        testid (str): 测试实例的唯一ID。
+                      The unique test ID.
+        point_names (List[str]): 需要预测的测点名称。
+                                 The forecast point names to request.
+        horizon (int): 预测时长（秒）。
+                       The forecast horizon in seconds.
+        interval (int): 预测时间间隔（秒）。
+                        The forecast interval in seconds.
+
+    Returns:
+        Optional[Dict[str, Any]]: 每个测点的预测值列表，失败时返回None。
+                                  A list of forecast values per point, or None on failure.
+    """
+    url = f"{get_settings().boptest_base_url}/forecast/{testid}"
+    payload = {'point_names': point_names, 'horizon': horizon, 'interval': interval}
+    logging.info(f"Fetching forecast for testid {testid}: {payload}")
+    response = requests.put(url, json=payload, timeout=60)
+    response.raise_for_status()
+    return response.json().get('payload', {})
+
+@traced("boptest.get_scenario")
+@_handle_request_errors
+def get_scenario(testid: str) -> Optional[Dict[str, Any]]:
+    """
+    获取当前的测试场景 (电价方案、时间段等)。
+    Get the current test scenario (electricity price, time period, ...).
+    """
+    url = f"{get_settings().boptest_base_url}/scenario/{testid}"
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return response.json().get('payload', {})
+
+@traced("boptest.get_inputs")
+@_handle_request_errors
+def get_inputs(testid: str) -> Optional[Dict[str, Any]]:
+    """
+    获取测试案例可覆盖的输入及其取值范围 (Description / Minimum / Maximum / Unit)。
+    Get the testcase's overwritable inputs and their ranges (Description / Minimum / Maximum / Unit).
+    """
+    url = f"{get_settings().boptest_base_url}/inputs/{testid}"
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return response.json().get('payload', {})
+
+@traced("boptest.stop")
 @_handle_request_errors
 def stop(testid: str) -> Optional[Dict[str, Any]]:
     """
@@ -189,7 +253,7 @@ def stop(testid: str) -> Optional[Dict[str, Any]]:
         Optional[Dict[str, Any]]: 成功时返回API的响应，失败时返回None。
                                   The API response on success, or None on failure.
     """
-    url = f"{BOPTEST_BASE_URL}/stop/{testid}"
+    url = f"{get_settings().boptest_base_url}/stop/{testid}"
     logging.info(f"Stopping test case with testid {testid}")
     response = requests.put(url, timeout=60)
     response.raise_for_status()
@@ -203,4 +267,139 @@ def stop(testid: str) -> Optional[Dict[str, Any]]:
     else:
         # 响应体为空，但请求成功
         logging.info("stop() endpoint returned an empty response, indicating success.")
-        return {"status": "success", "message": "stop signal sent"}
\ No newline at end of file
+        return {"status": "success", "message": "stop signal sent"}
+
+
+# ==============================================================================
+# 预测服务 (Forecast service)
+# ==============================================================================
+
+FORECAST_CACHE_DIR = os.path.join(OUTPUT_DATA_DIR, ".forecast_cache")
+
+
+class ForecastService:
+    """
+    一次获取一个长时域的预测块，按 (测试案例, 场景, 回合开始时间, 间隔) 缓存到磁盘，之后在本地切出窗口。
+    同一测试案例、场景和开始时间的预测是确定的，因此只有它们改变或请求超出缓存块时才重新获取。
+    场景以函数给出时，每次未命中都会重新查询场景，运行中场景改变时切换到 (或获取) 对应的块。
+    缓存文件以原子替换的方式写入，因为并发的扫描运行共享这些文件。
+    Fetches one long-horizon forecast block, caches it on disk per (testcase, scenario, episode start,
+    interval) and serves windowed slices locally. Forecasts are deterministic for a testcase, scenario
+    and start time, so they are only refetched when these change or a request falls outside the cached block.
+    When the scenario is given as a function it is queried again on every miss, so a scenario change
+    during the run switches to (or fetches) the matching block. Cache files are replaced atomically,
+    since concurrent sweep runs share them.
+
+    Args:
+        testid (str): 测试实例的唯一ID。(The unique test ID.)
+        testcase_name (str): 测试案例名 (缓存键的一部分)。(Testcase name, part of the cache key.)
+        point_names (List[str]): 预测测点。(The forecast points.)
+        interval (int): 预测时间间隔（秒）。(The forecast interval in seconds.)
+        block_horizon (int): 每次获取的时域（秒），通常为整个回合加上窗口长度。
+                             Horizon fetched at once in seconds, typically the episode plus one window.
+        fetch (Callable): 与 get_forecast 签名相同的函数 (可为本地模拟器的方法)。
+                          A function with get_forecast's signature (may be the local simulator's).
+        scenario (Union[Dict, Callable, None]): 场景，或按 testid 获取场景的函数；None 表示未知场景。
+                                                The scenario, or a function fetching it by testid.
+        cache_dir (Optional[str]): 磁盘缓存目录，None 时只缓存在内存中。
+                                   On-disk cache directory; memory only with None.
+        start_time (Optional[float]): 回合开始时间（秒，缓存键的一部分）；None 表示未知。
+                                      The episode start time in seconds, part of the cache key.
+    """
+
+    def __init__(self, testid: str, testcase_name: str, point_names: List[str], interval: int, block_horizon: int,
+                 fetch: Callable[..., Optional[Dict[str, Any]]] = None,
+                 scenario: Union[Dict[str, Any], Callable[[str], Optional[Dict[str, Any]]], None] = None,
+                 cache_dir: Optional[str] = FORECAST_CACHE_DIR, start_time: Optional[float] = None):
+        if interval <= 0:
+            raise ValueError(f"The forecast interval must be positive, got {interval}.")
+        self.testid = testid
+        self.testcase_name = testcase_name
+        self.point_names = list(point_names)
+        self.interval = interval
+        self.block_horizon = block_horizon
+        self.fetch = fetch or get_forecast
+        self.cache_dir = cache_dir
+        self.start_time = start_time
+        self.fetches = 0
+        self.hits = 0
+        self._block: Optional[Dict[str, Any]] = None
+        self._scenario_source = scenario if callable(scenario) else None
+        self.set_scenario(scenario(testid) if callable(scenario) else scenario)
+
+    def set_scenario(self, scenario: Optional[Dict[str, Any]]):
+        """切换场景；键改变时丢弃内存中的块。(Switches the scenario; the in-memory block is dropped when the key changes.)"""
+        digest = hashlib.sha1(json.dumps(scenario or {}, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        start = "any" if self.start_time is None else int(self.start_time)
+        key = f"{self.testcase_name}.{digest}.{start}.{int(self.interval)}"
+        if getattr(self, "cache_key", None) != key:
+            self.cache_key = key
+            self._block = self._load_block()
+
+    @property
+    def cache_path(self) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{self.cache_key}.json") if self.cache_dir else None
+
+    def _load_block(self) -> Optional[Dict[str, Any]]:
+        path = self.cache_path
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring the unreadable forecast cache {path}: {e}")
+            return None
+
+    def _slice(self, time: float, steps: int) -> Optional[Dict[str, List[float]]]:
+        block = self._block
+        if not block or any(point not in block["points"] for point in self.point_names):
+            return None
+        offset = (time - block["start"]) / self.interval
+        index = round(offset)
+        if index < 0 or abs(offset - index) * self.interval >= 1.0 or index + steps >= block["length"]:
+            return None
+        window = {"time": [block["start"] + (index + k) * self.interval for k in range(steps + 1)]}
+        for point in self.point_names:
+            window[point] = block["points"][point][index:index + steps + 1]
+        return window
+
+    def window(self, time: float, horizon: int) -> Optional[Dict[str, List[float]]]:
+        """
+        从当前模拟时间 time 起、时域为 horizon 秒的预测，形状与 get_forecast 的结果相同。
+        The forecast over `horizon` seconds from the current simulation time, shaped like get_forecast's result.
+        Returns None when fetching fails.
+        """
+        steps = int(horizon // self.interval)
+        window = self._slice(time, steps)
+        if window is None and self._scenario_source is not None:
+            # 未命中时确认场景没有改变；改变后先尝试对应键的缓存块 (on a miss, check whether the scenario changed)
+            self.set_scenario(self._scenario_source(self.testid))
+            window = self._slice(time, steps)
+        if window is not None:
+            self.hits += 1
+            return window
+        # BOPTEST 的预测从当前模拟时间开始，因此未命中时从 time 起获取一个新块
+        # BOPTEST forecasts start at the current simulation time, so a miss fetches a new block from `time`
+        payload = self.fetch(self.testid, point_names=self.point_names,
+                             horizon=max(horizon, self.block_horizon), interval=self.interval)
+        if not payload:
+            return None
+        self.fetches += 1
+        length = min(len(payload.get(point) or []) for point in self.point_names)
+        start = (payload.get("time") or [time])[0]
+        self._block = {"start": start, "length": length,
+                       "points": {point: list(payload[point][:length]) for point in self.point_names}}
+        if self.cache_path:
+            # 先写临时文件再原子替换，并发的运行不会读到写了一半的文件 (write a temp file, then replace atomically)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{self.cache_key}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._block, f)
+                os.replace(tmp_path, self.cache_path)
+            except OSError as e:
+                logging.warning(f"Could not write the forecast cache {self.cache_path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return self._slice(time, steps)
@@ -0,0 +1,380 @@
+"""
+状态简报的复用 (Reuse of the state briefing)。
+
+信息综合代理每一步都是一次完整的LLM调用，即使在夜间建筑处于稳态、简报几乎不变时也是如此。
+BriefingCache 在投影后的 prompt 类观测点上做变化检测：温度点 (K/degC) 与功率点 (W/kW) 相对
+上次生成简报时的变化都在阈值以内、并且时段 (在室与分时电价区间) 没有切换时，直接复用上一份
+简报，只替换其中的时间戳；否则 (或复用次数达到上限时) 重新调用LLM。跳过的调用和重新生成的
+原因记录在 BriefingStats 中。
+
+The information synthesizer is a full LLM call every step, even at night when the building sits
+at steady state and the briefing barely changes. BriefingCache runs a change detector over the
+projected prompt-class points: when every temperature point (K/degC) and power point (W/kW) is
+within its threshold of the values at the last briefing, and the phase (occupancy and time-of-use
+tariff period) has not switched, the previous briefing is reused with its timestamp patched;
+otherwise (or once the reuse limit is reached) the LLM is called again. Skipped calls and the
+reasons for refreshing are tracked in BriefingStats.
+
+TemplateBriefing 是信息综合代理的确定性替代 (run_config 的 synthesizer: template)：同样的两节
+markdown 布局，趋势 (窗口内的斜率、最小/最大值) 由 NumPy 在历史列缓冲区上直接计算，运行规则
+(在室时段与设定点、围护结构、暖通系统) 在构造时从 StaticBuildingData 渲染一次。每次渲染不到一毫秒，
+不调用LLM。
+
+TemplateBriefing is a deterministic stand-in for the synthesizer (`synthesizer: template` in the
+run config): the same two-section markdown layout, with the trends (slope and min/max over the
+window) computed by NumPy straight from the history's column buffers, and the operational rules
+(occupancy and setpoints, envelope, HVAC) rendered once from the StaticBuildingData at
+construction. A render takes well under a millisecond and makes no LLM call.
+"""
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from .point_registry import PROMPT, PointRegistry
+from .schedules import ScheduleRules
+
+TEMPERATURE_UNITS = ("K", "degC")
+POWER_UNITS = {"W": 1.0, "kW": 1000.0}
+
+REFRESH_FIRST = "first"
+REFRESH_PHASE = "phase"
+REFRESH_TEMPERATURE = "temperature"
+REFRESH_POWER = "power"
+REFRESH_MAX_REUSE = "max_reuse"
+
+SYNTHESIZER_LLM = "llm"
+SYNTHESIZER_TEMPLATE = "template"
+SYNTHESIZERS = (SYNTHESIZER_LLM, SYNTHESIZER_TEMPLATE)
+
+# 斜率绝对值低于此值 (每小时，温度 K、功率 W) 时视为稳定
+# Slopes below these magnitudes (per hour; K for temperature, W for power) count as stable
+STABLE_SLOPES = {REFRESH_TEMPERATURE: 0.1, REFRESH_POWER: 50.0}
+
+
+def point_kind(name: str, point_registry: Optional[PointRegistry]) -> Optional[Tuple[str, float]]:
+    """
+    prompt 类观测点的种类: ("temperature"/"power", 换算到 K/W 的系数)；其他点为 None。
+    The kind of a prompt-class point: ("temperature"/"power", the scale to K/W); None for other points.
+    """
+    if point_registry is not None:
+        spec = point_registry.spec(name)
+        if spec.point_class == PROMPT:
+            if spec.unit in TEMPERATURE_UNITS:
+                return REFRESH_TEMPERATURE, 1.0
+            if spec.unit in POWER_UNITS:
+                return REFRESH_POWER, POWER_UNITS[spec.unit]
+        return None
+    if "reaT" in name:
+        return REFRESH_TEMPERATURE, 1.0
+    if "reaP" in name:
+        return REFRESH_POWER, 1.0
+    return None
+
+
+def briefing_phase(time_seconds: float, rules: ScheduleRules) -> Tuple[Hashable, ...]:
+    """时段: (是否在室, 分时电价)。(The phase: occupancy and the time-of-use price.)"""
+    return rules.occupied_at(time_seconds), rules.price_at(time_seconds)
+
+
+@dataclass
+class BriefingStats:
+    """简报生成与复用的累计统计。(Cumulative statistics of briefing generation and reuse.)"""
+    steps: int = 0
+    skipped: int = 0
+    refreshes: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def skip_rate(self) -> Optional[float]:
+        return self.skipped / self.steps if self.steps else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"steps": self.steps, "llm_calls": self.steps - self.skipped, "skipped": self.skipped,
+                "skip_rate": self.skip_rate, "refreshes": dict(self.refreshes)}
+
+
+class BriefingCache:
+    """
+    Args:
+        rules (ScheduleRules): 用于判断时段的时间表规则。(Schedule rules that define the phase.)
+        point_registry (Optional[PointRegistry]): 决定哪些点参与比较 (prompt 类) 及其单位。
+                                                  Decides which points are compared (prompt class) and their units.
+        temperature_delta (float): 温度阈值 (K)。(Temperature threshold in K.)
+        power_delta (float): 功率阈值 (W)。(Power threshold in W.)
+        max_reuse (int): 一份简报最多连续复用的步数。(Maximum consecutive steps a briefing is reused.)
+    """
+
+    def __init__(self, rules: ScheduleRules, point_registry: Optional[PointRegistry] = None,
+                 temperature_delta: float = 0.5, power_delta: float = 200.0, max_reuse: int = 6):
+        self.rules = rules
+        self.point_registry = point_registry
+        self.temperature_delta = temperature_delta
+        self.power_delta = power_delta
+        self.max_reuse = max_reuse
+        self.stats = BriefingStats()
+        self._briefing: Optional[str] = None
+        self._timestamp: Optional[str] = None
+        self._reference: Dict[str, Tuple[str, float]] = {}
+        self._phase: Optional[Tuple[Hashable, ...]] = None
+        self._reused = 0
+        # 点名 -> ("temperature"/"power", 换算系数) 或 None，首次出现时解析
+        # point -> ("temperature"/"power", scale) or None, resolved on first sight
+        self._kinds: Dict[str, Optional[Tuple[str, float]]] = {}
+
+    def _kind(self, name: str) -> Optional[Tuple[str, float]]:
+        if name not in self._kinds:
+            self._kinds[name] = point_kind(name, self.point_registry)
+        return self._kinds[name]
+
+    def _project(self, observation: Dict[str, Any]) -> Dict[str, Tuple[str, float]]:
+        projected = {}
+        for name, value in observation.items():
+            kind = self._kind(name)
+            if kind is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+                projected[name] = (kind[0], value * kind[1])
+        return projected
+
+    def _change(self, observation: Dict[str, Any], time_seconds: float) -> Optional[str]:
+        """需要重新生成简报的原因；可以复用时为 None。(Why the briefing must be refreshed; None when reusable.)"""
+        if self._briefing is None:
+            return REFRESH_FIRST
+        if self._reused >= self.max_reuse:
+            return REFRESH_MAX_REUSE
+        if briefing_phase(time_seconds, self.rules) != self._phase:
+            return REFRESH_PHASE
+        for name, (kind, value) in self._project(observation).items():
+            reference = self._reference.get(name)
+            if reference is None:
+                continue
+            limit = self.temperature_delta if kind == REFRESH_TEMPERATURE else self.power_delta
+            if abs(value - reference[1]) > limit:
+                return kind
+        return None
+
+    def reuse(self, observation: Dict[str, Any], time_seconds: float, timestamp: str) -> Optional[str]:
+        """
+        状态没有实质变化时返回替换了时间戳的上一份简报，否则返回 None (调用者随后应调用 store)。
+        Returns the previous briefing with its timestamp patched when nothing material changed;
+        None otherwise (the caller should then call `store`).
+        """
+        self.stats.steps += 1
+        reason = self._change(observation, time_seconds)
+        if reason is not None:
+            self.stats.refreshes[reason] = self.stats.refreshes.get(reason, 0) + 1
+            return None
+        self._reused += 1
+        self.stats.skipped += 1
+        if self._timestamp and self._timestamp in self._briefing:
+            return self._briefing.replace(self._timestamp, timestamp)
+        return f"{self._briefing}\n\n(State unchanged as of {timestamp}.)"
+
+    def store(self, briefing: str, observation: Dict[str, Any], time_seconds: float, timestamp: str):
+        """记录新生成的简报及其参照状态。(Records a freshly generated briefing and its reference state.)"""
+        self._briefing = briefing
+        self._timestamp = timestamp
+        self._reference = self._project(observation)
+        self._phase = briefing_phase(time_seconds, self.rules)
+        self._reused = 0
+
+
+# ------------------------------------------------------------------------------
+# 确定性的模板简报 (Deterministic template briefing)
+# ------------------------------------------------------------------------------
+
+def trend_stats(times: np.ndarray, values: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    窗口内的最小二乘斜率 (每小时)、最小值、最大值和最新值；有效样本少于一个时为 None。
+    Least-squares slope (per hour), min, max and latest value over a window; None without valid samples.
+    """
+    n = min(len(times), len(values))
+    times, values = times[-n:], values[-n:]
+    valid = np.isfinite(values) & np.isfinite(times)
+    if not valid.any():
+        return None
+    t, y = times[valid] / 3600.0, values[valid]
+    slope = 0.0
+    if len(y) > 1:
+        dt = t - t.mean()
+        denominator = float(dt @ dt)
+        slope = float(dt @ (y - y.mean())) / denominator if denominator > 0 else 0.0
+    return {"slope": slope, "min": float(y.min()), "max": float(y.max()), "latest": float(y[-1]), "samples": len(y)}
+
+
+def _plain(static_info: Any) -> Dict[str, Any]:
+    if static_info is None:
+        return {}
+    if hasattr(static_info, "model_dump"):  # StaticBuildingData
+        return static_info.model_dump(by_alias=True)
+    return static_info
+
+
+def _layer_name(layer: Dict[str, Any]) -> str:
+    # "Layer 2 (insulation)" -> "insulation"
+    name = layer.get("name") or "layer"
+    match = re.search(r"\(([^)]+)\)", name)
+    return match.group(1) if match else name
+
+
+def _envelope_summary(envelope: Dict[str, Any]) -> Optional[str]:
+    """
+    各围护构件的层、总厚度、热阻 (仅材料层) 和面积热容，以及窗户面积和朝向；没有任何信息时为 None。
+    Layers, total thickness, thermal resistance (layers only) and areal heat capacity of each envelope
+    component, plus window areas and orientations; None when nothing is given.
+    """
+    parts = []
+    for key, label in (("exterior_walls", "Exterior walls"), ("roof", "Roof"), ("floors", "Floors")):
+        layers = [l for l in ((envelope.get(key) or {}).get("layers") or []) if isinstance(l, dict)]
+        if not layers:
+            continue
+        text = f"{label}: {', '.join(_layer_name(l) for l in layers)}"
+        thickness = [l.get("thickness_m") for l in layers]
+        details = []
+        if all(isinstance(d, (int, float)) for d in thickness):
+            details.append(f"{sum(thickness):.3g} m")
+            conductivity = [l.get("thermal_conductivity_W_mK") for l in layers]
+            if all(isinstance(k, (int, float)) and k > 0 for k in conductivity):
+                details.append(f"R {sum(d / k for d, k in zip(thickness, conductivity)):.2f} m2K/W")
+            capacity = [(l.get("density_kg_m3"), l.get("specific_heat_capacity_J_kgK")) for l in layers]
+            if all(isinstance(r, (int, float)) and isinstance(c, (int, float)) for r, c in capacity):
+                details.append(f"{sum(d * r * c for d, (r, c) in zip(thickness, capacity)) / 1000.0:.0f} kJ/m2K")
+        parts.append(f"{text} ({', '.join(details)})" if details else text)
+    windows = [w for w in envelope.get("windows") or [] if isinstance(w, dict)]
+    described = [f"{w['area_m2']:g} m2" + (f" {w['orientation']}" if w.get("orientation") else "")
+                 for w in windows if isinstance(w.get("area_m2"), (int, float))]
+    if described:
+        parts.append(f"Windows: {', '.join(described)}")
+    return "; ".join(parts) + "." if parts else None
+
+
+def _occupancy_summary(zones: List[Dict[str, Any]]) -> str:
+    schedules, setpoints = [], []
+    for zone in zones:
+        schedule = zone.get("occupancy_schedule")
+        if isinstance(schedule, str) and schedule.strip():
+            schedules.append(schedule.strip())
+        elif isinstance(schedule, dict) and schedule.get("occupied_hours"):
+            hours = schedule["occupied_hours"]
+            for period in hours if isinstance(hours, list) else [hours]:
+                if isinstance(period, dict):
+                    start, end = period.get("start", period.get("start_hour")), period.get("end", period.get("end_hour"))
+                    schedules.append(f"occupied {start}-{end}")
+        for state in ("occupied", "unoccupied"):
+            values = (zone.get("temperature_setpoints") or {}).get(state) or {}
+            described = ", ".join(f"{mode} {value}" for mode, value in values.items() if value is not None)
+            if described:
+                setpoints.append(f"{state}: {described}")
+    if not schedules and not setpoints:
+        return "Occupancy Schedule & Setpoints: Not specified."
+    schedule_text = "; ".join(dict.fromkeys(schedules)) or "Not specified"
+    setpoint_text = "; ".join(dict.fromkeys(setpoints)) or "Not specified"
+    return f"Occupancy Schedule & Setpoints: {schedule_text}. Setpoints: {setpoint_text}."
+
+
+def _hvac_summary(systems: List[Dict[str, Any]]) -> str:
+    described = []
+    for system in systems:
+        if not isinstance(system, dict) or not (system.get("type") or system.get("description")):
+            continue
+        text = system.get("type") or system.get("description")
+        capacity = [f"{value:g} kW" for key, value in system.items()
+                    if "capacity_kW" in key and isinstance(value, (int, float))]
+        if capacity:
+            text += f" ({', '.join(capacity)} nominal)"
+        components = [c.get("name") if isinstance(c, dict) else c for c in system.get("components") or []]
+        components = [c for c in components if c]
+        if components:
+            text += f"; components: {', '.join(components)}"
+        described.append(text)
+    return f"HVAC System: {'; '.join(described)}." if described else "HVAC System: Not specified."
+
+
+def render_rules(static_info: Any) -> str:
+    """
+    由静态建筑信息渲染 "Key Operational Rules" 一节 (缺失的信息写作 Not specified，与综合提示的规则一致)。
+    Renders the "Key Operational Rules" section from the static building info (missing information
+    is stated as "Not specified", as the synthesizer prompt requires).
+    """
+    building = _plain(static_info).get("building_info") or {}
+    zones = [z for z in ((building.get("internal_loads") or {}).get("zones") or []) if isinstance(z, dict)]
+    lines = [_occupancy_summary(zones)]
+    envelope = _envelope_summary(building.get("envelope") or {})
+    if envelope:
+        lines.append(f"Building Thermal Characteristics: {envelope}")
+    lines.append(_hvac_summary((building.get("hvac") or {}).get("hvac_systems") or []))
+    return "\n".join("* **{}:**{}".format(*line.split(":", 1)) for line in lines)
+
+
+@dataclass
+class TemplateStats:
+    """模板简报的累计统计。(Cumulative statistics of the template briefing.)"""
+    renders: int = 0
+    render_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"synthesizer": SYNTHESIZER_TEMPLATE, "steps": self.renders, "llm_calls": 0,
+                "mean_render_us": round(1e6 * self.render_s / self.renders, 2) if self.renders else None}
+
+
+class TemplateBriefing:
+    """
+    Args:
+        static_info (Any): 静态建筑信息 (dict 或 StaticBuildingData)。(Static building info, a dict or StaticBuildingData.)
+        point_registry (Optional[PointRegistry]): 决定提示中的点、单位换算和哪些点计算趋势。
+                                                  Decides the prompted points, unit conversion and which points are trended.
+    """
+
+    def __init__(self, static_info: Any, point_registry: Optional[PointRegistry] = None):
+        self.point_registry = point_registry
+        self.rules_section = render_rules(static_info)
+        self.stats = TemplateStats()
+
+    def _format(self, name: str, value: float) -> Tuple[str, Any]:
+        if self.point_registry is None:
+            return name, round(value, 2)
+        return self.point_registry.format_for_prompt(name, value)
+
+    def _trend(self, name: str, kind: Tuple[str, float], stats: Dict[str, float]) -> str:
+        slope = stats["slope"] * kind[1]
+        unit = "K" if kind[0] == REFRESH_TEMPERATURE else "W"
+        direction = "stable" if abs(slope) < STABLE_SLOPES[kind[0]] else ("rising" if slope > 0 else "falling")
+        key, low = self._format(name, stats["min"])
+        _, high = self._format(name, stats["max"])
+        return f"{key} is {direction} ({slope:+.2f} {unit}/h, min {low}, max {high})"
+
+    def render(self, memory: Any, timestamp: str, window: int,
+               daily_summary: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        渲染当前步骤的简报；memory 为 MemoryStore，window 为计算趋势的步数 (history_window_size)。
+        Renders the briefing of the current step; `memory` is the MemoryStore and `window` the number
+        of steps the trends are computed over (history_window_size).
+        """
+        start = time.perf_counter()
+        latest = memory.latest_step()
+        observation = latest.observation if latest is not None else {}
+        times = memory.history.time_window(window)
+        trends = []
+        for name in observation:
+            kind = point_kind(name, self.point_registry)
+            if kind is None or name.endswith("_u"):
+                continue
+            stats = trend_stats(times, memory.window(name, window))
+            if stats is not None:
+                trends.append(self._trend(name, kind, stats))
+        hours = (times[-1] - times[0]) / 3600.0 if len(times) > 1 else 0.0
+        if len(times) > 1 and trends:
+            dynamic = f"Over the last {len(times)} steps ({hours:g} h): {'; '.join(trends)}."
+        else:
+            dynamic = "Not enough history to establish trends yet."
+        if daily_summary:
+            rewards = ", ".join(f"{day['date']}: {day['reward_sum']}" for day in daily_summary)
+            dynamic += f" Daily reward sums over the last {len(daily_summary)} simulated days: {rewards}."
+        current = (self.point_registry.project_for_prompt(observation) if self.point_registry is not None
+                   else observation)
+        state = ", ".join(f"{key} = {value}" for key, value in current.items())
+        briefing = (f"### 1. Dynamic State & Trends\n{dynamic} At {timestamp}, the current state is: {state}.\n\n"
+                    f"### 2. Key Operational Rules\n{self.rules_section}")
+        self.stats.renders += 1
+        self.stats.render_s += time.perf_counter() - start
+        return briefing
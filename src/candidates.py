@@ -0,0 +1,288 @@
+"""
+多候选决策 (Best-of-N decisions)。
+
+决策代理并发给出 N 个候选动作 (N 次并行调用，经过同一个请求调度器)，每个候选在分叉出的模拟器上
+保持该动作推进若干控制步，按所选目标的奖励 (RewardEngine) 打分，最终只把得分最高的动作送入真实运行。
+- 本地替身模型: 复制当前实例的状态，在进程池 (或本进程) 中评估；结果与进程数无关。
+- BOPTEST: 在额外的 testid 上评估。BOPTEST 不能复制运行中测试的状态，因此每次评估都在当前时间
+  用较短的 candidate_warmup_period 重新初始化一个额外的 testid —— 建筑状态来自预热期的基线控制器而非
+  本次运行，是一种近似；候选数受 candidate_max_remote 限制。
+得分相同的候选取序号最小者；相同的动作只评估一次。每秒候选评估数和评估器的近似方式记录在 BestOfNStats 中。
+
+The decision maker proposes N candidate actions concurrently (N parallel calls through the shared
+request scheduler). Each candidate is held for a few control steps on a forked simulator and scored
+by the selected objective's reward (RewardEngine); only the best action reaches the real run.
+- Local stand-in: the current instance's state is copied and evaluated in a process pool (or
+  in-process); results do not depend on the number of workers.
+- BOPTEST: candidates run on extra testids. BOPTEST cannot copy a running test's state, so every
+  evaluation re-initializes an extra testid at the current time with the short
+  candidate_warmup_period; the building state then comes from the baseline controller, not from
+  this run, as an approximation, and the number of candidates is capped by candidate_max_remote.
+Ties go to the lowest candidate index and identical actions are evaluated once. Candidate
+evaluations per second and the evaluator's approximation are tracked in BestOfNStats.
+"""
+import copy
+import json
+import time
+import queue
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .core.tracing import span
+from .local_boptest import LocalBoptest, rollout
+from .reward_engine import RewardEngine
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 追加到每个候选的决策输入之后，让各候选彼此不同 (appended to each candidate's input so the candidates differ)
+CANDIDATE_HINT = ("\n\n[CANDIDATE]:\nYou are proposing candidate {index} of {count}. The candidates are compared "
+                  "in simulation before one is executed, so a distinct but reasonable action is useful.")
+
+
+@dataclass
+class Candidate:
+    index: int
+    prompt: str
+    raw_output: str
+    thought: Optional[str] = None
+    action: Optional[Dict[str, Any]] = None
+    score: Optional[float] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {"index": self.index, "action": self.action, "score": self.score}
+
+
+@dataclass
+class BestOfNStats:
+    """多候选决策的累计统计。(Cumulative statistics of best-of-N decisions.)"""
+    decisions: int = 0
+    candidates: int = 0
+    evaluations: int = 0
+    sampling_s: float = 0.0
+    evaluation_s: float = 0.0
+    # 评估器如何得到候选的起始状态 (how the evaluator obtains the candidates' starting state)
+    approximation: Optional[Dict[str, Any]] = None
+
+    @property
+    def evaluations_per_second(self) -> Optional[float]:
+        return self.evaluations / self.evaluation_s if self.evaluation_s > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"decisions": self.decisions, "candidates": self.candidates, "evaluations": self.evaluations,
+                "sampling_s": round(self.sampling_s, 4), "evaluation_s": round(self.evaluation_s, 4),
+                "evaluations_per_second": self.evaluations_per_second, "approximation": self.approximation}
+
+
+# --- 评估器 (Evaluators) ---
+
+class LocalCandidateEvaluator:
+    """
+    在本地替身模型的状态副本上评估候选。
+    Evaluates candidates on copies of the local stand-in's state.
+
+    Args:
+        simulator (LocalBoptest): 正在运行的本地模拟器。(The running local simulator.)
+        testid (str): 被分叉的实例。(The instance that is forked.)
+        workers (int): 进程数，0 表示在本进程内评估。(Worker processes; 0 evaluates in-process.)
+    """
+
+    max_candidates: Optional[int] = None
+
+    def __init__(self, simulator: LocalBoptest, testid: str, workers: int = 0):
+        self.simulator = simulator
+        self.testid = testid
+        self._pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.approximation = {"evaluator": "local", "state": "forked from the run"}
+
+    def rollouts(self, actions: List[Dict[str, Any]], horizon: int,
+                 time_seconds: float) -> List[Optional[List[Dict[str, Any]]]]:
+        state = self.simulator.snapshot(self.testid)
+        if state is None:
+            return [None] * len(actions)
+        if self._pool is None:
+            return [rollout(copy.deepcopy(state), action, horizon) for action in actions]
+        return list(self._pool.map(rollout, [state] * len(actions), actions, [horizon] * len(actions)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+
+class BoptestCandidateEvaluator:
+    """
+    在额外的 BOPTEST testid 上评估候选 (近似，见模块说明)。
+    Evaluates candidates on extra BOPTEST testids (an approximation, see the module docstring).
+
+    Args:
+        client (Dict[str, Callable]): select_testcase / set_step / initialize / advance / get_kpis / stop。
+        testcase_name (str): 测试案例名。(The testcase name.)
+        control_step (int): 控制步长（秒）。(Control step in seconds.)
+        warmup_period (int): 每次评估的预热时长（秒），应远短于运行的预热期。
+                             Warmup before every evaluation in seconds; much shorter than the run's.
+        workers (int): 额外 testid 的数量 (并行度)。(Number of extra testids, i.e. the parallelism.)
+        max_candidates (Optional[int]): 每次决策评估的候选数上限。(Cap on the candidates per decision.)
+    """
+
+    def __init__(self, client: Dict[str, Callable], testcase_name: str, control_step: int, warmup_period: int,
+                 workers: int = 1, max_candidates: Optional[int] = None):
+        self.client = client
+        self.testcase_name = testcase_name
+        self.control_step = control_step
+        self.warmup_period = warmup_period
+        self.workers = max(1, workers)
+        self.max_candidates = max_candidates
+        self.approximation = {"evaluator": "boptest", "state": "baseline controller after warmup",
+                              "warmup_period_s": warmup_period}
+        self._testids: List[str] = []
+        self._idle: "queue.Queue[str]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def _ensure_testids(self, count: int):
+        while len(self._testids) < min(count, self.workers):
+            testid = self.client["select_testcase"](self.testcase_name)
+            if not testid or not self.client["set_step"](testid, self.control_step):
+                break
+            self._testids.append(testid)
+            self._idle.put(testid)
+        if not self._testids:
+            raise RuntimeError("No BOPTEST testid is available for candidate evaluation.")
+
+    def _evaluate(self, action: Dict[str, Any], horizon: int, time_seconds: float) -> Optional[List[Dict[str, Any]]]:
+        testid = self._idle.get()
+        try:
+            if not self.client["initialize"](testid, int(time_seconds), self.warmup_period):
+                return None
+            kpis = [self.client["get_kpis"](testid) or {}]
+            for _ in range(horizon):
+                if self.client["advance"](testid, action) is None:
+                    return None
+                kpis.append(self.client["get_kpis"](testid) or {})
+            return kpis
+        finally:
+            self._idle.put(testid)
+
+    def rollouts(self, actions: List[Dict[str, Any]], horizon: int,
+                 time_seconds: float) -> List[Optional[List[Dict[str, Any]]]]:
+        self._ensure_testids(len(actions))
+        return list(self._pool.map(lambda action: self._evaluate(action, horizon, time_seconds), actions))
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+        for testid in self._testids:
+            self.client["stop"](testid)
+        self._testids.clear()
+
+
+def make_candidate_evaluator(client: Dict[str, Callable], testid: str, testcase_name: str, control_step: int,
+                             warmup_period: int, workers: int = 0, max_remote_candidates: Optional[int] = None):
+    """
+    客户端函数绑定在本地模拟器上时 (见 bind_local_boptest) 分叉本地状态，否则使用额外的 BOPTEST testid
+    (预热期为 warmup_period，候选数不超过 max_remote_candidates)。
+    Forks the local state when the client functions are bound to the local simulator (see
+    bind_local_boptest), and uses extra BOPTEST testids otherwise, warmed up for `warmup_period` and
+    evaluating at most `max_remote_candidates` candidates.
+    """
+    simulator = getattr(client["advance"], "__self__", None)
+    if isinstance(simulator, LocalBoptest):
+        return LocalCandidateEvaluator(simulator, testid, workers)
+    return BoptestCandidateEvaluator(client, testcase_name, control_step, warmup_period, workers or 1,
+                                     max_remote_candidates)
+
+
+# --- 采样、打分与选择 (Sampling, scoring and selection) ---
+
+def score_rollouts(reward_engine: RewardEngine, objective: str,
+                   rollouts: List[Optional[List[Dict[str, Any]]]]) -> List[Optional[float]]:
+    """
+    每条推演在评估时域内的奖励之和 (以推演开始时的目标函数值为基线)；失败的推演得分为 None。
+    The reward summed over each rollout's horizon, with the objective values at the fork as the
+    baseline; failed rollouts score None.
+    """
+    column = reward_engine.index(objective)
+    scores: List[Optional[float]] = []
+    for kpis in rollouts:
+        if not kpis or len(kpis) < 2:
+            scores.append(None)
+            continue
+        matrix = reward_engine.kpi_matrix(kpis)
+        rewards = reward_engine.rewards(matrix[1:], baseline=reward_engine.objective_values(matrix[0]))
+        scores.append(float(rewards[:, column].sum()))
+    return scores
+
+
+def _parse_candidate(index: int, prompt: str, raw_output: str,
+                     parse: Callable[[str], Tuple[Optional[str], Optional[str]]],
+                     repair: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None) -> Candidate:
+    thought, action_str = parse(raw_output)
+    action = None
+    if thought and action_str:
+        try:
+            action = json.loads(action_str)
+        except json.JSONDecodeError:
+            action = None
+    action = action if isinstance(action, dict) else None
+    # 候选按执行时的形式评估 (candidates are evaluated as they would be executed)
+    if action is not None and repair is not None:
+        action = repair(action)
+    return Candidate(index, prompt, raw_output, thought, action)
+
+
+async def sample_candidates(make_agent: Callable[[], Tuple[Any, str]], task: str, count: int,
+                            parse: Callable[[str], Tuple[Optional[str], Optional[str]]],
+                            repair: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+                            ) -> List[Candidate]:
+    """
+    并发请求 count 个候选决策；repair 在评估前校验并修复候选动作 (见 src/action_registry.py)。
+    Requests `count` candidate decisions concurrently; `repair` validates and repairs the candidate
+    actions before evaluation (see src/action_registry.py).
+    """
+    async def propose(index: int) -> Candidate:
+        agent, _ = make_agent()
+        prompt = task + CANDIDATE_HINT.format(index=index + 1, count=count)
+        with span("llm.decision_maker", candidate=index):
+            raw_output = (await agent.run(task=prompt)).messages[-1].content
+        return _parse_candidate(index, prompt, raw_output, parse, repair)
+
+    return list(await asyncio.gather(*(propose(index) for index in range(count))))
+
+
+async def choose_action(make_agent: Callable[[], Tuple[Any, str]], task: str, count: int,
+                        parse: Callable[[str], Tuple[Optional[str], Optional[str]]], evaluator,
+                        reward_engine: RewardEngine, objective: str, horizon: int, time_seconds: float,
+                        stats: BestOfNStats,
+                        repair: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None
+                        ) -> Tuple[Candidate, List[Candidate]]:
+    """
+    采样 count 个候选、在分叉的模拟器上评估并返回 (最佳候选, 全部候选)。没有可解析的候选时返回第一个候选。
+    Samples `count` candidates, evaluates them on forked simulators and returns (best, all). Without
+    a parseable candidate the first one is returned.
+    """
+    start = time.perf_counter()
+    candidates = await sample_candidates(make_agent, task, count, parse, repair)
+    stats.sampling_s += time.perf_counter() - start
+    stats.decisions += 1
+    stats.candidates += len(candidates)
+
+    valid = [c for c in candidates if c.action is not None]
+    # 相同的动作只评估一次 (identical actions are evaluated once)
+    unique: Dict[str, Dict[str, Any]] = {}
+    for candidate in valid:
+        unique.setdefault(json.dumps(candidate.action, sort_keys=True), candidate.action)
+    if unique:
+        start = time.perf_counter()
+        with span("candidates.evaluate", candidates=len(unique)):
+            rollouts = await asyncio.to_thread(evaluator.rollouts, list(unique.values()), horizon, time_seconds)
+        stats.evaluation_s += time.perf_counter() - start
+        stats.evaluations += len(unique)
+        scores = dict(zip(unique, score_rollouts(reward_engine, objective, rollouts)))
+        for candidate in valid:
+            candidate.score = scores[json.dumps(candidate.action, sort_keys=True)]
+
+    scored = [c for c in valid if c.score is not None]
+    best = max(scored, key=lambda c: (c.score, -c.index)) if scored else (valid or candidates)[0]
+    logging.info(f"Best-of-{count}: candidate {best.index + 1} {best.action} "
+                 f"(scores: {[None if c.score is None else round(c.score, 4) for c in candidates]})")
+    return best, candidates
@@ -1,55 +1,197 @@
-import os
-from dotenv import load_dotenv
-
-# 加载项目根目录下的 .env 文件
-load_dotenv()
+"""
+项目配置 (Project configuration)。
 
-# --- 【修改】: 从环境变量中安全地获取 OpenAI API 密钥 ---
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+导入本模块没有任何副作用：不读取 .env、不创建目录、也不校验密钥。
+所有设置在首次使用时才解析，优先级从低到高为：
+    代码默认值 -> configs/run_config.yaml -> 环境变量 (.env) -> 命令行覆盖 (--set key=value)
+并且只有真正被使用的设置才会被校验 (例如 OPENAI_API_KEY 只在静态信息提取时才需要)。
 
-# 如果没有在 .env 文件中找到密钥，则抛出错误
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in .env file. Please add your key to the .env file.")
+Importing this module has no side effects. Settings are resolved lazily on first use,
+merging defaults, configs/run_config.yaml, environment variables and CLI overrides,
+and only the settings that are actually used get validated.
+"""
+import os
+from dataclasses import dataclass, field, fields
+from typing import Optional, Dict, Any, List
 
-# --- 路径配置 (无变化) ---
+# --- 路径配置 (纯常量，无副作用) ---
+# --- Path configuration (plain constants, no side effects) ---
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 INPUT_DATA_DIR = os.path.join(PROJECT_ROOT, "data", "input")
 OUTPUT_DATA_DIR = os.path.join(PROJECT_ROOT, "data", "output")
 CONFIG_DIR = os.path.join(PROJECT_ROOT, "configs") # 【新增】: Config目录路径
+RUN_CONFIG_PATH = os.path.join(CONFIG_DIR, "run_config.yaml")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    类型化的运行环境设置。每个字段的 metadata 中记录了对应的环境变量名。
+    Typed environment settings. Each field's metadata names its environment variable.
+    """
+    boptest_base_url: str = field(default="http://127.0.0.1:80", metadata={"env": "BOPTEST_BASE_URL"})
+    # Desc: Master switch to enable or disable the GraphRAG tool for the decision agent.
+    use_graphrag_tool: bool = field(default=False, metadata={"env": "USE_GRAPHRAG_TOOL"})
+    # Desc: Path to the GraphRAG settings file.
+    graphrag_settings_path: str = field(default=r"D:/graphrag/ragtest/settings.yaml",
+                                        metadata={"env": "GRAPHRAG_SETTINGS_PATH"})
+    # 知识检索后端: "local" 使用本地 BM25 索引 (src/retrieval.py)，"graphrag" 使用 GraphRAG 检索代理
+    # Knowledge retrieval backend: "local" uses the local BM25 index (src/retrieval.py), "graphrag" the
+    # GraphRAG retriever agent
+    knowledge_backend: str = field(default="local", metadata={"env": "KNOWLEDGE_BACKEND"})
+    # 本地索引的文档，逗号分隔的 glob，相对路径相对于项目根目录
+    # Documents of the local index: comma-separated globs, relative to the project root
+    knowledge_paths: str = field(default="data/input/*.md", metadata={"env": "KNOWLEDGE_PATHS"})
+    # 只有静态信息提取 (src/extractor.py) 需要该密钥
+    # Only the static extraction (src/extractor.py) needs this key
+    openai_api_key: Optional[str] = field(default=None, repr=False, metadata={"env": "OPENAI_API_KEY"})
+    trace_file: Optional[str] = field(default=None, metadata={"env": "LLMCL_TRACE_FILE"})
+    # 覆盖 configs/agent_config.yaml 中模型的 base_url，例如指向本地模拟服务 (mock_llm_server.py)
+    # Overrides the model base_url of configs/agent_config.yaml, e.g. to point at the local mock server
+    llm_base_url: Optional[str] = field(default=None, metadata={"env": "LLM_BASE_URL"})
+
+    def require(self, name: str) -> Any:
+        """
+        返回一个必须存在的设置，缺失时抛出 ValueError。
+        Returns a mandatory setting, raising ValueError if it is missing.
+        """
+        value = getattr(self, name)
+        if value in (None, ""):
+            env_name = _FIELD_ENV.get(name, name.upper())
+            raise ValueError(f"{env_name} not found in the environment or .env file. "
+                             f"Please add it to the .env file or pass --set {name}=...")
+        return value
+
+
+_FIELD_ENV = {f.name: f.metadata.get("env", f.name.upper()) for f in fields(Settings)}
+
+# 旧的模块级常量名到设置字段的映射，保持 `from src.config import X` 的兼容性
+# Legacy module-level names mapped to settings fields to keep `from src.config import X` working
+_LEGACY_NAMES = {
+    "BOPTEST_BASE_URL": "boptest_base_url",
+    "USE_GRAPHRAG_TOOL": "use_graphrag_tool",
+    "GRAPHRAG_SETTINGS_PATH": "graphrag_settings_path",
+    "OPENAI_API_KEY": "openai_api_key",
+}
+
+# 模拟参数已移入 configs/run_config.yaml (见 src.core.run_config.RunConfig)；旧常量名从运行配置中解析
+# Simulation parameters now live in configs/run_config.yaml (see src.core.run_config.RunConfig);
+# the legacy constant names are resolved from the run config
+_LEGACY_RUN_CONFIG_NAMES = {
+    "TEST_CASE_NAME": "test_case_name",
+    "START_TIME": "start_time",
+    "WARMUP_PERIOD": "warmup_period",
+    "HISTORY_WINDOW_SIZE": "history_window_size",
+    "CONTROL_STEP": "control_step",
+    "SIMULATION_STEPS": "simulation_steps",
+    "SELECTED_OBJECTIVE": "selected_objective",
+    "CONTROLLABLE_PARAM_DESC": "controllable_param_desc",
+}
+
+_settings: Optional[Settings] = None
+_cli_overrides: Dict[str, Any] = {}
+
+
+def _coerce(name: str, value: Any) -> Any:
+    """按字段的默认值类型转换字符串值。(Coerces string values to the field's type.)"""
+    default = Settings.__dataclass_fields__[name].default
+    if not isinstance(value, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def _read_run_config(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    return data if isinstance(data, dict) else {}
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def _resolve_settings(overrides: Dict[str, Any]) -> Settings:
+    _load_dotenv()
+    values: Dict[str, Any] = {}
+    run_config = _read_run_config(RUN_CONFIG_PATH)
+    for f in fields(Settings):
+        if f.name in run_config:
+            values[f.name] = run_config[f.name]
+        env_value = os.getenv(_FIELD_ENV[f.name])
+        if env_value not in (None, ""):
+            values[f.name] = env_value
+        if f.name in overrides:
+            values[f.name] = overrides[f.name]
+    return Settings(**{name: _coerce(name, value) for name, value in values.items()})
 
-BOPTEST_BASE_URL = "http://127.0.0.1:80"
 
-TEST_CASE_NAME = "bestest_air"
+def get_settings() -> Settings:
+    """
+    返回惰性解析并缓存的全局设置。
+    Returns the lazily resolved, cached process-wide settings.
+    """
+    global _settings
+    if _settings is None:
+        _settings = _resolve_settings(_cli_overrides)
+    return _settings
 
-# 确保目录存在
-os.makedirs(OUTPUT_DATA_DIR, exist_ok=True)
-os.makedirs(INPUT_DATA_DIR, exist_ok=True)
 
-# --- 模拟参数 ---
-START_TIME = 334*24*3600
-WARMUP_PERIOD = 7*24*3600
-HISTORY_WINDOW_SIZE = 3
-CONTROL_STEP = 3600
-SIMULATION_STEPS = 14*24
+def configure_settings(**overrides) -> Settings:
+    """
+    应用命令行覆盖并重新解析设置。未知的键会被拒绝。
+    Applies CLI overrides and re-resolves the settings. Unknown keys are rejected.
+    """
+    global _settings
+    unknown = set(overrides) - set(_FIELD_ENV)
+    if unknown:
+        raise ValueError(f"Unknown setting(s): {sorted(unknown)}. Known settings: {sorted(_FIELD_ENV)}")
+    _cli_overrides.update(overrides)
+    _settings = None
+    return get_settings()
 
-# --- 【修改】: 目标选择与用户自定义描述 ---
 
-# 1. 选择本次模拟要运行的目标。
-#    这个名字必须与 'configs/objectives_config.yaml' 中的一个键完全匹配。
-SELECTED_OBJECTIVE = "balance_energy_comfort"
+def parse_cli_overrides(pairs: Optional[List[str]]) -> Dict[str, str]:
+    """
+    解析形如 ["key=value", ...] 的命令行覆盖。
+    Parses CLI overrides of the form ["key=value", ...].
+    """
+    overrides = {}
+    for pair in pairs or []:
+        if "=" not in pair:
+            raise ValueError(f"Invalid override '{pair}', expected key=value.")
+        key, value = pair.split("=", 1)
+        overrides[key.strip()] = value.strip()
+    return overrides
 
-# 2. 用户自定义的、关于可控参数的描述。
-#    这部分会与所选目标的描述动态拼接。
-CONTROLLABLE_PARAM_DESC = (
-    "The controllable parameter is con_oveTSetCoo_u in the range ‘min_value’: 278.15, "
-    "‘max_value’: 308.15, Zone temperature setpoint for cooling"
 
-)
+def ensure_data_dirs():
+    """在写入前确保数据目录存在。(Ensures the data directories exist before writing.)"""
+    os.makedirs(OUTPUT_DATA_DIR, exist_ok=True)
+    os.makedirs(INPUT_DATA_DIR, exist_ok=True)
 
-# --- 【新增】: GraphRAG 工具配置 ---
-# Desc: Master switch to enable or disable the GraphRAG tool for the decision agent.
-# Set to False to run the agent without the knowledge retrieval tool.
-USE_GRAPHRAG_TOOL = False
 
-# Desc: Path to the GraphRAG settings file.
-GRAPHRAG_SETTINGS_PATH = r"D:/graphrag/ragtest/settings.yaml"
+def __getattr__(name: str) -> Any:
+    # PEP 562: 旧常量在被访问时才解析
+    # PEP 562: legacy constants are resolved only when accessed
+    if name in _LEGACY_NAMES:
+        setting = _LEGACY_NAMES[name]
+        if setting == "openai_api_key":
+            return get_settings().require(setting)
+        return getattr(get_settings(), setting)
+    if name in _LEGACY_RUN_CONFIG_NAMES:
+        from src.core.run_config import load_run_config
+        return getattr(load_run_config(), _LEGACY_RUN_CONFIG_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
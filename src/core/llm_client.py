@@ -1,16 +1,394 @@
 import os
-from autogen_ext.models.openai import OpenAIChatCompletionClient
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, Optional
+from src.config import get_settings
 from .config_loader import load_config
+from .tracing import span
 
-def get_deepseek_client() -> OpenAIChatCompletionClient:
+if TYPE_CHECKING:
+    from .scheduled_client import ScheduledChatCompletionClient
+
+# ==============================================================================
+# 进程级 LLM 请求调度器 (Process-wide LLM request scheduler)
+# ==============================================================================
+# 所有代理、所有并发运行 (episode) 的请求都经过同一个调度器：
+#   * 令牌桶限制每分钟请求数 (RPM) 和每分钟 token 数 (TPM)
+#   * 优先级: 决策 > 信息综合 > 知识检索
+#   * 同一优先级内按 episode 轮转，保证并发运行之间的公平性
+#   * 遇到 429 时统一暂停所有请求，而不是每个客户端各自退避
+# Every agent and every concurrent episode goes through one scheduler: token buckets for
+# requests/min and tokens/min, priority classes, round-robin fairness across episodes within a
+# class, and a shared pause on HTTP 429 instead of independent client-side back-off.
+
+PRIORITY_CLASSES = {"decision_maker": 0, "information_synthesizer": 1, "knowledge_retriever": 2}
+DEFAULT_PRIORITY = len(PRIORITY_CLASSES)
+
+_current_episode: ContextVar[str] = ContextVar("llm_episode", default="default")
+
+
+def set_llm_episode(name: str):
+    """
+    设置当前异步任务所属的 episode，用于公平排队。返回可用于 reset 的 token。
+    Sets the episode of the current async task for fair queuing; returns a token for reset.
+    """
+    return _current_episode.set(str(name))
+
+
+class TokenBucket:
     """
-    根据配置文件创建一个Deepseek LLM客户端。
-    Creates a Deepseek LLM client based on the configuration file.
+    每分钟补充 `per_minute` 个令牌的令牌桶，容量等于一分钟的配额。None 表示不限制。
+    A token bucket refilled at `per_minute` per minute with one minute of burst. None disables it.
+    """
+
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = float(per_minute) if per_minute else None
+        self.level = self.capacity or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60.0 / self.capacity)
+
+    def consume(self, amount: float, now: float):
+        if self.capacity is not None:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """用实际用量修正预估 (正数表示多用)。(Corrects an estimate with the actual usage.)"""
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level - delta)
+
+
+@dataclass
+class _Waiter:
+    priority_class: str
+    episode: str
+    tokens: int
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _is_transient(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409) or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    线程安全、与事件循环无关的请求调度器。
+    A thread-safe, event-loop-agnostic request scheduler.
+
+    Args:
+        requests_per_minute (Optional[float]): 每分钟请求上限。(Request limit per minute.)
+        tokens_per_minute (Optional[float]): 每分钟 token 上限。(Token limit per minute.)
+        max_concurrent (Optional[int]): 同时进行的请求上限。(Maximum requests in flight.)
+        completion_token_estimate (int): 排队时为回复预估的 token 数。
+                                         Tokens assumed for the completion while queuing.
+        max_retries (int): 429 与暂时性错误的最大重试次数。(Retries on 429 and transient errors.)
+        backoff_s (float): 首次重试的退避时间，之后指数增长。(Initial back-off, doubled per retry.)
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_concurrent: Optional[int] = None, completion_token_estimate: int = 512,
+                 max_retries: int = 10, backoff_s: float = 2.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrent = max_concurrent
+        self.completion_token_estimate = completion_token_estimate
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self._rpm = TokenBucket(requests_per_minute)
+        self._tpm = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        # 每个优先级一个有序字典: episode -> 等待队列；按插入顺序轮转
+        # One ordered dict per priority: episode -> waiters, rotated in insertion order
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._wakeup_at: Optional[float] = None
+        self.reset_metrics()
+
+    # --- 排队与分派 (Queuing and dispatch) ---
+
+    async def acquire(self, priority_class: str, tokens: int) -> _Waiter:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority_class, _current_episode.get(), tokens, loop, loop.create_future())
+        priority = PRIORITY_CLASSES.get(priority_class, DEFAULT_PRIORITY)
+        with self._lock:
+            self._queues.setdefault(priority, OrderedDict()).setdefault(waiter.episode, deque()).append(waiter)
+            self._dispatch()
+        try:
+            with span("llm.queue_wait", priority=priority_class, episode=waiter.episode):
+                await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._in_flight -= 1
+                self._dispatch()
+            raise
+        return waiter
+
+    def release(self, waiter: _Waiter, actual_tokens: Optional[int] = None):
+        with self._lock:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                self._tpm.adjust(actual_tokens - waiter.tokens)
+                self._metrics["tokens_actual"] += actual_tokens
+            self._dispatch()
+
+    def _next_waiter(self):
+        for priority in sorted(self._queues):
+            episodes = self._queues[priority]
+            while episodes:
+                episode, waiters = next(iter(episodes.items()))
+                if waiters and not waiters[0].future.done():
+                    return priority, episode, waiters
+                if waiters:
+                    waiters.popleft()  # 已取消的等待者 (a cancelled waiter)
+                if not waiters:
+                    del episodes[episode]
+        return None
+
+    def _dispatch(self):
+        # 必须在持有锁时调用 (must be called with the lock held)
+        while True:
+            if self.max_concurrent and self._in_flight >= self.max_concurrent:
+                return
+            head = self._next_waiter()
+            if head is None:
+                return
+            priority, episode, waiters = head
+            waiter = waiters[0]
+            now = time.monotonic()
+            delay = max(self._paused_until - now, self._rpm.wait_time(1, now),
+                        self._tpm.wait_time(waiter.tokens, now))
+            if delay > 0:
+                self._schedule_wakeup(waiter.loop, now, delay)
+                return
+            waiters.popleft()
+            episodes = self._queues[priority]
+            episodes.move_to_end(episode)
+            if not waiters:
+                del episodes[episode]
+            self._rpm.consume(1, now)
+            self._tpm.consume(waiter.tokens, now)
+            self._in_flight += 1
+            waiter.granted = True
+            self._record_grant(waiter, now - waiter.enqueued_at)
+            waiter.loop.call_soon_threadsafe(self._resolve, waiter.future)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _schedule_wakeup(self, loop: asyncio.AbstractEventLoop, now: float, delay: float):
+        wake_at = now + delay
+        if self._wakeup_at is not None and self._wakeup_at <= wake_at:
+            return
+        self._wakeup_at = wake_at
+        loop.call_soon_threadsafe(loop.call_later, delay, self._wake)
+
+    def _wake(self):
+        with self._lock:
+            self._wakeup_at = None
+            self._dispatch()
+
+    def report_rate_limit(self, pause_s: float):
+        """收到 429 后暂停所有请求。(Pauses every request after an HTTP 429.)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause_s)
+            self._metrics["rate_limited"] += 1
+            self._dispatch()
+
+    # --- 执行 (Execution) ---
+
+    async def run(self, priority_class: str, tokens: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在调度器的许可下执行 `call`，并在 429 或暂时性错误时统一重试。
+        Runs `call` once admitted, retrying through the queue on 429 and transient errors.
+        """
+        attempt = 0
+        while True:
+            waiter = await self.acquire(priority_class, tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                self.release(waiter)
+                if attempt >= self.max_retries or not (_is_rate_limited(e) or _is_transient(e)):
+                    raise
+                attempt += 1
+                pause = _retry_after(e) or self.backoff_s * 2 ** (attempt - 1)
+                if _is_rate_limited(e):
+                    self.report_rate_limit(pause)
+                else:
+                    await asyncio.sleep(pause)
+                logging.warning(f"LLM request failed ({e}); retry {attempt}/{self.max_retries} in {pause:.1f}s.")
+                continue
+            usage = getattr(result, "usage", None)
+            self.release(waiter, (usage.prompt_tokens + usage.completion_tokens) if usage else None)
+            return result
+
+    # --- 指标 (Metrics) ---
+
+    def reset_metrics(self):
+        self._metrics = {"rate_limited": 0, "tokens_estimated": 0, "tokens_actual": 0,
+                         "classes": {}, "episodes": {}}
+
+    def _record_grant(self, waiter: _Waiter, wait_s: float):
+        self._metrics["tokens_estimated"] += waiter.tokens
+        for group, key in (("classes", waiter.priority_class), ("episodes", waiter.episode)):
+            entry = self._metrics[group].setdefault(key, {"requests": 0, "waits": deque(maxlen=10000)})
+            entry["requests"] += 1
+            entry["waits"].append(wait_s)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        返回排队指标的快照 (可 JSON 序列化)。
+        Returns a JSON-serialisable snapshot of the queuing metrics.
+        """
+        with self._lock:
+            queued: Dict[str, int] = {}
+            for episodes in self._queues.values():
+                for waiters in episodes.values():
+                    for w in waiters:
+                        if not w.future.done():
+                            queued[w.priority_class] = queued.get(w.priority_class, 0) + 1
+
+            def summarize(entry):
+                waits = list(entry["waits"])
+                return {"requests": entry["requests"], "mean_wait_s": sum(waits) / len(waits) if waits else 0.0,
+                        "p95_wait_s": _percentile(waits, 0.95), "max_wait_s": max(waits, default=0.0)}
+
+            return {
+                "limits": {"requests_per_minute": self.requests_per_minute,
+                           "tokens_per_minute": self.tokens_per_minute, "max_concurrent": self.max_concurrent},
+                "in_flight": self._in_flight,
+                "queued": queued,
+                "rate_limited": self._metrics["rate_limited"],
+                "tokens_estimated": self._metrics["tokens_estimated"],
+                "tokens_actual": self._metrics["tokens_actual"],
+                "classes": {k: summarize(v) for k, v in self._metrics["classes"].items()},
+                "episodes": {k: summarize(v) for k, v in self._metrics["episodes"].items()},
+            }
+
+    def export_metrics(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.metrics(), f, indent=4)
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """
+    返回进程级调度器，首次调用时根据 agent_config.yaml 的 `scheduler` 部分创建。
+    Returns the process-wide scheduler, built from the `scheduler` section of agent_config.yaml.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            cfg = dict(load_config().get("scheduler") or {})
+            cfg.pop("metrics_file", None)
+            cfg.pop("client_max_retries", None)
+            _scheduler = RequestScheduler(**cfg)
+        return _scheduler
+
+
+def configure_scheduler(**kwargs) -> RequestScheduler:
+    """替换进程级调度器 (例如在基准测试中)。(Replaces the process-wide scheduler, e.g. in benchmarks.)"""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = RequestScheduler(**kwargs)
+        return _scheduler
+
+
+def export_scheduler_metrics(path: Optional[str] = None) -> Optional[str]:
+    """
+    如果调度器已被使用，则把指标写入 `path` 或配置中的 `scheduler.metrics_file`。
+    Writes the metrics to `path` or the configured `scheduler.metrics_file` if the scheduler was used.
+    """
+    if _scheduler is None:
+        return None
+    path = path or (load_config().get("scheduler") or {}).get("metrics_file")
+    if not path:
+        return None
+    _scheduler.export_metrics(path)
+    logging.info(f"LLM调度器指标已写入 (LLM scheduler metrics written to) '{path}'.")
+    return path
+
+
+# 每个事件循环和 base_url 共享一个底层客户端 (及其 HTTP 连接池)。代理每步都会重新创建，如果每次都新建
+# 客户端，连接不会被复用 (每步一次新的 TCP/TLS 握手)，而且被丢弃的连接池要等到垃圾回收才关闭。
+# One underlying client (and its HTTP connection pool) is shared per event loop and base_url. Agents
+# are rebuilt every step; a new client each time would reuse no connections (a new TCP/TLS handshake
+# per step) and leave the abandoned pools to be closed by the garbage collector.
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def get_deepseek_client(priority_class: str = "default") -> "ScheduledChatCompletionClient":
+    """
+    根据配置文件创建一个Deepseek LLM客户端，其请求经过进程级调度器。在事件循环中调用时，同一循环内
+    的客户端共享底层连接池。
+    Creates a Deepseek LLM client based on the configuration file, routed through the process-wide scheduler.
+    Called inside an event loop, the clients of that loop share the underlying connection pool.
+
+    Args:
+        priority_class (str): 调度优先级类别，见 PRIORITY_CLASSES。
+                              Scheduling priority class, see PRIORITY_CLASSES.
 
     Returns:
-        OpenAIChatCompletionClient: 配置好的AutoGen客户端实例。
-                                    A configured AutoGen client instance.
+        ScheduledChatCompletionClient: 配置好的AutoGen客户端实例。
+                                       A configured AutoGen client instance.
     """
+    # 惰性导入：autogen_ext 的导入开销较大，只在真正创建客户端时才需要
+    # Lazy import: autogen_ext is expensive to import and only needed when a client is created
+    from autogen_ext.models.openai import OpenAIChatCompletionClient
+    from .scheduled_client import ScheduledChatCompletionClient
+
     config = load_config()
     model_cfg = config["model"]
     api_key = os.getenv(model_cfg["api_key_env_var"])
@@ -18,13 +396,21 @@ def get_deepseek_client() -> OpenAIChatCompletionClient:
     if not api_key:
         raise ValueError(f"环境变量 '{model_cfg['api_key_env_var']}' 未设置或为空。")
 
+    base_url = get_settings().llm_base_url or model_cfg["base_url"]
+    try:
+        shared = _shared_clients.setdefault(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        shared = None
+    if shared is not None and base_url in shared:
+        return ScheduledChatCompletionClient(shared[base_url], priority_class=priority_class, owns_inner=False)
+
     # 注意: Autogen的OpenAIChatCompletionClient可以用于任何与OpenAI API兼容的端点，
     # 包括Deepseek。我们通过base_url来指定API地址。
     # Note: Autogen's OpenAIChatCompletionClient can be used for any OpenAI-compatible
     # endpoint, including Deepseek. We specify the API address via the base_url.
-    return OpenAIChatCompletionClient(
+    client = OpenAIChatCompletionClient(
         model=model_cfg["name"],
-        base_url=model_cfg["base_url"],
+        base_url=base_url,
         api_key=api_key,
         # 从配置中读取其他参数
         # Read other parameters from the config
@@ -32,7 +418,9 @@ def get_deepseek_client() -> OpenAIChatCompletionClient:
         max_tokens=model_cfg["parameters"]["max_tokens"],
         top_p=model_cfg["parameters"]["top_p"],
         timeout=60.0,
-        max_retries=10,
+        # 重试由调度器统一处理，避免各客户端独立退避
+        # Retries are handled by the scheduler instead of independent per-client back-off
+        max_retries=(config.get("scheduler") or {}).get("client_max_retries", 0),
     # 为autogen提供模型能力信息
         # Provide model capability information for autogen
         model_info={
@@ -42,4 +430,8 @@ def get_deepseek_client() -> OpenAIChatCompletionClient:
             "vision": model_cfg["vision"],
             "structured_output": model_cfg["structured_output"]
         }
-    )
\ No newline at end of file
+    )
+    if shared is None:
+        return ScheduledChatCompletionClient(client, priority_class=priority_class)
+    shared[base_url] = client
+    return ScheduledChatCompletionClient(client, priority_class=priority_class, owns_inner=False)
@@ -0,0 +1,392 @@
+"""
+本地 OpenAI 兼容的模拟LLM服务 (Local OpenAI-compatible mock LLM server)。
+
+实现 /v1/chat/completions (含 SSE 流式输出) 与 /v1/models，使整个代理栈 (AutoGen 的
+OpenAIChatCompletionClient、请求调度器、重试) 无需网络和 API 密钥即可运行。回复的来源依次为：
+    1. 回放: llm_interactions_*.jsonl 或 MemoryStore 文件中记录的回复，按最后一条用户消息的哈希匹配；
+    2. 合成: 与脚本化客户端相同的按角色生成的 <think>/<action> 回复。
+延迟 (含抖动)、流式分块和错误注入 (429 带 Retry-After，或 5xx) 均可配置。只依赖标准库的 asyncio，
+HTTP/1.1 连接保持 keep-alive (流式响应结束后关闭连接)。
+
+Implements /v1/chat/completions (including SSE streaming) and /v1/models so the whole agent
+stack (AutoGen's OpenAIChatCompletionClient, the request scheduler, retries) runs without network
+access or an API key. Replies come from, in order:
+    1. replay: completions recorded in llm_interactions_*.jsonl or a MemoryStore file, matched by
+       the hash of the last user message;
+    2. synthesis: the role-based <think>/<action> replies of the scripted client.
+Latency (with jitter), stream chunking and error injection (429 with Retry-After, or 5xx) are
+configurable. Only the standard library's asyncio is used; HTTP/1.1 connections are kept alive
+(a streamed response closes its connection).
+
+用法 (Usage):
+    python mock_llm_server.py --replay LLM_expert_data_collection/datasets/llm_interactions_train.jsonl
+    export LLM_BASE_URL=http://127.0.0.1:8765/v1 DEEPSEEK_API_KEY=mock
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .scripted_llm_client import scripted_response
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SOURCE_REPLAY = "replay"
+SOURCE_SYNTHETIC = "synthetic"
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+           500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+def prompt_hash(text: str) -> str:
+    """提示文本的哈希 (统一换行并去掉首尾空白)。(Hash of a prompt, with newlines normalised and whitespace stripped.)"""
+    return hashlib.sha256(text.replace("\r\n", "\n").strip().encode("utf-8")).hexdigest()
+
+
+def _content_text(content: Any) -> str:
+    # OpenAI 消息内容可以是字符串或内容片段列表 (content may be a string or a list of parts)
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content if isinstance(content, str) else ""
+
+
+def _completion_from_record(record: Dict[str, Any]) -> Optional[str]:
+    """由 MemoryStore 的步骤记录重建决策代理的原始回复。(Rebuilds the decision maker's reply from a step record.)"""
+    thought, action = record.get("llm_thought"), record.get("action")
+    if not thought or action is None:
+        return None
+    return f"<think>{thought}</think>\n<action>{json.dumps(action)}</action>"
+
+
+class ReplayStore:
+    """
+    提示哈希 -> 记录的回复；同一提示有多条回复时轮流返回。
+    Prompt hash -> recorded completions; several completions for one prompt are returned in turn.
+    """
+
+    def __init__(self):
+        self._completions: Dict[str, List[str]] = {}
+        self._cursors: Dict[str, Iterator[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._completions)
+
+    def add(self, prompt: str, completion: str):
+        key = prompt_hash(prompt)
+        self._completions.setdefault(key, []).append(completion)
+        self._cursors.pop(key, None)
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        key = prompt_hash(prompt)
+        if key not in self._completions:
+            return None
+        if key not in self._cursors:
+            self._cursors[key] = itertools.cycle(self._completions[key])
+        return next(self._cursors[key])
+
+    def load_interactions(self, path: str) -> int:
+        """读取 llm_interactions_*.jsonl ({"input", "output"} 每行一条)。(Reads an llm_interactions_*.jsonl file.)"""
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("input") and record.get("output"):
+                    self.add(record["input"], record["output"])
+                    count += 1
+        return count
+
+    def load_memory(self, path: str) -> int:
+        """
+        读取 MemoryStore 文件中由LLM决策的步骤 (本地策略或计划执行的步骤没有LLM回复，被跳过)。
+        Reads the LLM-decided steps of a MemoryStore file (steps served by the local policy or a plan
+        have no LLM reply and are skipped).
+        """
+        from src.memory_store import expand_memories  # 惰性导入 (lazy import)
+
+        with open(path, "r", encoding="utf-8") as f:
+            memories = expand_memories(json.load(f), base_dir=os.path.dirname(os.path.abspath(path)))
+        count = 0
+        for run in memories.values():
+            for record in run.get("history") or []:
+                completion = _completion_from_record(record)
+                if record.get("llm_input") and completion and not record.get("policy"):
+                    self.add(record["llm_input"], completion)
+                    count += 1
+        return count
+
+    def load(self, path: str) -> int:
+        """按扩展名读取回放文件 (.jsonl 或 MemoryStore 的 .json)。(Loads a replay file by extension.)"""
+        return self.load_interactions(path) if path.endswith(".jsonl") else self.load_memory(path)
+
+
+@dataclass
+class MockOptions:
+    """模拟服务的行为。(Behaviour of the mock server.)"""
+    model: str = "mock-llm"
+    latency_s: float = 0.0
+    jitter_s: float = 0.0
+    # 注入错误的概率与状态码 (429 立即返回并带 Retry-After，5xx 在延迟之后返回)
+    # Probability and status of injected errors (429 returns at once with Retry-After, 5xx after the latency)
+    error_rate: float = 0.0
+    error_status: int = 500
+    retry_after_s: float = 0.5
+    stream_chunk_chars: int = 16
+    stream_interval_s: float = 0.0
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockStats:
+    """模拟服务的累计统计。(Cumulative statistics of the mock server.)"""
+    requests: int = 0
+    replayed: int = 0
+    synthetic: int = 0
+    streamed: int = 0
+    errors: Dict[int, int] = field(default_factory=dict)
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    service_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "replayed": self.replayed, "synthetic": self.synthetic,
+                "streamed": self.streamed, "errors": {str(k): v for k, v in self.errors.items()},
+                "in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight,
+                "mean_service_ms": round(1e3 * self.service_s / self.requests, 3) if self.requests else None}
+
+
+class MockLLMServer:
+    """
+    Args:
+        replay (Optional[ReplayStore]): 回放的回复；为空时全部合成。(Recorded replies; everything is synthesised without.)
+        options (Optional[MockOptions]): 延迟、流式和错误注入。(Latency, streaming and error injection.)
+        host (str): 监听地址。(Listen address.)
+        port (int): 监听端口；0 表示由系统分配。(Listen port; 0 lets the OS choose.)
+    """
+
+    def __init__(self, replay: Optional[ReplayStore] = None, options: Optional[MockOptions] = None,
+                 host: str = "127.0.0.1", port: int = 8765):
+        self.replay = replay if replay is not None else ReplayStore()
+        self.options = options or MockOptions()
+        self.host, self.port = host, port
+        self.stats = MockStats()
+        self._rng = random.Random(self.options.seed)
+        self._ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        """开始监听并返回 base_url。(Starts listening and returns the base_url.)"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Mock LLM server listening on {self.base_url} ({len(self.replay)} replayable prompts).")
+        return self.base_url
+
+    async def stop(self):
+        """停止监听并关闭保持中的连接。(Stops listening and closes the kept-alive connections.)"""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self) -> str:
+        """
+        在后台线程的独立事件循环中启动并返回 base_url。与客户端在同一进程中做负载测试时使用，
+        使服务不与客户端共用事件循环 (以及 CPU 时间片)。
+        Starts on a separate event loop in a background thread and returns the base_url. Used for load
+        tests in the clients' process, so the server does not share their event loop (or CPU slices).
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.base_url
+
+    def stop_thread(self):
+        """停止由 start_in_thread 启动的服务。(Stops a server started with start_in_thread.)"""
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    # --- HTTP ---
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if not await self._dispatch(method, path.split("?", 1)[0], body, writer, keep_alive):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+            self._connections.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool,
+                    headers: Optional[Dict[str, str]] = None) -> bool:
+        body = json.dumps(payload).encode("utf-8")
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}", "Content-Type: application/json",
+                 f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+        return keep_alive
+
+    async def _dispatch(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter,
+                        keep_alive: bool) -> bool:
+        if method == "POST" and path.endswith("/chat/completions"):
+            return await self._chat_completion(body, writer, keep_alive)
+        if method == "GET" and path.endswith("/models"):
+            return await self._send(writer, 200, {"object": "list", "data": [
+                {"id": self.options.model, "object": "model", "owned_by": "mock"}]}, keep_alive)
+        if method == "GET" and path in ("/stats", "/v1/stats"):
+            return await self._send(writer, 200, self.stats.to_dict(), keep_alive)
+        if method == "GET" and path in ("/health", "/v1/health"):
+            return await self._send(writer, 200, {"status": "ok"}, keep_alive)
+        return await self._send(writer, 404, _error_body(404, f"No route for {method} {path}"), keep_alive)
+
+    # --- Completions ---
+
+    def _reply(self, messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """(回复, 来源)。(The reply and its source.)"""
+        system = "\n".join(_content_text(m.get("content")) for m in messages if m.get("role") == "system")
+        user = next((_content_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+        recorded = self.replay.lookup(user)
+        if recorded is not None:
+            return recorded, SOURCE_REPLAY
+        return scripted_response(system, user), SOURCE_SYNTHETIC
+
+    def _injected_error(self) -> Optional[int]:
+        if self.options.error_rate > 0 and self._rng.random() < self.options.error_rate:
+            return self.options.error_status
+        return None
+
+    async def _chat_completion(self, body: bytes, writer: asyncio.StreamWriter, keep_alive: bool) -> bool:
+        start = time.perf_counter()
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+        try:
+            try:
+                request = json.loads(body or b"{}")
+                messages = [m for m in request.get("messages") or [] if isinstance(m, dict)]
+            except (json.JSONDecodeError, AttributeError):
+                return await self._send(writer, 400, _error_body(400, "Request body is not a JSON object."), keep_alive)
+            error = self._injected_error()
+            if error == 429:
+                self.stats.errors[error] = self.stats.errors.get(error, 0) + 1
+                return await self._send(writer, 429, _error_body(429, "Rate limit reached (injected)."), keep_alive,
+                                        {"Retry-After": f"{self.options.retry_after_s:g}"})
+            latency = self.options.latency_s + self._rng.uniform(0.0, self.options.jitter_s)
+            if latency > 0:
+                await asyncio.sleep(latency)
+            if error is not None:
+                self.stats.errors[error] = self.stats.errors.get(error, 0) + 1
+                return await self._send(writer, error, _error_body(error, "Server error (injected)."), keep_alive)
+
+            content, source = self._reply(messages)
+            if source == SOURCE_REPLAY:
+                self.stats.replayed += 1
+            else:
+                self.stats.synthetic += 1
+            prompt_tokens = sum(len(_content_text(m.get("content"))) for m in messages) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                     "total_tokens": prompt_tokens + len(content) // 4}
+            model = request.get("model") or self.options.model
+            completion_id = f"chatcmpl-mock-{next(self._ids)}"
+            if request.get("stream"):
+                self.stats.streamed += 1
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                await self._stream(writer, completion_id, model, content, usage if include_usage else None, source)
+                return False
+            return await self._send(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            }, keep_alive, {"X-Mock-Source": source})
+        finally:
+            self.stats.in_flight -= 1
+            self.stats.service_s += time.perf_counter() - start
+
+    async def _stream(self, writer: asyncio.StreamWriter, completion_id: str, model: str, content: str,
+                      usage: Optional[Dict[str, int]], source: str):
+        """以 SSE 分块发送回复，结束后关闭连接。(Sends the reply as SSE chunks, then closes the connection.)"""
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                      f"Connection: close\r\nX-Mock-Source: {source}\r\n\r\n").encode("latin-1"))
+        created = int(time.time())
+
+        def event(choices: List[Dict[str, Any]], **extra) -> bytes:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": choices, **extra}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        size = max(1, self.options.stream_chunk_chars)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+        for index, piece in enumerate(pieces):
+            delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+            writer.write(event([{"index": 0, "delta": delta, "finish_reason": None}]))
+            await writer.drain()
+            if self.options.stream_interval_s > 0:
+                await asyncio.sleep(self.options.stream_interval_s)
+        writer.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if usage is not None:
+            writer.write(event([], usage=usage))
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+
+def _error_body(status: int, message: str) -> Dict[str, Any]:
+    kind = "rate_limit_error" if status == 429 else ("invalid_request_error" if status < 500 else "server_error")
+    return {"error": {"message": message, "type": kind, "code": status}}
@@ -0,0 +1,147 @@
+"""
+提示组装引擎 (Prompt assembly engine)。
+
+代理的输入由 prompts 目录中的模板渲染 (例如 decision_input_template.txt)。模板在第一次使用时
+编译为 (字面文本, 字段) 片段列表，之后每次渲染只做拼接。模板把不变的内容放在前面 (用户目标、
+计划说明)、每步变化的内容放在后面 (当前状态、上一步奖励)，使服务端的前缀缓存 (例如 DeepSeek
+API 的上下文硬盘缓存) 可以命中。每次渲染报告与同一模板上一次渲染相同的前缀长度 (字符数)；系统
+提示不变且位于用户消息之前，因此它和这个前缀一起构成请求中可被缓存的部分。
+
+Agent inputs are rendered from templates in the prompts directory (e.g.
+decision_input_template.txt). A template is compiled into a list of (literal, field) parts on
+first use, so every render is a plain join. Templates put the content that does not change first
+(the user goal, the plan instructions) and the per-step content last (the current state, the last
+reward), so provider-side prefix caching (e.g. the DeepSeek API context cache) can hit. Each render
+reports how many characters it shares as a prefix with the previous render of the same template;
+the system message is constant and precedes the user message, so together with this prefix it
+makes up the cacheable part of the request.
+"""
+import os
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .prompt_loader import load_prompt
+
+CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """一次渲染的结果。(The result of one render.)"""
+    text: str
+    stable_prefix_chars: int
+
+    @property
+    def prompt_chars(self) -> int:
+        return len(self.text)
+
+    @property
+    def stable_share(self) -> float:
+        return self.stable_prefix_chars / len(self.text) if self.text else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"prompt_chars": self.prompt_chars, "stable_prefix_chars": self.stable_prefix_chars}
+
+
+class PromptTemplate:
+    """
+    预编译的提示模板，使用 str.format 的字段语法 ({name} 或 {name:.4f})。
+    A precompiled prompt template using str.format field syntax ({name} or {name:.4f}).
+
+    Args:
+        name (str): 模板名 (用于报错和统计)。(Template name, for errors and statistics.)
+        text (str): 模板文本；末尾的换行不属于提示。(Template text; a trailing newline is not part of the prompt.)
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        text = text[:-1] if text.endswith("\n") else text
+        self._parts: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and (not field or not field.isidentifier()):
+                raise ValueError(f"Prompt template '{name}' has an unsupported field {{{field}}}; use plain names.")
+            self._parts.append((literal, field, spec or "", conversion))
+        self.fields = tuple(dict.fromkeys(field for _, field, _, _ in self._parts if field is not None))
+
+    def segments(self, values: Dict[str, Any]) -> List[str]:
+        """渲染为片段列表 (字面文本与字段值交替)。(Renders into segments, literals and field values in order.)"""
+        segments = []
+        for literal, field, spec, conversion in self._parts:
+            if literal:
+                segments.append(literal)
+            if field is None:
+                continue
+            try:
+                value = values[field]
+            except KeyError:
+                raise KeyError(f"Prompt template '{self.name}' needs a value for '{field}'.") from None
+            if conversion:
+                value = CONVERSIONS[conversion](value)
+            segments.append(format(value, spec) if spec else str(value))
+        return segments
+
+    def render(self, **values: Any) -> str:
+        return "".join(self.segments(values))
+
+
+def _shared_prefix(previous: List[str], current: List[str]) -> int:
+    """
+    两次渲染的公共前缀长度；先按片段比较，只在第一个不同的片段内逐字符比较。
+    Common prefix length of two renders; segments are compared whole, characters only within the
+    first differing segment.
+    """
+    length = 0
+    for old, new in zip(previous, current):
+        if old == new:
+            length += len(new)
+            continue
+        return length + len(os.path.commonprefix([old, new]))
+    return length
+
+
+@dataclass
+class PromptStats:
+    """一个模板的累计统计。(Cumulative statistics of one template.)"""
+    calls: int = 0
+    prompt_chars: int = 0
+    stable_prefix_chars: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls,
+                "mean_prompt_chars": round(self.prompt_chars / self.calls, 1) if self.calls else None,
+                "mean_stable_prefix_chars": round(self.stable_prefix_chars / self.calls, 1) if self.calls else None,
+                "stable_share": round(self.stable_prefix_chars / self.prompt_chars, 4) if self.prompt_chars else None}
+
+
+class PromptEngine:
+    """
+    加载、编译并缓存模板，渲染时报告稳定前缀的长度。
+    Loads, compiles and caches templates, and reports the stable prefix of every render.
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._previous: Dict[str, List[str]] = {}
+        self.stats: Dict[str, PromptStats] = {}
+
+    def template(self, name: str) -> PromptTemplate:
+        """prompts 目录中名为 name 的模板 (编译一次)。(The template `name` from the prompts directory, compiled once.)"""
+        template = self._templates.get(name)
+        if template is None:
+            template = self._templates[name] = PromptTemplate(name, load_prompt(name))
+        return template
+
+    def render(self, name: str, **values: Any) -> RenderedPrompt:
+        segments = self.template(name).segments(values)
+        text = "".join(segments)
+        stable = _shared_prefix(self._previous.get(name, []), segments)
+        self._previous[name] = segments
+        stats = self.stats.setdefault(name, PromptStats())
+        stats.calls += 1
+        stats.prompt_chars += len(text)
+        stats.stable_prefix_chars += stable
+        return RenderedPrompt(text, stable)
+
+    def stats_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
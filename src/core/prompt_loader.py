@@ -1,13 +1,16 @@
 import os
+import functools
 
 # 定义prompts目录的绝对路径，确保在任何地方调用都正确
 # Define the absolute path to the prompts directory for robust calling
 PROMPT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "prompts")
 
+@functools.lru_cache(maxsize=None)
 def load_prompt(name: str) -> str:
     """
-    从prompts目录加载一个指定的提示文件。
-    Loads a specified prompt file from the prompts directory.
+    从prompts目录加载一个指定的提示文件。每个文件只读取一次 (修改文件后调用 load_prompt.cache_clear())。
+    Loads a specified prompt file from the prompts directory. Each file is read once (call
+    load_prompt.cache_clear() after editing one).
 
     Args:
         name (str): 提示文件的名称（不含.txt后缀）。
@@ -0,0 +1,313 @@
+"""
+运行配置的模式、加载器与参数扫描展开器 (Run-configuration schema, loader and sweep expander)。
+
+`configs/run_config.yaml` 是模拟参数的唯一来源，`main.py` 与专家数据脚本都从这里读取，
+不再使用 Python 中硬编码的常量。扫描文件可以把一个基础配置展开成许多个运行配置以便批量执行。
+
+`configs/run_config.yaml` is the single source of the simulation parameters for both `main.py`
+and the expert-data script. A sweep file expands a base config into many run configs for batch runs.
+"""
+import os
+import copy
+import itertools
+from dataclasses import dataclass, field, fields, asdict
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from src.config import RUN_CONFIG_PATH, Settings
+from src.core.config_loader import load_yaml_file
+
+
+@dataclass
+class ExpertDataConfig:
+    """专家数据采集脚本的参数。(Parameters of the expert-data collection script.)"""
+    test_case_name: str = "bestest_air"
+    training_start_time: int = 146 * 24 * 3600
+    testing_start_time: int = 153 * 24 * 3600
+    episode_length: int = 7 * 24 * 3600
+    warmup_period: int = 7 * 24 * 3600
+    control_period: int = 900
+    sampling_period: int = 60
+    # 奖励权重: 能源成本 / 温度越限 / 动作变化率 (Reward weights: cost / temperature / slew)
+    w_cost: float = 100.0
+    w_temp: float = 1.0
+    w_slew: float = 10.0
+    # 由专家数据集训练的本地策略 (train_policy.py --source expert)；为空时每个控制周期都询问LLM
+    # Local policy trained on the expert dataset (train_policy.py --source expert); every control
+    # period asks the LLM when empty
+    local_policy: Optional[str] = None
+    local_policy_margin: float = 1.0
+    # 数据集输出目录，为空时使用脚本旁的 datasets 目录
+    # Dataset output directory; defaults to the datasets folder next to the script
+    output_dir: Optional[str] = None
+
+
+@dataclass
+class RunConfig:
+    """主控制循环 (main.py) 的运行参数。(Run parameters of the main control loop.)"""
+    test_case_name: str = "bestest_air"
+    start_time: int = 334 * 24 * 3600
+    warmup_period: int = 7 * 24 * 3600
+    control_step: int = 3600
+    simulation_steps: int = 14 * 24
+    history_window_size: int = 3
+    # 分层历史: 内存中保留的步骤数 (0 表示全部保留)、每次溢出的步骤数、提示中的每日汇总天数
+    # Tiered history: steps kept in memory (0 keeps all), steps spilled at a time, days of daily summaries in prompts
+    hot_history_steps: int = 0
+    history_spill_chunk: int = 48
+    daily_summary_days: int = 7
+    # 多候选决策 (src/candidates.py): 候选动作数 (1 表示关闭)、评估时域 (控制步数)、评估进程数 (0 表示在本进程内)
+    # Best-of-N decisions (src/candidates.py): candidate actions (1 disables), evaluation horizon in control
+    # steps, evaluation worker processes (0 evaluates in-process)
+    best_of_n: int = 1
+    candidate_horizon: int = 3
+    candidate_workers: int = 0
+    # 在 BOPTEST 上评估候选时: 每次评估的预热时长 (秒，远短于 warmup_period) 与候选数上限
+    # When candidates are evaluated on BOPTEST: the warmup before each evaluation (seconds, much shorter
+    # than warmup_period) and the cap on the candidates per decision
+    candidate_warmup_period: int = 6 * 3600
+    candidate_max_remote: int = 3
+    # 蒸馏的本地策略 (src/policy.py, 由 train_policy.py 生成的 .npz)；为空时每一步都询问LLM。
+    # margin 放大置信门控的阈值。
+    # Distilled local policy (src/policy.py, an .npz written by train_policy.py); every step asks the LLM
+    # when empty. The margin scales the confidence gate's threshold.
+    local_policy: Optional[str] = None
+    local_policy_margin: float = 1.0
+    # 分层控制 (src/planning.py): 每个LLM计划覆盖的控制步数 (1 表示每步决策)、触发重新规划的偏离阈值 (K)
+    # Hierarchical control (src/planning.py): control steps covered by each LLM plan (1 decides every step),
+    # and the deviation that triggers a re-plan (K)
+    plan_horizon_steps: int = 1
+    plan_deviation_threshold: float = 1.5
+    # 简报复用 (src/briefing.py): 一份简报最多连续复用的步数 (0 表示每步调用信息综合代理)，
+    # 以及视为实质变化的温度 (K) 和功率 (W) 阈值
+    # Briefing reuse (src/briefing.py): maximum consecutive steps a briefing is reused (0 calls the
+    # synthesizer every step), and the temperature (K) and power (W) changes considered material
+    briefing_reuse_steps: int = 0
+    briefing_temperature_delta: float = 0.5
+    briefing_power_delta: float = 200.0
+    # 简报的生成方式: "llm" 为信息综合代理，"template" 为确定性模板 (src/briefing.py 的 TemplateBriefing)
+    # How the briefing is produced: "llm" runs the synthesizer agent, "template" the deterministic
+    # TemplateBriefing in src/briefing.py
+    synthesizer: str = "llm"
+    # 知识检索 (src/retrieval.py) 每次返回的文本块数 (chunks returned per knowledge retrieval)
+    retrieval_top_k: int = 3
+    # 必须与 'configs/objectives_config.yaml' 中的一个键完全匹配
+    # Must match a key in 'configs/objectives_config.yaml'
+    selected_objective: str = "balance_energy_comfort"
+    # 关于可控参数的描述，会与所选目标的描述动态拼接
+    # Description of the controllable parameter, joined with the objective description
+    controllable_param_desc: str = (
+        "The controllable parameter is con_oveTSetCoo_u in the range ‘min_value’: 278.15, "
+        "‘max_value’: 308.15, Zone temperature setpoint for cooling"
+    )
+    memory_filename: str = "memory_store.json"
+    run_name: Optional[str] = None
+    expert_data: ExpertDataConfig = field(default_factory=ExpertDataConfig)
+
+    def validate(self) -> "RunConfig":
+        """
+        校验取值范围，失败时抛出 ValueError。
+        Validates value ranges, raising ValueError on failure.
+        """
+        positive = {
+            "control_step": self.control_step, "simulation_steps": self.simulation_steps,
+            "history_window_size": self.history_window_size,
+            "best_of_n": self.best_of_n, "candidate_horizon": self.candidate_horizon,
+            "candidate_max_remote": self.candidate_max_remote,
+            "plan_horizon_steps": self.plan_horizon_steps, "retrieval_top_k": self.retrieval_top_k,
+            "expert_data.control_period": self.expert_data.control_period,
+            "expert_data.sampling_period": self.expert_data.sampling_period,
+            "expert_data.episode_length": self.expert_data.episode_length,
+        }
+        for name, value in positive.items():
+            if value <= 0:
+                raise ValueError(f"Run config '{name}' must be positive, got {value}.")
+        for name, value in {"start_time": self.start_time, "warmup_period": self.warmup_period,
+                            "hot_history_steps": self.hot_history_steps,
+                            "daily_summary_days": self.daily_summary_days,
+                            "candidate_workers": self.candidate_workers,
+                            "candidate_warmup_period": self.candidate_warmup_period,
+                            "briefing_reuse_steps": self.briefing_reuse_steps,
+                            "briefing_temperature_delta": self.briefing_temperature_delta,
+                            "briefing_power_delta": self.briefing_power_delta}.items():
+            if value < 0:
+                raise ValueError(f"Run config '{name}' must not be negative, got {value}.")
+        for name, value in {"local_policy_margin": self.local_policy_margin,
+                            "expert_data.local_policy_margin": self.expert_data.local_policy_margin}.items():
+            if value <= 0:
+                raise ValueError(f"Run config '{name}' must be positive, got {value}.")
+        if self.plan_deviation_threshold <= 0:
+            raise ValueError(f"Run config 'plan_deviation_threshold' must be positive, "
+                             f"got {self.plan_deviation_threshold}.")
+        if self.synthesizer not in ("llm", "template"):
+            raise ValueError(f"Run config 'synthesizer' must be 'llm' or 'template', got {self.synthesizer!r}.")
+        if self.plan_horizon_steps > 1 and self.best_of_n > 1:
+            raise ValueError("plan_horizon_steps and best_of_n cannot both be enabled: "
+                             "candidates are scored as single actions.")
+        if self.history_spill_chunk <= 0:
+            raise ValueError(f"Run config 'history_spill_chunk' must be positive, got {self.history_spill_chunk}.")
+        if self.hot_history_steps and self.hot_history_steps < max(2, self.history_window_size):
+            raise ValueError("hot_history_steps must be 0 (keep everything) or at least history_window_size (and 2).")
+        if self.expert_data.control_period % self.expert_data.sampling_period != 0:
+            raise ValueError("expert_data.control_period must be a multiple of expert_data.sampling_period.")
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# run_config.yaml 同时存放运行环境设置 (见 src.config.Settings)，这些键在这里被忽略
+# run_config.yaml also holds environment settings (see src.config.Settings); they are ignored here
+_SETTINGS_KEYS = {f.name for f in fields(Settings)}
+
+
+def _coerce_value(current: Any, value: Any) -> Any:
+    if isinstance(value, str) and current is not None and not isinstance(current, str):
+        if isinstance(current, bool):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        if isinstance(current, int):
+            return int(float(value))
+        if isinstance(current, float):
+            return float(value)
+    if isinstance(current, int) and not isinstance(current, bool) and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _apply(target: Any, data: Dict[str, Any], prefix: str = ""):
+    known = {f.name: f for f in fields(target)}
+    for key, value in data.items():
+        if key not in known:
+            if not prefix and key in _SETTINGS_KEYS:
+                continue
+            raise ValueError(f"Unknown run config key '{prefix}{key}'. Known keys: {sorted(known)}")
+        current = getattr(target, key)
+        if isinstance(current, ExpertDataConfig):
+            if not isinstance(value, dict):
+                raise ValueError(f"Run config '{prefix}{key}' must be a mapping.")
+            _apply(current, value, prefix=f"{prefix}{key}.")
+        else:
+            setattr(target, key, _coerce_value(current, value))
+
+
+def _nest_dotted(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for dotted, value in overrides.items():
+        node = nested
+        *parents, leaf = dotted.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return nested
+
+
+def run_config_from_dict(data: Dict[str, Any], base: Optional[RunConfig] = None) -> RunConfig:
+    """
+    基于默认值（或给定的基础配置）从字典构建运行配置。未知键会被拒绝。
+    Builds a run config from a dict on top of the defaults (or a base). Unknown keys are rejected.
+    """
+    config = copy.deepcopy(base) if base is not None else RunConfig()
+    _apply(config, data or {})
+    return config.validate()
+
+
+def apply_overrides(config: RunConfig, overrides: Optional[Dict[str, Any]]) -> RunConfig:
+    """
+    应用形如 {"expert_data.control_period": "900"} 的点号覆盖。
+    Applies dotted overrides such as {"expert_data.control_period": "900"}.
+    """
+    if not overrides:
+        return config
+    return run_config_from_dict(_nest_dotted(overrides), base=config)
+
+
+def load_run_config(path: Optional[str] = None, overrides: Optional[Dict[str, Any]] = None) -> RunConfig:
+    """
+    加载运行配置：默认值 -> YAML 文件 -> 命令行覆盖。
+    Loads the run config: defaults -> YAML file -> CLI overrides.
+
+    Args:
+        path (Optional[str]): YAML 路径，默认为 configs/run_config.yaml。
+                              YAML path, configs/run_config.yaml by default.
+        overrides (Optional[Dict[str, Any]]): 点号形式的覆盖值。
+                                              Dotted-key overrides.
+
+    Returns:
+        RunConfig: 校验后的运行配置。(The validated run config.)
+    """
+    path = path or RUN_CONFIG_PATH
+    data = load_yaml_file(Path(path)) if os.path.exists(path) else {}
+    return apply_overrides(run_config_from_dict(data or {}), overrides)
+
+
+def split_overrides(overrides: Dict[str, Any]):
+    """
+    将命令行覆盖拆分为运行环境设置和运行配置两部分。
+    Splits CLI overrides into environment settings and run-config overrides.
+    """
+    settings = {k: v for k, v in overrides.items() if k in _SETTINGS_KEYS}
+    run = {k: v for k, v in overrides.items() if k not in _SETTINGS_KEYS}
+    return settings, run
+
+
+# ==============================================================================
+# 参数扫描 (Parameter sweeps)
+# ==============================================================================
+
+def _format_value(value: Any) -> str:
+    return str(value).replace(os.sep, "_").replace(" ", "")
+
+
+def expand_sweep(spec: Dict[str, Any], base: Optional[RunConfig] = None) -> List[RunConfig]:
+    """
+    将扫描规格展开为运行配置列表。
+    Expands a sweep spec into a list of run configs.
+
+    规格格式 (Spec format):
+        name: window_sweep          # 运行名前缀 (run-name prefix)
+        base: configs/run_config.yaml  # 可选的基础配置 (optional base config)
+        fixed:                      # 所有运行共享的覆盖 (overrides shared by all runs)
+          simulation_steps: 48
+        grid:                       # 笛卡尔积 (Cartesian product)
+          history_window_size: [1, 3, 5]
+          expert_data.control_period: [900, 1800]
+        zip:                        # 按位置配对、长度必须一致 (paired by position, equal lengths)
+          start_time: [0, 2592000]
+          selected_objective: [balance_energy_comfort, comfort_focus]
+
+    每个运行都会得到唯一的 run_name 和 memory_filename，互不覆盖。
+    Every run gets a unique run_name and memory_filename so runs never overwrite each other.
+    """
+    if base is None:
+        base = load_run_config(spec.get("base")) if spec.get("base") else load_run_config()
+    base = apply_overrides(base, spec.get("fixed"))
+
+    grid = spec.get("grid") or {}
+    zipped = spec.get("zip") or {}
+    for key, values in list(grid.items()) + list(zipped.items()):
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Sweep values for '{key}' must be a non-empty list.")
+    zip_lengths = {len(v) for v in zipped.values()}
+    if len(zip_lengths) > 1:
+        raise ValueError(f"All 'zip' lists must have the same length, got lengths {sorted(zip_lengths)}.")
+
+    grid_keys = list(grid)
+    grid_points = list(itertools.product(*(grid[k] for k in grid_keys))) if grid_keys else [()]
+    zip_points = [dict(zip(zipped, values)) for values in zip(*zipped.values())] if zipped else [{}]
+
+    name = spec.get("name", "sweep")
+    configs = []
+    for index, (grid_values, zip_values) in enumerate(itertools.product(grid_points, zip_points)):
+        overrides = dict(zip(grid_keys, grid_values))
+        overrides.update(zip_values)
+        config = apply_overrides(base, overrides)
+        label = "_".join(f"{k.split('.')[-1]}={_format_value(v)}" for k, v in overrides.items())
+        config.run_name = f"{name}_{index:03d}" + (f"_{label}" if label else "")
+        config.memory_filename = f"memory_store_{config.run_name}.json"
+        configs.append(config)
+    return configs
+
+
+def load_sweep(path: str) -> List[RunConfig]:
+    """从 YAML 文件加载并展开扫描规格。(Loads and expands a sweep spec from a YAML file.)"""
+    return expand_sweep(load_yaml_file(Path(path)) or {})
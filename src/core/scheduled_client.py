@@ -0,0 +1,131 @@
+"""
+经过进程级调度器的 AutoGen 模型客户端包装 (An AutoGen model client wrapper routed through the scheduler)。
+
+它把任意 ChatCompletionClient 的请求交给 `src.core.llm_client.RequestScheduler` 排队、限速和重试，
+其他方法直接委托给被包装的客户端。
+Queues, rate-limits and retries the requests of any ChatCompletionClient through
+`src.core.llm_client.RequestScheduler`; every other method is delegated to the wrapped client.
+
+被包装的客户端可能由多个代理共享，因此用量按包装器各自统计，只包括经由它发出的请求。
+The wrapped client may be shared by several agents, so usage is tracked per wrapper and only covers
+the requests made through it.
+"""
+import json
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage, ModelInfo, RequestUsage
+
+from .llm_client import RequestScheduler, get_scheduler
+
+
+def _estimate_prompt_tokens(messages: Sequence[LLMMessage]) -> int:
+    """粗略估计 (约 4 个字符一个 token)，避免在排队时调用分词器。(~4 characters per token, no tokenizer.)"""
+    total = 0
+    for message in messages:
+        content = getattr(message, "content", "")
+        total += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    return total // 4
+
+
+class ScheduledChatCompletionClient(ChatCompletionClient):
+    """
+    Args:
+        inner (ChatCompletionClient): 被包装的模型客户端。(The wrapped model client.)
+        priority_class (str): 调度优先级类别。(Scheduling priority class.)
+        scheduler (Optional[RequestScheduler]): 默认使用进程级调度器。(Defaults to the process-wide scheduler.)
+        owns_inner (bool): close() 是否关闭被包装的客户端 (共享时为 False)。
+                           Whether close() closes the wrapped client (False when it is shared).
+    """
+
+    def __init__(self, inner: ChatCompletionClient, priority_class: str = "default",
+                 scheduler: Optional[RequestScheduler] = None, owns_inner: bool = True):
+        self.inner = inner
+        self.priority_class = priority_class
+        self._scheduler = scheduler
+        self.owns_inner = owns_inner
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._last_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        return self._scheduler or get_scheduler()
+
+    def _estimate(self, messages: Sequence[LLMMessage]) -> int:
+        return _estimate_prompt_tokens(messages) + self.scheduler.completion_token_estimate
+
+    def _record_usage(self, usage: Optional[RequestUsage]):
+        if usage is None:
+            return
+        self._last_usage = usage
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + usage.completion_tokens,
+        )
+
+    async def create(
+            self,
+            messages: Sequence[LLMMessage],
+            *,
+            tools: Sequence[Any] = [],
+            tool_choice: Any = "auto",
+            json_output: Optional[Any] = None,
+            extra_create_args: Mapping[str, Any] = {},
+            cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        result = await self.scheduler.run(
+            self.priority_class, self._estimate(messages),
+            lambda: self.inner.create(messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                                      extra_create_args=extra_create_args, cancellation_token=cancellation_token))
+        self._record_usage(result.usage)
+        return result
+
+    async def create_stream(
+            self,
+            messages: Sequence[LLMMessage],
+            *,
+            tools: Sequence[Any] = [],
+            tool_choice: Any = "auto",
+            json_output: Optional[Any] = None,
+            extra_create_args: Mapping[str, Any] = {},
+            cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        # 流式请求只排队一次，不重试 (已产出的片段无法撤回)
+        # Streams are admitted once and never retried, since yielded chunks cannot be taken back
+        scheduler = self.scheduler
+        waiter = await scheduler.acquire(self.priority_class, self._estimate(messages))
+        actual_tokens = None
+        try:
+            async for chunk in self.inner.create_stream(
+                    messages, tools=tools, tool_choice=tool_choice, json_output=json_output,
+                    extra_create_args=extra_create_args, cancellation_token=cancellation_token):
+                if isinstance(chunk, CreateResult) and chunk.usage:
+                    actual_tokens = chunk.usage.prompt_tokens + chunk.usage.completion_tokens
+                    self._record_usage(chunk.usage)
+                yield chunk
+        finally:
+            scheduler.release(waiter, actual_tokens)
+
+    async def close(self) -> None:
+        if self.owns_inner:
+            await self.inner.close()
+
+    def actual_usage(self) -> RequestUsage:
+        return self._last_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self.inner.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return self.inner.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> Any:
+        return self.inner.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.inner.model_info
@@ -0,0 +1,153 @@
+"""
+一个脚本化的、确定性的 AutoGen 模型客户端，用于离线基准测试和管道测试。
+A scripted, deterministic AutoGen model client for offline benchmarks and plumbing tests.
+
+它根据系统提示识别代理角色（信息综合 / 决策 / 知识检索），返回格式正确的固定风格输出，
+并可配置人为延迟来模拟网络往返。不需要 API 密钥或网络。
+It recognises the agent role from the system prompt, returns well-formed canned output
+and can inject an artificial latency to model the network round trip.
+"""
+import json
+import asyncio
+import hashlib
+import itertools
+from typing import Any, AsyncGenerator, List, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelInfo,
+    RequestUsage,
+    SystemMessage,
+)
+
+SYNTHESIZER_BRIEFING = (
+    "### 1. Dynamic State & Trends\n"
+    "Over the recent window the indoor temperature has been stable. At {time}, the indoor "
+    "temperature is {t_zone}K while the outdoor temperature is {t_out}K.\n\n"
+    "### 2. Key Operational Rules\n"
+    "* **Occupancy Schedule & Setpoints:** Not specified.\n"
+    "* **HVAC System:** Not specified."
+)
+
+
+def _message_text(message: LLMMessage) -> str:
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def _stable_fraction(text: str) -> float:
+    """由输入文本得到 [0, 1) 之间的确定性数值。(A deterministic value in [0, 1) derived from the text.)"""
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") / 2 ** 32
+
+
+def scripted_response(system_message: str, user_message: str) -> str:
+    """
+    为给定的系统提示和输入生成确定性回复。
+    Produces a deterministic reply for a given system prompt and input.
+    """
+    fraction = _stable_fraction(user_message)
+    if "intelligence analyst" in system_message:
+        return SYNTHESIZER_BRIEFING.format(time="the current time", t_zone=round(294.0 + 4 * fraction, 2),
+                                           t_out=round(280.0 + 10 * fraction, 2))
+    if "research assistant" in system_message:
+        return "Pre-cool the zone before occupancy and relax setpoints when the building is unoccupied."
+    if "fcu_oveFan_u" in user_message:
+        action = {"fcu_oveFan_u": round(fraction, 3)}
+    else:
+        action = {"con_oveTSetCoo_u": round(295.15 + 4.0 * fraction, 2)}
+    return (
+        "<think>The indoor temperature is close to the setpoint, so a moderate adjustment keeps comfort "
+        "while limiting energy use.</think>\n"
+        f"<action>{json.dumps(action)}</action>"
+    )
+
+
+class ScriptedChatCompletionClient(ChatCompletionClient):
+    """
+    确定性的假模型客户端。可传入固定回复列表循环返回，否则按角色生成脚本化回复。
+    A deterministic fake model client. Cycles through `responses` if given, otherwise scripts by role.
+
+    Args:
+        responses (Optional[List[str]]): 按顺序循环返回的固定回复。
+                                         Canned replies returned in order, cycling.
+        latency_s (float): 每次调用前的人为延迟（秒）。
+                           Artificial latency before each reply, in seconds.
+    """
+
+    def __init__(self, responses: Optional[List[str]] = None, latency_s: float = 0.0):
+        self._responses = itertools.cycle(responses) if responses else None
+        self.latency_s = latency_s
+        self.calls = 0
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._last_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _reply(self, messages: Sequence[LLMMessage]) -> str:
+        if self._responses is not None:
+            return next(self._responses)
+        system = "\n".join(_message_text(m) for m in messages if isinstance(m, SystemMessage))
+        user = _message_text(messages[-1]) if messages else ""
+        return scripted_response(system, user)
+
+    async def create(
+            self,
+            messages: Sequence[LLMMessage],
+            *,
+            tools: Sequence[Any] = [],
+            tool_choice: Any = "auto",
+            json_output: Optional[Any] = None,
+            extra_create_args: Mapping[str, Any] = {},
+            cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if self.latency_s > 0:
+            await asyncio.sleep(self.latency_s)
+        content = self._reply(messages)
+        usage = RequestUsage(prompt_tokens=self.count_tokens(messages), completion_tokens=len(content) // 4)
+        self.calls += 1
+        self._last_usage = usage
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + usage.completion_tokens,
+        )
+        return CreateResult(finish_reason="stop", content=content, usage=usage, cached=False)
+
+    async def create_stream(
+            self,
+            messages: Sequence[LLMMessage],
+            *,
+            tools: Sequence[Any] = [],
+            tool_choice: Any = "auto",
+            json_output: Optional[Any] = None,
+            extra_create_args: Mapping[str, Any] = {},
+            cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        result = await self.create(messages)
+        yield result.content
+        yield result
+
+    async def close(self) -> None:
+        return None
+
+    def actual_usage(self) -> RequestUsage:
+        return self._last_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return sum(len(_message_text(m)) for m in messages) // 4
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Any] = []) -> int:
+        return max(0, 128000 - self.count_tokens(messages))
+
+    @property
+    def capabilities(self) -> Any:
+        return self.model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return ModelInfo(vision=False, function_calling=False, json_output=False,
+                         family="unknown", structured_output=False)
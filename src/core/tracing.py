@@ -0,0 +1,373 @@
+"""
+轻量级结构化追踪 (Lightweight structured tracing)。
+
+为控制循环中的各个阶段（BOPTEST 调用、LLM 调用、持久化等）记录可嵌套的时间跨度(span)，
+并写入本地 JSONL 文件或 Chrome Trace 文件 (chrome://tracing / Perfetto 可直接打开)。
+完全离线工作，不需要任何采集服务。
+
+Records nestable spans for each stage of the control loop and writes them to a local
+JSONL or Chrome-trace file. Works fully offline, no collector service required.
+
+用法 (Usage):
+    export LLMCL_TRACE_FILE=data/output/traces/run.jsonl   # 或 .json 输出 Chrome Trace
+    with span("control_step", step=3, testid=testid):
+        with span("llm.decision"):
+            ...
+"""
+import os
+import json
+import time
+import logging
+import threading
+import itertools
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 通过环境变量启用追踪，未设置时所有 span 都是零开销的空操作。
+# Tracing is enabled via this environment variable; when unset every span is a no-op.
+TRACE_ENV_VAR = "LLMCL_TRACE_FILE"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("llmcl_current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """一个正在进行中的时间跨度。(An in-flight span.)"""
+    __slots__ = ("name", "span_id", "parent_id", "tags", "start_wall", "start_perf", "tid")
+
+    def __init__(self, name: str, parent: Optional["Span"], tags: Dict[str, Any]):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent else None
+        # 子 span 继承父 span 的标签（例如 step、testid）
+        # Child spans inherit their parent's tags (e.g. step, testid)
+        self.tags = {**parent.tags, **tags} if parent else dict(tags)
+        self.start_wall = time.time()
+        self.start_perf = time.perf_counter()
+        self.tid = threading.get_ident()
+
+    def set_tag(self, key: str, value: Any):
+        """在 span 运行期间补充标签。(Adds a tag while the span is running.)"""
+        self.tags[key] = value
+
+
+class Tracer:
+    """
+    将结束的 span 追加写入本地文件的追踪器。
+    A tracer that appends finished spans to a local file.
+
+    文件后缀为 `.json` 时写入 Chrome Trace (JSON Array) 格式，否则写入 JSONL。
+    A `.json` suffix selects the Chrome-trace (JSON array) format, anything else JSONL.
+    """
+
+    def __init__(self, output_path: Optional[str] = None):
+        self.output_path = output_path
+        self.chrome_format = bool(output_path) and output_path.endswith(".json")
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = os.getpid()
+        self._first_event = True
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.output_path)
+
+    def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(directory, exist_ok=True)
+        last_char = _reopen_chrome_array(self.output_path) if self.chrome_format else None
+        self._file = open(self.output_path, "a", encoding="utf-8")
+        if self.chrome_format and last_char is None:
+            # Chrome 允许数组缺少结尾的 ']'，因此崩溃时文件依然可读。
+            # Chrome accepts an unterminated array, so the file stays readable after a crash.
+            self._file.write("[\n")
+            self._first_event = True
+        elif self.chrome_format:
+            self._first_event = last_char == b"["
+        logging.info(f"Tracing enabled, writing spans to {self.output_path}")
+
+    @contextmanager
+    def span(self, name: str, **tags) -> Iterator[Optional[Span]]:
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        current = Span(name, parent, tags)
+        token = _current_span.set(current)
+        error = None
+        try:
+            yield current
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            duration = time.perf_counter() - current.start_perf
+            self._emit(current, duration, error)
+
+    def _emit(self, current: Span, duration: float, error: Optional[str]):
+        record = {
+            "name": current.name,
+            "span_id": current.span_id,
+            "parent_id": current.parent_id,
+            "start": current.start_wall,
+            "duration": duration,
+            "tags": current.tags,
+            "pid": self._pid,
+            "tid": current.tid,
+        }
+        if error:
+            record["error"] = error
+        if self.chrome_format:
+            line = json.dumps(_to_chrome_event(record), default=str, ensure_ascii=False)
+        else:
+            line = json.dumps(record, default=str, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self.chrome_format:
+                line = ("" if self._first_event else ",") + line
+                self._first_event = False
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                if self.chrome_format:
+                    self._file.write("]\n")
+                self._file.close()
+                self._file = None
+
+
+def _reopen_chrome_array(path: str) -> Optional[bytes]:
+    """
+    截掉已有 Chrome Trace 文件结尾的 ']' (由 close() 写入)，使追加的事件仍在数组内。
+    返回剩余内容的最后一个非空白字符；文件不存在或为空时返回 None。
+    Truncates the closing ']' (written by close()) of an existing Chrome-trace file so appended events
+    stay inside the array. Returns the last non-whitespace byte left, or None for a missing/empty file.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(0, end - 64))
+        tail = f.read()
+        stripped = tail.rstrip()
+        if stripped.endswith(b"]"):
+            stripped = stripped[:-1].rstrip()
+            f.truncate(end - len(tail) + len(stripped))
+            f.seek(0, os.SEEK_END)
+            f.write(b"\n")
+        return stripped[-1:] or b","
+
+
+_tracer: Optional[Tracer] = None
+
+
+def configure_tracing(output_path: Optional[str]) -> Tracer:
+    """
+    配置全局追踪器。传入 None 则关闭追踪。
+    Configures the process-wide tracer. Passing None disables tracing.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(output_path)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """返回全局追踪器，首次调用时从环境变量初始化。(Returns the global tracer, initialised from the environment.)"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(os.getenv(TRACE_ENV_VAR) or None)
+    return _tracer
+
+
+def span(name: str, **tags):
+    """
+    在全局追踪器上打开一个 span 的快捷方式。
+    Shortcut for opening a span on the global tracer.
+    """
+    return get_tracer().span(name, **tags)
+
+
+def traced(name: str):
+    """
+    为同步函数添加 span 的装饰器。
+    A decorator that wraps a synchronous function in a span.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ==============================================================================
+# 离线读取与转换 (Offline loading and conversion)
+# ==============================================================================
+
+def _to_chrome_event(record: Dict[str, Any]) -> Dict[str, Any]:
+    args = dict(record.get("tags") or {})
+    args["span_id"] = record["span_id"]
+    args["parent_id"] = record["parent_id"]
+    if record.get("error"):
+        args["error"] = record["error"]
+    return {
+        "name": record["name"],
+        "ph": "X",
+        "ts": record["start"] * 1e6,
+        "dur": record["duration"] * 1e6,
+        "pid": record["pid"],
+        "tid": record["tid"],
+        "args": args,
+    }
+
+
+def _from_chrome_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    args = dict(event.get("args") or {})
+    record = {
+        "name": event["name"],
+        "span_id": args.pop("span_id", None),
+        "parent_id": args.pop("parent_id", None),
+        "start": event["ts"] / 1e6,
+        "duration": event.get("dur", 0.0) / 1e6,
+        "pid": event.get("pid"),
+        "tid": event.get("tid"),
+    }
+    error = args.pop("error", None)
+    if error:
+        record["error"] = error
+    record["tags"] = args
+    return record
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    """
+    读取 JSONL 或 Chrome Trace 格式的追踪文件。
+    Loads a trace file written in either JSONL or Chrome-trace format.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        body = stripped.rstrip()
+        if not body.endswith("]"):
+            body = body.rstrip(",") + "]"
+        data = json.loads(body)
+        events = data.get("traceEvents", []) if isinstance(data, dict) else data
+        return [_from_chrome_event(e) for e in events if e.get("ph") == "X"]
+    spans = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            # 进程崩溃时最后一行可能不完整
+            # The last line may be truncated if the process crashed
+            logging.warning(f"Skipping malformed trace line in {path}")
+    return spans
+
+
+def to_chrome_trace(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """将 span 列表转换为 Chrome Trace 对象。(Converts spans to a Chrome-trace object.)"""
+    return {"traceEvents": [_to_chrome_event(s) for s in spans], "displayTimeUnit": "ms"}
+
+
+# ==============================================================================
+# 聚合报告 (Aggregated reports)
+# ==============================================================================
+
+def _span_key(record: Dict[str, Any]):
+    return record.get("pid"), record.get("span_id")
+
+
+def _parent_key(record: Dict[str, Any]):
+    return record.get("pid"), record.get("parent_id")
+
+
+def compute_self_times(spans: List[Dict[str, Any]]) -> Dict[Any, float]:
+    """
+    计算每个 span 的自身耗时（总耗时减去直接子 span 的耗时）。
+    Computes each span's self time (its duration minus its direct children).
+    """
+    children_total: Dict[Any, float] = {}
+    for s in spans:
+        if s.get("parent_id") is not None:
+            key = _parent_key(s)
+            children_total[key] = children_total.get(key, 0.0) + s["duration"]
+    return {_span_key(s): max(0.0, s["duration"] - children_total.get(_span_key(s), 0.0)) for s in spans}
+
+
+def summarize_spans(spans: List[Dict[str, Any]], group_by: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    按阶段名（可选再按某个标签）聚合 span，得到每阶段的时间分解。
+    Aggregates spans per stage name (optionally also per tag) into a time breakdown.
+
+    Returns:
+        List[Dict[str, Any]]: 每行包含 count/total/self/mean/p50/p95/max 以及占根 span 总时长的比例，
+                              按自身耗时降序排列。
+                              Rows with count/total/self/mean/p50/p95/max and the share of
+                              root wall time, sorted by self time descending.
+    """
+    self_times = compute_self_times(spans)
+    root_total = sum(s["duration"] for s in spans if s.get("parent_id") is None) or 1e-12
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for s in spans:
+        key = (s["name"], (s.get("tags") or {}).get(group_by)) if group_by else (s["name"], None)
+        groups.setdefault(key, []).append(s)
+
+    rows = []
+    for (name, group_value), members in groups.items():
+        durations = sorted(m["duration"] for m in members)
+        total = sum(durations)
+        self_total = sum(self_times[_span_key(m)] for m in members)
+        row = {
+            "stage": name,
+            "count": len(durations),
+            "total_s": total,
+            "self_s": self_total,
+            "mean_s": total / len(durations),
+            "p50_s": durations[len(durations) // 2],
+            "p95_s": durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+            "max_s": durations[-1],
+            "self_share": self_total / root_total,
+            "errors": sum(1 for m in members if m.get("error")),
+        }
+        if group_by:
+            row[group_by] = group_value
+        rows.append(row)
+    rows.sort(key=lambda r: r["self_s"], reverse=True)
+    return rows
+
+
+def to_folded_stacks(spans: List[Dict[str, Any]]) -> List[str]:
+    """
+    生成火焰图工具 (flamegraph.pl / speedscope) 使用的折叠栈格式，权重为自身耗时(微秒)。
+    Produces collapsed stacks for flame-graph tools, weighted by self time in microseconds.
+    """
+    by_key = {_span_key(s): s for s in spans}
+    self_times = compute_self_times(spans)
+    folded: Dict[str, float] = {}
+    for s in spans:
+        frames = [s["name"]]
+        parent = by_key.get(_parent_key(s)) if s.get("parent_id") is not None else None
+        while parent is not None:
+            frames.append(parent["name"])
+            parent = by_key.get(_parent_key(parent)) if parent.get("parent_id") is not None else None
+        stack = ";".join(reversed(frames))
+        folded[stack] = folded.get(stack, 0.0) + self_times[_span_key(s)]
+    return [f"{stack} {int(round(weight * 1e6))}" for stack, weight in sorted(folded.items())]
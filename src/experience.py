@@ -0,0 +1,297 @@
+"""
+紧凑的经验历史表示 (Compact experience-history representation)。
+
+每一步是一个带 __slots__ 的 ExperienceStep 记录；数值型的观测值、KPI、时间和奖励存放在
+按点名索引、可增长的 NumPy 列缓冲区中。窗口查询 (例如 "zon_reaTRooAir_y 的最近 N 个值")
+返回零拷贝视图；JSON 形式的历史只在需要时 (提示、保存、导出) 才生成。
+
+Each step is an ExperienceStep record with __slots__; numeric observations, KPIs, times and rewards
+live in growable NumPy column buffers indexed by point name. Windowed queries return zero-copy
+views, and the JSON-shaped history is only materialised on demand (prompts, saving, export).
+"""
+import math
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+# JSON 形式步骤记录的字段顺序 (field order of a JSON-shaped step record)
+STEP_FIELDS = ("timestep", "time", "observation", "instruction", "llm_input", "llm_thought", "action", "reward", "kpis")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ColumnBuffer:
+    """
+    行为步骤、列为点名的二维 float64 缓冲区，按需翻倍扩容。缺失值用 NaN 表示。
+    A 2-D float64 buffer (rows are steps, columns are point names) that doubles on demand.
+    Missing values are NaN, so a genuine NaN reading is indistinguishable from a missing one.
+    """
+
+    def __init__(self, row_capacity: int = 64, column_capacity: int = 8):
+        self._index: Dict[str, int] = {}
+        self._data = np.full((row_capacity, column_capacity), np.nan)
+        self._rows = 0
+
+    def __len__(self) -> int:
+        return self._rows
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._index)
+
+    def _grow(self, rows: int, columns: int):
+        old_rows, old_columns = self._data.shape
+        if rows <= old_rows and columns <= old_columns:
+            return
+        new_rows = old_rows if rows <= old_rows else max(rows, old_rows * 2)
+        new_columns = old_columns if columns <= old_columns else max(columns, old_columns * 2)
+        grown = np.full((new_rows, new_columns), np.nan)
+        grown[:old_rows, :old_columns] = self._data
+        self._data = grown
+
+    def add_row(self) -> int:
+        self._grow(self._rows + 1, self._data.shape[1])
+        self._rows += 1
+        return self._rows - 1
+
+    def set_values(self, row: int, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        写入一行中的数值，返回无法存入缓冲区的非数值项 (没有则返回 None)。
+        Writes the numeric values of a row; returns the non-numeric items (or None).
+        """
+        extras = None
+        for name, value in values.items():
+            if not _is_number(value):
+                extras = extras or {}
+                extras[name] = value
+                continue
+            column = self._index.get(name)
+            if column is None:
+                column = len(self._index)
+                self._grow(self._data.shape[0], column + 1)
+                self._index[name] = column
+            self._data[row, column] = value
+        return extras
+
+    def clear_row(self, row: int):
+        self._data[row, :] = np.nan
+
+    def truncate(self, rows: int):
+        """只保留前 rows 行。(Keeps only the first `rows` rows.)"""
+        if rows < self._rows:
+            self._data[rows:self._rows, :] = np.nan
+            self._rows = rows
+
+    def drop_head(self, rows: int):
+        """丢弃最前面的 rows 行，其余行前移。(Drops the first `rows` rows and shifts the rest up.)"""
+        rows = min(rows, self._rows)
+        remaining = self._rows - rows
+        self._data[:remaining] = self._data[rows:self._rows]
+        self._data[remaining:self._rows] = np.nan
+        self._rows = remaining
+
+    def value(self, row: int, name: str) -> Optional[float]:
+        column = self._index.get(name)
+        if column is None:
+            return None
+        value = float(self._data[row, column])
+        return None if math.isnan(value) else value
+
+    def get_row(self, row: int) -> Dict[str, float]:
+        values = self._data[row, :len(self._index)].tolist()
+        return {name: values[column] for name, column in self._index.items() if not math.isnan(values[column])}
+
+    def window(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        """
+        返回某列最近 n 个值的只读零拷贝视图 (n 为 None 时返回整列)。未知点名返回空数组。
+        Returns a read-only zero-copy view of the last n values of a column (the whole column if n is None).
+        The view stays valid, but a later growth of the buffer is not reflected in it.
+        """
+        column = self._index.get(name)
+        if column is None:
+            return np.empty(0)
+        start = 0 if n is None else max(0, self._rows - n)
+        view = self._data[start:self._rows, column]
+        view.flags.writeable = False
+        return view
+
+
+class ExperienceStep:
+    """
+    一个控制步骤的记录。数值数据存放在所属 ExperienceHistory 的列缓冲区中，通过 row 访问。
+    The record of one control step. Numeric data lives in the owning ExperienceHistory's buffers at `row`.
+    """
+    __slots__ = ("_history", "row", "timestep", "instruction", "llm_input", "llm_thought", "action",
+                 "observation_extras", "kpi_extras", "has_kpis", "extra_fields")
+
+    # 直接存放在记录上的非数值字段 (non-numeric fields stored on the record itself)
+    TEXT_FIELDS = ("instruction", "llm_input", "llm_thought", "action")
+
+    def __init__(self, history: "ExperienceHistory", row: int, timestep: int):
+        self._history = history
+        self.row = row
+        self.timestep = timestep
+        self.instruction = None
+        self.llm_input = None
+        self.llm_thought = None
+        self.action = None
+        self.observation_extras: Optional[Dict[str, Any]] = None
+        self.kpi_extras: Optional[Dict[str, Any]] = None
+        self.has_kpis = False
+        # 未知字段原样保留，以便向前兼容 (unknown fields are kept as-is for forward compatibility)
+        self.extra_fields: Optional[Dict[str, Any]] = None
+
+    @property
+    def time(self) -> Optional[float]:
+        return self._history.scalars.value(self.row, "time")
+
+    @property
+    def reward(self) -> Optional[float]:
+        return self._history.scalars.value(self.row, "reward")
+
+    @property
+    def observation(self) -> Dict[str, Any]:
+        observation = self._history.observations.get_row(self.row)
+        if self.observation_extras:
+            observation.update(self.observation_extras)
+        return observation
+
+    @property
+    def kpis(self) -> Optional[Dict[str, Any]]:
+        if not self.has_kpis:
+            return None
+        kpis = self._history.kpis.get_row(self.row)
+        if self.kpi_extras:
+            kpis.update(self.kpi_extras)
+        return kpis
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """与旧的 dict 记录兼容的访问方式。(Dict-style access compatible with the old records.)"""
+        if key in STEP_FIELDS:
+            value = getattr(self, key)
+        else:
+            value = (self.extra_fields or {}).get(key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in STEP_FIELDS:
+            return getattr(self, key)
+        if self.extra_fields and key in self.extra_fields:
+            return self.extra_fields[key]
+        raise KeyError(key)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """生成 JSON 形式的记录。(Materialises the JSON-shaped record.)"""
+        record = {field: getattr(self, field) for field in STEP_FIELDS}
+        if self.extra_fields:
+            record.update(self.extra_fields)
+        return record
+
+
+class ExperienceHistory:
+    """
+    一次运行的步骤序列，外加观测、KPI 和 (时间, 奖励) 三个列缓冲区。
+    The step sequence of one run plus column buffers for observations, KPIs and (time, reward).
+
+    按下标访问返回 JSON 形式的 dict，以兼容旧代码；`steps` 提供 ExperienceStep 记录本身。
+    Indexing returns JSON-shaped dicts for compatibility; `steps` exposes the ExperienceStep records.
+    """
+
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        self.steps: List[ExperienceStep] = []
+        self.observations = ColumnBuffer()
+        self.kpis = ColumnBuffer()
+        self.scalars = ColumnBuffer(column_capacity=2)
+        for record in records or []:
+            self.append(record)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __bool__(self) -> bool:
+        return bool(self.steps)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [step.to_dict() for step in self.steps[index]]
+        return self.steps[index].to_dict()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (step.to_dict() for step in self.steps)
+
+    def latest(self) -> Optional[ExperienceStep]:
+        return self.steps[-1] if self.steps else None
+
+    def append(self, record: Dict[str, Any]) -> ExperienceStep:
+        """追加一条 JSON 形式的步骤记录。(Appends a JSON-shaped step record.)"""
+        row = self.observations.add_row()
+        self.kpis.add_row()
+        self.scalars.add_row()
+        step = ExperienceStep(self, row, record.get("timestep", len(self.steps)))
+        self.steps.append(step)
+        self._update(step, {key: value for key, value in record.items() if key != "timestep"})
+        return step
+
+    def update_latest(self, fields: Dict[str, Any]):
+        """更新最新一步的字段。(Updates fields of the latest step.)"""
+        if self.steps:
+            self._update(self.steps[-1], fields)
+
+    def truncate(self, length: int):
+        """只保留前 length 个步骤。(Keeps only the first `length` steps.)"""
+        del self.steps[length:]
+        for buffer in (self.observations, self.kpis, self.scalars):
+            buffer.truncate(len(self.steps))
+
+    def drop_head(self, count: int) -> List[ExperienceStep]:
+        """
+        移除最早的 count 个步骤 (例如溢出到磁盘之后)，返回被移除的记录。
+        Removes the oldest `count` steps (e.g. after spilling them to disk) and returns them.
+        """
+        dropped = self.steps[:count]
+        del self.steps[:count]
+        for buffer in (self.observations, self.kpis, self.scalars):
+            buffer.drop_head(len(dropped))
+        for step in self.steps:
+            step.row -= len(dropped)
+        return dropped
+
+    def _update(self, step: ExperienceStep, fields: Dict[str, Any]):
+        for key, value in fields.items():
+            if key == "observation":
+                self.observations.clear_row(step.row)
+                step.observation_extras = self.observations.set_values(step.row, value or {})
+            elif key == "kpis":
+                self.kpis.clear_row(step.row)
+                step.has_kpis = value is not None
+                step.kpi_extras = self.kpis.set_values(step.row, value or {})
+            elif key in ("time", "reward"):
+                self.scalars.set_values(step.row, {key: value if value is not None else math.nan})
+            elif key == "timestep":
+                step.timestep = value
+            elif key in ExperienceStep.TEXT_FIELDS:
+                setattr(step, key, value)
+            else:
+                step.extra_fields = step.extra_fields or {}
+                step.extra_fields[key] = value
+
+    # --- 零拷贝窗口查询 (Zero-copy windowed queries) ---
+
+    def window(self, point_name: str, n: Optional[int] = None) -> np.ndarray:
+        """观测点最近 n 个值的视图。(A view of the last n values of an observation point.)"""
+        return self.observations.window(point_name, n)
+
+    def kpi_window(self, kpi_name: str, n: Optional[int] = None) -> np.ndarray:
+        return self.kpis.window(kpi_name, n)
+
+    def reward_window(self, n: Optional[int] = None) -> np.ndarray:
+        return self.scalars.window("reward", n)
+
+    def time_window(self, n: Optional[int] = None) -> np.ndarray:
+        return self.scalars.window("time", n)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """生成完整的 JSON 形式历史。(Materialises the full JSON-shaped history.)"""
+        return [step.to_dict() for step in self.steps]
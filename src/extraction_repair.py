@@ -0,0 +1,303 @@
+"""
+静态信息提取结果的本地修复 (Local repair of static extraction output)。
+
+LLM 按 StaticBuildingData 模式返回的 JSON 常有几类小错误：数值写成字符串、数值带单位后缀
+("0.15 m"、"1,100 kg/m3")、表格的每一行都生成一个父对象 ("roof": [{"layers": [行1]}, {"layers": [行2]}])、
+或者把表格行直接放在父对象的位置。这里按模式在本地修正这些错误 (带单位换算，例如厚度 "150 mm"
+-> thickness_m 0.15)，然后用 Pydantic 验证，并把仍然无法验证的错误归到最小的子树 (模式中的
+嵌套模型字段)，只有这些子树需要重新向 LLM 请求。
+
+LLM output for the StaticBuildingData schema often has small mistakes: numbers as strings, numbers
+with unit suffixes ("0.15 m", "1,100 kg/m3"), one parent object per table row ("roof": [{"layers":
+[row 1]}, {"layers": [row 2]}]) or table rows in place of their parent object. They are corrected
+here locally against the schema (with unit conversion, e.g. a thickness of "150 mm" -> thickness_m
+0.15); the result is validated with Pydantic and the remaining errors are attributed to the
+smallest subtrees (nested model fields of the schema), so only those subtrees need to be requested
+from the LLM again.
+"""
+import re
+import json
+import types
+import typing
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from .data_models import StaticBuildingData
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FieldPath = Tuple[Any, ...]
+
+# 字段名的单位后缀 -> {文本中的单位: 换算到该单位的系数}；其他字段的单位后缀只被去掉
+# Unit suffix of a field name -> {unit in the text: factor to that unit}; other fields only lose the suffix
+UNIT_SCALES: Dict[str, Dict[str, float]] = {
+    "m": {"m": 1.0, "cm": 0.01, "mm": 0.001},
+    "mm": {"mm": 1.0, "cm": 10.0, "m": 1000.0},
+    "m2": {"m2": 1.0, "sqm": 1.0},
+    "kW": {"kW": 1.0, "W": 0.001, "MW": 1000.0},
+    "kPa": {"kPa": 1.0, "Pa": 0.001, "bar": 100.0},
+    "kg_s": {"kg/s": 1.0, "kg/h": 1.0 / 3600.0},
+}
+NULL_TEXT = {"", "-", "--", "n/a", "na", "none", "null", "unknown", "not specified", "not available"}
+NUMBER = re.compile(r"^\s*([-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?(?:[eE][-+]?\d+)?|[-+]?\.\d+)\s*(.*?)\s*$")
+
+
+@dataclass(frozen=True)
+class Fix:
+    """一处本地修正。(One local correction.)"""
+    path: str
+    kind: str
+    detail: str
+
+
+def dotted(path: FieldPath) -> str:
+    return "".join(f"[{p}]" if isinstance(p, int) else (f".{p}" if i else str(p)) for i, p in enumerate(path)) or "<root>"
+
+
+def _shape(annotation: Any) -> Tuple[str, Any]:
+    """
+    把字段注解归类为 model / list / dict / number / union / other。
+    Classifies a field annotation as model, list, dict, number, union or other.
+    """
+    origin = typing.get_origin(annotation)
+    if origin in (typing.Union, types.UnionType):
+        options = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(options) == 1:
+            return _shape(options[0])
+        return "union", [_shape(o) for o in options]
+    if origin is list:
+        args = typing.get_args(annotation)
+        return "list", args[0] if args else Any
+    if origin is dict:
+        args = typing.get_args(annotation)
+        return "dict", args[1] if len(args) == 2 else Any
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return "model", annotation
+    if annotation in (float, int):
+        return "number", annotation
+    return "other", annotation
+
+
+def _model_option(annotation: Any) -> Optional[Type[BaseModel]]:
+    """注解中的模型类型 (包括 Union[Model, str])。(The model type of an annotation, including Union[Model, str].)"""
+    kind, inner = _shape(annotation)
+    if kind == "model":
+        return inner
+    if kind == "union":
+        return next((cls for option_kind, cls in inner if option_kind == "model"), None)
+    return None
+
+
+def _fields(cls: Type[BaseModel]) -> Dict[str, Tuple[str, Any]]:
+    """字段名和别名 -> (字段名, 注解)。(Field names and aliases -> (field name, annotation).)"""
+    index = {}
+    for name, info in cls.model_fields.items():
+        index[name] = (name, info.annotation)
+        if info.alias:
+            index[info.alias] = (name, info.annotation)
+    return index
+
+
+def _field_unit(name: str) -> Optional[str]:
+    # 最长的后缀优先 (例如 _kg_s 先于 _s) (longest suffix first, e.g. _kg_s before _s)
+    return next((unit for unit in sorted(UNIT_SCALES, key=len, reverse=True) if name.endswith("_" + unit)), None)
+
+
+def _normalize_unit(text: str) -> str:
+    text = text.strip().strip("[]()").replace("²", "2").replace("³", "3").replace("^", "")
+    return text.replace(" ", "")
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _merge(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """合并两个重复的父对象：列表拼接、对象递归合并、标量保留第一个非空值。(Merges two duplicated parents.)"""
+    merged = dict(first)
+    for key, value in second.items():
+        if key not in merged or _is_empty(merged[key]):
+            merged[key] = value
+        elif isinstance(merged[key], list) and isinstance(value, list):
+            merged[key] = merged[key] + value
+        elif isinstance(merged[key], dict) and isinstance(value, dict):
+            merged[key] = _merge(merged[key], value)
+    return merged
+
+
+class _Repairer:
+    def __init__(self):
+        self.fixes: List[Fix] = []
+
+    def _fix(self, path: FieldPath, kind: str, detail: str):
+        self.fixes.append(Fix(dotted(path), kind, detail))
+
+    def value(self, value: Any, annotation: Any, path: FieldPath, name: str) -> Any:
+        kind, inner = _shape(annotation)
+        if kind == "union":
+            # Union[Model, str] 等: 只修复结构化的值 (only structured values are repaired)
+            model = _model_option(annotation)
+            return self.model(value, model, path) if model is not None and isinstance(value, (dict, list)) else value
+        if kind == "model":
+            return self.model(value, inner, path)
+        if kind == "list":
+            if isinstance(value, dict):
+                self._fix(path, "wrap_list", "a single object where a list was expected")
+                value = [value]
+            if isinstance(value, list):
+                return [self.value(item, inner, path + (i,), name) for i, item in enumerate(value)]
+            return value
+        if kind == "dict" and isinstance(value, dict):
+            return {key: self.value(item, inner, path + (key,), name) for key, item in value.items()}
+        if kind == "number":
+            return self.number(value, inner, path, name)
+        return value
+
+    def number(self, value: Any, target: type, path: FieldPath, name: str) -> Any:
+        if not isinstance(value, str):
+            if target is int and isinstance(value, float) and value.is_integer():
+                return int(value)
+            return value
+        if value.strip().lower() in NULL_TEXT:
+            self._fix(path, "null", f"{value!r} -> null")
+            return None
+        match = NUMBER.match(value)
+        if match is None:
+            return value
+        number = float(match.group(1).replace(",", ""))
+        unit = _normalize_unit(match.group(2))
+        if unit:
+            field_unit = _field_unit(name)
+            if field_unit is not None:
+                scale = UNIT_SCALES[field_unit].get(unit)
+                if scale is None:
+                    return value  # 无法换算的单位留给验证报错 (unconvertible units are left to validation)
+                number *= scale
+            elif unit == "%":
+                return value  # 百分比还是比例不明确 (percent or fraction is ambiguous)
+        if target is int:
+            if not number.is_integer():
+                return value
+            number = int(number)
+        self._fix(path, "unit" if unit else "number", f"{value!r} -> {number!r}")
+        return number
+
+    def model(self, value: Any, cls: Type[BaseModel], path: FieldPath) -> Any:
+        if isinstance(value, str) and value.strip().startswith("{"):
+            try:
+                value = json.loads(value)
+                self._fix(path, "json_string", f"{cls.__name__} given as a JSON string")
+            except json.JSONDecodeError:
+                return value
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            value = self.rows(value, cls, path)
+        if not isinstance(value, dict):
+            return value
+        fields = _fields(cls)
+        repaired = {}
+        for key, item in value.items():
+            if key in fields:
+                name, annotation = fields[key]
+                repaired[key] = self.value(item, annotation, path + (key,), name)
+            else:
+                repaired[key] = item
+        return repaired
+
+    def rows(self, rows: List[Dict[str, Any]], cls: Type[BaseModel], path: FieldPath) -> Dict[str, Any]:
+        """
+        父对象的位置上出现了列表: 要么是表格行 (放入父对象唯一的列表字段)，要么是每行一个的重复父对象 (合并)。
+        A list where a parent object was expected: either table rows (moved into the parent's only list
+        field) or one duplicated parent per row (merged).
+        """
+        fields = _fields(cls)
+        keys = set().union(*(row.keys() for row in rows))
+        list_fields = []
+        for name, info in cls.model_fields.items():
+            kind, item = _shape(info.annotation)
+            if kind == "list" and _shape(item)[0] == "model":
+                list_fields.append((name, item))
+        if not keys <= set(fields) and len(list_fields) == 1:
+            list_name, item_cls = list_fields[0]
+            if keys & set(_fields(item_cls)):
+                self._fix(path, "wrap_rows", f"{len(rows)} rows moved into {cls.__name__}.{list_name}")
+                return {list_name: rows}
+        merged = rows[0]
+        for row in rows[1:]:
+            merged = _merge(merged, row)
+        self._fix(path, "merge_rows", f"{len(rows)} duplicated {cls.__name__} objects merged")
+        return merged
+
+
+def repair(data: Any, model_cls: Type[BaseModel] = StaticBuildingData,
+           path: FieldPath = ()) -> Tuple[Any, List[Fix]]:
+    """
+    按模式修正 data (不修改输入)，返回修正后的数据和修正列表；path 是 data 在整个文档中的位置 (用于报告)。
+    Corrects `data` against the schema (the input is not modified) and returns the result and the
+    list of fixes; `path` is the location of `data` in the whole document, for the report.
+    """
+    repairer = _Repairer()
+    repaired = repairer.model(data, model_cls, path)
+    return repaired, repairer.fixes
+
+
+def validate(data: Any, model_cls: Type[BaseModel] = StaticBuildingData) -> Tuple[Optional[BaseModel], List[Dict[str, Any]]]:
+    """(模型实例, []) 或 (None, Pydantic 错误列表)。(The model instance and no errors, or None and the errors.)"""
+    try:
+        return model_cls.model_validate(data), []
+    except ValidationError as e:
+        return None, e.errors(include_url=False)
+
+
+def failing_subtrees(errors: List[Dict[str, Any]],
+                     model_cls: Type[BaseModel] = StaticBuildingData) -> List[Tuple[FieldPath, Type[BaseModel]]]:
+    """
+    每个错误归到包含它的最深的模型字段 (列表元素归到拥有该列表的模型)，去掉被祖先覆盖的子树。
+    Attributes every error to the deepest model field containing it (list items to the model owning
+    the list) and drops subtrees covered by an ancestor.
+    """
+    found: Dict[FieldPath, Type[BaseModel]] = {}
+    for error in errors:
+        cls, best = model_cls, ((), model_cls)
+        loc = tuple(error.get("loc") or ())
+        for depth, key in enumerate(loc):
+            field = _fields(cls).get(key) if isinstance(key, str) else None
+            model = _model_option(field[1]) if field is not None else None
+            if model is None:
+                break
+            cls, best = model, (loc[:depth + 1], model)
+        found.setdefault(*best)
+    subtrees = []
+    for path in sorted(found, key=len):
+        if not any(path[:len(kept)] == kept for kept, _ in subtrees):
+            subtrees.append((path, found[path]))
+    return subtrees
+
+
+def errors_under(errors: List[Dict[str, Any]], path: FieldPath) -> List[str]:
+    """path 之下的错误，每条一行。(The errors under `path`, one line each.)"""
+    return [f"{dotted(tuple(e['loc']))}: {e['msg']} (got {e.get('input')!r})"
+            for e in errors if tuple(e.get("loc") or ())[:len(path)] == path]
+
+
+def get_path(data: Any, path: FieldPath) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def set_path(data: Dict[str, Any], path: FieldPath, value: Any) -> Dict[str, Any]:
+    """设置 path 处的值 (path 为空时替换整个文档)，返回文档。(Sets the value at `path`; an empty path replaces the document.)"""
+    if not path:
+        return value
+    node = data
+    for key in path[:-1]:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    node[path[-1]] = value
+    return data
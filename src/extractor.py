@@ -1,33 +1,127 @@
 import os
 import json
+import asyncio
 import logging
-from typing import Optional
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
 
 # Correctly import from the 'src' package
-from .config import OPENAI_API_KEY, INPUT_DATA_DIR, OUTPUT_DATA_DIR
+from .config import INPUT_DATA_DIR, OUTPUT_DATA_DIR, get_settings, ensure_data_dirs
 from .data_models import StaticBuildingData
-
-from llama_index.core import SimpleDirectoryReader
-from llama_index.program.openai import OpenAIPydanticProgram
-from llama_index.llms.openai import OpenAI
+from .extraction_repair import (FieldPath, Fix, dotted, errors_under, failing_subtrees, get_path, repair,
+                                set_path, validate)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Follow-up prompt for one subtree that is still invalid after the local repair
+SUBTREE_PROMPT_TEMPLATE = (
+    "You extracted a `StaticBuildingData` JSON object from the document below, but its `{path}` section "
+    "does not conform to the schema, even after automatic cleanup.\n\n"
+    "Validation errors:\n{errors}\n\n"
+    "Previous value of `{path}`:\n{previous}\n\n"
+    "Extract ONLY the `{path}` section again, as a single JSON object that strictly adheres to the `{model}` "
+    "schema. Numbers must be plain JSON numbers in the unit named by the field (no quotes, no unit text). "
+    "Table rows belong in one list inside a SINGLE parent object, one list entry per row.\n\n"
+    "--- Document Text Begins ---\n"
+    "{input}\n"
+    "--- Document Text Ends ---"
+)
+
+
+async def _request_json(llm, output_cls: Type[BaseModel], prompt: str) -> Dict[str, Any]:
+    """
+    Calls the LLM with `output_cls` as a required function (as OpenAIPydanticProgram does) and returns
+    the raw arguments, so a malformed reply can still be repaired instead of being thrown away.
+    """
+    from llama_index.core.program.function_program import get_function_tool
+
+    response = await llm.achat_with_tools([get_function_tool(output_cls)], user_msg=prompt, tool_required=True)
+    return llm.get_tool_calls_from_response(response, error_on_no_tool_call=True)[0].tool_kwargs
+
+
+async def _request_subtree(llm, full_text: str, data: Dict[str, Any], path: FieldPath, output_cls: Type[BaseModel],
+                           errors: List[Dict[str, Any]]) -> Tuple[Any, List[Fix]]:
+    """Requests one invalid subtree again and repairs the reply; raises ValueError if it is still invalid."""
+    prompt = SUBTREE_PROMPT_TEMPLATE.format(
+        path=dotted(path), model=output_cls.__name__, errors="\n".join(errors_under(errors, path)),
+        previous=json.dumps(get_path(data, path), indent=2, default=str), input=full_text)
+    value, fixes = repair(await _request_json(llm, output_cls, prompt), output_cls, path)
+    _, remaining = validate(value, output_cls)
+    if remaining:
+        raise ValueError(f"{len(remaining)} validation error(s) remain: " + "; ".join(
+            f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in remaining[:3]))
+    return value, fixes
+
+
+def _log_fixes(fixes: List[Fix]):
+    if fixes:
+        counts = ", ".join(f"{kind}={n}" for kind, n in Counter(f.kind for f in fixes).items())
+        logging.info(f"Repaired {len(fixes)} value(s) locally ({counts}).")
+        for fix in fixes:
+            logging.debug(f"  {fix.path}: {fix.kind} ({fix.detail})")
+
+
+async def extract_static_data(llm, prompt: str, full_text: str) -> Optional[StaticBuildingData]:
+    """
+    Runs the extraction with a repair stage instead of treating any validation failure as fatal:
+      1. one full extraction call; the raw JSON is kept;
+      2. common mistakes are corrected locally against `StaticBuildingData` (src/extraction_repair.py);
+      3. only the subtrees that are still invalid are requested again, concurrently;
+      4. a subtree that fails again is dropped (every field is optional), so the rest is still saved.
+    """
+    data, fixes = repair(await _request_json(llm, StaticBuildingData, prompt))
+    _log_fixes(fixes)
+    final_data, errors = validate(data)
+    if final_data is not None:
+        return final_data
+
+    subtrees = failing_subtrees(errors)
+    logging.warning(f"{len(errors)} validation error(s) remain after the local repair; requesting "
+                    f"{len(subtrees)} subtree(s) again: {', '.join(dotted(path) for path, _ in subtrees)}")
+    replies = await asyncio.gather(*(_request_subtree(llm, full_text, data, path, output_cls, errors)
+                                     for path, output_cls in subtrees), return_exceptions=True)
+    for (path, _), reply in zip(subtrees, replies):
+        if isinstance(reply, Exception):
+            logging.error(f"Subtree '{dotted(path)}' is still invalid and is dropped: {reply}")
+            data = set_path(data, path, None)
+            continue
+        value, sub_fixes = reply
+        _log_fixes(sub_fixes)
+        data = set_path(data, path, value)
+        logging.info(f"Subtree '{dotted(path)}' was re-extracted successfully.")
+
+    final_data, errors = validate(data)
+    if errors:
+        raise ValueError(f"Extraction is still invalid after the repair stage: {errors_under(errors, ())[:3]}")
+    return final_data
+
 
 def run_extraction_pipeline():
     """
     Executes the complete information extraction pipeline.
     This version uses a highly optimized prompt with a few-shot example to ensure
-    robust and accurate extraction of tabular data from Markdown files.
+    robust and accurate extraction of tabular data from Markdown files. Malformed output is
+    repaired locally and only the subtrees that stay invalid are requested again (see
+    `extract_static_data`). Must not be called from a running event loop; use asyncio.to_thread.
     """
     logging.info("--- Starting Static Building Information Extraction (V3 - Hardened Schema & Prompt) ---")
 
+    # llama_index is heavy and only needed here, so it is imported lazily
+    from llama_index.core import PromptTemplate, SimpleDirectoryReader
+    from llama_index.llms.openai import OpenAI
+
+    # The OpenAI key is only validated when the extraction actually runs
+    openai_api_key = get_settings().require("openai_api_key")
+    ensure_data_dirs()
+
     # 1. Initialize the OpenAI LLM
     logging.info("Initializing OpenAI LLM (gpt-4o)...")
     llm = OpenAI(
         model="gpt-4o",
-        api_key=OPENAI_API_KEY,
+        api_key=openai_api_key,
         temperature=0.0,  # Set to 0.0 for maximum determinism and accuracy
         request_timeout=180.0
     )
@@ -47,7 +141,7 @@ def run_extraction_pipeline():
         logging.error(f"Fatal error during document loading: {e}", exc_info=True)
         return
 
-    # 3. Create the Pydantic Program with the final, most robust prompt
+    # 3. Build the extraction prompt with the final, most robust template
     # --- [KEY IMPROVEMENT V3] ---
     # The example now shows the full nested structure (`building_info.envelope.roof`),
     # giving the LLM an unambiguous template to follow for all tables.
@@ -132,25 +226,21 @@ def run_extraction_pipeline():
         "--- Document Text Ends ---"
     )
 
-    program = OpenAIPydanticProgram.from_defaults(
-        output_cls=StaticBuildingData,
-        llm=llm,
-        prompt_template_str=prompt_template_str,
-        verbose=True  # Keep verbose=True to see the LLM interaction during debugging
-    )
+    # PromptTemplate only substitutes {input}; the braces of the JSON example are kept as they are
+    prompt = PromptTemplate(prompt_template_str).format(input=full_text)
 
-    # 4. Execute the extraction program
-    logging.info("--- Calling Pydantic Program with the advanced prompt ---")
+    # 4. Execute the extraction with the local repair stage
+    logging.info("--- Calling the LLM with the advanced prompt ---")
     final_data: Optional[StaticBuildingData] = None
     try:
-        final_data = program(input=full_text)
-        logging.info("Successfully received and parsed a valid response from the LLM.")
+        final_data = asyncio.run(extract_static_data(llm, prompt, full_text))
+        logging.info("Successfully received a valid response from the LLM.")
     except Exception as e:
-        # This will catch errors during the program call, including parsing failures or API issues
-        logging.error(f"The program call failed during execution: {e}", exc_info=True)
+        # This will catch API issues and output that is still invalid after the repair stage
+        logging.error(f"The extraction failed during execution: {e}", exc_info=True)
         logging.error(
-            "This could be due to an LLM error, a malformed response that Pydantic couldn't parse, or a network issue. "
-            "Check the logs above for the raw LLM output if available."
+            "This could be due to an LLM error, a response that could not be repaired, or a network issue. "
+            "Check the logs above for the validation errors."
         )
         return
 
@@ -0,0 +1,130 @@
+"""
+长时间运行的分层历史 (Tiered history for long runs)。
+
+- 热窗口: 最近的步骤保存在内存中的 ExperienceHistory 里 (见 MemoryStore 的 hot_steps)。
+- 溢出文件: 更早的步骤以完整文本 (驻留已还原) 追加到记忆文件旁的 JSONL 文件中，不再占用内存，
+  也不再写入记忆文件本身。
+- 每日汇总: 关键观测点 (points_config.yaml 中的 aggregate) 的日均值与极值、动作和奖励之和，
+  按模拟日增量累积，作为长时段上下文提供给信息综合代理；提示中只包含最近几天的汇总。
+
+- Hot window: the most recent steps stay in the in-memory ExperienceHistory (see MemoryStore's hot_steps).
+- Spill file: older steps are appended, with their full text (interning resolved), to a JSONL file
+  next to the memory file; they no longer use RAM nor the memory file itself.
+- Daily aggregates: the daily mean and extremes of key observation points (`aggregate` in
+  points_config.yaml), the actions and the reward sum are accumulated per simulated day and
+  offered to the synthesizer as long-horizon context; prompts only carry the last few days.
+"""
+import os
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+SECONDS_PER_DAY = 86400
+
+
+# --- 溢出文件 (Spill file) ---
+
+def append_spill(path: str, records: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_spill(path: str, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """逐条读取溢出的步骤 (最多 limit 条)。(Yields the spilled steps, at most `limit` of them.)"""
+    if not os.path.exists(path) or limit == 0:
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for count, line in enumerate(f, start=1):
+            yield json.loads(line)
+            if limit is not None and count >= limit:
+                return
+
+
+def truncate_spill(path: str, steps: int):
+    """
+    只保留前 steps 条记录。溢出后、保存前中断时，文件中多出的记录也仍在已保存的热窗口里。
+    Keeps only the first `steps` records. After a crash between a spill and the next save, the extra
+    records are still part of the saved hot window.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    if len(lines) > steps:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:steps])
+
+
+# --- 每日汇总 (Daily aggregates) ---
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _accumulate(stats: Dict[str, List[float]], values: Optional[Dict[str, Any]], keep: Callable[[str], bool]):
+    for name, value in (values or {}).items():
+        if not _is_number(value) or not keep(name):
+            continue
+        entry = stats.get(name)
+        if entry is None:
+            stats[name] = [value, value, value, 1]  # [总和 sum, 最小 min, 最大 max, 计数 count]
+        else:
+            entry[0] += value
+            entry[1] = min(entry[1], value)
+            entry[2] = max(entry[2], value)
+            entry[3] += 1
+
+
+def _finalize(stats: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {name: {"mean": total / count, "min": low, "max": high}
+            for name, (total, low, high, count) in stats.items()}
+
+
+class DailyAggregator:
+    """
+    按模拟日累积已完成步骤的统计量。状态是可 JSON 序列化的 dict (存放在运行记录的 "aggregates" 中)，
+    因此未完成的一天在保存与续跑之间得以保留。
+    Accumulates the statistics of completed steps per simulated day. The state is a JSON-serializable
+    dict (kept under the run's "aggregates"), so a partial day survives saving and resuming.
+
+    Args:
+        state (Dict): {"days": [...], "current": {...} 或 None}。
+        keep_point (Callable[[str], bool]): 哪些观测点参与汇总。(Which observation points are aggregated.)
+    """
+
+    def __init__(self, state: Dict[str, Any], keep_point: Callable[[str], bool]):
+        self.state = state
+        self.state.setdefault("days", [])
+        self.state.setdefault("current", None)
+        self.keep_point = keep_point
+
+    @property
+    def days(self) -> List[Dict[str, Any]]:
+        return self.state["days"]
+
+    def add(self, time: Optional[float], observation: Optional[Dict[str, Any]],
+            action: Optional[Dict[str, Any]], reward: Optional[float]):
+        if time is None:
+            return
+        day = int(time // SECONDS_PER_DAY)
+        current = self.state["current"]
+        if current is not None and current["day"] != day:
+            self.days.append(self._close(current))
+            current = None
+        if current is None:
+            current = self.state["current"] = {"day": day, "steps": 0, "reward_sum": 0.0,
+                                               "observations": {}, "actions": {}}
+        current["steps"] += 1
+        current["reward_sum"] += reward if _is_number(reward) else 0.0
+        _accumulate(current["observations"], observation, self.keep_point)
+        _accumulate(current["actions"], action, lambda name: True)
+
+    @staticmethod
+    def _close(current: Dict[str, Any]) -> Dict[str, Any]:
+        return {"day": current["day"], "steps": current["steps"], "reward_sum": current["reward_sum"],
+                "observations": _finalize(current["observations"]), "actions": _finalize(current["actions"])}
+
+    def recent(self, num_days: int) -> List[Dict[str, Any]]:
+        """最近 num_days 个已结束的模拟日。(The last `num_days` completed simulated days.)"""
+        return self.days[-num_days:] if num_days > 0 else []
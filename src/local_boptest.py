@@ -0,0 +1,349 @@
+"""
+本地 BOPTEST 替身 (Local BOPTEST stand-in)。
+
+一个进程内的单区域 RC 热模型，提供与 `src.boptest_client` 相同的函数接口
+(select_testcase / set_step / initialize / advance / get_kpis / advance_and_get_feedback /
+get_forecast / get_scenario / get_inputs / stop)，返回与 bestest_air 测试案例同名的测点和 KPI。
+它不追求物理精度，只用于在没有模拟器的情况下运行、测试和压测控制循环的管道代码。
+
+An in-process single-zone RC thermal model exposing the same function interface as
+`src.boptest_client` and returning bestest_air-style points and KPIs. It is not meant to be
+physically accurate; it exists to run, test and benchmark the loop plumbing without a simulator.
+"""
+import copy
+import math
+import uuid
+import logging
+from typing import Optional, Dict, Any, List
+
+from .core.tracing import traced
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- 模型参数 (Model parameters, loosely sized after bestest_air) ---
+FLOOR_AREA_M2 = 48.0
+THERMAL_CAPACITY_J_K = 8.0e6
+UA_W_K = 60.0
+SOLAR_GAIN_M2 = 3.0
+INTERNAL_GAIN_OCCUPIED_W = 500.0
+INTERNAL_GAIN_UNOCCUPIED_W = 80.0
+MAX_HEATING_W = 5000.0
+MAX_COOLING_W = 5000.0
+CONTROLLER_GAIN_W_K = 2500.0
+COOLING_COP = 3.0
+HEATING_EFFICIENCY = 0.9
+FAN_NOMINAL_W = 150.0
+INTERNAL_DT = 60.0
+
+# BOPTEST bestest_air 中的舒适区间与时间表 (Comfort bands and schedule as in bestest_air)
+OCCUPIED_HOURS = (8, 18)
+COMFORT_OCCUPIED_K = (294.15, 297.15)
+COMFORT_UNOCCUPIED_K = (288.15, 303.15)
+CO2_OUTDOOR_PPM = 400.0
+
+# 可被覆盖的输入及其默认值 (Overwritable inputs and their defaults)
+DEFAULT_INPUTS = {
+    "con_oveTSetCoo_u": None,
+    "con_oveTSetHea_u": None,
+    "fcu_oveFan_u": 1.0,
+    "fcu_oveTSup_u": 291.15,
+}
+# 输入的取值范围 (最小值, 最大值, 单位, 描述) (Input ranges: minimum, maximum, unit, description)
+INPUT_RANGES = {
+    "con_oveTSetCoo_u": (278.15, 308.15, "K", "Zone temperature setpoint for cooling"),
+    "con_oveTSetHea_u": (278.15, 308.15, "K", "Zone temperature setpoint for heating"),
+    "fcu_oveFan_u": (0.0, 1.0, "1", "Fan control signal as air mass flow rate normalized to the design air mass flow rate"),
+    "fcu_oveTSup_u": (285.15, 313.15, "K", "Supply air temperature setpoint"),
+}
+
+def outdoor_temperature(time_seconds: float) -> float:
+    """确定性的室外干球温度曲线 (K)。(Deterministic outdoor dry-bulb temperature in K.)"""
+    day_of_year = time_seconds / 86400.0
+    seasonal = 10.0 * math.cos(2 * math.pi * (day_of_year - 200) / 365.0)
+    diurnal = 5.0 * math.sin(2 * math.pi * (time_seconds % 86400 / 86400.0 - 0.375))
+    return 283.15 + seasonal + diurnal
+
+
+def global_horizontal_irradiance(time_seconds: float) -> float:
+    """确定性的水平总辐射 (W/m2)。(Deterministic global horizontal irradiance in W/m2.)"""
+    hour = (time_seconds % 86400) / 3600.0
+    if hour < 6 or hour > 18:
+        return 0.0
+    return 700.0 * math.sin(math.pi * (hour - 6) / 12.0)
+
+
+def electricity_price(time_seconds: float) -> float:
+    """与 BOPTEST 动态电价形状相似的分时电价。(A time-of-use price shaped like the BOPTEST dynamic price.)"""
+    hour = (time_seconds % 86400) / 3600.0
+    if 12 <= hour < 19:
+        return 0.13814
+    if 6 <= hour < 12 or 19 <= hour < 22:
+        return 0.08420
+    return 0.04440
+
+
+def is_occupied(time_seconds: float) -> bool:
+    hour = (time_seconds % 86400) / 3600.0
+    return OCCUPIED_HOURS[0] <= hour < OCCUPIED_HOURS[1]
+
+
+FORECAST_FUNCTIONS = {
+    "TDryBul": outdoor_temperature,
+    "HGloHor": global_horizontal_irradiance,
+    "PriceElectricPowerDynamic": electricity_price,
+    "LowerSetp[1]": lambda t: COMFORT_OCCUPIED_K[0] if is_occupied(t) else COMFORT_UNOCCUPIED_K[0],
+    "UpperSetp[1]": lambda t: COMFORT_OCCUPIED_K[1] if is_occupied(t) else COMFORT_UNOCCUPIED_K[1],
+}
+
+
+class _TestInstance:
+    """单个测试实例的可序列化状态。(Picklable state of a single test instance.)"""
+
+    def __init__(self, testcase_name: str):
+        self.testcase_name = testcase_name
+        self.step = 3600.0
+        self.time = 0.0
+        self.start_time = 0.0
+        self.t_zone = 295.15
+        self.co2 = 450.0
+        self.inputs: Dict[str, Any] = {}
+        self.last_power = {"heating": 0.0, "cooling": 0.0, "fan": 0.0}
+        self.kpi_acc = {"energy_j": 0.0, "cost": 0.0, "tdis_kh": 0.0, "idis_ppmh": 0.0}
+
+    def effective_input(self, name: str):
+        # 与 BOPTEST 一致：只有 *_activate 为 1 时覆盖值才生效
+        # As in BOPTEST, an override only takes effect when its *_activate flag is 1
+        base = name[:-2]
+        if self.inputs.get(f"{base}_activate") in (1, 1.0, True) and name in self.inputs:
+            return self.inputs[name]
+        return DEFAULT_INPUTS.get(name)
+
+    def integrate(self, duration: float):
+        remaining = duration
+        while remaining > 1e-9:
+            dt = min(INTERNAL_DT, remaining)
+            self._substep(dt)
+            remaining -= dt
+
+    def _substep(self, dt: float):
+        t = self.time
+        occupied = is_occupied(t)
+        t_out = outdoor_temperature(t)
+        lower, upper = COMFORT_OCCUPIED_K if occupied else COMFORT_UNOCCUPIED_K
+        setpoint_heating = self.effective_input("con_oveTSetHea_u") or lower
+        setpoint_cooling = self.effective_input("con_oveTSetCoo_u") or upper
+        fan = min(1.0, max(0.0, float(self.effective_input("fcu_oveFan_u"))))
+
+        q_heating = min(MAX_HEATING_W, max(0.0, CONTROLLER_GAIN_W_K * (setpoint_heating - self.t_zone)))
+        q_cooling = min(MAX_COOLING_W * fan, max(0.0, CONTROLLER_GAIN_W_K * (self.t_zone - setpoint_cooling)))
+        q_internal = INTERNAL_GAIN_OCCUPIED_W if occupied else INTERNAL_GAIN_UNOCCUPIED_W
+        q_solar = SOLAR_GAIN_M2 * global_horizontal_irradiance(t)
+        q_net = UA_W_K * (t_out - self.t_zone) + q_solar + q_internal + q_heating - q_cooling
+        self.t_zone += q_net * dt / THERMAL_CAPACITY_J_K
+
+        p_heating = q_heating / HEATING_EFFICIENCY
+        p_cooling = q_cooling / COOLING_COP
+        p_fan = FAN_NOMINAL_W * fan ** 3 if (q_heating > 0 or q_cooling > 0) else 0.0
+        self.last_power = {"heating": p_heating, "cooling": p_cooling, "fan": p_fan}
+
+        people = 2.0 if occupied else 0.0
+        self.co2 += dt * (people * 0.005 - 0.0002 * (self.co2 - CO2_OUTDOOR_PPM))
+
+        total_power = p_heating + p_cooling + p_fan
+        self.kpi_acc["energy_j"] += total_power * dt
+        self.kpi_acc["cost"] += electricity_price(t) * total_power * dt / 3.6e6
+        self.kpi_acc["tdis_kh"] += (max(0.0, lower - self.t_zone) + max(0.0, self.t_zone - upper)) * dt / 3600.0
+        self.kpi_acc["idis_ppmh"] += max(0.0, self.co2 - (CO2_OUTDOOR_PPM + 700.0)) * dt / 3600.0
+        self.time += dt
+
+    def measurements(self) -> Dict[str, Any]:
+        t = self.time
+        t_out = outdoor_temperature(t)
+        ghi = global_horizontal_irradiance(t)
+        hour_angle = 2 * math.pi * ((t % 86400) / 86400.0 - 0.5)
+        payload = {
+            "time": t,
+            "fcu_reaFloSup_y": 0.55 * self.effective_input("fcu_oveFan_u"),
+            "fcu_reaPCoo_y": self.last_power["cooling"],
+            "fcu_reaPFan_y": self.last_power["fan"],
+            "fcu_reaPHea_y": self.last_power["heating"],
+            "zon_reaCO2RooAir_y": self.co2,
+            "zon_reaPLig_y": 56.64 if is_occupied(t) else 0.0,
+            "zon_reaPPlu_y": 25.92 if is_occupied(t) else 5.4,
+            "zon_reaTRooAir_y": self.t_zone,
+        }
+        weather = {
+            "zon_weaSta_reaWeaCeiHei_y": 20000.0, "zon_weaSta_reaWeaCloTim_y": t,
+            "zon_weaSta_reaWeaHDifHor_y": 0.3 * ghi, "zon_weaSta_reaWeaHDirNor_y": 0.7 * ghi,
+            "zon_weaSta_reaWeaHGloHor_y": ghi, "zon_weaSta_reaWeaHHorIR_y": 300.0,
+            "zon_weaSta_reaWeaLat_y": 0.6946, "zon_weaSta_reaWeaLon_y": -1.8294,
+            "zon_weaSta_reaWeaNOpa_y": 0.5, "zon_weaSta_reaWeaNTot_y": 0.5,
+            "zon_weaSta_reaWeaPAtm_y": 101325.0, "zon_weaSta_reaWeaRelHum_y": 0.6,
+            "zon_weaSta_reaWeaSolAlt_y": max(0.0, math.cos(hour_angle)) * 0.8,
+            "zon_weaSta_reaWeaSolDec_y": -0.38, "zon_weaSta_reaWeaSolHouAng_y": hour_angle,
+            "zon_weaSta_reaWeaSolTim_y": t, "zon_weaSta_reaWeaSolZen_y": 1.5708 - max(0.0, math.cos(hour_angle)) * 0.8,
+            "zon_weaSta_reaWeaTBlaSky_y": t_out - 15.0, "zon_weaSta_reaWeaTDewPoi_y": t_out - 5.0,
+            "zon_weaSta_reaWeaTDryBul_y": t_out, "zon_weaSta_reaWeaTWetBul_y": t_out - 2.0,
+            "zon_weaSta_reaWeaWinDir_y": 3.1, "zon_weaSta_reaWeaWinSpe_y": 3.5,
+        }
+        payload.update(weather)
+        for name in ("con_oveTSetCoo", "con_oveTSetHea", "fcu_oveFan", "fcu_oveTSup"):
+            payload[f"{name}_activate"] = self.inputs.get(f"{name}_activate", 0)
+            payload[f"{name}_u"] = self.effective_input(f"{name}_u") or 0.0
+        return payload
+
+    def kpis(self) -> Dict[str, Any]:
+        energy_kwh_m2 = self.kpi_acc["energy_j"] / 3.6e6 / FLOOR_AREA_M2
+        elapsed = max(1.0, self.time - self.start_time)
+        return {
+            "tdis_tot": self.kpi_acc["tdis_kh"],
+            "idis_tot": self.kpi_acc["idis_ppmh"],
+            "ener_tot": energy_kwh_m2,
+            "cost_tot": self.kpi_acc["cost"] / FLOOR_AREA_M2,
+            "emis_tot": energy_kwh_m2 * 0.167,
+            "pele_tot": energy_kwh_m2 / max(elapsed / 3600.0, 1.0),
+            "pgas_tot": 0.0,
+            "pdih_tot": None,
+            "time_rat": 0.0,
+        }
+
+
+def rollout(state: _TestInstance, control_inputs: Dict[str, Any], steps: int) -> List[Dict[str, Any]]:
+    """
+    在一个实例副本上保持同一控制输入推进 steps 步，返回推进前及每步之后的 KPI (共 steps + 1 个)。
+    Advances a copy of an instance `steps` times with the same control inputs and returns the KPIs
+    before and after every step (steps + 1 entries). Module-level so that process pools can pickle it.
+    """
+    kpis = [state.kpis()]
+    for _ in range(steps):
+        state.inputs = dict(control_inputs or {})
+        state.integrate(state.step)
+        kpis.append(state.kpis())
+    return kpis
+
+
+class LocalBoptest:
+    """
+    一个可以同时托管多个测试实例的本地模拟器，方法签名与 `src.boptest_client` 中的函数一致。
+    A local simulator hosting several test instances, with methods mirroring `src.boptest_client`.
+    """
+
+    def __init__(self):
+        self._instances: Dict[str, _TestInstance] = {}
+
+    def _get(self, testid: str) -> Optional[_TestInstance]:
+        instance = self._instances.get(testid)
+        if instance is None:
+            logging.error(f"Unknown local testid: {testid}")
+        return instance
+
+    def snapshot(self, testid: str) -> Optional[_TestInstance]:
+        """一个实例状态的独立副本，用于分叉评估。(An independent copy of an instance's state, for forked evaluation.)"""
+        instance = self._get(testid)
+        return copy.deepcopy(instance) if instance else None
+
+    @traced("boptest.select_testcase")
+    def select_testcase(self, testcase_name: str) -> Optional[str]:
+        testid = str(uuid.uuid4())
+        self._instances[testid] = _TestInstance(testcase_name)
+        return testid
+
+    @traced("boptest.set_step")
+    def set_step(self, testid: str, step: int) -> Optional[Dict[str, Any]]:
+        instance = self._get(testid)
+        if instance is None:
+            return None
+        instance.step = float(step)
+        return {"step": step}
+
+    @traced("boptest.initialize")
+    def initialize(self, testid: str, start_time: int, warmup_period: int) -> Optional[Dict[str, Any]]:
+        instance = self._get(testid)
+        if instance is None:
+            return None
+        instance.time = float(start_time) - float(warmup_period)
+        instance.inputs = {}
+        instance.integrate(float(warmup_period))
+        instance.start_time = instance.time
+        instance.kpi_acc = {key: 0.0 for key in instance.kpi_acc}
+        return instance.measurements()
+
+    @traced("boptest.advance")
+    def advance(self, testid: str, control_inputs: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        instance = self._get(testid)
+        if instance is None:
+            return None
+        # BOPTEST 在每次 advance 时重新应用本次提供的覆盖值
+        # BOPTEST re-applies the overrides supplied with each advance call
+        instance.inputs = dict(control_inputs or {})
+        instance.integrate(instance.step)
+        return instance.measurements()
+
+    @traced("boptest.get_kpis")
+    def get_kpis(self, testid: str) -> Optional[Dict[str, Any]]:
+        instance = self._get(testid)
+        return instance.kpis() if instance else None
+
+    @traced("boptest.advance_and_get_feedback")
+    def advance_and_get_feedback(self, testid: str, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        new_state = self.advance(testid, action)
+        if new_state is None:
+            return None
+        return {"observation": new_state, "kpis": self.get_kpis(testid) or {}}
+
+    @traced("boptest.get_forecast")
+    def get_forecast(self, testid: str, point_names: List[str], horizon: int, interval: int) -> Optional[Dict[str, Any]]:
+        instance = self._get(testid)
+        if instance is None:
+            return None
+        times = [instance.time + k * interval for k in range(int(horizon // interval) + 1)]
+        payload: Dict[str, Any] = {"time": times}
+        for point in point_names:
+            func = FORECAST_FUNCTIONS.get(point)
+            payload[point] = [func(t) for t in times] if func else [0.0] * len(times)
+        return payload
+
+    @traced("boptest.get_scenario")
+    def get_scenario(self, testid: str) -> Optional[Dict[str, Any]]:
+        return {"electricity_price": "dynamic", "time_period": None} if self._get(testid) else None
+
+    @traced("boptest.get_inputs")
+    def get_inputs(self, testid: str) -> Optional[Dict[str, Any]]:
+        if self._get(testid) is None:
+            return None
+        inputs = {}
+        for name, (low, high, unit, description) in INPUT_RANGES.items():
+            inputs[name] = {"Description": description, "Minimum": low, "Maximum": high, "Unit": unit}
+            inputs[name[:-2] + "_activate"] = {"Description": f"Activation for {name}", "Minimum": 0,
+                                               "Maximum": 1, "Unit": None}
+        return inputs
+
+    @traced("boptest.stop")
+    def stop(self, testid: str) -> Optional[Dict[str, Any]]:
+        self._instances.pop(testid, None)
+        return {"status": "success", "message": "stop signal sent"}
+
+
+CLIENT_FUNCTIONS = ("select_testcase", "set_step", "initialize", "advance", "get_kpis",
+                    "advance_and_get_feedback", "get_forecast", "get_scenario", "get_inputs", "stop")
+
+
+def bind_local_boptest(module, simulator: Optional[LocalBoptest] = None) -> LocalBoptest:
+    """
+    将某个模块中从 `src.boptest_client` 导入的函数替换为本地模拟器的方法。
+    Rebinds the `src.boptest_client` functions a module imported to the local simulator's methods.
+
+    Args:
+        module: 导入了客户端函数的模块 (例如 main)。
+                The module that imported the client functions (e.g. main).
+        simulator (Optional[LocalBoptest]): 要使用的模拟器，默认新建一个。
+                                            The simulator to use; a new one by default.
+
+    Returns:
+        LocalBoptest: 被绑定的模拟器实例。(The bound simulator.)
+    """
+    simulator = simulator or LocalBoptest()
+    for name in CLIENT_FUNCTIONS:
+        if hasattr(module, name):
+            setattr(module, name, getattr(simulator, name))
+    return simulator
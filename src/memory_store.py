@@ -1,18 +1,121 @@
 import os
 import json
+import hashlib
 import logging
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
 from .config import OUTPUT_DATA_DIR
+from .core.tracing import traced
+from .experience import ExperienceHistory, ExperienceStep
+from .history_summary import DailyAggregator, SECONDS_PER_DAY, append_spill, read_spill, truncate_spill
+from .point_registry import PointRegistry
+from .utils import convert_seconds_to_datetime_string
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# 提示中的历史只包含这些字段；instruction / llm_input / llm_thought 只存储不发送
+# Prompt history carries only these fields; instruction / llm_input / llm_thought are stored, never sent
+PROMPT_HISTORY_FIELDS = ("timestep", "time", "observation", "action", "reward", "kpis")
+
+# --- 内容寻址的字符串驻留 (Content-addressed string interning) ---
+# 每个不同的提示或静态文本块只在该运行的 "strings" 表中存储一次，步骤记录中用哈希引用它：
+#   整段驻留: {"$ref": "<hash>"}
+#   分块驻留: {"$blocks": ["短文本", {"$ref": "<hash>"}, ...]}，各块以空行连接
+# Each distinct prompt or static block is stored once in the run's "strings" table and referenced
+# by hash from the step records, either whole ({"$ref": h}) or as blank-line separated blocks.
+INTERN_WHOLE_FIELDS = ("instruction",)
+INTERN_BLOCK_FIELDS = ("llm_input",)
+BLOCK_SEPARATOR = "\n\n"
+# 短于此长度的块直接内联 (blocks shorter than this are stored inline)
+MIN_INTERN_CHARS = 64
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def intern_text(strings: Dict[str, str], text: str) -> str:
+    """将文本放入字符串表，返回其哈希。(Puts the text into the string table and returns its hash.)"""
+    key = _content_hash(text)
+    while key in strings and strings[key] != text:  # 哈希前缀冲突时加长 (lengthen on a prefix collision)
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:len(key) + 8]
+    strings[key] = text
+    return key
+
+
+def resolve_value(value: Any, strings: Dict[str, str]) -> Any:
+    """将一个驻留引用还原为原文；其他值原样返回。(Resolves an interned reference; other values pass through.)"""
+    if isinstance(value, dict) and len(value) == 1:
+        if "$ref" in value:
+            return strings[value["$ref"]]
+        if "$blocks" in value:
+            return BLOCK_SEPARATOR.join(part if isinstance(part, str) else strings[part["$ref"]]
+                                        for part in value["$blocks"])
+    return value
+
+
+def resolve_step(step: Dict[str, Any], strings: Dict[str, str]) -> Dict[str, Any]:
+    """返回还原了所有驻留字段的步骤记录副本。(Returns a copy of a step with every interned field resolved.)"""
+    return {key: resolve_value(value, strings) for key, value in step.items()}
+
+
+def _refs(value: Any) -> List[str]:
+    if isinstance(value, dict):
+        if "$ref" in value:
+            return [value["$ref"]]
+        return [part["$ref"] for part in value.get("$blocks", []) if isinstance(part, dict)]
+    return []
+
+
+def spilled_records(testcase_data: Dict[str, Any], base_dir: str) -> List[Dict[str, Any]]:
+    """读取一次运行溢出到磁盘的步骤。(Reads the steps a run spilled to disk.)"""
+    spill = testcase_data.get("spill") or {}
+    if not spill.get("steps"):
+        return []
+    return list(read_spill(os.path.join(base_dir, spill["file"]), spill["steps"]))
+
+
+def expand_memories(all_memories: Dict[str, Dict[str, Any]], base_dir: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    将记忆文件内容展开为旧格式 (无字符串表，每条记录带完整文本)。给出 base_dir (记忆文件所在目录) 时，
+    溢出到磁盘的步骤也会被并入历史。
+    Expands memory-file content into the legacy format (no string table, full text in every record).
+    With base_dir (the memory file's directory), steps spilled to disk are merged back into the history.
+    """
+    expanded = {}
+    for testid, testcase_data in all_memories.items():
+        strings = testcase_data.get("strings") or {}
+        run = {key: value for key, value in testcase_data.items() if key not in ("strings", "spill")}
+        spilled = spilled_records(testcase_data, base_dir) if base_dir is not None else []
+        run["history"] = spilled + [resolve_step(step, strings) for step in testcase_data.get("history", [])]
+        expanded[testid] = run
+    return expanded
+
+
 class MemoryStore:
-    """负责管理测试案例的经验数据。"""
-    def __init__(self, testid: str, filename: str = "memory_store.json"):
+    """
+    负责管理测试案例的经验数据。
+    如果提供了观测点注册表，观测值在存储前会被投影 (丢弃 drop 类别的点)。
+    历史保存在紧凑的 ExperienceHistory 中，JSON 形式只在保存和导出时生成。
+    Manages the experience data of a test case. With a point registry, observations are
+    projected before storage (drop-class points are discarded). The history is held in a
+    compact ExperienceHistory; its JSON shape is only materialised for saving and export.
+
+    设置 hot_steps 后历史是分层的 (见 src/history_summary.py)：只有最近的 hot_steps 个步骤留在内存中，
+    更早的步骤每累积 spill_chunk 个就溢出到磁盘；每日汇总始终可用。
+    With hot_steps the history is tiered (see src/history_summary.py): only the last hot_steps steps
+    stay in memory, older ones spill to disk every spill_chunk steps, and daily aggregates stay available.
+    """
+    def __init__(self, testid: str, filename: str = "memory_store.json",
+                 point_registry: Optional[PointRegistry] = None,
+                 hot_steps: Optional[int] = None, spill_chunk: int = 48):
         if not testid:
             raise ValueError("必须提供一个有效的testid来初始化MemoryStore。")
         self.testid = testid
+        self.point_registry = point_registry
         self.filepath = os.path.join(OUTPUT_DATA_DIR, filename)
         self._all_memories = self._load_all_memories()
 
@@ -21,8 +124,38 @@ class MemoryStore:
             "history": [],
             "reward_state": {"last_objective_integrand": None} # 【新增】: 初始化奖励状态
         })
-        self.current_run_history = self.testcase_data["history"]
-        logging.info(f"MemoryStore initialized for testid: {self.testid}. Found {len(self.current_run_history)} records.")
+        # 列表形式的历史只在磁盘上存在 (the list-shaped history only exists on disk)
+        self.history = ExperienceHistory(self.testcase_data.pop("history", None) or [])
+        # 旧格式的文件没有字符串表，其中的文本照常可读 (legacy files have no table; their text reads as-is)
+        self.strings: Dict[str, str] = self.testcase_data.setdefault("strings", {})
+
+        if hot_steps is not None and hot_steps < 2:
+            raise ValueError("hot_steps must keep at least the last two steps in memory.")
+        self.hot_steps = hot_steps
+        self.spill_chunk = max(1, spill_chunk)
+        spill = self.testcase_data.get("spill") or {}
+        self.spilled_steps: int = spill.get("steps", 0)
+        stem = os.path.splitext(os.path.basename(self.filepath))[0]
+        self.spill_path = os.path.join(os.path.dirname(self.filepath), spill.get("file") or f"{stem}.{testid}.history.jsonl")
+        truncate_spill(self.spill_path, self.spilled_steps)
+        self.aggregator = DailyAggregator(self.testcase_data.setdefault("aggregates", {}), self._is_aggregated)
+        logging.info(f"MemoryStore initialized for testid: {self.testid}. Found {self.spilled_steps + len(self.history)} records.")
+
+    def _is_aggregated(self, name: str) -> bool:
+        # 没有注册表时不汇总观测点，只汇总动作与奖励 (without a registry only actions and rewards are aggregated)
+        return self.point_registry is not None and self.point_registry.is_aggregated(name)
+
+    @property
+    def current_run_history(self) -> ExperienceHistory:
+        """兼容旧代码：按下标访问返回 JSON 形式的 dict。(Compatibility view; indexing returns JSON-shaped dicts.)"""
+        return self.history
+
+    def latest_step(self) -> Optional[ExperienceStep]:
+        return self.history.latest()
+
+    def window(self, point_name: str, n: Optional[int] = None) -> np.ndarray:
+        """观测点最近 n 个存储值的零拷贝视图。(A zero-copy view of the last n stored values of a point.)"""
+        return self.history.window(point_name, n)
 
     def _load_all_memories(self) -> Dict[str, Dict[str, Any]]:
         if os.path.exists(self.filepath):
@@ -33,22 +166,109 @@ class MemoryStore:
                 return {}
         return {}
 
+    @property
+    def run_meta(self) -> Dict[str, Any]:
+        """
+        断点续跑所需的运行元数据 (运行配置、状态、BOPTEST testid)；旧文件中为空。
+        Run metadata needed to resume (run config, status, BOPTEST testid); empty in legacy files.
+        """
+        return self.testcase_data.get("run_meta") or {}
+
+    def update_run_meta(self, **fields: Any):
+        self.testcase_data.setdefault("run_meta", {}).update(fields)
+
+    def _hot_completed(self) -> int:
+        return next((i for i, step in enumerate(self.history.steps) if step.action is None), len(self.history))
+
+    def completed_steps(self) -> int:
+        """已执行动作的前导步骤数 (含已溢出的步骤)。(Leading steps whose action was executed, spilled ones included.)"""
+        return self.spilled_steps + self._hot_completed()
+
+    def trim_incomplete(self) -> int:
+        """
+        丢弃最后一个未完成步骤之后的记录，使历史以待决策的步骤结尾；返回已完成的步骤数。
+        Drops the records after the first incomplete step so the history ends with the step awaiting
+        a decision; returns the number of completed steps.
+        """
+        hot_completed = self._hot_completed()
+        if hot_completed < len(self.history) - 1:
+            logging.warning(f"Dropping {len(self.history) - hot_completed - 1} records after the last complete step.")
+            self.history.truncate(hot_completed + 1)
+        return self.spilled_steps + hot_completed
+
+    def full_history(self) -> ExperienceHistory:
+        """
+        包含溢出步骤的完整历史 (用于重放等离线用途；会把溢出文件读入内存)。
+        The complete history including spilled steps (for replay and other offline uses; reads the spill file).
+        """
+        if not self.spilled_steps:
+            return self.history
+        records = list(read_spill(self.spill_path, self.spilled_steps))
+        return ExperienceHistory(records + self.history.to_list())
+
     def add_static_info(self, static_data: Dict[str, Any]):
         self.testcase_data["static_info"] = static_data
 
     def add_initial_state(self, initial_state: Dict[str, Any]):
-        if any(step.get('timestep') == 0 for step in self.current_run_history):
+        if self.spilled_steps or any(step.timestep == 0 for step in self.history.steps):
             return
         time = initial_state.pop('time', 0.0)
-        experience_step = {
-            "timestep": 0, "time": time, "observation": initial_state,
-            "instruction": None, "llm_input": None, "llm_thought": None,
-            "action": None, "reward": 0.0, "kpis": None # 初始奖励为0
-        }
-        self.current_run_history.append(experience_step)
+        self.history.append({
+            "timestep": 0, "time": time, "observation": self._project(initial_state),
+            "reward": 0.0  # 初始奖励为0
+        })
+
+    def sync_latest_observation(self, measurements: Dict[str, Any]):
+        """
+        用模拟器的当前测量值更新待决策的步骤；若最后一步已完成，则追加一个新步骤。
+        Refreshes the step awaiting a decision with the simulator's current measurements, or appends
+        a new step if the last one is already complete.
+        """
+        measurements = dict(measurements)
+        time = measurements.pop('time', 0.0)
+        latest = self.history.latest()
+        if latest.action is None:
+            self.history.update_latest({"time": time, "observation": self._project(measurements)})
+        else:
+            self.add_new_step(new_observation=measurements, new_time=time)
+
+    def _project(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        if self.point_registry is None:
+            return observation
+        return self.point_registry.project_for_storage(observation)
+
+    def _intern_fields(self, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        interned = dict(update_data)
+        for key in INTERN_WHOLE_FIELDS:
+            value = interned.get(key)
+            if isinstance(value, str) and len(value) >= MIN_INTERN_CHARS:
+                interned[key] = {"$ref": intern_text(self.strings, value)}
+        for key in INTERN_BLOCK_FIELDS:
+            value = interned.get(key)
+            if isinstance(value, str) and len(value) >= MIN_INTERN_CHARS:
+                interned[key] = {"$blocks": [
+                    {"$ref": intern_text(self.strings, block)} if len(block) >= MIN_INTERN_CHARS else block
+                    for block in value.split(BLOCK_SEPARATOR)
+                ]}
+        return interned
 
     def get_recent_history(self, num_steps: int) -> list:
-        return self.current_run_history[-num_steps:]
+        """返回最近的步骤记录 (驻留文本已还原)。(Returns the recent steps with interned text resolved.)"""
+        return [resolve_step(step.to_dict(), self.strings) for step in self.history.steps[-num_steps:]]
+
+    def get_prompt_history(self, num_steps: int) -> list:
+        """
+        返回用于提示的最近历史：只保留 PROMPT_HISTORY_FIELDS，观测值只保留 prompt 类别的点 (已换算、取整)。
+        Returns the recent history for prompts: only PROMPT_HISTORY_FIELDS, and only the prompt-class
+        points of each observation (converted and rounded).
+        """
+        history = []
+        for step in self.get_recent_history(num_steps):
+            entry = {key: step.get(key) for key in PROMPT_HISTORY_FIELDS}
+            if self.point_registry is not None and entry["observation"]:
+                entry["observation"] = self.point_registry.project_for_prompt(entry["observation"])
+            history.append(entry)
+        return history
 
     def get_last_reward(self) -> float:
         """
@@ -57,13 +277,13 @@ class MemoryStore:
         """
         # 如果历史记录少于2条，意味着还没有一个“已完成”的上一步。
         # If there are less than 2 entries, there's no "previous completed" step yet.
-        if len(self.current_run_history) < 2:
+        if len(self.history) < 2:
             return 0.0
 
         # 返回倒数第二个条目（即上一个完整步骤）的奖励。
         # Return the reward from the second-to-last entry (the last completed step).
-        previous_step = self.current_run_history[-2]
-        return previous_step.get("reward", 0.0)
+        previous_reward = self.history.steps[-2].reward
+        return 0.0 if previous_reward is None else previous_reward
 
     def get_last_objective_integrand(self) -> Optional[float]:
         """【新增】获取上一步的目标函数值。"""
@@ -73,24 +293,89 @@ class MemoryStore:
         """【新增】更新目标函数值。"""
         self.testcase_data["reward_state"]["last_objective_integrand"] = value
 
+    def get_last_objective_values(self) -> Dict[str, float]:
+        """上一步所有目标的目标函数值 (见 src/reward_engine.py)。(Last objective values of every objective.)"""
+        return self.testcase_data.get("reward_state", {}).get("last_objective_values") or {}
+
+    def set_last_objective_values(self, values: Dict[str, float]):
+        self.testcase_data.setdefault("reward_state", {})["last_objective_values"] = dict(values)
+
     def update_latest_step(self, update_data: Dict[str, Any]):
-        if not self.current_run_history: return
-        self.current_run_history[-1].update(update_data)
+        if not self.history: return
+        self.history.update_latest(self._intern_fields(update_data))
+        if update_data.get("action") is not None:
+            step = self.history.latest()
+            self.aggregator.add(step.time, step.observation, step.action, step.reward)
+
+    def get_daily_summaries(self, num_days: int) -> List[Dict[str, Any]]:
+        """
+        最近 num_days 个模拟日的汇总 (观测点按提示规则换算、取整)，长度与运行时长无关。
+        Summaries of the last num_days simulated days (points formatted by the prompt rules); their size
+        does not grow with the run length.
+        """
+        summaries = []
+        for day in self.aggregator.recent(num_days):
+            observations = {}
+            for name, stats in day["observations"].items():
+                formatted = {}
+                for stat, value in stats.items():
+                    key, formatted[stat] = (self.point_registry.format_for_prompt(name, value)
+                                            if self.point_registry is not None else (name, value))
+                observations[key] = formatted
+            summaries.append({
+                "date": convert_seconds_to_datetime_string(day["day"] * SECONDS_PER_DAY).rsplit(",", 1)[0],
+                "steps": day["steps"],
+                "reward_sum": round(day["reward_sum"], 4),
+                "observations": observations,
+                "actions": {name: {stat: round(v, 2) for stat, v in stats.items()} for name, stats in day["actions"].items()},
+            })
+        return summaries
 
     def add_new_step(self, new_observation: dict, new_time: float):
-        new_timestep_number = self.current_run_history[-1]['timestep'] + 1
-        experience_step = {
-            "timestep": new_timestep_number, "time": new_time, "observation": new_observation,
-            "instruction": None, "llm_input": None, "llm_thought": None,
-            "action": None, "reward": None, "kpis": None
-        }
-        self.current_run_history.append(experience_step)
+        new_timestep_number = self.history.latest().timestep + 1
+        self.history.append({
+            "timestep": new_timestep_number, "time": new_time, "observation": self._project(new_observation)
+        })
+        self._maybe_spill()
+
+    def _maybe_spill(self):
+        if not self.hot_steps or len(self.history) < self.hot_steps + self.spill_chunk:
+            return
+        count = len(self.history) - self.hot_steps
+        # 溢出的记录自带完整文本；之后清理不再被热窗口引用的字符串
+        # Spilled records carry their full text; strings no longer referenced by the hot window are then dropped
+        append_spill(self.spill_path, [resolve_step(step.to_dict(), self.strings)
+                                       for step in self.history.steps[:count]])
+        self.history.drop_head(count)
+        self.spilled_steps += count
+        self.testcase_data["spill"] = {"file": os.path.basename(self.spill_path), "steps": self.spilled_steps}
+        used = {ref for step in self.history.steps
+                for key in INTERN_WHOLE_FIELDS + INTERN_BLOCK_FIELDS for ref in _refs(getattr(step, key))}
+        for key in [key for key in self.strings if key not in used]:
+            del self.strings[key]
+
+    def _testcase_record(self) -> Dict[str, Any]:
+        return {**self.testcase_data, "history": self.history.to_list()}
 
+    @traced("memory.save")
     def save(self):
-        self._all_memories[self.testid] = self.testcase_data
+        if "run_meta" in self.testcase_data:
+            self.update_run_meta(updated_at=datetime.now().isoformat(timespec="seconds"))
+        self._all_memories[self.testid] = self._testcase_record()
         try:
+            os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
             with open(self.filepath, 'w', encoding='utf-8') as f:
                 json.dump(self._all_memories, f, indent=4, ensure_ascii=False)
             logging.info(f"MemoryStore 已成功保存至 {self.filepath}")
         except IOError as e:
             logging.error(f"写入 {self.filepath} 失败: {e}")
+
+    def export_expanded(self, filepath: str):
+        """
+        以旧格式 (每条记录带完整文本) 导出所有记忆。
+        Exports all memories in the legacy format, with the full text in every record.
+        """
+        self._all_memories[self.testid] = self._testcase_record()
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(expand_memories(self._all_memories, os.path.dirname(self.filepath)), f, indent=4, ensure_ascii=False)
@@ -0,0 +1,233 @@
+"""
+分层控制节奏: LLM 规划设定点时间表，本地执行器逐步执行 (Hierarchical control cadence)。
+
+决策代理一次给出覆盖多个控制步的分段计划 (例如 con_oveTSetCoo_u 或 fcu_oveFan_u 的分段时间表)，
+PlanExecutor 在每个控制步从计划中取出当前动作，不调用LLM。只有在计划到期、观测偏离计划超过
+阈值、或没有可用计划 (例如第一步) 时才重新规划。偏离的参照是计划分段中给出的 "expected"
+观测值；没有给出时，制冷 (制热) 设定点以室温高于 (低于) 设定点的幅度衡量，控制点和室温点由点注册表按后缀解析。
+规划次数、重新规划的原因和LLM调用的减少比例记录在 PlanStats 中，只统计按计划执行或由LLM规划的步；
+由本地策略服务的步不计入。
+
+The decision maker emits a piecewise plan covering several control steps (e.g. a schedule for
+con_oveTSetCoo_u or fcu_oveFan_u). Every control step the PlanExecutor takes the current action
+from the plan without calling the LLM, and re-plans only when the plan expires or the observation
+deviates from it beyond a threshold, or when there is no usable plan (e.g. at the first step).
+Deviation is measured against the "expected" observations a plan segment gives; without them, a cooling
+(heating) setpoint is tracked by how far the zone temperature rises above (falls below) it, with the
+control and zone points resolved by the point registry's suffix match. Plans, re-plan reasons and
+the reduction in LLM calls are tracked in PlanStats over the steps executed from a plan or planned
+by the LLM; steps served by the local policy are left out.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .point_registry import ZONE_TEMPERATURE_SUFFIXES, PointRegistry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 追加到决策输入之后，要求给出分段计划 (appended to the decision input to ask for a piecewise plan)
+PLAN_HINT = (
+    "\n\n[PLAN]:\nInstead of a single action, plan the next {horizon} control steps ({step_hours:g} h each). "
+    "Put a JSON object in <action> of the form "
+    '{{"plan": [{{"steps": 2, "action": {{...}}, "expected": {{"zon_reaTRooAir_y": 297.15}}}}, ...]}}. '
+    "Each segment holds `action` for `steps` control steps; the steps should add up to {horizon}. "
+    "`expected` is optional and gives the observations you expect while the segment is in force; "
+    "the plan is revised early if the building drifts away from them."
+)
+
+# 没有 expected 时用于衡量偏离的 (动作点后缀 -> 观测点候选后缀, 方向)，由点注册表按后缀解析，适用于各测试案例；
+# +1 表示只有观测高于动作值才算偏离，-1 表示只有低于才算
+# (action point suffix -> candidate observed point suffixes, direction) used when a segment has no
+# `expected`, resolved by the point registry's suffix match so that every testcase is covered; +1
+# counts only observations above the action value as deviation, -1 only observations below it
+TRACKED_SETPOINTS = {"oveTSetCoo_u": (ZONE_TEMPERATURE_SUFFIXES, 1),
+                     "oveTSetHea_u": (ZONE_TEMPERATURE_SUFFIXES, -1)}
+
+REPLAN_NONE = "no_plan"
+REPLAN_EXPIRED = "expired"
+REPLAN_DEVIATION = "deviation"
+
+
+@dataclass
+class PlanSegment:
+    steps: int
+    action: Dict[str, Any]
+    expected: Dict[str, float] = field(default_factory=dict)
+
+    def deviation(self, observation: Dict[str, Any], point_registry: PointRegistry) -> Optional[float]:
+        """
+        观测相对本段计划的最大偏离；没有可比较的点时为 None。
+        Largest deviation of an observation from this segment; None when nothing is comparable.
+        """
+        deviations = [abs(observation[name] - value) for name, value in self.expected.items()
+                      if isinstance(observation.get(name), (int, float))]
+        if not self.expected:
+            for point, (observed, direction) in TRACKED_SETPOINTS.items():
+                action_point = point_registry.resolve(point, self.action)
+                observed_point = point_registry.resolve(observed, observation) if action_point else None
+                if observed_point is None:
+                    continue
+                target, value = self.action[action_point], observation[observed_point]
+                if isinstance(target, (int, float)) and isinstance(value, (int, float)):
+                    deviations.append(max(0.0, direction * (value - target)))
+        return max(deviations) if deviations else None
+
+
+@dataclass
+class SetpointPlan:
+    """从 start_step 开始执行的分段计划。(A piecewise plan executed from control step start_step.)"""
+    segments: List[PlanSegment]
+    start_step: int
+
+    def __len__(self) -> int:
+        return sum(segment.steps for segment in self.segments)
+
+    def segment_at(self, offset: int) -> Optional[PlanSegment]:
+        for segment in self.segments:
+            if offset < segment.steps:
+                return segment
+            offset -= segment.steps
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"start_step": self.start_step,
+                "segments": [{"steps": s.steps, "action": s.action, "expected": s.expected} for s in self.segments]}
+
+
+def parse_plan(action: Any, start_step: int, horizon: int) -> Optional[SetpointPlan]:
+    """
+    把决策输出 ({"plan": [...]}、分段列表或单个动作) 转换为计划，截断或延长到 horizon 个控制步。
+    单个动作视为在整个时域内保持。无法解析时返回 None。
+    Turns the decision output ({"plan": [...]}, a segment list or a single action) into a plan,
+    truncated or extended to `horizon` control steps. A single action is held over the whole
+    horizon. Returns None when nothing can be parsed.
+    """
+    raw = action.get("plan") if isinstance(action, dict) and "plan" in action else action
+    if isinstance(raw, dict):
+        raw = [{"steps": horizon, "action": raw}]
+    if not isinstance(raw, list):
+        return None
+    segments, remaining = [], horizon
+    for item in raw:
+        if remaining <= 0:
+            break
+        if not isinstance(item, dict) or not isinstance(item.get("action"), dict):
+            continue
+        try:
+            steps = max(1, int(item.get("steps", 1)))
+        except (TypeError, ValueError):
+            steps = 1
+        expected = {name: float(value) for name, value in (item.get("expected") or {}).items()
+                    if isinstance(value, (int, float)) and not isinstance(value, bool)}
+        segments.append(PlanSegment(min(steps, remaining), item["action"], expected))
+        remaining -= segments[-1].steps
+    if not segments:
+        return None
+    # 计划短于时域时最后一段保持到时域结束 (a short plan holds its last segment to the horizon)
+    segments[-1].steps += max(0, remaining)
+    return SetpointPlan(segments, start_step)
+
+
+@dataclass
+class PlanStats:
+    """
+    分层执行的累计统计；control_steps 只包括按计划执行和由LLM规划的步。
+    Cumulative statistics of hierarchical execution; control_steps only covers steps executed from a
+    plan or planned by the LLM.
+    """
+    control_steps: int = 0
+    plans: int = 0
+    replans: Dict[str, int] = field(default_factory=lambda: {REPLAN_NONE: 0, REPLAN_EXPIRED: 0,
+                                                             REPLAN_DEVIATION: 0})
+    max_deviation: float = 0.0
+
+    @property
+    def llm_call_reduction(self) -> Optional[float]:
+        """相对每步调用LLM减少的比例。(Fraction of LLM decisions saved versus one per control step.)"""
+        # 每次重新规划都是一次LLM决策，包括没有得到可用计划的 (every re-plan is an LLM decision, usable plan or not)
+        return 1.0 - sum(self.replans.values()) / self.control_steps if self.control_steps else None
+
+    @property
+    def steps_per_plan(self) -> Optional[float]:
+        return self.control_steps / self.plans if self.plans else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"control_steps": self.control_steps, "plans": self.plans, "replans": dict(self.replans),
+                "steps_per_plan": self.steps_per_plan, "llm_call_reduction": self.llm_call_reduction,
+                "max_deviation": round(self.max_deviation, 4)}
+
+
+class PlanExecutor:
+    """
+    逐控制步执行当前计划，判断何时需要重新规划。
+    Executes the current plan step by step and decides when to re-plan.
+
+    Args:
+        horizon (int): 每个计划覆盖的控制步数。(Control steps covered by each plan.)
+        deviation_threshold (float): 触发重新规划的偏离阈值 (观测点的单位)。
+                                     Deviation that triggers a re-plan, in the observed point's units.
+        point_registry (Optional[PointRegistry]): 解析跟踪的设定点和观测点；默认只按后缀匹配。
+                                                  Resolves the tracked setpoints and observed points;
+                                                  suffix matching alone by default.
+    """
+
+    def __init__(self, horizon: int, deviation_threshold: float, point_registry: Optional[PointRegistry] = None):
+        self.horizon = horizon
+        self.deviation_threshold = deviation_threshold
+        self.point_registry = point_registry or PointRegistry([], {})
+        self.plan: Optional[SetpointPlan] = None
+        self.stats = PlanStats()
+        # 等待LLM规划时的重新规划原因 (why a re-plan is pending until the LLM plans)
+        self._pending_reason: Optional[str] = None
+
+    def hint(self, control_step: int) -> str:
+        return PLAN_HINT.format(horizon=self.horizon, step_hours=control_step / 3600.0)
+
+    def next_action(self, step: int, observation: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], str]:
+        """
+        返回 (计划中的动作, 说明)；需要重新规划时动作为 None，说明为原因。偏离按产生当前观测的上一段计划衡量。
+        重新规划只在 adopt 时计入统计，这样由本地策略服务的步不会被算作规划步。
+        Returns (the planned action, a note); the action is None when a re-plan is needed and the
+        note is the reason. Deviation is measured against the segment that produced the observation.
+        A re-plan is only counted by `adopt`, so steps the local policy serves are not counted as planning.
+        """
+        if self.plan is None:
+            return None, self._pending_reason or REPLAN_NONE
+        offset = step - self.plan.start_step
+        segment = self.plan.segment_at(offset)
+        if segment is None:
+            return self._replan(REPLAN_EXPIRED)
+        previous = self.plan.segment_at(offset - 1) if offset > 0 else None
+        deviation = previous.deviation(observation, self.point_registry) if previous is not None else None
+        if deviation is not None:
+            self.stats.max_deviation = max(self.stats.max_deviation, deviation)
+            if deviation > self.deviation_threshold:
+                logging.info(f"Plan deviation {deviation:.2f} exceeds {self.deviation_threshold}; re-planning.")
+                return self._replan(REPLAN_DEVIATION)
+        self.stats.control_steps += 1
+        return segment.action, f"plan step {offset + 1} of {len(self.plan)}"
+
+    def _replan(self, reason: str) -> Tuple[None, str]:
+        self.plan = None
+        self._pending_reason = reason
+        return None, reason
+
+    def adopt(self, action_str: Optional[str], step: int) -> Optional[SetpointPlan]:
+        """
+        记录一次LLM规划步并采用决策输出中的计划；没有输出或无法解析时返回 None (该步不执行动作)。
+        Records an LLM planning step and adopts the plan in its decision output; None when there is
+        no output or it cannot be parsed.
+        """
+        self.stats.control_steps += 1
+        self.stats.replans[self._pending_reason or REPLAN_NONE] += 1
+        self._pending_reason = None
+        try:
+            plan = parse_plan(json.loads(action_str), step, self.horizon) if action_str else None
+        except json.JSONDecodeError:
+            plan = None
+        if plan is not None:
+            self.plan = plan
+            self.stats.plans += 1
+        return plan
@@ -0,0 +1,193 @@
+"""
+观测点注册表 (Observation point registry)。
+
+根据静态建筑信息中的 observation_space 和 configs/points_config.yaml 的规则，
+为每个测试案例决定哪些观测点进入提示、哪些只以全精度存储、哪些直接丢弃，
+并为每个类别应用各自的取整和单位换算规则。
+
+Decides, per testcase, which observation points go into prompts, which are only stored at
+full precision and which are dropped, based on the observation_space of the static building
+info and the rules in configs/points_config.yaml. Each class has its own rounding and
+unit-conversion rules.
+"""
+import math
+from fnmatch import fnmatchcase
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Union
+
+from .config import CONFIG_DIR
+from .core.config_loader import load_yaml_file
+
+PROMPT, STORE, DROP = "prompt", "store", "drop"
+POINT_CLASSES = (PROMPT, STORE, DROP)
+
+# 室温点的候选后缀，用于 resolve (candidate suffixes of the zone temperature point, for resolve)
+ZONE_TEMPERATURE_SUFFIXES = ("reaTRooAir_y", "reaTZon_y")
+
+# (源单位, 目标单位) -> 换算函数 ((source unit, target unit) -> conversion)
+UNIT_CONVERSIONS: Dict[tuple, Callable[[float], float]] = {
+    ("K", "degC"): lambda v: v - 273.15,
+    ("rad", "deg"): math.degrees,
+    ("Pa", "kPa"): lambda v: v / 1000.0,
+    ("W", "kW"): lambda v: v / 1000.0,
+    ("s", "h"): lambda v: v / 3600.0,
+}
+
+
+@dataclass(frozen=True)
+class PointSpec:
+    """一个观测点的解析结果。(The resolved description of one observation point.)"""
+    name: str
+    point_class: str
+    unit: Optional[str] = None
+    description: Optional[str] = None
+
+
+def load_points_config() -> Dict[str, Any]:
+    """加载观测点配置文件。 (Loads the point registry configuration file.)"""
+    return load_yaml_file(Path(CONFIG_DIR) / 'points_config.yaml') or {}
+
+
+def _observations_of(static_info: Any) -> List[Dict[str, Any]]:
+    if static_info is None:
+        return []
+    if hasattr(static_info, "model_dump"):  # StaticBuildingData
+        static_info = static_info.model_dump()
+    observation_space = static_info.get("observation_space") or {}
+    return [o for o in observation_space.get("observations") or [] if o.get("name")]
+
+
+class PointRegistry:
+    """
+    Args:
+        observations (List[Dict]): observation_space 中的观测点 (name/unit/description)。
+                                   Points from the observation_space (name/unit/description).
+        config (Dict): points_config.yaml 的内容。(The content of points_config.yaml.)
+        testcase (Optional[str]): 测试案例名，用于选择测试案例专属规则。
+                                  Testcase name, selecting the testcase-specific rules.
+    """
+
+    def __init__(self, observations: List[Dict[str, Any]], config: Dict[str, Any], testcase: Optional[str] = None):
+        self.testcase = testcase
+        self._observations = {o["name"]: o for o in observations}
+        testcase_cfg = (config.get("testcases") or {}).get(testcase or "", {}) or {}
+        self._rules = list(testcase_cfg.get("rules") or []) + list(config.get("rules") or [])
+        self._unit_fallbacks = list(config.get("unit_fallbacks") or [])
+        self._default_class = config.get("default_class", STORE)
+        self._class_rules = config.get("classes") or {}
+        self._aggregate_patterns = list(config.get("aggregate") or [])
+        for rule in self._rules:
+            if rule.get("class") not in POINT_CLASSES:
+                raise ValueError(f"Unknown point class in rule {rule}; expected one of {POINT_CLASSES}.")
+        self._specs: Dict[str, PointSpec] = {}
+        self._resolved: Dict[tuple, Optional[str]] = {}
+
+    @classmethod
+    def from_static_info(cls, static_info: Any, testcase: Optional[str] = None,
+                         config: Optional[Dict[str, Any]] = None) -> "PointRegistry":
+        """
+        由静态建筑信息 (dict 或 StaticBuildingData) 构建注册表。
+        Builds the registry from the static building info (a dict or a StaticBuildingData).
+        """
+        return cls(_observations_of(static_info), config if config is not None else load_points_config(), testcase)
+
+    def _match_observation(self, name: str) -> Optional[Dict[str, Any]]:
+        # 按后缀匹配: zon_weaSta_reaWeaLat_y -> weaSta_reaWeaLat_y -> reaWeaLat_y
+        # Suffix matching: zon_weaSta_reaWeaLat_y -> weaSta_reaWeaLat_y -> reaWeaLat_y
+        parts = name.split("_")
+        for i in range(len(parts) - 1):
+            observation = self._observations.get("_".join(parts[i:]))
+            if observation:
+                return observation
+        return None
+
+    def resolve(self, suffixes: Union[str, Sequence[str]], names: Collection[str]) -> Optional[str]:
+        """
+        names 中按后缀匹配的观测点 (带缓存)，例如 reaWeaTDryBul_y -> zon_weaSta_reaWeaTDryBul_y；
+        不同测试案例的同一物理量前缀不同，名称也可能不同，因此可以按顺序给出多个候选后缀。
+        The point in `names` matching a suffix (cached), e.g. reaWeaTDryBul_y -> zon_weaSta_reaWeaTDryBul_y.
+        Testcases prefix (and sometimes name) the same quantity differently, so several candidate
+        suffixes may be given in order of preference.
+        """
+        key = (suffixes,) if isinstance(suffixes, str) else tuple(suffixes)
+        name = self._resolved.get(key)
+        if name is None or name not in names:
+            name = next((n for suffix in key for n in names if n == suffix or fnmatchcase(n, "*_" + suffix)), None)
+            self._resolved[key] = name
+        return name
+
+    def spec(self, name: str) -> PointSpec:
+        """返回观测点的解析结果 (带缓存)。(Returns the resolved point, cached.)"""
+        spec = self._specs.get(name)
+        if spec is None:
+            observation = self._match_observation(name) or {}
+            unit = observation.get("unit") or next(
+                (r["unit"] for r in self._unit_fallbacks if fnmatchcase(name, r["pattern"])), None)
+            point_class = next((r["class"] for r in self._rules if fnmatchcase(name, r["pattern"])),
+                               self._default_class)
+            spec = PointSpec(name, point_class, unit, observation.get("description"))
+            self._specs[name] = spec
+        return spec
+
+    def _format(self, spec: PointSpec, value: Any):
+        """按类别规则换算单位并取整，返回 (键名, 值)。(Converts and rounds by class; returns (key, value).)"""
+        rules = self._class_rules.get(spec.point_class) or {}
+        unit = spec.unit
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            target = (rules.get("convert") or {}).get(unit)
+            if target and (unit, target) in UNIT_CONVERSIONS:
+                value, unit = UNIT_CONVERSIONS[(unit, target)](value), target
+            if rules.get("round") is not None:
+                value = round(value, rules["round"])
+        return (f"{spec.name} [{unit}]" if unit else spec.name), value
+
+    def is_aggregated(self, name: str) -> bool:
+        """该点是否计入每日汇总 (points_config.yaml 的 aggregate)。(Whether the point is in the daily aggregates.)"""
+        return any(fnmatchcase(name, pattern) for pattern in self._aggregate_patterns)
+
+    def format_for_prompt(self, name: str, value: Any):
+        """按 prompt 类别的规则换算并取整，与点的类别无关。(Formats by the prompt-class rules regardless of class.)"""
+        spec = self.spec(name)
+        return self._format(PointSpec(spec.name, PROMPT, spec.unit, spec.description), value)
+
+    def project_for_storage(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        保留 prompt 和 store 类别的观测点，原始全精度值。
+        Keeps the prompt and store points at full precision.
+        """
+        projected = {}
+        for name, value in observation.items():
+            point_class = self.spec(name).point_class
+            if point_class == DROP:
+                continue
+            # prompt 点的取整只用于提示；store 类别可以配置存储精度 (默认为全精度)
+            # Prompt rounding only applies to prompts; the store class may set a storage precision
+            rounding = (self._class_rules.get(STORE) or {}).get("round") if point_class == STORE else None
+            projected[name] = round(value, rounding) if rounding is not None and isinstance(value, float) else value
+        return projected
+
+    def project_for_prompt(self, observation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        只保留 prompt 类别的观测点，并换算单位、取整；键名附带单位。
+        Keeps only the prompt points, converted and rounded, with the unit in the key.
+        Inactive override signals are omitted.
+        """
+        projected = {}
+        for name, value in observation.items():
+            spec = self.spec(name)
+            # 未激活的覆盖信号 (xxx_activate == 0) 没有意义，不进入提示
+            # An override signal whose xxx_activate flag is 0 is meaningless and is left out
+            if name.endswith("_u") and observation.get(name[:-2] + "_activate") == 0:
+                continue
+            if spec.point_class == PROMPT:
+                key, value = self._format(spec, value)
+                projected[key] = value
+        return projected
+
+    def summary(self, names: List[str]) -> Dict[str, List[str]]:
+        """按类别列出给定的观测点。(Lists the given points by class.)"""
+        grouped: Dict[str, List[str]] = {c: [] for c in POINT_CLASSES}
+        for name in names:
+            grouped[self.spec(name).point_class].append(name)
+        return grouped
@@ -0,0 +1,331 @@
+"""
+蒸馏的本地策略 (Distilled local policy)。
+
+用已有的模仿数据 (记忆文件中已执行的 LLM 决策) 训练一个小的 CPU 模型 (NumPy 岭回归)，在控制循环中
+代替 LLM 给出动作。特征由 step_features 从原始观测点构建，训练和服务使用同一函数。置信门控用训练数据的马氏距离判断当前状态是否在分布内：
+距离超过训练集的分位数阈值、或缺少特征时，该步升级给 LLM。PolicyStats 记录本地服务的比例和节省的延迟。
+
+A small CPU model (NumPy ridge regression) is trained on the existing imitation data (the executed
+LLM decisions in memory files) and serves actions in the control loop instead of the LLM. Features
+are built from the raw observation points by step_features, the same function at training and
+serving time. A confidence gate measures the Mahalanobis distance to the training
+data: beyond a quantile of the training distances, or with a missing feature, the step is escalated
+to the LLM. PolicyStats reports the fraction of steps served locally and the latency saved.
+A policy whose features the live observations do not provide is rejected at the first step.
+
+专家数据集 (llm_expert_data_*.csv) 也是训练来源: 它的 obs_* 状态向量 (含预测和过去的温度) 由专家数据
+脚本构建，因此这样训练的策略由 expert_features 在该脚本的循环中服务，而不是在 main.py 中。
+The expert dataset (llm_expert_data_*.csv) is a training source too: its obs_* state vector (with
+forecasts and past temperatures) is built by the expert-data script, so a policy trained on it is
+served through expert_features in that script's loop rather than in main.py.
+"""
+import os
+import csv
+import json
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .memory_store import expand_memories
+from .point_registry import PROMPT, PointRegistry
+
+TIME_FEATURES = ("time_of_day_sin", "time_of_day_cos")
+# 专家数据集中的动作列与对应的控制点 (the expert dataset's action column and its control point)
+EXPERT_ACTION_COLUMN = "action_llm"
+EXPERT_ACTION_NAME = "fcu_oveFan_u"
+
+
+def time_features(time_seconds: float) -> Dict[str, float]:
+    angle = 2 * math.pi * (time_seconds % 86400) / 86400.0
+    return {"time_of_day_sin": math.sin(angle), "time_of_day_cos": math.cos(angle)}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+
+def step_features(observation: Optional[Dict[str, Any]], time_seconds: Optional[float]) -> Dict[str, float]:
+    """一个记录步骤的特征：数值观测加一天中的时刻。(Features of a step: numeric observations and the time of day.)"""
+    features = {name: float(value) for name, value in (observation or {}).items() if _is_number(value)}
+    if time_seconds is not None:
+        features.update(time_features(time_seconds))
+    return features
+
+
+def expert_features(state_vector: Dict[str, Any]) -> Dict[str, float]:
+    """
+    专家数据脚本的 26 维状态向量的特征，训练和服务使用同一函数。
+    Features of the expert-data script's 26-dim state vector, the same function at training and serving time.
+    """
+    features = {name: float(value) for name, value in state_vector.items()
+                if name.startswith("obs_") and _is_number(value)}
+    features.update(time_features(features.get("obs_time_sec_of_day", 0.0)))
+    return features
+
+
+# --- 数据集 (Datasets) ---
+
+@dataclass
+class Dataset:
+    features: np.ndarray
+    targets: np.ndarray
+    feature_names: List[str]
+    action_names: List[str]
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+
+def _tabulate(rows: List[Tuple[Dict[str, float], Dict[str, float]]],
+              action_names: Optional[Sequence[str]] = None) -> Dataset:
+    if not rows:
+        raise ValueError("No training rows were found.")
+    action_names = list(action_names or sorted(rows[0][1]))
+    rows = [(x, y) for x, y in rows if all(_is_number(y.get(name)) for name in action_names)]
+    if not rows:
+        raise ValueError(f"No training rows carry the actions {action_names}.")
+    # 只保留所有行都有的特征 (only features present in every row are kept)
+    common = set(rows[0][0])
+    for features, _ in rows[1:]:
+        common &= set(features)
+    feature_names = sorted(common)
+    features = np.array([[x[name] for name in feature_names] for x, _ in rows], dtype=float)
+    targets = np.array([[float(y[name]) for name in action_names] for _, y in rows], dtype=float)
+    return Dataset(features, targets, feature_names, action_names)
+
+
+def memory_dataset(paths: Sequence[str], run_keys: Optional[Sequence[str]] = None,
+                   action_names: Optional[Sequence[str]] = None,
+                   point_registry: Optional[PointRegistry] = None) -> Dataset:
+    """
+    记忆文件中已执行的 LLM 决策 -> 数据集。有注册表时只用 prompt 类观测点 (即 LLM 看到的点)。
+    Executed LLM decisions in memory files -> a dataset. With a registry only prompt-class points
+    (what the LLM sees) are used as features.
+    """
+    rows = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            memories = expand_memories(json.load(f), os.path.dirname(os.path.abspath(path)))
+        for key, run in memories.items():
+            if run_keys and not any(key.startswith(prefix) for prefix in run_keys):
+                continue
+            for step in run.get("history", []):
+                action = step.get("action")
+                if not isinstance(action, dict) or step.get("policy"):
+                    continue
+                observation = step.get("observation") or {}
+                if point_registry is not None:
+                    observation = {name: value for name, value in observation.items()
+                                   if point_registry.spec(name).point_class == PROMPT}
+                rows.append((step_features(observation, step.get("time")), action))
+    return _tabulate(rows, action_names)
+
+
+def expert_dataset(paths: Sequence[str]) -> Dataset:
+    """
+    专家数据集的状态向量与 action_llm -> 数据集；由本地策略服务的行 (policy 列非空) 被跳过。
+    The expert dataset's state vector and action_llm -> a dataset; rows served by the local policy
+    (a non-empty policy column) are skipped.
+    """
+    rows = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for record in csv.DictReader(f):
+                if record.get("policy"):
+                    continue
+                features = expert_features({name: float(value) for name, value in record.items()
+                                            if name.startswith("obs_") and value})
+                rows.append((features, {EXPERT_ACTION_NAME: float(record[EXPERT_ACTION_COLUMN])}))
+    return _tabulate(rows, [EXPERT_ACTION_NAME])
+
+
+# --- 模型 (Model) ---
+
+class RidgePolicy:
+    """
+    标准化特征上的多输出岭回归，加上基于马氏距离的置信门控。
+    Multi-output ridge regression on standardized features, with a Mahalanobis-distance confidence gate.
+    """
+
+    def __init__(self, feature_names: List[str], action_names: List[str], mean: np.ndarray, scale: np.ndarray,
+                 coef: np.ndarray, intercept: np.ndarray, precision: np.ndarray, gate_threshold: float,
+                 action_low: np.ndarray, action_high: np.ndarray):
+        self.feature_names = list(feature_names)
+        self.action_names = list(action_names)
+        self.mean, self.scale = mean, scale
+        self.coef, self.intercept = coef, intercept
+        self.precision = precision
+        self.gate_threshold = float(gate_threshold)
+        self.action_low, self.action_high = action_low, action_high
+
+    @classmethod
+    def fit(cls, dataset: Dataset, alpha: float = 1.0, gate_quantile: float = 0.99,
+            min_samples: int = 10) -> "RidgePolicy":
+        """
+        Raises:
+            ValueError: 样本太少或没有可变的特征。(Too few samples or no varying feature.)
+        """
+        if len(dataset) < min_samples:
+            raise ValueError(f"At least {min_samples} training rows are needed, got {len(dataset)}.")
+        std = dataset.features.std(axis=0)
+        keep = std > 1e-9  # 训练中恒定的特征不携带信息 (constant features carry no information)
+        if not keep.any():
+            raise ValueError("Every feature is constant in the training data.")
+        features = dataset.features[:, keep]
+        mean, scale = features.mean(axis=0), std[keep]
+        z = (features - mean) / scale
+        intercept = dataset.targets.mean(axis=0)
+        gram = z.T @ z + alpha * np.eye(z.shape[1])
+        coef = np.linalg.solve(gram, z.T @ (dataset.targets - intercept))
+        # 正则化的协方差逆矩阵，用于马氏距离 (regularized inverse covariance for the Mahalanobis distance)
+        covariance = np.cov(z, rowvar=False).reshape(z.shape[1], z.shape[1])
+        precision = np.linalg.inv(covariance + 1e-3 * np.eye(z.shape[1]))
+        distances = np.sqrt(np.einsum("ij,jk,ik->i", z, precision, z))
+        return cls([n for n, k in zip(dataset.feature_names, keep) if k], dataset.action_names, mean, scale,
+                   coef, intercept, precision, float(np.quantile(distances, gate_quantile)),
+                   dataset.targets.min(axis=0), dataset.targets.max(axis=0))
+
+    def _standardize(self, features: np.ndarray) -> np.ndarray:
+        return (features - self.mean) / self.scale
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """(N, 特征) -> (N, 动作)，裁剪到训练中出现过的范围。(Clipped to the range seen in training.)"""
+        return np.clip(self._standardize(features) @ self.coef + self.intercept, self.action_low, self.action_high)
+
+    def distance(self, features: np.ndarray) -> np.ndarray:
+        z = np.atleast_2d(self._standardize(features))
+        return np.sqrt(np.einsum("ij,jk,ik->i", z, self.precision, z))
+
+    def act(self, features: Dict[str, float], margin: float = 1.0) -> Tuple[Optional[Dict[str, float]], float]:
+        """
+        返回 (动作, 距离)；状态在分布外或缺少特征时动作为 None (应升级给 LLM)。
+        Returns (action, distance); the action is None when the state is out of distribution or a
+        feature is missing, meaning the step should be escalated to the LLM.
+        """
+        if any(name not in features for name in self.feature_names):
+            return None, math.inf
+        x = np.array([features[name] for name in self.feature_names], dtype=float)
+        distance = float(self.distance(x)[0])
+        if distance > self.gate_threshold * margin:
+            return None, distance
+        prediction = self.predict(x[None, :])[0]
+        return {name: round(float(value), 4) for name, value in zip(self.action_names, prediction)}, distance
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(path, feature_names=np.array(self.feature_names), action_names=np.array(self.action_names),
+                 mean=self.mean, scale=self.scale, coef=self.coef, intercept=self.intercept,
+                 precision=self.precision, gate_threshold=np.array(self.gate_threshold),
+                 action_low=self.action_low, action_high=self.action_high)
+
+    @classmethod
+    def load(cls, path: str) -> "RidgePolicy":
+        with np.load(path) as data:
+            return cls([str(n) for n in data["feature_names"]], [str(n) for n in data["action_names"]],
+                       data["mean"], data["scale"], data["coef"], data["intercept"], data["precision"],
+                       float(data["gate_threshold"]), data["action_low"], data["action_high"])
+
+
+def cross_validate(dataset: Dataset, folds: int = 5, alpha: float = 1.0,
+                   gate_quantile: float = 0.99) -> Dict[str, Any]:
+    """
+    按时间顺序分块的 k 折交叉验证：每个动作的 RMSE 与被门控接受的比例。
+    Contiguous (time-ordered) k-fold cross-validation: RMSE per action and the share accepted by the gate.
+    """
+    indices = np.array_split(np.arange(len(dataset)), folds)
+    errors, accepted, total = [], 0, 0
+    for fold in indices:
+        train = np.setdiff1d(np.arange(len(dataset)), fold)
+        policy = RidgePolicy.fit(Dataset(dataset.features[train], dataset.targets[train],
+                                         dataset.feature_names, dataset.action_names), alpha, gate_quantile)
+        keep = [dataset.feature_names.index(name) for name in policy.feature_names]
+        features = dataset.features[fold][:, keep]
+        errors.append(policy.predict(features) - dataset.targets[fold])
+        accepted += int((policy.distance(features) <= policy.gate_threshold).sum())
+        total += len(fold)
+    errors = np.concatenate(errors)
+    return {"rmse": dict(zip(dataset.action_names, np.sqrt((errors ** 2).mean(axis=0)).tolist())),
+            "gate_accept_rate": accepted / total if total else None}
+
+
+# --- 控制循环中的使用 (Use in the control loop) ---
+
+@dataclass
+class PolicyStats:
+    """本地策略的累计统计。(Cumulative statistics of the local policy.)"""
+    steps: int = 0
+    local_steps: int = 0
+    local_s: float = 0.0
+    llm_steps: int = 0
+    llm_s: float = 0.0
+
+    @property
+    def local_fraction(self) -> Optional[float]:
+        return self.local_steps / self.steps if self.steps else None
+
+    @property
+    def latency_saved_s(self) -> Optional[float]:
+        """按升级步骤的平均 LLM 耗时估算。(Estimated from the mean LLM time of the escalated steps.)"""
+        if not self.llm_steps:
+            return None
+        return self.local_steps * (self.llm_s / self.llm_steps) - self.local_s
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"steps": self.steps, "local_steps": self.local_steps, "local_fraction": self.local_fraction,
+                "local_s": round(self.local_s, 4), "llm_steps": self.llm_steps, "llm_s": round(self.llm_s, 4),
+                "latency_saved_s": self.latency_saved_s}
+
+
+class LocalController:
+    """
+    Args:
+        policy (RidgePolicy): 训练好的策略。(The trained policy.)
+        margin (float): 门控阈值的倍数，越大越多步骤在本地服务。(Multiplies the gate threshold.)
+    """
+
+    def __init__(self, policy: RidgePolicy, margin: float = 1.0):
+        self.policy = policy
+        self.margin = margin
+        self.stats = PolicyStats()
+        self._features_checked = False
+
+    @classmethod
+    def from_file(cls, path: str, margin: float = 1.0) -> "LocalController":
+        return cls(RidgePolicy.load(path), margin)
+
+    def check_features(self, features: Dict[str, float]):
+        """
+        确认实时特征包含策略的全部特征，否则每一步都会悄悄升级给 LLM。
+        Checks that the live features include all of the policy's features; otherwise every step would
+        silently be escalated to the LLM.
+
+        Raises:
+            ValueError: 策略需要的特征不在实时特征中。(Features the policy needs are missing from the live features.)
+        """
+        missing = [name for name in self.policy.feature_names if name not in features]
+        if missing:
+            raise ValueError(
+                f"The local policy needs {len(missing)} feature(s) the observations do not provide "
+                f"(e.g. {', '.join(missing[:5])}); it was trained on a different testcase or feature set. "
+                f"Retrain it with train_policy.py on data of this loop (memory files for main.py, the expert "
+                f"CSV for the expert-data script) or unset local_policy.")
+
+    def decide(self, features: Dict[str, float]) -> Tuple[Optional[Dict[str, float]], float]:
+        """本地动作与距离；动作为 None 时调用方应询问 LLM。(None means the caller should ask the LLM.)"""
+        if not self._features_checked:
+            self.check_features(features)
+            self._features_checked = True
+        start = time.perf_counter()
+        action, distance = self.policy.act(features, self.margin)
+        self.stats.steps += 1
+        if action is not None:
+            self.stats.local_steps += 1
+            self.stats.local_s += time.perf_counter() - start
+        return action, distance
+
+    def record_llm_step(self, seconds: float):
+        self.stats.llm_steps += 1
+        self.stats.llm_s += seconds
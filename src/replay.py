@@ -0,0 +1,208 @@
+"""
+记录运行的确定性重放 (Deterministic replay of recorded runs)。
+
+把 MemoryStore 中记录的动作序列按原始的起始时间、预热期和控制步长重新送入 BOPTEST
+(或本地模拟器)，不调用LLM。可以把连续相同的动作合并为一个更长的步长，以减少 advance 调用。
+重放结果作为新的运行记录写入记忆文件，同时生成 KPI 和奖励相对原始运行的差异报告。
+用途：奖励函数修改后重新生成 KPI、验证模拟器、生成基线。
+
+Feeds the action sequence recorded in a MemoryStore back into BOPTEST (or the local stand-in)
+with the original start time, warmup period and control step, without calling the LLM.
+Consecutive identical actions can be merged into one longer step to save `advance` calls.
+The replay is written as a new run record, together with a diff of KPIs and rewards against the
+original. Uses: regenerating KPIs after a reward-function change, validating the simulator,
+producing baselines.
+"""
+import os
+import json
+import math
+import uuid
+import logging
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .boptest_client import select_testcase, set_step, initialize, advance, get_kpis, stop
+from .config import OUTPUT_DATA_DIR
+from .core.config_loader import load_objectives_config
+from .experience import ExperienceHistory
+from .memory_store import MemoryStore
+from .resume import STATUS_COMPLETED, resume_run_config
+from .reward_engine import RewardEngine
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+@dataclass
+class ReplaySegment:
+    """一次 advance 调用：从第 start 个记录步骤开始，连续 length 个相同的动作。
+    One `advance` call: `length` identical actions starting at recorded step `start`."""
+    start: int
+    length: int
+    action: Dict[str, Any]
+
+    @property
+    def end(self) -> int:
+        """该段最后一个记录步骤的下标。(Index of the last recorded step in the segment.)"""
+        return self.start + self.length - 1
+
+
+def plan_segments(actions: List[Dict[str, Any]], batch_identical: bool = False,
+                  max_batch: Optional[int] = None) -> List[ReplaySegment]:
+    """
+    把动作序列划分为重放段；不合并时每个动作一段。
+    Splits the action sequence into replay segments; one segment per action without batching.
+
+    Args:
+        actions (List[Dict]): 记录的动作，按步骤顺序。(Recorded actions in step order.)
+        batch_identical (bool): 是否合并连续相同的动作。(Merge consecutive identical actions.)
+        max_batch (Optional[int]): 每段最多合并的步骤数。(Upper bound on the steps merged per segment.)
+    """
+    segments: List[ReplaySegment] = []
+    for index, action in enumerate(actions):
+        last = segments[-1] if segments else None
+        # 第一步没有目标函数基线，奖励恒为 0，因此从不合并，以便与原始运行逐段比较
+        # The first step has no objective baseline (its reward is 0), so it is never merged,
+        # keeping the segments comparable with the original run
+        if (batch_identical and last is not None and last.start > 0 and last.action == action
+                and (max_batch is None or last.length < max_batch)):
+            last.length += 1
+        else:
+            segments.append(ReplaySegment(index, 1, action))
+    return segments
+
+
+def _numeric_diff(original: Optional[Dict[str, Any]], replayed: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    diff = {}
+    for name, value in (replayed or {}).items():
+        old = (original or {}).get(name)
+        if isinstance(value, (int, float)) and isinstance(old, (int, float)):
+            diff[name] = value - old
+    return diff
+
+
+def diff_runs(original: ExperienceHistory, replayed: ExperienceHistory, segments: List[ReplaySegment]) -> Dict[str, Any]:
+    """
+    在每个重放段的末尾比较累计 KPI，并比较该段内的奖励之和。
+    Compares the cumulative KPIs at the end of every replay segment, and the reward summed over it.
+    """
+    rows = []
+    max_kpi_diff: Dict[str, float] = {}
+    original_total = replayed_total = 0.0
+    for index, segment in enumerate(segments):
+        old_steps = original.steps[segment.start:segment.end + 1]
+        old_reward = sum(step.reward or 0.0 for step in old_steps)
+        new_step = replayed.steps[index]
+        new_reward = new_step.reward or 0.0
+        kpi_diff = _numeric_diff(old_steps[-1].kpis, new_step.kpis)
+        for name, value in kpi_diff.items():
+            if abs(value) > abs(max_kpi_diff.get(name, 0.0)):
+                max_kpi_diff[name] = value
+        original_total += old_reward
+        replayed_total += new_reward
+        rows.append({"steps": [segment.start, segment.end], "original_reward": old_reward,
+                     "replayed_reward": new_reward, "reward_diff": new_reward - old_reward,
+                     "kpi_diff": kpi_diff})
+    return {
+        "original_total_reward": original_total,
+        "replayed_total_reward": replayed_total,
+        "total_reward_diff": replayed_total - original_total,
+        "max_kpi_diff": max_kpi_diff,
+        "final_kpis": {"original": original.steps[segments[-1].end].kpis if segments else None,
+                       "replayed": replayed.steps[len(segments) - 1].kpis if segments else None},
+        "segments": rows,
+    }
+
+
+def replay_run(run_key: str, filename: str = "memory_store.json", output_filename: Optional[str] = None,
+               batch_identical: bool = False, max_batch: Optional[int] = None,
+               objective: Optional[str] = None) -> Dict[str, Any]:
+    """
+    重放一次记录的运行，写入新的运行记录和差异报告，返回差异报告。
+    Replays a recorded run, writes the new run record and the diff report, and returns the report.
+
+    Args:
+        run_key (str): 原始运行在记忆文件中的键。(Key of the original run in the memory file.)
+        filename (str): 原始记忆文件 (相对于 data/output)。(Source memory file, relative to data/output.)
+        output_filename (Optional[str]): 重放记录写入的记忆文件，默认与原始文件相同。
+                                         Memory file for the replay record; the source file by default.
+        batch_identical (bool): 合并连续相同的动作。(Merge consecutive identical actions.)
+        max_batch (Optional[int]): 每段最多合并的步骤数。(Upper bound on the steps merged per segment.)
+        objective (Optional[str]): 用于重新计算奖励的目标，默认为原始运行的目标。
+                                   Objective used to recompute rewards; the original one by default.
+
+    Raises:
+        ValueError: 运行不存在或没有已完成的步骤。(Unknown run, or no completed steps.)
+        RuntimeError: 模拟器调用失败。(A simulator call failed.)
+    """
+    original = MemoryStore(run_key, filename=filename)
+    completed = original.completed_steps()
+    if completed == 0:
+        raise ValueError(f"Run '{run_key}' has no completed steps to replay.")
+    run_config = resume_run_config(original)
+    objective = objective or run_config.selected_objective
+    reward_engine = RewardEngine.from_objectives_config(load_objectives_config())
+    if objective not in reward_engine:
+        raise ValueError(f"Objective '{objective}' has no `reward` spec in objectives_config.yaml.")
+    original_history = original.full_history()
+    segments = plan_segments([step.action for step in original_history.steps[:completed]],
+                             batch_identical, max_batch)
+    logging.info(f"Replaying {completed} recorded steps of '{run_key}' in {len(segments)} advance calls.")
+
+    testid = select_testcase(run_config.test_case_name)
+    if not testid:
+        raise RuntimeError("Failed to select the test case for replay.")
+    replay_key = f"{run_key}-replay-{uuid.uuid4().hex[:8]}"
+    replayed = MemoryStore(replay_key, filename=output_filename or original.filepath)
+    try:
+        if not set_step(testid, run_config.control_step):
+            raise RuntimeError("Failed to set the control step.")
+        initial_state = initialize(testid, run_config.start_time, run_config.warmup_period)
+        if not initial_state:
+            raise RuntimeError("Failed to initialize the simulator.")
+        replayed.add_static_info(original.testcase_data.get("static_info"))
+        replayed.add_initial_state(dict(initial_state))
+        replayed.update_run_meta(run_config={**run_config.to_dict(), "selected_objective": objective},
+                                 replay_of=run_key, batch_identical=batch_identical, boptest_testid=testid,
+                                 started_at=datetime.now().isoformat(timespec="seconds"))
+
+        current_step = run_config.control_step
+        last_values: Dict[str, float] = {}
+        for segment in segments:
+            step_length = run_config.control_step * segment.length
+            if step_length != current_step:
+                set_step(testid, step_length)
+                current_step = step_length
+            measurements = advance(testid, segment.action)
+            if measurements is None:
+                raise RuntimeError(f"advance failed at recorded step {segment.start}.")
+            kpis = get_kpis(testid) or {}
+            rewards, last_values = reward_engine.step(kpis, last_values)
+            replayed.update_latest_step({"action": segment.action, "kpis": kpis, "reward": rewards[objective],
+                                         "rewards": rewards, "replayed_steps": segment.length})
+            new_time = measurements.pop('time', 0.0)
+            expected_time = (original_history.steps[segment.end + 1].time
+                             if segment.end + 1 < len(original_history) else None)
+            if expected_time is not None and not math.isclose(new_time, expected_time, abs_tol=1.0):
+                logging.warning(f"Replay time {new_time} differs from the recorded {expected_time} "
+                                f"after step {segment.end}.")
+            replayed.add_new_step(new_observation=measurements, new_time=new_time)
+        replayed.set_last_objective_values(last_values)
+        replayed.set_last_objective_integrand(last_values.get(objective))
+        replayed.update_run_meta(status=STATUS_COMPLETED)
+        replayed.save()
+    finally:
+        stop(testid)
+
+    report = {"run_key": run_key, "replay_key": replay_key, "objective": objective,
+              "recorded_steps": completed, "advance_calls": len(segments),
+              **diff_runs(original_history, replayed.history, segments)}
+    # 差异报告写在重放记录所在的目录 (the diff report goes next to the replay record)
+    report_dir = os.path.dirname(replayed.filepath) or OUTPUT_DATA_DIR
+    report_path = os.path.join(report_dir, f"replay_diff_{replay_key}.json")
+    os.makedirs(report_dir, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    report["report_path"] = report_path
+    logging.info(f"Replay '{replay_key}' saved; diff written to {report_path}.")
+    return report
@@ -0,0 +1,137 @@
+"""
+中断运行的断点续跑 (Resuming an interrupted run)。
+
+MemoryStore 在每一步之后都会保存历史、奖励状态和运行元数据 (run_meta)。续跑时，
+在一个新的 BOPTEST 实例上恢复到最后一个已完成步骤的时刻，然后从该步骤继续控制循环：
+  replay: 从原始 start_time 预热，再用 advance 依次重放记录的动作 (不调用LLM)。
+          模拟器状态和累计 KPI 与中断前一致，奖励状态可以原样沿用。
+  reinit: 直接在存储的时刻初始化并预热。更快，但建筑的热状态是近似的，且 BOPTEST
+          的累计 KPI 从零重新开始，因此目标函数基线重置为 0。
+
+MemoryStore saves the history, reward state and run metadata (run_meta) after every step.
+Resuming restores a fresh BOPTEST instance to the time of the last complete step and continues
+the control loop from there:
+  replay: warm up from the original start_time, then replay the recorded actions through
+          `advance` (no LLM calls). The simulator state and cumulative KPIs match the
+          interrupted run, so the reward state carries over unchanged.
+  reinit: initialize and warm up directly at the stored time. Faster, but the thermal state is
+          approximate and BOPTEST's cumulative KPIs restart from zero, so the objective
+          baseline is reset to 0.
+"""
+import os
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import OUTPUT_DATA_DIR
+from .core.run_config import RunConfig, apply_overrides, load_run_config, run_config_from_dict
+from .memory_store import MemoryStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+REPLAY, REINIT = "replay", "reinit"
+RESUME_STRATEGIES = (REPLAY, REINIT)
+
+# 运行状态 (Run statuses)；除 completed 外都可以续跑 (everything but completed is resumable)
+STATUS_RUNNING, STATUS_STOPPED, STATUS_FAILED, STATUS_COMPLETED = "running", "stopped", "failed", "completed"
+
+# 重放得到的时间与记录的时间之差超过该值 (秒) 时视为重放失败
+# A replayed time further than this (seconds) from the recorded one means the replay diverged
+TIME_TOLERANCE_S = 1.0
+
+
+@dataclass
+class RunSummary:
+    """记忆文件中一次运行的概况。(An overview of one run in a memory file.)"""
+    key: str
+    test_case_name: Optional[str]
+    run_name: Optional[str]
+    status: str
+    completed_steps: int
+    simulation_steps: Optional[int]
+    last_time: Optional[float]
+    updated_at: Optional[str]
+
+    @property
+    def resumable(self) -> bool:
+        if self.status == STATUS_COMPLETED:
+            return False
+        return self.simulation_steps is None or self.completed_steps < self.simulation_steps
+
+
+def list_runs(filename: str = "memory_store.json") -> List[RunSummary]:
+    """
+    列出记忆文件中的所有运行。
+    Lists every run in a memory file.
+
+    Args:
+        filename (str): 记忆文件名 (相对于 data/output) 或路径。
+                        Memory file name (relative to data/output) or path.
+    """
+    filepath = os.path.join(OUTPUT_DATA_DIR, filename)
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        all_memories = json.load(f)
+
+    runs = []
+    for key, testcase_data in all_memories.items():
+        history = testcase_data.get("history") or []
+        meta = testcase_data.get("run_meta") or {}
+        config = meta.get("run_config") or {}
+        hot_completed = next((i for i, step in enumerate(history) if step.get("action") is None), len(history))
+        runs.append(RunSummary(
+            key=key,
+            test_case_name=config.get("test_case_name"),
+            run_name=config.get("run_name"),
+            status=meta.get("status", "unknown"),
+            completed_steps=(testcase_data.get("spill") or {}).get("steps", 0) + hot_completed,
+            simulation_steps=config.get("simulation_steps"),
+            last_time=history[min(hot_completed, len(history) - 1)].get("time") if history else None,
+            updated_at=meta.get("updated_at"),
+        ))
+    return runs
+
+
+def resume_run_config(memory: MemoryStore, overrides: Optional[Dict[str, Any]] = None) -> RunConfig:
+    """
+    从 run_meta 还原运行配置；旧文件没有 run_meta 时退回到 configs/run_config.yaml。
+    Restores the run config from run_meta, falling back to configs/run_config.yaml for legacy files.
+    """
+    stored = memory.run_meta.get("run_config")
+    if stored is None:
+        logging.warning(f"Run '{memory.testid}' has no stored run config; using configs/run_config.yaml.")
+        config = load_run_config(overrides=overrides)
+    else:
+        config = apply_overrides(run_config_from_dict(stored), overrides)
+    # 续跑必须写回同一个记忆文件 (a resumed run must write back to the same memory file)
+    config.memory_filename = memory.filepath
+    return config
+
+
+def replay_actions(advance: Callable[[str, Dict[str, Any]], Optional[Dict[str, Any]]], testid: str,
+                   memory: MemoryStore, completed_steps: int) -> Dict[str, Any]:
+    """
+    在已初始化的模拟器上依次重放前 completed_steps 个记录的动作，返回最后的测量值。
+    Replays the first `completed_steps` recorded actions on an initialized simulator and returns
+    the last measurements.
+
+    Raises:
+        RuntimeError: advance 失败，或重放得到的时间与记录不一致。
+                      `advance` failed, or the replayed time does not match the record.
+    """
+    steps = memory.full_history().steps
+    measurements: Dict[str, Any] = {}
+    for index in range(completed_steps):
+        measurements = advance(testid, steps[index].action)
+        if measurements is None:
+            raise RuntimeError(f"Replay failed: advance returned nothing at step {index + 1}.")
+        if index + 1 < len(steps):
+            expected, actual = steps[index + 1].time, measurements.get("time")
+            if expected is not None and actual is not None and abs(actual - expected) > TIME_TOLERANCE_S:
+                raise RuntimeError(f"Replay diverged at step {index + 1}: time {actual} != recorded {expected}.")
+        if (index + 1) % 50 == 0:
+            logging.info(f"Replayed {index + 1}/{completed_steps} actions.")
+    logging.info(f"Replayed {completed_steps} recorded actions.")
+    return measurements
@@ -0,0 +1,318 @@
+"""
+本地知识检索 (Local knowledge retrieval)。
+
+替代每一步都要创建的 GraphRAG 知识检索代理 (一次LLM调用生成查询 + 一次从配置文件加载的
+local_search)。KnowledgeIndex 对 data/input/*.md 等文档按标题分块，一次性建立 BM25 倒排索引，
+并以 .npy 数组持久化在 data/output/.retrieval_index 下；之后的运行以内存映射方式加载，查询在
+毫秒级完成。源文件变化时 (按路径、大小和修改时间的指纹) 自动重建。
+
+查询结果按归一化的状态签名 (目标、时段、在室、室温相对设定点、室外温度分档) 缓存在
+KnowledgeCache 中，处于同一工况的步骤直接复用结果；缓存同样适用于 GraphRAG 后端。
+
+Replaces the per-step GraphRAG knowledge retriever (one LLM call to formulate a query plus a
+local_search loaded from its settings file). KnowledgeIndex chunks data/input/*.md and other
+documents by heading, builds a BM25 inverted index once and persists it as .npy arrays under
+data/output/.retrieval_index; later runs load it memory-mapped and answer queries in milliseconds.
+The index is rebuilt when the sources change (a fingerprint of paths, sizes and mtimes).
+
+Results are cached in a KnowledgeCache keyed on a normalized state signature (objective, time of
+day, occupancy, zone temperature relative to the setpoint, outdoor temperature bin), so steps in
+the same regime reuse them; the cache serves the GraphRAG backend as well.
+"""
+import os
+import re
+import glob
+import json
+import math
+import time
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import PROJECT_ROOT, OUTPUT_DATA_DIR
+from .point_registry import ZONE_TEMPERATURE_SUFFIXES, PointRegistry
+from .schedules import KELVIN_OFFSET, SECONDS_PER_DAY, ScheduleRules
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+INDEX_DIR = os.path.join(OUTPUT_DATA_DIR, ".retrieval_index")
+INDEX_VERSION = 1
+MAX_CHUNK_CHARS = 1500
+BM25_K1, BM25_B = 1.5, 0.75
+
+# 按后缀解析，各测试案例的前缀不同 (resolved by suffix; testcases use different prefixes)
+OUTDOOR_TEMPERATURE_SUFFIX = "reaWeaTDryBul_y"
+OUTDOOR_BIN_DEGC = 5.0
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset("a an and are as at be by for from has have in is it of on or that the this to was "
+                        "were which with".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOP_WORDS]
+
+
+def resolve_paths(patterns: Sequence[str]) -> List[str]:
+    """glob 模式 (相对路径相对于项目根目录) -> 排序后的文件列表。(Globs, relative to the project root -> sorted files.)"""
+    paths = set()
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if pattern:
+            paths.update(glob.glob(pattern if os.path.isabs(pattern) else os.path.join(PROJECT_ROOT, pattern)))
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+def chunk_markdown(text: str, source: str, max_chars: int = MAX_CHUNK_CHARS) -> List[Dict[str, str]]:
+    """
+    按标题把 Markdown 切成小节，过长的小节再按段落切分；每块带上标题路径。
+    Splits Markdown into sections by heading, and long sections by paragraph; each chunk carries
+    its heading path.
+    """
+    chunks: List[Dict[str, str]] = []
+    headings: List[str] = []
+    body: List[str] = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        body.clear()
+        if not content:
+            return
+        heading = " > ".join(h for h in headings if h)
+        piece = ""
+        for paragraph in re.split(r"\n\s*\n", content):
+            if piece and len(piece) + len(paragraph) > max_chars:
+                chunks.append({"source": source, "heading": heading, "text": piece.strip()})
+                piece = ""
+            piece += paragraph + "\n\n"
+        if piece.strip():
+            chunks.append({"source": source, "heading": heading, "text": piece.strip()})
+
+    for line in text.splitlines():
+        match = re.match(r"^(#{1,6})\s+(.*)", line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            headings = (headings + [""] * level)[:level - 1] + [match.group(2).strip()]
+        else:
+            body.append(line)
+    flush()
+    return chunks
+
+
+def _fingerprint(paths: Sequence[str]) -> str:
+    digest = hashlib.sha1(f"v{INDEX_VERSION}:{BM25_K1}:{BM25_B}:{MAX_CHUNK_CHARS}".encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+class KnowledgeIndex:
+    """
+    BM25 倒排索引。倒排表以 CSR 形式存放: indptr[t]:indptr[t+1] 是词 t 的 (文档, 词频) 区间。
+    A BM25 inverted index. Postings are stored CSR-style: indptr[t]:indptr[t+1] is the
+    (document, term frequency) range of term t.
+    """
+
+    _ARRAYS = ("indptr", "postings_doc", "postings_tf", "doc_len", "idf")
+
+    def __init__(self, chunks: List[Dict[str, str]], vocabulary: Dict[str, int], arrays: Dict[str, np.ndarray]):
+        self.chunks = chunks
+        self.vocabulary = vocabulary
+        self.indptr = arrays["indptr"]
+        self.postings_doc = arrays["postings_doc"]
+        self.postings_tf = arrays["postings_tf"]
+        self.doc_len = arrays["doc_len"]
+        self.idf = arrays["idf"]
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @classmethod
+    def build(cls, paths: Sequence[str]) -> "KnowledgeIndex":
+        chunks = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                chunks.extend(chunk_markdown(f.read(), os.path.basename(path)))
+        counts = [Counter(tokenize(f"{c['heading']} {c['text']}")) for c in chunks]
+        vocabulary = {term: i for i, term in enumerate(sorted({t for c in counts for t in c}))}
+        postings: List[List[Tuple[int, int]]] = [[] for _ in vocabulary]
+        for doc, counter in enumerate(counts):
+            for term, tf in counter.items():
+                postings[vocabulary[term]].append((doc, tf))
+        df = np.array([len(p) for p in postings], dtype=np.float32)
+        n = max(len(chunks), 1)
+        arrays = {
+            "indptr": np.concatenate([[0], np.cumsum(df, dtype=np.int64)]).astype(np.int64),
+            "postings_doc": np.array([d for p in postings for d, _ in p], dtype=np.int32),
+            "postings_tf": np.array([tf for p in postings for _, tf in p], dtype=np.float32),
+            "doc_len": np.array([sum(c.values()) for c in counts], dtype=np.float32),
+            "idf": np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32),
+        }
+        return cls(chunks, vocabulary, arrays)
+
+    def save(self, directory: str, fingerprint: str):
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in self._ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        # 元数据最后写入，它的存在表示索引完整 (metadata goes last; its presence marks a complete index)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": fingerprint, "chunks": self.chunks, "vocabulary": self.vocabulary}, f,
+                      ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> Tuple[Optional["KnowledgeIndex"], Optional[str]]:
+        """以内存映射方式加载；返回 (索引, 指纹)，不存在时为 (None, None)。(Loads memory-mapped; (None, None) if absent.)"""
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None, None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in cls._ARRAYS}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable retrieval index in {directory}: {e}")
+            return None, None
+        return cls(meta["chunks"], meta["vocabulary"], arrays), meta.get("fingerprint")
+
+    @classmethod
+    def open(cls, patterns: Sequence[str], directory: str = INDEX_DIR) -> "KnowledgeIndex":
+        """
+        加载持久化的索引，源文件变化或索引不存在时重建。
+        Loads the persisted index, rebuilding it when the sources changed or it does not exist.
+        """
+        paths = resolve_paths(patterns)
+        fingerprint = _fingerprint(paths)
+        index, stored = cls.load(directory)
+        if index is not None and stored == fingerprint:
+            return index
+        del index  # 释放内存映射后再覆盖文件 (release the memory maps before overwriting the files)
+        start = time.perf_counter()
+        index = cls.build(paths)
+        index.save(directory, fingerprint)
+        logging.info(f"Built the retrieval index: {len(index)} chunks from {len(paths)} files "
+                     f"in {time.perf_counter() - start:.2f}s ({directory}).")
+        return cls.load(directory)[0]
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, Dict[str, str]]]:
+        """返回 (得分, 文本块) 列表，按得分降序。(Returns (score, chunk) pairs, best first.)"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * np.asarray(self.doc_len) / (self.avgdl or 1.0))
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1.0) / (tf + norm[docs])
+        top_k = min(top_k, len(scores))
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), self.chunks[i]) for i in best if scores[i] > 0]
+
+
+def render_results(results: List[Tuple[float, Dict[str, str]]]) -> str:
+    """把检索结果格式化为决策提示中的 [RETRIEVED KNOWLEDGE]。(Formats results for [RETRIEVED KNOWLEDGE].)"""
+    if not results:
+        return "No relevant knowledge was found."
+    return "\n\n".join(f"[{chunk['source']} > {chunk['heading']}]\n{chunk['text']}" for _, chunk in results)
+
+
+# --- 状态签名与缓存 (State signature and cache) ---
+
+def state_signature(observation: Dict[str, Any], time_seconds: float, objective: str,
+                    rules: ScheduleRules, point_registry: PointRegistry) -> Tuple[Hashable, ...]:
+    """
+    归一化的工况签名: (目标, 时段, 是否在室, 室温相对制冷设定点, 室外温度分档)。室温和室外温度点由注册表按后缀解析。
+    A normalized regime signature: (objective, time of day, occupied, zone temperature versus the
+    cooling setpoint, outdoor temperature bin). The zone and outdoor points are resolved by the
+    registry's suffix match.
+    """
+    hour = (time_seconds % SECONDS_PER_DAY) / 3600.0
+    period = ("night", "morning", "afternoon", "evening")[int(hour // 6) % 4]
+    zone_point = point_registry.resolve(ZONE_TEMPERATURE_SUFFIXES, observation)
+    zone = observation.get(zone_point) if zone_point is not None else None
+    setpoint = rules.cooling_setpoint_at(time_seconds)
+    if not isinstance(zone, (int, float)):
+        zone_state = "unknown"
+    elif zone > setpoint + 0.5:
+        zone_state = "above setpoint"
+    elif zone < setpoint - 2.0:
+        zone_state = "below setpoint"
+    else:
+        zone_state = "near setpoint"
+    outdoor_point = point_registry.resolve(OUTDOOR_TEMPERATURE_SUFFIX, observation)
+    outdoor = observation.get(outdoor_point) if outdoor_point is not None else None
+    outdoor_bin = (int(math.floor((outdoor - KELVIN_OFFSET) / OUTDOOR_BIN_DEGC) * OUTDOOR_BIN_DEGC)
+                   if isinstance(outdoor, (int, float)) else None)
+    return objective, period, rules.occupied_at(time_seconds), zone_state, outdoor_bin
+
+
+def signature_query(signature: Tuple[Hashable, ...], objective_description: str = "") -> str:
+    """由状态签名构造检索查询，不需要LLM。(Builds the retrieval query from a signature, without the LLM.)"""
+    objective, period, occupied, zone_state, outdoor_bin = signature
+    outdoor = f"outdoor temperature {outdoor_bin} degC" if outdoor_bin is not None else ""
+    return (f"{objective.replace('_', ' ')} {objective_description} "
+            f"{'occupied' if occupied else 'unoccupied'} {period} schedule zone temperature {zone_state} "
+            f"cooling setpoint {outdoor} controller energy pricing comfort")
+
+
+@dataclass
+class RetrievalStats:
+    """知识检索的累计统计。(Cumulative statistics of knowledge retrieval.)"""
+    requests: int = 0
+    cache_hits: int = 0
+    searches: int = 0
+    search_s: float = 0.0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        return self.cache_hits / self.requests if self.requests else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "cache_hits": self.cache_hits, "hit_rate": self.hit_rate,
+                "searches": self.searches,
+                "mean_search_ms": round(1e3 * self.search_s / self.searches, 3) if self.searches else None}
+
+
+class KnowledgeCache:
+    """
+    以状态签名为键的 LRU 结果缓存。
+    An LRU result cache keyed on the state signature.
+
+    Args:
+        max_entries (int): 缓存的签名数上限。(Upper bound on cached signatures.)
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.stats = RetrievalStats()
+
+    def get(self, signature: Hashable) -> Optional[str]:
+        self.stats.requests += 1
+        result = self._entries.get(signature)
+        if result is not None:
+            self._entries.move_to_end(signature)
+            self.stats.cache_hits += 1
+        return result
+
+    def put(self, signature: Hashable, result: str, search_s: float = 0.0):
+        self.stats.searches += 1
+        self.stats.search_s += search_s
+        self._entries[signature] = result
+        self._entries.move_to_end(signature)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,166 @@
+"""
+向量化的奖励引擎 (Vectorized reward engine)。
+
+每个目标在 configs/objectives_config.yaml 中用 `reward` 块声明：对 BOPTEST 累计 KPI 的加权和
+J = Σ w_k · KPI_k，以及是否做差分 (difference: true 时 r_t = -scale · (J_t - J_{t-1})，
+否则 r_t = -scale · J_t)。所有目标被编译成一个 (KPI × 目标) 的权重矩阵，因此一条轨迹
+(或一批轨迹) 上所有目标的奖励只需一次矩阵乘法即可算出，在线 (逐步) 与离线 (整段) 共用同一套公式。
+
+Each objective declares a `reward` block in configs/objectives_config.yaml: a weighted sum of
+BOPTEST's cumulative KPIs, J = Σ w_k · KPI_k, and whether it is differenced (with
+`difference: true`, r_t = -scale · (J_t - J_{t-1}); otherwise r_t = -scale · J_t). All objectives
+are compiled into one (KPI × objective) weight matrix, so the rewards of every objective over a
+trajectory (or a batch of trajectories) take a single matrix product. The online (per-step) and
+offline (whole-episode) paths share the same formula.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .core.config_loader import load_objectives_config
+
+
+@dataclass(frozen=True)
+class RewardSpec:
+    """一个目标的声明式奖励。(The declarative reward of one objective.)"""
+    name: str
+    weights: Dict[str, float] = field(default_factory=dict)
+    difference: bool = True
+    scale: float = 1.0
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict[str, Any]) -> "RewardSpec":
+        unknown = set(data) - {"weights", "difference", "scale"}
+        if unknown:
+            raise ValueError(f"Unknown keys {sorted(unknown)} in the reward spec of '{name}'.")
+        weights = {str(k): float(v) for k, v in (data.get("weights") or {}).items()}
+        if not weights:
+            raise ValueError(f"The reward spec of '{name}' needs at least one KPI weight.")
+        return cls(name, weights, bool(data.get("difference", True)), float(data.get("scale", 1.0)))
+
+
+def load_reward_specs(objectives_config: Optional[Dict[str, Any]] = None) -> Dict[str, RewardSpec]:
+    """
+    读取所有带 `reward` 块的目标。(Reads every objective that has a `reward` block.)
+    """
+    objectives_config = objectives_config if objectives_config is not None else load_objectives_config()
+    return {name: RewardSpec.from_dict(name, cfg["reward"])
+            for name, cfg in (objectives_config or {}).items()
+            if isinstance(cfg, dict) and cfg.get("reward")}
+
+
+class RewardEngine:
+    """
+    Args:
+        specs (Sequence[RewardSpec]): 要一起计算的目标。(The objectives computed together.)
+    """
+
+    def __init__(self, specs: Sequence[RewardSpec]):
+        if not specs:
+            raise ValueError("RewardEngine needs at least one reward spec.")
+        self.names: List[str] = [spec.name for spec in specs]
+        self.kpi_names: List[str] = sorted({kpi for spec in specs for kpi in spec.weights})
+        kpi_index = {kpi: i for i, kpi in enumerate(self.kpi_names)}
+        # (KPI × 目标) 权重矩阵 (the (KPI × objective) weight matrix)
+        self.weights = np.zeros((len(self.kpi_names), len(specs)))
+        for column, spec in enumerate(specs):
+            for kpi, weight in spec.weights.items():
+                self.weights[kpi_index[kpi], column] = weight
+        self._neg_scale = -np.array([spec.scale for spec in specs])
+        self._difference = np.array([spec.difference for spec in specs])
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_objectives_config(cls, objectives_config: Optional[Dict[str, Any]] = None) -> "RewardEngine":
+        return cls(list(load_reward_specs(objectives_config).values()))
+
+    def __contains__(self, objective: str) -> bool:
+        return objective in self._index
+
+    def index(self, objective: str) -> int:
+        return self._index[objective]
+
+    # --- 输入整理 (Input shaping) ---
+
+    def kpi_vector(self, kpis: Optional[Dict[str, Any]]) -> np.ndarray:
+        """把一个 KPI 字典排成向量；缺失或 None 的 KPI 记为 0。(Missing or None KPIs count as 0.)"""
+        kpis = kpis or {}
+        values = [kpis.get(name) for name in self.kpi_names]
+        return np.array([v if isinstance(v, (int, float)) and not math.isnan(v) else 0.0 for v in values])
+
+    def kpi_matrix(self, kpi_sequence: Sequence[Optional[Dict[str, Any]]]) -> np.ndarray:
+        """(T, KPI) 矩阵。(A (T, KPI) matrix.)"""
+        if not kpi_sequence:
+            return np.zeros((0, len(self.kpi_names)))
+        return np.stack([self.kpi_vector(kpis) for kpis in kpi_sequence])
+
+    def kpi_batch(self, episodes: Sequence[Sequence[Optional[Dict[str, Any]]]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        把长度不一的多条轨迹排成 (E, T, KPI) 数组，返回 (数组, 各轨迹长度)。填充部分为 NaN。
+        Packs ragged episodes into an (E, T, KPI) array padded with NaN; returns (array, lengths).
+        """
+        lengths = np.array([len(episode) for episode in episodes], dtype=int)
+        batch = np.full((len(episodes), int(lengths.max(initial=0)), len(self.kpi_names)), np.nan)
+        for e, episode in enumerate(episodes):
+            batch[e, :len(episode)] = self.kpi_matrix(episode)
+        return batch, lengths
+
+    # --- 计算 (Evaluation) ---
+
+    def objective_values(self, kpi_array: np.ndarray) -> np.ndarray:
+        """(..., KPI) -> (..., 目标) 的目标函数值 J。(Objective values J, (..., KPI) -> (..., objective).)"""
+        return kpi_array @ self.weights
+
+    def rewards(self, kpi_array: np.ndarray, baseline: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        一次计算所有目标在整条轨迹上的奖励。
+        Rewards of every objective over whole trajectories in one call.
+
+        Args:
+            kpi_array (np.ndarray): (T, KPI) 或 (E, T, KPI) 的累计 KPI。
+                                    Cumulative KPIs, shaped (T, KPI) or (E, T, KPI).
+            baseline (Optional[np.ndarray]): 第一步之前的目标函数值 (..., 目标)；为 None 时第一步的
+                                             差分奖励为 0 (与在线循环一致)。
+                                             Objective values before the first step; with None the
+                                             first differenced reward is 0, as in the online loop.
+
+        Returns:
+            np.ndarray: (T, 目标) 或 (E, T, 目标) 的奖励；填充位置为 NaN。T=0 时返回同形状的空数组。
+                        Rewards shaped (T, objective) or (E, T, objective); padding stays NaN.
+                        An empty series (T=0) gives an empty array of that shape.
+        """
+        values = self.objective_values(kpi_array)
+        if values.shape[-2] == 0:
+            return values + 0.0
+        previous = np.empty_like(values)
+        previous[..., 1:, :] = values[..., :-1, :]
+        previous[..., 0, :] = values[..., 0, :] if baseline is None else baseline
+        differenced = values - previous
+        return self._neg_scale * np.where(self._difference, differenced, values) + 0.0  # 不输出 -0.0 (no -0.0)
+
+    def episode_rewards(self, episodes: Sequence[Sequence[Optional[Dict[str, Any]]]]) -> Dict[str, List[np.ndarray]]:
+        """
+        一批轨迹 (每条为逐步的 KPI 字典列表) -> {目标: [每条轨迹的奖励数组]}。
+        A batch of episodes (each a list of per-step KPI dicts) -> {objective: [rewards per episode]}.
+        """
+        batch, lengths = self.kpi_batch(episodes)
+        rewards = self.rewards(batch)
+        return {name: [rewards[e, :lengths[e], column] for e in range(len(episodes))]
+                for column, name in enumerate(self.names)}
+
+    def step(self, kpis: Optional[Dict[str, Any]],
+             last_values: Optional[Dict[str, Optional[float]]] = None) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        在线计算一步：返回 ({目标: 奖励}, {目标: 新的目标函数值})。没有上一步值的目标奖励为 0。
+        One online step: returns ({objective: reward}, {objective: new objective value}).
+        Objectives without a previous value get a reward of 0.
+        """
+        values = self.objective_values(self.kpi_vector(kpis))
+        last_values = last_values or {}
+        previous = np.array([last_values.get(name) if last_values.get(name) is not None else np.nan
+                             for name in self.names])
+        differenced = np.where(np.isnan(previous), 0.0, values - np.nan_to_num(previous))
+        rewards = self._neg_scale * np.where(self._difference, differenced, values) + 0.0
+        return dict(zip(self.names, rewards.tolist())), dict(zip(self.names, values.tolist()))
@@ -0,0 +1,369 @@
+"""
+已存储运行的离线分析 (Offline analytics over stored runs)。
+
+把记忆文件中的每次运行展平为列式表 (每个已完成步骤一行)：
+    timestep, time, time_end, reward, obs:<点名>, act:<控制量>, kpi:<KPI>, rew:<目标>
+文本字段 (提示、思考过程) 从不解析进表中。每个记忆文件第一次被读取时，其表会缓存为
+data/output/.analytics_cache 下的 .npz 文件 (源文件修改后自动失效)；之后只从缓存中按需
+加载被请求的列，因此几十个运行也能在数秒内完成比较。
+
+Flattens every run of a memory file into a columnar table (one row per completed step):
+    timestep, time, time_end, reward, obs:<point>, act:<input>, kpi:<KPI>, rew:<objective>
+Text fields (prompts, thoughts) are never parsed into the table. The first time a memory file is
+read its tables are cached as an .npz under data/output/.analytics_cache (invalidated when the
+source changes); afterwards only the requested columns are loaded from the cache, so dozens of
+runs compare in seconds.
+"""
+import os
+import json
+import math
+import hashlib
+import logging
+from fnmatch import fnmatchcase
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import OUTPUT_DATA_DIR
+from .memory_store import spilled_records
+
+try:  # 可选的快速 JSON 解析器 (optional fast JSON parser)
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CACHE_DIR = os.path.join(OUTPUT_DATA_DIR, ".analytics_cache")
+# 缓存格式变化时递增 (bump when the cache layout changes)
+CACHE_VERSION = 1
+BASE_COLUMNS = ("timestep", "time", "time_end", "reward")
+COLUMN_PREFIXES = {"observation": "obs:", "action": "act:", "kpis": "kpi:", "rewards": "rew:"}
+
+# 默认的区域温度点 (default zone-temperature points) 与舒适区间 (°C)
+ZONE_TEMPERATURE_PATTERNS = ("*reaTRooAir_y", "*reaTZon_y")
+DEFAULT_COMFORT_BAND = (21.0, 24.0)
+# KPI 增量超过该值即视为该步骤内发生了不舒适 (a KPI increment above this marks a discomfort step)
+DISCOMFORT_EPS = 1e-9
+
+
+@dataclass
+class RunTable:
+    """一次运行的列式表。(The columnar table of one run.)"""
+    key: str
+    source: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        return self.meta.get("run_name") or self.key[:8]
+
+    def __len__(self) -> int:
+        return len(self.columns["timestep"]) if "timestep" in self.columns else 0
+
+    def column(self, name: str) -> Optional[np.ndarray]:
+        return self.columns.get(name)
+
+    def matching(self, pattern: str) -> Dict[str, np.ndarray]:
+        return {name: values for name, values in self.columns.items() if fnmatchcase(name, pattern)}
+
+
+# --- 展平 (Flattening) ---
+
+def _read_json(path: str) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value is None:
+        return math.nan
+    return float(value)
+
+
+def flatten_run(testcase_data: Dict[str, Any], base_dir: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    把一次运行的历史展平为列 (只含已完成的步骤、只含数值)。给出 base_dir 时包含溢出到磁盘的步骤。
+    Flattens a run's history into columns (completed steps and numeric values only). With base_dir
+    the steps spilled to disk are included.
+    """
+    history = testcase_data.get("history") or []
+    if base_dir is not None:
+        history = spilled_records(testcase_data, base_dir) + history
+    completed = next((i for i, step in enumerate(history) if step.get("action") is None), len(history))
+    steps = history[:completed]
+    n = len(steps)
+    columns: Dict[str, np.ndarray] = {
+        "timestep": np.array([step.get("timestep", i) for i, step in enumerate(steps)], dtype=float),
+        "time": np.array([_number(step.get("time")) for step in steps]),
+        "reward": np.array([_number(step.get("reward")) for step in steps]),
+    }
+    # 每一步的结束时间是下一条记录的时间 (a step ends at the time of the next record)
+    time_end = np.array([_number(history[i + 1].get("time")) if i + 1 < len(history) else math.nan
+                         for i in range(n)])
+    if n and math.isnan(time_end[-1]):
+        spacing = np.nanmedian(np.diff(columns["time"])) if n > 1 else math.nan
+        time_end[-1] = columns["time"][-1] + spacing
+    columns["time_end"] = time_end
+
+    for field_name, prefix in COLUMN_PREFIXES.items():
+        for i, step in enumerate(steps):
+            values = step.get(field_name)
+            if not isinstance(values, dict):
+                continue
+            for name, value in values.items():
+                number = _number(value)
+                if math.isnan(number):
+                    continue
+                column = columns.get(prefix + name)
+                if column is None:
+                    column = columns[prefix + name] = np.full(n, math.nan)
+                column[i] = number
+    return columns
+
+
+def _run_meta(testcase_data: Dict[str, Any]) -> Dict[str, Any]:
+    config = (testcase_data.get("run_meta") or {}).get("run_config") or {}
+    return {"test_case_name": config.get("test_case_name"), "run_name": config.get("run_name"),
+            "selected_objective": config.get("selected_objective"),
+            "status": (testcase_data.get("run_meta") or {}).get("status"),
+            "replay_of": (testcase_data.get("run_meta") or {}).get("replay_of")}
+
+
+# --- 列式缓存 (Columnar cache) ---
+
+def _cache_path(source: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(source).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(CACHE_DIR, f"{os.path.basename(source)}.{digest}.npz")
+
+
+def _source_stamp(source: str) -> Dict[str, Any]:
+    stat = os.stat(source)
+    return {"version": CACHE_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def build_cache(source: str) -> str:
+    """
+    解析记忆文件并写出其列式缓存，返回缓存路径。
+    Parses a memory file and writes its columnar cache; returns the cache path.
+    """
+    stamp = _source_stamp(source)
+    all_memories = _read_json(source)
+    manifest = {**stamp, "runs": []}
+    arrays: Dict[str, np.ndarray] = {}
+    for index, (key, testcase_data) in enumerate(all_memories.items()):
+        columns = flatten_run(testcase_data, os.path.dirname(os.path.abspath(source)))
+        manifest["runs"].append({"key": key, "meta": _run_meta(testcase_data), "columns": list(columns)})
+        for name, values in columns.items():
+            arrays[f"r{index}|{name}"] = values
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(source)
+    np.savez(path, __manifest__=np.array(json.dumps(manifest)), **arrays)
+    return path
+
+
+def _open_cache(source: str, use_cache: bool = True):
+    path = _cache_path(source)
+    if use_cache and os.path.exists(path):
+        archive = np.load(path)
+        manifest = json.loads(str(archive["__manifest__"]))
+        if {k: manifest.get(k) for k in ("version", "mtime_ns", "size")} == _source_stamp(source):
+            return archive, manifest
+        archive.close()
+    archive = np.load(build_cache(source))
+    return archive, json.loads(str(archive["__manifest__"]))
+
+
+def _selected(name: str, patterns: Optional[Sequence[str]]) -> bool:
+    return name in BASE_COLUMNS or patterns is None or any(fnmatchcase(name, p) for p in patterns)
+
+
+def load_runs(sources: Iterable[str], columns: Optional[Sequence[str]] = None,
+              keys: Optional[Sequence[str]] = None, use_cache: bool = True) -> List[RunTable]:
+    """
+    加载一个或多个记忆文件中的运行。
+    Loads the runs of one or more memory files.
+
+    Args:
+        sources (Iterable[str]): 记忆文件路径。(Memory file paths.)
+        columns (Optional[Sequence[str]]): 要加载的列的通配模式 (例如 "kpi:*")；基础列总会加载。
+                                           Glob patterns of the columns to load (e.g. "kpi:*");
+                                           the base columns are always loaded.
+        keys (Optional[Sequence[str]]): 只加载这些运行 (键或其前缀)。(Only these runs, by key or prefix.)
+        use_cache (bool): 是否使用列式缓存。(Whether to use the columnar cache.)
+    """
+    runs = []
+    for source in sources:
+        archive, manifest = _open_cache(source, use_cache)
+        with archive:
+            for index, run in enumerate(manifest["runs"]):
+                if keys and not any(run["key"].startswith(k) for k in keys):
+                    continue
+                # npz 的成员按需读取，未选中的列不会被解压 (npz members are read lazily; pruned columns stay packed)
+                table_columns = {name: archive[f"r{index}|{name}"] for name in run["columns"]
+                                 if _selected(name, columns)}
+                runs.append(RunTable(run["key"], source, run["meta"], table_columns))
+    return runs
+
+
+# --- 指标 (Metrics) ---
+
+def _last_finite(values: np.ndarray) -> Optional[float]:
+    finite = values[np.isfinite(values)]
+    return float(finite[-1]) if finite.size else None
+
+
+def _durations_h(table: RunTable) -> np.ndarray:
+    return np.nan_to_num(table.columns["time_end"] - table.columns["time"]) / 3600.0
+
+
+def _to_celsius(values: np.ndarray) -> np.ndarray:
+    # BOPTEST 温度以 K 为单位 (BOPTEST temperatures are in K)
+    return values - 273.15 if np.nanmedian(values) > 200 else values
+
+
+def zone_temperatures(table: RunTable, patterns: Sequence[str] = ZONE_TEMPERATURE_PATTERNS) -> Dict[str, np.ndarray]:
+    found = {}
+    for pattern in patterns:
+        found.update(table.matching("obs:" + pattern))
+    return {name: _to_celsius(values) for name, values in found.items()}
+
+
+def daily_energy(table: RunTable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按模拟日统计能耗 (累计 KPI ener_tot 的日增量)，返回 (日序号, 每日能耗)。
+    Energy per simulated day (daily increments of the cumulative ener_tot KPI); returns (days, energy).
+    """
+    energy = table.column("kpi:ener_tot")
+    if energy is None or not len(table):
+        return np.zeros(0, dtype=int), np.zeros(0)
+    # 步骤按其开始时刻归入某一天 (a step belongs to the day it starts in)
+    days = np.floor(table.columns["time"] / 86400.0).astype(int)
+    cumulative = np.maximum.accumulate(np.nan_to_num(energy))
+    unique_days, last_index = np.unique(days[::-1], return_index=True)
+    day_end = cumulative[len(days) - 1 - last_index]
+    return unique_days, np.diff(day_end, prepend=0.0)
+
+
+def summarize_run(table: RunTable, comfort_band: Tuple[float, float] = DEFAULT_COMFORT_BAND,
+                  zone_patterns: Sequence[str] = ZONE_TEMPERATURE_PATTERNS) -> Dict[str, Any]:
+    """
+    一次运行的汇总指标。(Summary metrics of one run.)
+
+    comfort_violation_h 根据 BOPTEST 自己的 tdis_tot 增量判定 (使用其随占用变化的舒适区间)；
+    out_of_band_h 是任一区域温度超出给定舒适区间的小时数。
+    comfort_violation_h uses BOPTEST's own tdis_tot increments (its occupancy-dependent comfort
+    bounds); out_of_band_h counts the hours in which any zone temperature leaves the given band.
+    """
+    n = len(table)
+    durations = _durations_h(table)
+    time = table.columns["time"]
+    days = float(np.nansum(durations) / 24.0) if n else 0.0
+    summary: Dict[str, Any] = {
+        "run": table.label, "key": table.key, "testcase": table.meta.get("test_case_name"),
+        "objective": table.meta.get("selected_objective"), "steps": n,
+        "start_day": float(time[0] / 86400.0) if n else None, "days": days,
+        "total_reward": float(np.nansum(table.columns["reward"])) if n else 0.0,
+        "mean_reward": float(np.nanmean(table.columns["reward"])) if n and np.isfinite(table.columns["reward"]).any() else None,
+    }
+    for name, values in table.matching("kpi:*").items():
+        summary[name[4:]] = _last_finite(values)
+    for name, values in table.matching("rew:*").items():
+        summary["total_reward:" + name[4:]] = float(np.nansum(values))
+
+    tdis = table.column("kpi:tdis_tot")
+    if tdis is not None and n:
+        increments = np.diff(np.nan_to_num(tdis), prepend=0.0)
+        summary["comfort_violation_h"] = float(durations[increments > DISCOMFORT_EPS].sum())
+    zones = zone_temperatures(table, zone_patterns)
+    if zones:
+        temperatures = np.vstack(list(zones.values()))
+        low, high = comfort_band
+        with np.errstate(invalid="ignore"):
+            outside = ((temperatures < low) | (temperatures > high)).any(axis=0)
+        summary["out_of_band_h"] = float(durations[outside].sum())
+        summary["mean_zone_temp_C"] = float(np.nanmean(temperatures))
+    if summary.get("ener_tot") is not None and days > 0:
+        summary["energy_per_day"] = summary["ener_tot"] / days
+    return summary
+
+
+def comparison_table(summaries: List[Dict[str, Any]], columns: Optional[Sequence[str]] = None) -> Tuple[List[str], List[List[Any]]]:
+    """
+    把多个运行的汇总排成对比表，返回 (表头, 行)。
+    Arranges run summaries into a comparison table; returns (header, rows).
+    """
+    if columns is None:
+        columns = []
+        for summary in summaries:
+            columns.extend(name for name in summary if name not in columns and name != "key")
+    return list(columns), [[summary.get(name) for name in columns] for summary in summaries]
+
+
+def format_table(header: List[str], rows: List[List[Any]]) -> str:
+    """等宽文本表。(A fixed-width text table.)"""
+    def cell(value: Any) -> str:
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return "-" if value is None else str(value)
+    cells = [[cell(v) for v in row] for row in rows]
+    widths = [max([len(h)] + [len(r[i]) for r in cells]) for i, h in enumerate(header)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(header, widths)),
+             "  ".join("-" * w for w in widths)]
+    lines += ["  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+
+# --- 导出 (Export) ---
+
+def combine_runs(tables: List[RunTable]) -> Dict[str, np.ndarray]:
+    """
+    把多个运行拼成一张长表 (列取并集，缺失为 NaN)，附带 run 序号列。
+    Concatenates runs into one long table (union of columns, NaN where missing) with a run index column.
+    """
+    names: List[str] = list(BASE_COLUMNS)
+    for table in tables:
+        names.extend(name for name in table.columns if name not in names)
+    total = sum(len(table) for table in tables)
+    combined = {"run": np.concatenate([np.full(len(t), i) for i, t in enumerate(tables)]) if tables else np.zeros(0, int)}
+    for name in names:
+        column = np.full(total, math.nan)
+        offset = 0
+        for table in tables:
+            values = table.columns.get(name)
+            if values is not None:
+                column[offset:offset + len(table)] = values
+            offset += len(table)
+        combined[name] = column
+    return combined
+
+
+def export_runs(tables: List[RunTable], path: str):
+    """
+    导出长表：.npz (NumPy)、.parquet (需要 pandas 与 pyarrow) 或 .csv (需要 pandas)。
+    Exports the long table: .npz (NumPy), .parquet (needs pandas and pyarrow) or .csv (needs pandas).
+    """
+    combined = combine_runs(tables)
+    run_keys = np.array([table.key for table in tables])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith(".npz"):
+        np.savez_compressed(path, run_keys=run_keys, **combined)
+        return
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError("Exporting to Parquet/CSV needs pandas; use an .npz path instead.") from e
+    frame = pd.DataFrame(combined)
+    frame.insert(0, "run_key", run_keys[combined["run"].astype(int)] if len(frame) else [])
+    if path.endswith(".parquet"):
+        try:
+            frame.to_parquet(path, index=False)
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow or fastparquet; use an .npz or .csv path instead.") from e
+    elif path.endswith(".csv"):
+        frame.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported export format: {path} (use .npz, .parquet or .csv)")
@@ -0,0 +1,233 @@
+"""
+静态时间表的预计算 (Precomputed static schedules)。
+
+专家数据循环的奖励在每个采样点都需要分时电价和舒适度设定点 (在室/非在室)。这些都是只依赖时间的
+静态规则，因此 EpisodeSchedule 在回合开始时按采样周期一次性算出整个回合的电价、设定点和在室数组，
+逐点查询则使用每套规则只算一次的按秒日表 (O(1) 下标)；奖励计算和提示构建共用同一个实例。规则来自 configs/schedules_config.yaml
+(可按测试案例覆盖)，静态建筑信息中结构化的在室时段和设定点优先。
+
+The expert-data reward needs the time-of-use price and the comfort setpoint (occupied/unoccupied)
+at every sample. Both are static, time-only rules, so an EpisodeSchedule computes the price,
+setpoint and occupancy arrays of a whole episode once, at the sampling period, and per-point
+lookups index a per-second day table computed once per set of rules; the reward computation and the prompt building share one instance. The
+rules come from configs/schedules_config.yaml (overridable per testcase); structured occupancy
+hours and setpoints in the static building info take precedence.
+"""
+import functools
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import CONFIG_DIR
+from .core.config_loader import load_yaml_file
+
+SECONDS_PER_DAY = 86400
+KELVIN_OFFSET = 273.15
+
+
+def load_schedules_config() -> Dict[str, Any]:
+    """加载时间表配置文件。 (Loads the schedules configuration file.)"""
+    return load_yaml_file(Path(CONFIG_DIR) / 'schedules_config.yaml') or {}
+
+
+@dataclass(frozen=True)
+class ScheduleRules:
+    """
+    只依赖时间的规则，时刻以小时表示，设定点以 K 表示。
+    Time-only rules; hours of the day, setpoints in K.
+    """
+    off_peak_price: float = 0.04440
+    # (起始小时, 结束小时, 电价)，先匹配者优先 ((start_hour, end_hour, price), first match wins)
+    tariff_periods: Tuple[Tuple[float, float, float], ...] = field(default_factory=tuple)
+    occupied_hours: Tuple[float, float] = (8.0, 18.0)
+    occupied_cooling_k: float = 24.0 + KELVIN_OFFSET
+    unoccupied_cooling_k: float = 30.0 + KELVIN_OFFSET
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]] = None, testcase: Optional[str] = None,
+                    static_info: Any = None) -> "ScheduleRules":
+        config = config if config is not None else load_schedules_config()
+        merged = dict(config.get("default") or {})
+        for key, value in ((config.get("testcases") or {}).get(testcase or "", {}) or {}).items():
+            merged[key] = {**(merged.get(key) or {}), **value} if isinstance(value, dict) else value
+        tariff = merged.get("tariff") or {}
+        occupancy = merged.get("occupancy") or {}
+        comfort = merged.get("comfort") or {}
+        occupied_hours = (float(occupancy.get("start_hour", 8)), float(occupancy.get("end_hour", 18)))
+        occupied_c = float(comfort.get("occupied_cooling", 24.0))
+        unoccupied_c = float(comfort.get("unoccupied_cooling", 30.0))
+
+        hours, setpoints = _static_schedule(static_info)
+        occupied_hours = hours or occupied_hours
+        occupied_c = setpoints.get("occupied", occupied_c)
+        unoccupied_c = setpoints.get("unoccupied", unoccupied_c)
+        return cls(
+            off_peak_price=float(tariff.get("off_peak", cls.off_peak_price)),
+            tariff_periods=tuple((float(p["start_hour"]), float(p["end_hour"]), float(p["price"]))
+                                 for p in tariff.get("periods") or []),
+            occupied_hours=occupied_hours,
+            occupied_cooling_k=_to_kelvin(occupied_c),
+            unoccupied_cooling_k=_to_kelvin(unoccupied_c),
+        )
+
+    # --- 标量规则 (Scalar rules; used off the precomputed grid) ---
+
+    def price_at(self, time_seconds: float) -> float:
+        hour = (time_seconds % SECONDS_PER_DAY) / 3600.0
+        return next((price for start, end, price in self.tariff_periods if start <= hour < end), self.off_peak_price)
+
+    def occupied_at(self, time_seconds: float) -> bool:
+        hour = (time_seconds % SECONDS_PER_DAY) / 3600.0
+        return self.occupied_hours[0] <= hour < self.occupied_hours[1]
+
+    def cooling_setpoint_at(self, time_seconds: float) -> float:
+        return self.occupied_cooling_k if self.occupied_at(time_seconds) else self.unoccupied_cooling_k
+
+
+@functools.lru_cache(maxsize=8)
+def _day_tables(rules: ScheduleRules) -> Tuple[List[float], List[bool], List[float], List[Tuple[float, float]]]:
+    """
+    一天中每一整秒的电价、在室、制冷设定点以及 (电价, 设定点) 对 (与标量规则相同的算术)，每套规则只计算一次。
+    Price, occupancy, cooling setpoint and (price, setpoint) pairs for every whole second of a day, with
+    the same arithmetic as the scalar rules; computed once per set of rules.
+    """
+    hours = np.arange(SECONDS_PER_DAY) / 3600.0
+    price = np.full(SECONDS_PER_DAY, rules.off_peak_price)
+    assigned = np.zeros(SECONDS_PER_DAY, dtype=bool)
+    for start, end, period_price in rules.tariff_periods:
+        in_period = (hours >= start) & (hours < end) & ~assigned
+        price[in_period] = period_price
+        assigned |= in_period
+    occupied = (hours >= rules.occupied_hours[0]) & (hours < rules.occupied_hours[1])
+    setpoint = np.where(occupied, rules.occupied_cooling_k, rules.unoccupied_cooling_k)
+    # 逐点查询用 Python 列表，避免 NumPy 标量的开销 (lists for per-point lookups avoid NumPy scalar overhead)
+    price, occupied, setpoint = price.tolist(), occupied.tolist(), setpoint.tolist()
+    return price, occupied, setpoint, list(zip(price, setpoint))
+
+
+def _to_kelvin(value: float) -> float:
+    # 小于 200 的值视为摄氏度 (values below 200 are taken as degC)
+    return value + KELVIN_OFFSET if value < 200 else value
+
+
+def _hour_of(value: Any) -> Optional[float]:
+    """8、8.5 或 "08:30" -> 小时数。(8, 8.5 or "08:30" -> hours.)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        parts = value.strip().split(":")
+        try:
+            return float(parts[0]) + (float(parts[1]) / 60.0 if len(parts) > 1 else 0.0)
+        except ValueError:
+            return None
+    return None
+
+
+def _static_schedule(static_info: Any) -> Tuple[Optional[Tuple[float, float]], Dict[str, float]]:
+    """
+    从静态建筑信息中读取第一个结构化的在室时段和制冷设定点；自由文本被忽略。
+    Reads the first structured occupied hours and cooling setpoints from the static building info;
+    free text is ignored.
+    """
+    if static_info is None:
+        return None, {}
+    if hasattr(static_info, "model_dump"):  # StaticBuildingData
+        static_info = static_info.model_dump(by_alias=True)
+    zones = (((static_info.get("building_info") or {}).get("internal_loads") or {}).get("zones")) or []
+    hours, setpoints = None, {}
+    for zone in zones:
+        schedule = zone.get("occupancy_schedule")
+        occupied = schedule.get("occupied_hours") if isinstance(schedule, dict) else None
+        occupied = occupied[0] if isinstance(occupied, list) and occupied else occupied
+        if hours is None and isinstance(occupied, dict):
+            start = _hour_of(occupied.get("start", occupied.get("start_hour")))
+            end = _hour_of(occupied.get("end", occupied.get("end_hour")))
+            if start is not None and end is not None and start < end:
+                hours = (start, end)
+        for state in ("occupied", "unoccupied"):
+            values = (zone.get("temperature_setpoints") or {}).get(state) or {}
+            cooling = values.get("cooling")
+            if state not in setpoints and isinstance(cooling, (int, float)):
+                setpoints[state] = float(cooling)
+    return hours, setpoints
+
+
+class EpisodeSchedule:
+    """
+    一个回合在采样网格上的电价、设定点和在室数组。逐点查询按整秒查日表，非整秒的时间戳回退到标量规则。
+    Price, setpoint and occupancy arrays of one episode on the sampling grid. Per-point lookups index
+    the per-second day table; timestamps that are not whole seconds fall back to the scalar rules.
+
+    Args:
+        rules (ScheduleRules): 时间表规则。(The schedule rules.)
+        start_time (float): 回合起始时间 (秒)。(Episode start time in seconds.)
+        episode_length (float): 回合长度 (秒)。(Episode length in seconds.)
+        period (float): 采样周期 (秒)。(Sampling period in seconds.)
+    """
+
+    def __init__(self, rules: ScheduleRules, start_time: float, episode_length: float, period: float):
+        if period <= 0:
+            raise ValueError(f"The schedule period must be positive, got {period}.")
+        self.rules = rules
+        self.start_time = float(start_time)
+        self.period = float(period)
+        # 包含回合结束时刻的网格点 (grid points including the end of the episode)
+        self.times = self.start_time + self.period * np.arange(int(math.ceil(episode_length / period)) + 1)
+        hours = (self.times % SECONDS_PER_DAY) / 3600.0
+        self.price = np.full(len(self.times), rules.off_peak_price)
+        assigned = np.zeros(len(self.times), dtype=bool)
+        for start, end, price in rules.tariff_periods:
+            in_period = (hours >= start) & (hours < end) & ~assigned
+            self.price[in_period] = price
+            assigned |= in_period
+        self.occupied = (hours >= rules.occupied_hours[0]) & (hours < rules.occupied_hours[1])
+        self.cooling_setpoint = np.where(self.occupied, rules.occupied_cooling_k, rules.unoccupied_cooling_k)
+        self._price, self._occupied, self._cooling_setpoint, self._reward_terms = _day_tables(rules)
+
+    @classmethod
+    def for_episode(cls, start_time: float, episode_length: float, period: float, testcase: Optional[str] = None,
+                    static_info: Any = None, config: Optional[Dict[str, Any]] = None) -> "EpisodeSchedule":
+        return cls(ScheduleRules.from_config(config, testcase, static_info), start_time, episode_length, period)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def price_at(self, time_seconds: float) -> float:
+        second = int(time_seconds)
+        if second != time_seconds:
+            return self.rules.price_at(time_seconds)
+        return self._price[second % SECONDS_PER_DAY]
+
+    def occupied_at(self, time_seconds: float) -> bool:
+        second = int(time_seconds)
+        if second != time_seconds:
+            return self.rules.occupied_at(time_seconds)
+        return self._occupied[second % SECONDS_PER_DAY]
+
+    def cooling_setpoint_at(self, time_seconds: float) -> float:
+        second = int(time_seconds)
+        if second != time_seconds:
+            return self.rules.cooling_setpoint_at(time_seconds)
+        return self._cooling_setpoint[second % SECONDS_PER_DAY]
+
+    def reward_terms_at(self, time_seconds: float) -> Tuple[float, float]:
+        """采样奖励所需的 (电价, 制冷设定点)，一次查表。(The (price, cooling setpoint) a sample's reward needs, in one lookup.)"""
+        second = int(time_seconds)
+        if second != time_seconds:
+            return self.rules.price_at(time_seconds), self.rules.cooling_setpoint_at(time_seconds)
+        return self._reward_terms[second % SECONDS_PER_DAY]
+
+    def window(self, time_seconds: float, count: int, step: Optional[float] = None) -> Dict[str, List[Any]]:
+        """
+        从 time_seconds 起每隔 step 秒 (默认为采样周期) 的 count 个点，用于提示中即将到来的时间表。
+        `count` points from `time_seconds` on, `step` seconds apart (the sampling period by default);
+        the upcoming schedule shown in prompts.
+        """
+        step = step or self.period
+        times = [time_seconds + k * step for k in range(count)]
+        return {"price": [self.price_at(t) for t in times],
+                "cooling_setpoint_degC": [round(self.cooling_setpoint_at(t) - KELVIN_OFFSET, 2) for t in times],
+                "occupied": [self.occupied_at(t) for t in times]}
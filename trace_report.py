@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+离线追踪报告：将 LLMCL_TRACE_FILE 写出的 span 聚合为每个阶段的时间分解。
+Offline trace report: aggregates spans written via LLMCL_TRACE_FILE into per-stage time breakdowns.
+
+示例 (Examples):
+    python trace_report.py data/output/traces/run.jsonl
+    python trace_report.py run.jsonl --group-by testid --json report.json
+    python trace_report.py run.jsonl --folded run.folded      # flamegraph.pl / speedscope
+    python trace_report.py run.jsonl --chrome run_chrome.json # chrome://tracing / Perfetto
+"""
+import json
+import argparse
+from pathlib import Path
+
+from src.core.tracing import load_spans, summarize_spans, to_folded_stacks, to_chrome_trace
+
+
+def print_breakdown(rows, group_by=None):
+    """以表格形式打印每阶段的时间分解。(Prints the per-stage breakdown as a table.)"""
+    header = f"{'stage':<36}"
+    if group_by:
+        header += f"{group_by:<40}"
+    header += f"{'count':>7}{'total(s)':>11}{'self(s)':>11}{'mean(ms)':>11}{'p95(ms)':>11}{'self%':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        line = f"{r['stage']:<36}"
+        if group_by:
+            line += f"{str(r.get(group_by)):<40}"
+        line += (f"{r['count']:>7}{r['total_s']:>11.3f}{r['self_s']:>11.3f}"
+                 f"{r['mean_s'] * 1e3:>11.2f}{r['p95_s'] * 1e3:>11.2f}{r['self_share'] * 100:>7.1f}%")
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate control-loop trace spans into per-stage time breakdowns.")
+    parser.add_argument("trace_file", type=str, help="Path to a JSONL or Chrome-trace file written by the tracer.")
+    parser.add_argument("--group-by", type=str, default=None,
+                        help="Additionally group stages by this span tag (e.g. testid or step).")
+    parser.add_argument("--json", type=str, default=None, help="Write the breakdown as JSON to this path.")
+    parser.add_argument("--folded", type=str, default=None,
+                        help="Write collapsed stacks for flame-graph tools to this path.")
+    parser.add_argument("--chrome", type=str, default=None, help="Convert the trace to a Chrome-trace JSON file.")
+    args = parser.parse_args()
+
+    spans = load_spans(args.trace_file)
+    if not spans:
+        print(f"⚠️ No spans found in '{args.trace_file}'")
+        raise SystemExit(1)
+
+    rows = summarize_spans(spans, group_by=args.group_by)
+    print_breakdown(rows, group_by=args.group_by)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=4, default=str), encoding="utf-8")
+        print(f"📄 Breakdown written to '{args.json}'")
+    if args.folded:
+        Path(args.folded).write_text("\n".join(to_folded_stacks(spans)) + "\n", encoding="utf-8")
+        print(f"🔥 Folded stacks written to '{args.folded}'")
+    if args.chrome:
+        Path(args.chrome).write_text(json.dumps(to_chrome_trace(spans)), encoding="utf-8")
+        print(f"🧭 Chrome trace written to '{args.chrome}'")
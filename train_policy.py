@@ -0,0 +1,60 @@
+"""
+训练蒸馏的本地策略 (Train the distilled local policy)。
+
+示例 (Examples):
+    python train_policy.py data/output/memory_store_balance_energy_comfort.json --out data/output/local_policy.npz
+    python train_policy.py LLM_expert_data_collection/datasets/llm_expert_data_train.csv --source expert \
+        --out data/output/expert_policy.npz
+然后在运行配置中设置 local_policy (then set local_policy in the run config):
+    python main.py --set local_policy=data/output/local_policy.npz
+    python LLM_expert_data_collection/generate_llm_expert_data.py --set expert_data.local_policy=data/output/expert_policy.npz
+"""
+import os
+import sys
+import json
+import argparse
+
+from src.config import OUTPUT_DATA_DIR
+from src.point_registry import PointRegistry
+from src.policy import RidgePolicy, cross_validate, expert_dataset, memory_dataset
+
+DEFAULT_OUTPUT = os.path.join(OUTPUT_DATA_DIR, "local_policy.npz")
+STATIC_INFO_PATH = os.path.join(OUTPUT_DATA_DIR, "static_building_info.json")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a ridge policy on recorded LLM decisions.")
+    parser.add_argument("paths", nargs="+", help="Memory files (--source memory) or expert CSV files (--source expert).")
+    parser.add_argument("--source", choices=["memory", "expert"], default="memory",
+                        help="memory: policies for main.py; expert: policies for the expert-data script.")
+    parser.add_argument("--runs", nargs="*", default=None, help="Only these run keys (or key prefixes).")
+    parser.add_argument("--actions", nargs="*", default=None, help="Action names to learn (default: all of them).")
+    parser.add_argument("--testcase", type=str, default="bestest_air",
+                        help="Testcase for the point registry; only prompt-class points become features.")
+    parser.add_argument("--alpha", type=float, default=1.0, help="Ridge regularization strength.")
+    parser.add_argument("--gate-quantile", type=float, default=0.99,
+                        help="Quantile of the training distances used as the confidence gate.")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds (0 to skip).")
+    parser.add_argument("--out", type=str, default=DEFAULT_OUTPUT, help="Path of the .npz policy file.")
+    args = parser.parse_args()
+
+    try:
+        if args.source == "expert":
+            dataset = expert_dataset(args.paths)
+        else:
+            registry = None
+            if os.path.exists(STATIC_INFO_PATH):
+                with open(STATIC_INFO_PATH, "r", encoding="utf-8") as f:
+                    registry = PointRegistry.from_static_info(json.load(f), testcase=args.testcase)
+            dataset = memory_dataset(args.paths, args.runs, args.actions, registry)
+        print(f"Training on {len(dataset)} decisions, {len(dataset.feature_names)} features -> {dataset.action_names}")
+        if args.folds > 1:
+            report = cross_validate(dataset, args.folds, args.alpha, args.gate_quantile)
+            rmse = ", ".join(f"{name}: {value:.4f}" for name, value in report["rmse"].items())
+            print(f"{args.folds}-fold RMSE: {rmse}; gate accepts {report['gate_accept_rate']:.1%} of held-out states")
+        policy = RidgePolicy.fit(dataset, args.alpha, args.gate_quantile)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    policy.save(args.out)
+    print(f"📄 Policy ({len(policy.feature_names)} features, gate threshold {policy.gate_threshold:.2f}) "
+          f"written to '{args.out}'.")